@@ -1,13 +1,22 @@
 import json
 import logging
-
-from django.core.exceptions import ValidationError, ObjectDoesNotExist
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from cacheops import invalidate_model
+from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
+from django.db import transaction
 from django.utils.datetime_safe import datetime
-from app.ciscoeox.exception import ConnectionFailedException, CiscoApiCallFailed
+from app.ciscoeox.exception import ConnectionFailedException, CiscoApiCallFailed, ApiServerErrorException, \
+    GatewayTimeoutException
 from app.ciscoeox.base_api import CiscoEoxApi
 from app.config.settings import AppSettings
+from app.productdb import migration_paths
+from app.productdb.bulk_writer import ProductBulkWriter
 from app.productdb.models import Product, Vendor, ProductMigrationSource, ProductMigrationOption
+from app.productdb.utils import split_list, get_bulk_batch_size
 
 logger = logging.getLogger("productdb")
 
@@ -48,150 +57,428 @@ def clean_api_url_response(url_response):
 
 def update_local_db_based_on_record(eox_record, create_missing=False):
     """
-    update a database entry based on an EoX record provided by the Cisco EoX API
+    update a database entry based on an EoX record provided by the Cisco EoX API (see update_local_db_based_on_records)
 
     :param eox_record: JSON data from the Cisco EoX API
     :param create_missing: set to True, if the product should be created if it's not part of the local database
     :return: returns an error message or None if successful
     """
-    pid = eox_record['EOLProductID']
+    return update_local_db_based_on_records([eox_record], create_missing).get(eox_record["EOLProductID"])
+
+
+# <API value> : <Product attribute>
+EOX_DATE_VALUE_MAP = {
+    "UpdatedTimeStamp": "eox_update_time_stamp",
+    "EndOfSaleDate": "end_of_sale_date",
+    "LastDateOfSupport": "end_of_support_date",
+    "EOXExternalAnnouncementDate": "eol_ext_announcement_date",
+    "EndOfSWMaintenanceReleases": "end_of_sw_maintenance_date",
+    "EndOfRoutineFailureAnalysisDate": "end_of_routine_failure_analysis",
+    "EndOfServiceContractRenewal": "end_of_service_contract_renewal",
+    "EndOfSvcAttachDate": "end_of_new_service_attachment_date",
+    "EndOfSecurityVulSupportDate": "end_of_sec_vuln_supp_date",
+}
+EOX_MIGRATION_SOURCE_NAME = "Cisco EoX Migration option"
+
+
+@lru_cache(maxsize=4096)
+def parse_eox_date(value, date_format):
+    """parse a date value from the Cisco EoX API (cached, most records within a batch share the same dates)"""
+    return datetime.strptime(value, convert_time_format(date_format)).date()
+
+
+def get_eox_product_changes(product, eox_record, url_validator):
+    """
+    compare the lifecycle values of an EoX record with the Product
+    :return: dictionary with the changed Product attributes
+    """
+    changes = {}
+    for key, attr in EOX_DATE_VALUE_MAP.items():
+        if eox_record.get(key, None):
+            value = eox_record[key].get("value", None)
+            value = value.strip() if value else ""
+            # None is required if the date is removed after an earlier sync
+            new_value = parse_eox_date(value, eox_record[key].get("dateFormat", "%Y-%m-%d")) if value != "" else None
+            if getattr(product, attr) != new_value:
+                changes[attr] = new_value
+
+    if "LinkToProductBulletinURL" in eox_record.keys():
+        value = clean_api_url_response(eox_record.get("LinkToProductBulletinURL", ""))
+        if value != "":
+            try:
+                url_validator(value)
+
+            except ValidationError:
+                raise Exception("invalid EoL reference URL")
+
+            if product.eol_reference_url != value:
+                changes["eol_reference_url"] = value
+
+            if "ProductBulletinNumber" in eox_record.keys():
+                value = eox_record.get("ProductBulletinNumber", "EoL bulletin")
+                if product.eol_reference_number != value:
+                    changes["eol_reference_number"] = value
+
+    return changes
+
+
+def get_eox_migration_option_changes(pmo, migration_details):
+    """
+    compare the migration details of an EoX record with the Product Migration Option
+    :return: tuple with a dictionary of the changed attributes and an optional message
+    """
+    values = {}
+    if migration_details["MigrationOption"] == "Enter PID(s)":
+        # product replacement available, add replacement PID
+        values["replacement_product_id"] = migration_details["MigrationProductId"].strip()
+
+    elif migration_details["MigrationOption"] == "See Migration Section" or \
+            migration_details["MigrationOption"] == "Enter Product Name(s)":
+        # complex product migration, only add comment
+        mig_strat = migration_details["MigrationStrategy"].strip()
+        values["comment"] = mig_strat if mig_strat != "" else migration_details["MigrationProductName"].strip()
+
+    else:
+        # no replacement available, only add comment
+        values["comment"] = migration_details["MigrationOption"].strip()  # some data separated by blank
+
+    values["migration_product_info_url"] = clean_api_url_response(migration_details["MigrationProductInfoURL"])
+
+    message = None
+    if values["migration_product_info_url"] != migration_details["MigrationProductInfoURL"].strip():
+        message = "Multiple URL values from the Migration Note received, only the first one is saved"
+
+    changes = dict([(attr, value) for attr, value in values.items() if getattr(pmo, attr) != value])
+    return changes, message
+
+
+def update_local_db_based_on_records(eox_records, create_missing=False):
+    """
+    update the database based on a batch of EoX records provided by the Cisco EoX API (same result as an update per
+    record), the existing Products and Product Migration Options are loaded with a single query each, records without
+    changes are skipped and all changes are saved within a single transaction
+
+    :param eox_records: list of EoX records (JSON data) from the Cisco EoX API
+    :param create_missing: set to True, if the product should be created if it's not part of the local database
+    :return: dictionary with the EoL Product ID as key and the message for the record as value
+    """
+    messages = {}
     # only used with Cisco Products
     v = Vendor.objects.get(name="Cisco Systems")
+    url_validator = URLValidator()
+    writer = ProductBulkWriter()
 
-    if create_missing:
-        product, created = Product.objects.get_or_create(
-            product_id=pid,
-            vendor=v
-        )
+    with transaction.atomic():
+        products = writer.load_products(v.id, [eox_record["EOLProductID"] for eox_record in eox_records])
 
-    else:
-        try:
-            product = Product.objects.get(
-                product_id=pid,
-                vendor=v
-            )
-            created = False
-
-        except ObjectDoesNotExist:
-            logger.debug("%15s: Product not found in database (create disabled)" % pid, exc_info=True)
-            return None
-
-    if created:
-        product.product_id = pid
-        product.description = eox_record['ProductIDDescription']
-        # it is a Cisco API and the vendors are predefined in the database
-        product.vendor = v
-        logger.debug("%15s: Product created" % pid)
-
-    # update the lifecycle information
-    try:
-        logger.debug("%15s: update product lifecycle values" % pid)
-
-        # save datetime values from Cisco EoX API record
-        value_map = {
-            # <API value> : <class attribute>
-            "UpdatedTimeStamp": "eox_update_time_stamp",
-            "EndOfSaleDate": "end_of_sale_date",
-            "LastDateOfSupport": "end_of_support_date",
-            "EOXExternalAnnouncementDate": "eol_ext_announcement_date",
-            "EndOfSWMaintenanceReleases": "end_of_sw_maintenance_date",
-            "EndOfRoutineFailureAnalysisDate": "end_of_routine_failure_analysis",
-            "EndOfServiceContractRenewal": "end_of_service_contract_renewal",
-            "EndOfSvcAttachDate": "end_of_new_service_attachment_date",
-            "EndOfSecurityVulSupportDate": "end_of_sec_vuln_supp_date",
-        }
-
-        for key in value_map.keys():
-            if eox_record.get(key, None):
-                value = eox_record[key].get("value", None)
-                value = value.strip() if value else ""
-                if value != "":
-                    setattr(
-                        product,
-                        value_map[key],
-                        datetime.strptime(
-                            value,
-                            convert_time_format(eox_record[key].get("dateFormat", "%Y-%m-%d"))
-                        ).date()
-                    )
-
-                else:
-                    # required if date is removed after an earlier sync
-                    setattr(
-                        product,
-                        value_map[key],
-                        None
-                    )
-
-        # save string values from Cisco EoX API record
-        if "LinkToProductBulletinURL" in eox_record.keys():
-            value = clean_api_url_response(eox_record.get('LinkToProductBulletinURL', ""))
-            if value != "":
-                val = URLValidator()
-                try:
-                    val(value)
-                    product.eol_reference_url = value
+        migration_details = []
+        for eox_record in eox_records:
+            pid = eox_record["EOLProductID"]
+            product = products.get(pid)
+            if product is None:
+                if not create_missing:
+                    logger.debug("%15s: Product not found in database (create disabled)" % pid)
+                    continue
 
-                except ValidationError:
-                    raise Exception("invalid EoL reference URL")
+                product = Product(product_id=pid, vendor_id=v.id)
+                products[pid] = product
 
-                if "ProductBulletinNumber" in eox_record.keys():
-                    product.eol_reference_number = eox_record.get('ProductBulletinNumber', "EoL bulletin")
+            created = product.pk is None
+            old_values = {}
+            try:
+                changes = get_eox_product_changes(product, eox_record, url_validator)
+                if created:
+                    changes["description"] = eox_record["ProductIDDescription"]
 
-        product.save()
+                # the changes are only applied to the Product if the validation was successful
+                old_values = dict([(attr, getattr(product, attr)) for attr in changes.keys()])
+                for attr, value in changes.items():
+                    setattr(product, attr, value)
 
-    except Exception as ex:
-        if created:
-            # remove the new (incomplete) entry from the database
-            product.delete()
+                if created:
+                    writer.create(product)
+                    logger.debug("%15s: Product created" % pid)
+
+                elif len(changes) != 0:
+                    writer.update(product, changes.keys())
+
+            except Exception as ex:
+                for attr, value in old_values.items():
+                    setattr(product, attr, value)
+
+                logger.error("%15s: Product Data update failed." % pid, exc_info=True)
+                logger.debug("%15s: DataSet with exception\n%s" % (pid, json.dumps(eox_record, indent=4)))
+                messages[pid] = "Product Data update failed: %s" % str(ex)
+                continue
 
-        logger.error("%15s: Product Data update failed." % pid, exc_info=True)
-        logger.debug("%15s: DataSet with exception\n%s" % (pid, json.dumps(eox_record, indent=4)))
-        return "Product Data update failed: %s" % str(ex)
+            if "EOXMigrationDetails" in eox_record:
+                migration_details.append((product, eox_record["EOXMigrationDetails"]))
+
+        writer.save()
+
+        # save migration information if defined (requires the database ID of the new Products)
+        if len(migration_details) == 0:
+            return messages
 
-    # save migration information if defined
-    if "EOXMigrationDetails" in eox_record:
-        migration_details = eox_record["EOXMigrationDetails"]
         product_migration_source, created = ProductMigrationSource.objects.get_or_create(
-            name="Cisco EoX Migration option"
+            name=EOX_MIGRATION_SOURCE_NAME
         )
-
         if created:
             product_migration_source.description = "Migration option suggested by the Cisco EoX API."
             product_migration_source.save()
 
-        if "MigrationOption" in migration_details:
-            candidate_replacement_pid = migration_details["MigrationProductId"].strip()
+        product_ids = [product.pk for product, _ in migration_details]
+        migration_options = {}
+        for chunk in split_list(product_ids):
+            for pmo in ProductMigrationOption.objects.filter(product_id__in=chunk,
+                                                             migration_source=product_migration_source):
+                migration_options[pmo.product_id] = pmo
 
-            if candidate_replacement_pid == pid:
+        changed_options = {}
+        for product, details in migration_details:
+            if "MigrationOption" not in details:
+                continue
+
+            pid = product.product_id
+            if details["MigrationProductId"].strip() == pid:
                 logger.error("Product ID '%s' should be replaced by itself, which is not possible" % pid)
+                continue
 
-            else:
-                # only a single migration option per migration source is allowed
-                pmo, _ = ProductMigrationOption.objects.get_or_create(product=product,
-                                                                      migration_source=product_migration_source)
-                if migration_details["MigrationOption"] == "Enter PID(s)":
-                    # product replacement available, add replacement PID
-                    pmo.replacement_product_id = candidate_replacement_pid
-                    pmo.migration_product_info_url = clean_api_url_response(migration_details["MigrationProductInfoURL"])
+            # only a single migration option per migration source is allowed
+            pmo = migration_options.get(product.pk)
+            if pmo is None:
+                pmo = ProductMigrationOption(product=product, migration_source=product_migration_source)
+                migration_options[product.pk] = pmo
+
+            changes, message = get_eox_migration_option_changes(pmo, details)
+            if message:
+                messages[pid] = message
+
+            if pmo.pk is None or len(changes) != 0:
+                old_values = dict([(attr, getattr(pmo, attr)) for attr in changes.keys()])
+                for attr, value in changes.items():
+                    setattr(pmo, attr, value)
+
+                try:
+                    pmo.clean_fields(exclude=["product", "migration_source", "replacement_db_product"])
+
+                except ValidationError as ex:
+                    for attr, value in old_values.items():
+                        setattr(pmo, attr, value)
 
-                elif migration_details["MigrationOption"] == "See Migration Section" or \
-                        migration_details["MigrationOption"] == "Enter Product Name(s)":
-                    # complex product migration, only add comment
-                    mig_strat = migration_details["MigrationStrategy"].strip()
-                    pmo.comment = mig_strat if mig_strat != "" else migration_details["MigrationProductName"].strip()
-                    pmo.migration_product_info_url = clean_api_url_response(migration_details["MigrationProductInfoURL"])
+                    logger.error("invalid data received from Cisco API, cannot save data object for "
+                                 "'%s' (%s)" % (pid, str(ex)), exc_info=True)
+                    messages[pid] = "Product Migration Option update failed: %s" % str(ex)
+                    continue
+
+                changed_options[product.pk] = pmo
+
+        _save_migration_options(list(changed_options.values()))
+
+    return messages
+
+
+def _save_migration_options(migration_options):
+    """
+    bulk save of the Product Migration Options (including the database relation to the replacement Product, see
+    update_product_migration_replacement_id_relation_field) and update of the affected migration paths
+    """
+    if len(migration_options) == 0:
+        return
+
+    # the relation is only set if the replacement Product ID is unique within the database
+    replacement_db_products = {}
+    replacement_product_ids = set([pmo.replacement_product_id for pmo in migration_options])
+    for chunk in split_list(list(replacement_product_ids)):
+        for product_id, pk in Product.objects.filter(product_id__in=chunk).values_list("product_id", "id"):
+            replacement_db_products[product_id] = None if product_id in replacement_db_products else pk
+
+    new_options = []
+    updated_options = []
+    for pmo in migration_options:
+        pmo.replacement_db_product_id = replacement_db_products.get(pmo.replacement_product_id)
+        if pmo.pk is None:
+            new_options.append(pmo)
+
+        else:
+            updated_options.append(pmo)
+
+    ProductMigrationOption.objects.bulk_create(
+        new_options,
+        batch_size=get_bulk_batch_size(ProductMigrationOption, new_options)
+    )
+    ProductMigrationOption.objects.bulk_update(
+        updated_options,
+        ["replacement_product_id", "replacement_db_product", "comment", "migration_product_info_url"],
+        batch_size=500
+    )
+    invalidate_model(ProductMigrationOption)
+
+    migration_paths.update_migration_paths([pmo.product_id for pmo in migration_options])
+
+
+class RateLimiter:
+    """
+    thread-safe token bucket, every call to acquire consumes a token and blocks until a token is available
+    """
+    def __init__(self, rate, capacity=1):
+        """
+        :param rate: amount of tokens that are added per second (0 disables the rate limit)
+        :param capacity: maximum amount of tokens in the bucket (burst size)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last_update = time.monotonic()
+        self._lock = threading.Lock()
 
-                else:
-                    # no replacement available, only add comment
-                    pmo.comment = migration_details["MigrationOption"].strip()  # some data separated by blank
-                    pmo.migration_product_info_url = clean_api_url_response(migration_details["MigrationProductInfoURL"])
+    def acquire(self):
+        if self.rate <= 0:
+            return
 
-                # add message if only a single entry was saved
-                if pmo.migration_product_info_url != migration_details["MigrationProductInfoURL"].strip():
-                    return "Multiple URL values from the Migration Note received, only the first one is saved"
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last_update) * self.rate)
+                self._last_update = now
 
-                pmo.save()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait_time = (1 - self._tokens) / self.rate
+
+            time.sleep(wait_time)
+
+
+class CiscoEoxApiFetcher:
+    """
+    fetches the EoX records from the Cisco EoX API using bounded thread pools. Every API request (including all pages
+    and retries) is rate limited based on the configured wait time between the requests and at most max_workers
+    requests are executed concurrently. The remaining pages of a query are fetched concurrently after the first page.
+    Temporary API failures (HTTP 500 or gateway timeouts) are retried with an exponential backoff. The worker threads
+    don't access the database.
+    """
+    RETRY_EXCEPTIONS = (ApiServerErrorException, GatewayTimeoutException)
+
+    def __init__(self, wait_time=None, max_workers=4, max_retries=3, backoff_factor=2):
+        """
+        :param wait_time: minimum time between the start of two API requests in seconds (default from the
+                          configuration)
+        :param max_workers: maximum amount of concurrent API requests
+        :param max_retries: amount of retries for an API call that temporary failed
+        :param backoff_factor: wait time before the first retry in seconds, doubled on every following retry
+        """
+        app_settings = AppSettings()
+        if wait_time is None:
+            wait_time = int(app_settings.get_cisco_eox_api_sync_wait_time())
+
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.rate_limiter = RateLimiter(1 / wait_time if wait_time > 0 else 0, capacity=max_workers)
+        self._request_slots = threading.BoundedSemaphore(max_workers)
+        self.api_enabled = app_settings.is_cisco_api_enabled()
+        self.client_id = app_settings.get_cisco_api_client_id()
+        self.client_secret = app_settings.get_cisco_api_client_secret()
+        self._local = threading.local()
+
+    def _get_api(self):
+        """API client of the current thread"""
+        api = getattr(self._local, "api", None)
+        if api is None:
+            api = CiscoEoxApi()
+            api.client_id = self.client_id
+            api.client_secret = self.client_secret
+            self._local.api = api
+
+        return api
+
+    def query_page(self, page, api_query=None, year=None):
+        """
+        query a single page from the Cisco EoX API, retries the API call on temporary failures
+        :raises CiscoApiCallFailed: exception raised if Cisco EoX API call failed
+        :return: tuple with the amount of pages and the EoX records of the page
+        """
+        api = self._get_api()
+        retry = 0
+        while True:
+            logger.info("Executing API query %s on page '%d" % (
+                '%s' % api_query if api_query else "for year %d" % year, page
+            ))
+            try:
+                with self._request_slots:
+                    self.rate_limiter.acquire()
+
+                    # will raise a CiscoApiCallFailed exception on error
+                    if year:
+                        api.query_year(year_to_query=year, page=page)
+
+                    else:
+                        api.query_product(product_id=api_query, page=page)
+
+                return api.amount_of_pages(), api.get_eox_records() if api.get_page_record_count() > 0 else []
+
+            except self.RETRY_EXCEPTIONS as ex:
+                if retry >= self.max_retries:
+                    raise
+
+                wait_time = self.backoff_factor * 2 ** retry
+                retry += 1
+                logger.warning("API call on page %d failed (%s), retry %d of %d in %d seconds" % (
+                    page, ex, retry, self.max_retries, wait_time
+                ))
+                time.sleep(wait_time)
+
+    def fetch(self, api_query=None, year=None, page_executor=None):
+        """
+        returns all EoX records for a specific query (from all pages)
+        :param page_executor: executor for the remaining pages of the query (a new executor is used if not set)
+        :raises CiscoApiCallFailed: exception raised if Cisco EoX API call failed
+        """
+        if not self.api_enabled:
+            raise CiscoApiCallFailed("Cisco API access not enabled")
+
+        amount_of_pages, results = self.query_page(1, api_query=api_query, year=year)
+
+        if amount_of_pages > 1:
+            if page_executor is None:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    results += self._fetch_pages(executor, amount_of_pages, api_query, year)
+
+            else:
+                results += self._fetch_pages(page_executor, amount_of_pages, api_query, year)
+
+        return results
+
+    def _fetch_pages(self, executor, amount_of_pages, api_query, year):
+        """EoX records from the pages 2..amount_of_pages of the query"""
+        results = []
+        for records in executor.map(lambda page: self.query_page(page, api_query, year)[1],
+                                    range(2, amount_of_pages + 1)):
+            results.extend(records)
+
+        return results
+
+    def fetch_queries(self, queries):
+        """
+        fetch the EoX records for multiple queries concurrently, yields a tuple with the query, the EoX records and the
+        exception (None if successful) in the order of completion. The remaining pages of all queries are fetched
+        with a single shared executor.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor, \
+                ThreadPoolExecutor(max_workers=self.max_workers) as page_executor:
+            futures = dict([
+                (executor.submit(self.fetch, api_query=query, page_executor=page_executor), query)
+                for query in queries
+            ])
+            for future in as_completed(futures):
+                query = futures[future]
+                try:
+                    yield query, future.result(), None
+
+                except Exception as ex:
+                    yield query, [], ex
 
 
 def get_raw_api_data(api_query=None, year=None):
@@ -224,30 +511,8 @@ def get_raw_api_data(api_query=None, year=None):
     # start Cisco EoX API query
     logger.info("send query to Cisco EoX database: %s" % api_query)
 
-    eoxapi = CiscoEoxApi()
-    eoxapi.load_client_credentials()
-    results = []
-
     try:
-        current_page = 1
-        result_pages = 999
-
-        while current_page <= result_pages:
-            logger.info("Executing API query %s on page '%d" % ('%s' % api_query if api_query else "for year %d" % year, current_page))
-
-            # will raise a CiscoApiCallFailed exception on error
-            if year:
-                eoxapi.query_year(year_to_query=year, page=current_page)
-
-            else:
-                eoxapi.query_product(product_id=api_query, page=current_page)
-
-            result_pages = eoxapi.amount_of_pages()
-
-            if eoxapi.get_page_record_count() > 0:
-                results.extend(eoxapi.get_eox_records())
-
-            current_page += 1
+        results = CiscoEoxApiFetcher().fetch(api_query=api_query, year=year)
 
     except ConnectionFailedException:
         logger.error("Query failed, server not reachable: %s" % api_query, exc_info=True)
@@ -85,7 +85,7 @@ class BaseCiscoApiConsole:
 
         if respone.status_code == 500:
             logger.error("API response invalid, result was HTTP 500 (%s)" % respone.url)
-            raise CiscoApiCallFailed("API response invalid, result was HTTP 500")
+            raise ApiServerErrorException("API response invalid, result was HTTP 500")
 
         if respone.text == "<h1>Not Authorized</h1>":
             logger.error("cannot claim access token, authorization failed (%s)" % respone.url)
@@ -97,7 +97,13 @@ class BaseCiscoApiConsole:
 
         elif respone.text == "<h1>Gateway Timeout</h1>":
             logger.error("cannot claim access token, Gateway timeout (%s)" % respone.url)
-            raise AuthorizationFailedException("API endpoint temporary unreachable")
+            raise GatewayTimeoutException("API endpoint temporary unreachable")
+
+        if respone.status_code in [502, 503, 504]:
+            logger.error("API endpoint temporary unreachable, result was HTTP %d (%s)" % (respone.status_code,
+                                                                                          respone.url))
+            raise ApiServerErrorException("API endpoint temporary unreachable, result was HTTP %d" %
+                                          respone.status_code)
 
     def load_client_credentials(self):
         logger.debug("load client credentials from configuration")
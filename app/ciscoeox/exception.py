@@ -45,3 +45,17 @@ class CiscoApiCallFailed(Exception):
     exception raised if an API call failed
     """
     pass
+
+
+class ApiServerErrorException(CiscoApiCallFailed):
+    """
+    exception raised if the API endpoint returns a server error (HTTP 500, 502, 503 or 504), the call can be retried
+    """
+    pass
+
+
+class GatewayTimeoutException(AuthorizationFailedException):
+    """
+    exception raised if the API gateway is temporary unreachable, the call can be retried
+    """
+    pass
@@ -4,20 +4,22 @@ import time
 from celery import chain
 from django.core.cache import cache
 from django.db import transaction
-from django.core.exceptions import ValidationError
 from cacheops import invalidate_model
 
 import app.ciscoeox.api_crawler as cisco_eox_api_crawler
 from app.ciscoeox.exception import CiscoApiCallFailed
+from app.config import task_metrics
 from app.config.settings import AppSettings
 from app.config.models import NotificationMessage
 from app.config import utils
 from app.productdb.models import Vendor, Product
-from django_project.celery import app as app, TaskState
+from app.productdb.utils import split_list
+from django_project.celery import app as app, TaskState, TaskProgress
 
 logger = logging.getLogger("productdb")
 
 NOTIFICATION_MESSAGE_TITLE = "Synchronization with Cisco EoX API"
+EOX_RECORD_BATCH_SIZE = 500
 
 
 @app.task(name="ciscoeox.populate_product_lc_state_sync_field")
@@ -70,9 +72,10 @@ def cisco_eox_populate_product_lc_state_sync_field():
     name="ciscoeox.update_local_database_records"
 )
 def update_local_database_records(results, year, records):
-    for record in records:
-        cisco_eox_api_crawler.update_local_db_based_on_record(record, True)
+    for batch in split_list(records, EOX_RECORD_BATCH_SIZE):
+        cisco_eox_api_crawler.update_local_db_based_on_records(batch, True)
 
+    task_metrics.record_task_items(len(records))
     results[str(year)] = "success"
     return results
 
@@ -130,14 +133,11 @@ def initial_sync_with_cisco_eox_api(self, years_list):
 
     if test_result:
         # perform synchronization
-        self.update_state(state=TaskState.PROCESSING, meta={
-            "status_message": "start initial synchronization with the Cisco EoX API..."
-        })
+        progress = TaskProgress(self.request.id)
+        progress.update("start initial synchronization with the Cisco EoX API...")
         all_records = []
         for year in years_list:
-            self.update_state(state=TaskState.PROCESSING, meta={
-                "status_message": "fetch all information for year %d..." % year
-            })
+            progress.update("fetch all information for year %d..." % year)
             # wait some time between the query calls
             time.sleep(int(app_config.get_cisco_eox_api_sync_wait_time()))
 
@@ -176,6 +176,8 @@ def initial_sync_with_cisco_eox_api(self, years_list):
                     type=NotificationMessage.MESSAGE_ERROR
                 )
 
+        task_metrics.record_task_items(sum([len(e["records"]) for e in all_records]))
+
         # update local database (asynchronous task)
         if len(all_records) != 0:
             tasks = [
@@ -227,6 +229,7 @@ def update_cisco_eox_records(records):
 
     counter = 0
     messages = {}
+    records_to_update = []
 
     for record in records:
         blacklisted = False
@@ -240,19 +243,18 @@ def update_cisco_eox_records(records):
                 logger.warning("invalid regular expression in blacklist: %s" % regex)
 
         if not blacklisted:
-            try:
-                message = cisco_eox_api_crawler.update_local_db_based_on_record(record, create_missing)
-                if message:
-                    messages[record["EOLProductID"]] = message
+            records_to_update.append(record)
 
-            except ValidationError as ex:
-                logger.error("invalid data received from Cisco API, cannot save data object for "
-                             "'%s' (%s)" % (record, str(ex)), exc_info=True)
         else:
             messages[record["EOLProductID"]] = " Product record ignored"
 
         counter += 1
 
+    # update the database in batches (single transaction per batch)
+    for batch in split_list(records_to_update, EOX_RECORD_BATCH_SIZE):
+        messages.update(cisco_eox_api_crawler.update_local_db_based_on_records(batch, create_missing))
+
+    task_metrics.record_task_items(counter)
     return {
         "count": counter,
         "messages": messages
@@ -286,9 +288,8 @@ def execute_task_to_synchronize_cisco_eox_states(self, ignore_periodic_sync_flag
 
     else:
         logger.info("start sync with Cisco EoX API...")
-        self.update_state(state=TaskState.PROCESSING, meta={
-            "status_message": "sync with Cisco EoX API..."
-        })
+        progress = TaskProgress(self.request.id)
+        progress.update("sync with Cisco EoX API...")
 
         # read configuration for the Cisco EoX API synchronization
         queries = app_config.get_cisco_eox_api_queries_as_list()
@@ -337,40 +338,41 @@ def execute_task_to_synchronize_cisco_eox_states(self, ignore_periodic_sync_flag
                 successful_queries = []
                 counter = 1
 
-                for query in queries:
-                    self.update_state(state=TaskState.PROCESSING, meta={
-                        "status_message": "send query <code>%s</code> to the Cisco EoX API (<strong>%d of "
-                                          "%d</strong>)..." % (query, counter, len(queries))
-                    })
+                # the queries are executed concurrently, the rate limit is based on the configured wait time
+                progress.update("send <strong>%d</strong> queries to the Cisco EoX API..." % len(queries))
+                fetcher = cisco_eox_api_crawler.CiscoEoxApiFetcher()
+                for query, records, ex in fetcher.fetch_queries(queries):
+                    progress.update("received results for query <code>%s</code> from the Cisco EoX API "
+                                    "(<strong>%d of %d</strong>)..." % (query, counter, len(queries)),
+                                    current=counter, total=len(queries))
 
-                    # wait some time between the query calls
-                    time.sleep(int(app_config.get_cisco_eox_api_sync_wait_time()))
-                    try:
-                        query_eox_records[query] = cisco_eox_api_crawler.get_raw_api_data(api_query=query)
-                        successful_queries.append(query)
+                    if ex is None:
+                        query_eox_records[query] = records
 
-                    except CiscoApiCallFailed as ex:
+                    elif isinstance(ex, CiscoApiCallFailed):
                         msg = "Cisco EoX API call failed (%s)" % str(ex)
-                        logger.error("Query %s to Cisco EoX API failed (%s)" % (query, msg), exc_info=True)
-                        failed_queries.append(query)
+                        logger.error("Query %s to Cisco EoX API failed (%s)" % (query, msg), exc_info=ex)
                         failed_query_msgs[query] = str(ex)
 
-                    except Exception as ex:
+                    else:
                         msg = "Unexpected Exception, cannot access the Cisco API. Please ensure that the server is " \
                               "connected to the internet and that the authentication settings are " \
                               "valid."
-                        logger.error("Query %s to Cisco EoX API failed (%s)" % (query, msg), exc_info=True)
-                        failed_queries.append(query)
+                        logger.error("Query %s to Cisco EoX API failed (%s)" % (query, msg), exc_info=ex)
                         failed_query_msgs[query] = str(ex)
 
                     counter += 1
 
-                for key in query_eox_records:
+                # keep the order of the configuration
+                successful_queries = [query for query in queries if query in query_eox_records]
+                failed_queries = [query for query in queries if query in failed_query_msgs]
+                task_metrics.record_task_items(sum([len(e) for e in query_eox_records.values()]))
+
+                for current, key in enumerate(query_eox_records, 1):
                     amount_of_records = len(query_eox_records[key])
-                    self.update_state(state=TaskState.PROCESSING, meta={
-                        "status_message": "update database (query <code>%s</code>, processed <b>0</b> of "
-                                          "<b>%d</b> results)..." % (key, amount_of_records)
-                    })
+                    progress.update("update database (query <code>%s</code>, processed <b>0</b> of "
+                                    "<b>%d</b> results)..." % (key, amount_of_records),
+                                    current=current, total=len(query_eox_records))
 
                     # update database in a separate task
                     update_cisco_eox_records.apply_async(kwargs={
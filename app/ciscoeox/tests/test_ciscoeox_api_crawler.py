@@ -4,11 +4,15 @@ Test suite for the ciscoeox.api_crawler module
 import pytest
 import json
 import datetime
+import threading
+import time
 import requests
 from copy import deepcopy
 from requests import Response
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from app.ciscoeox import api_crawler
-from app.ciscoeox.exception import CiscoApiCallFailed, ConnectionFailedException
+from app.ciscoeox.exception import CiscoApiCallFailed, ConnectionFailedException, ApiServerErrorException
 from app.productdb import models as productdb_models
 
 pytestmark = pytest.mark.django_db
@@ -121,7 +125,7 @@ class TestGetRawApiData:
                 return r
         monkeypatch.setattr(requests, "Session", MockSession)
 
-        with pytest.raises(CiscoApiCallFailed) as exinfo:
+        with pytest.raises(CiscoApiCallFailed):
             api_crawler.get_raw_api_data("WS-C2950G-48-EI-WS")
 
     @pytest.mark.usefixtures("mock_cisco_api_authentication_server")
@@ -199,6 +203,158 @@ class TestGetRawApiData:
             assert "ProductIDDescription" in e.keys()
 
 
+class MockEoxApi:
+    """replacement for the CiscoEoxApi class, returns a single record per page"""
+    def __init__(self, amount_of_pages=3, failed_calls=0):
+        self.pages = amount_of_pages
+        self.failed_calls = failed_calls
+        self.last_page_call = 0
+
+    def query_product(self, product_id, page=1):
+        if self.failed_calls > 0:
+            self.failed_calls -= 1
+            raise ApiServerErrorException("API response invalid, result was HTTP 500")
+        self.last_page_call = page
+
+    def amount_of_pages(self):
+        return self.pages
+
+    def get_page_record_count(self):
+        return 1
+
+    def get_eox_records(self):
+        return [{"EOLProductID": "Product %d" % self.last_page_call}]
+
+
+@pytest.fixture
+def mock_sleep(monkeypatch):
+    """replace time.sleep and time.monotonic with a virtual clock, returns the list of all sleep calls"""
+    clock = {"now": 0}
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock["now"] += seconds
+
+    monkeypatch.setattr(api_crawler.time, "sleep", sleep)
+    monkeypatch.setattr(api_crawler.time, "monotonic", lambda: clock["now"])
+    return sleeps
+
+
+class TestRateLimiter:
+    def test_token_bucket(self, mock_sleep):
+        limiter = api_crawler.RateLimiter(rate=0.5, capacity=2)
+        for _ in range(4):
+            limiter.acquire()
+
+        assert mock_sleep == [2, 2], "the first two calls should not wait (burst), the next calls wait 2 seconds"
+
+    def test_disabled_rate_limit(self, mock_sleep):
+        limiter = api_crawler.RateLimiter(rate=0)
+        for _ in range(10):
+            limiter.acquire()
+
+        assert mock_sleep == []
+
+
+class TestCiscoEoxApiFetcher:
+    def test_fetch_multiple_pages(self, monkeypatch):
+        fetcher = api_crawler.CiscoEoxApiFetcher(wait_time=0)
+        fetcher.api_enabled = True
+        monkeypatch.setattr(fetcher, "_get_api", lambda: MockEoxApi(amount_of_pages=5))
+
+        result = fetcher.fetch("WS-C2960-*")
+
+        assert [e["EOLProductID"] for e in result] == ["Product %d" % e for e in range(1, 6)]
+
+    def test_fetch_multiple_queries(self, monkeypatch):
+        fetcher = api_crawler.CiscoEoxApiFetcher(wait_time=0)
+        fetcher.api_enabled = True
+        monkeypatch.setattr(fetcher, "_get_api", lambda: MockEoxApi(amount_of_pages=2))
+
+        result = dict([(query, (records, ex)) for query, records, ex in fetcher.fetch_queries(["A*", "B*", "C*"])])
+
+        assert set(result.keys()) == {"A*", "B*", "C*"}
+        for records, ex in result.values():
+            assert ex is None
+            assert len(records) == 2
+
+    def test_failed_page_request_of_multiple_queries(self, monkeypatch):
+        fetcher = api_crawler.CiscoEoxApiFetcher(wait_time=0)
+        fetcher.api_enabled = True
+
+        def query_page(page, api_query=None, year=None):
+            if api_query == "B*" and page == 3:
+                raise CiscoApiCallFailed("page request failed")
+            return 4, [{"EOLProductID": "%s %d" % (api_query, page)}]
+
+        monkeypatch.setattr(fetcher, "query_page", query_page)
+
+        result = dict([(query, (records, ex)) for query, records, ex in fetcher.fetch_queries(["A*", "B*", "C*"])])
+
+        # only the query with the failed page is reported as failed
+        assert set(result.keys()) == {"A*", "B*", "C*"}
+        assert result["B*"][0] == []
+        assert type(result["B*"][1]) is CiscoApiCallFailed
+        assert str(result["B*"][1]) == "page request failed"
+        for query in ["A*", "C*"]:
+            assert result[query][1] is None
+            assert len(result[query][0]) == 4
+
+    def test_every_page_request_is_rate_limited(self, monkeypatch):
+        fetcher = api_crawler.CiscoEoxApiFetcher(wait_time=0, max_workers=2)
+        fetcher.api_enabled = True
+        monkeypatch.setattr(fetcher, "_get_api", lambda: MockEoxApi(amount_of_pages=4))
+
+        state = {"tokens": 0, "active": 0, "max_active": 0}
+        lock = threading.Lock()
+        query_product = MockEoxApi.query_product
+
+        def acquire():
+            with lock:
+                state["tokens"] += 1
+
+        def counting_query_product(api, *args, **kwargs):
+            with lock:
+                state["active"] += 1
+                state["max_active"] = max(state["max_active"], state["active"])
+            time.sleep(0.01)
+            with lock:
+                state["active"] -= 1
+            return query_product(api, *args, **kwargs)
+
+        monkeypatch.setattr(fetcher.rate_limiter, "acquire", acquire)
+        monkeypatch.setattr(MockEoxApi, "query_product", counting_query_product)
+
+        result = list(fetcher.fetch_queries(["A*", "B*", "C*"]))
+
+        assert [len(records) for _, records, _ in result] == [4, 4, 4]
+        assert state["tokens"] == 12, "every page request requires a token"
+        assert state["max_active"] <= 2
+
+    def test_fetch_with_disabled_api(self):
+        fetcher = api_crawler.CiscoEoxApiFetcher(wait_time=0)
+        fetcher.api_enabled = False
+
+        result = list(fetcher.fetch_queries(["A*"]))
+
+        assert len(result) == 1
+        assert type(result[0][2]) is CiscoApiCallFailed
+        assert str(result[0][2]) == "Cisco API access not enabled"
+
+    def test_retry_on_server_errors(self, monkeypatch, mock_sleep):
+        fetcher = api_crawler.CiscoEoxApiFetcher(wait_time=0, max_retries=3, backoff_factor=2)
+        api = MockEoxApi(amount_of_pages=1, failed_calls=2)
+        monkeypatch.setattr(fetcher, "_get_api", lambda: api)
+
+        assert fetcher.query_page(1, api_query="WS-C2960-*") == (1, [{"EOLProductID": "Product 1"}])
+        assert mock_sleep == [2, 4]
+
+        # stop after the maximum amount of retries
+        api.failed_calls = 4
+        with pytest.raises(ApiServerErrorException):
+            fetcher.query_page(1, api_query="WS-C2960-*")
+
 @pytest.mark.usefixtures("import_default_vendors")
 class TestUpdateLocalDbBasedOnRecord:
     def test_with_valid_new_records(self):
@@ -387,6 +543,88 @@ class TestUpdateLocalDbBasedOnRecord:
         assert pmo.get_valid_replacement_product() is None
 
 
+@pytest.mark.usefixtures("import_default_vendors")
+class TestUpdateLocalDbBasedOnRecords:
+    @staticmethod
+    def get_eox_records():
+        with open("app/ciscoeox/tests/data/cisco_eox_reponse_migration_data.json") as f:
+            return json.loads(f.read())["EOXRecord"]
+
+    def test_results_are_equal_to_the_update_per_record(self):
+        eox_records = self.get_eox_records() + [valid_eox_record]
+        fields = ["product_id", "description", "eox_update_time_stamp", "end_of_sale_date", "end_of_support_date",
+                  "eol_ext_announcement_date", "end_of_sw_maintenance_date", "end_of_routine_failure_analysis",
+                  "end_of_service_contract_renewal", "end_of_new_service_attachment_date",
+                  "end_of_sec_vuln_supp_date", "eol_reference_url", "eol_reference_number", "update_timestamp"]
+        pmo_fields = ["product__product_id", "migration_source__name", "replacement_product_id",
+                      "replacement_db_product__product_id", "comment", "migration_product_info_url"]
+
+        for eox_record in eox_records:
+            assert api_crawler.update_local_db_based_on_record(eox_record, create_missing=True) is None
+
+        expected_products = list(productdb_models.Product.objects.order_by("product_id").values(*fields))
+        expected_pmos = list(productdb_models.ProductMigrationOption.objects.order_by("product__product_id").values(
+            *pmo_fields
+        ))
+        productdb_models.Product.objects.all().delete()
+
+        result = api_crawler.update_local_db_based_on_records(eox_records, create_missing=True)
+
+        assert result == {}
+        assert list(productdb_models.Product.objects.order_by("product_id").values(*fields)) == expected_products
+        assert list(productdb_models.ProductMigrationOption.objects.order_by("product__product_id").values(
+            *pmo_fields
+        )) == expected_pmos
+        assert productdb_models.ProductMigrationPath.objects.count() == len(expected_pmos)
+
+    def test_update_of_existing_products(self):
+        v = productdb_models.Vendor.objects.get(name="Cisco Systems")
+        replacement = productdb_models.Product.objects.create(product_id="WS-C2960G-24TC-L", vendor=v)
+        productdb_models.Product.objects.create(product_id="WS-C2960-24T-S", vendor=v,
+                                                eox_update_time_stamp=datetime.date(1999, 1, 1))
+
+        # records that are not part of the database are ignored
+        result = api_crawler.update_local_db_based_on_records(self.get_eox_records() + [valid_eox_record])
+
+        assert result == {}
+        assert productdb_models.Product.objects.count() == 2
+        p = productdb_models.Product.objects.get(product_id="WS-C2960-24T-S")
+        assert p.eox_update_time_stamp == datetime.date(2016, 10, 3)
+        assert p.end_of_sale_date == datetime.date(2016, 10, 5)
+        assert p.get_preferred_replacement_option().replacement_db_product == replacement
+
+        # records without changes are skipped
+        with CaptureQueriesContext(connection) as context:
+            result = api_crawler.update_local_db_based_on_records([valid_eox_record])
+
+        assert result == {}
+        assert [q["sql"] for q in context.captured_queries if q["sql"].startswith(("INSERT", "UPDATE"))] == []
+
+    def test_invalid_records(self):
+        invalid_url_record = deepcopy(valid_eox_record)
+        invalid_url_record["LinkToProductBulletinURL"] = "Not yet provided"
+        invalid_url_record["EOLProductID"] = "xyz"
+        invalid_date_record = deepcopy(valid_eox_record)
+        invalid_date_record["EndOfSaleDate"]["value"] = "31.12.2016"
+        invalid_date_record["EOLProductID"] = "abc"
+        multiple_urls_record = deepcopy(valid_eox_record)
+        multiple_urls_record["EOXMigrationDetails"]["MigrationProductInfoURL"] = "https://localhost or " \
+                                                                                 "https://localhost/other"
+
+        result = api_crawler.update_local_db_based_on_records(
+            [invalid_url_record, invalid_date_record, multiple_urls_record],
+            create_missing=True
+        )
+
+        assert result == {
+            "xyz": "Product Data update failed: invalid EoL reference URL",
+            "abc": "Product Data update failed: time data '31.12.2016' does not match format '%Y-%m-%d'",
+            "WS-C2960-24T-S": "Multiple URL values from the Migration Note received, only the first one is saved"
+        }
+        assert list(productdb_models.Product.objects.values_list("product_id", flat=True)) == ["WS-C2960-24T-S"]
+        pmo = productdb_models.ProductMigrationOption.objects.get()
+        assert pmo.migration_product_info_url == "https://localhost"
+
 def test_clean_url_values():
     """
     test case to clean the URL values from the Cisco API response
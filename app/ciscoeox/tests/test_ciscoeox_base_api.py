@@ -9,6 +9,7 @@ from requests.models import Response
 from app.ciscoeox import base_api
 from app.ciscoeox.base_api import CiscoHelloApi, CiscoApiCallFailed, CredentialsNotFoundException, \
     InvalidClientCredentialsException, ConnectionFailedException, AuthorizationFailedException, CiscoEoxApi
+from app.ciscoeox.exception import ApiServerErrorException
 from django.core.cache import cache
 
 pytestmark = pytest.mark.django_db
@@ -262,6 +263,22 @@ class TestCiscoHelloApi:
             cisco_hello_api.create_temporary_access_token()
         assert exinfo.match("API endpoint temporary unreachable")
 
+    def test_service_unavailable(self, monkeypatch):
+        def get_invalid_authentication_response():
+            r = Response()
+            r.status_code = 503
+            r._content = "".encode("utf-8")
+            return r
+
+        monkeypatch.setattr(requests, "post", lambda x, params, proxies=None: get_invalid_authentication_response())
+
+        cisco_hello_api = CiscoHelloApi()
+        cisco_hello_api.load_client_credentials()
+
+        with pytest.raises(ApiServerErrorException) as exinfo:
+            cisco_hello_api.create_temporary_access_token()
+        assert exinfo.match("API endpoint temporary unreachable, result was HTTP 503")
+
     def test_invalid_json(self, monkeypatch):
         def get_invalid_authentication_response():
             r = Response()
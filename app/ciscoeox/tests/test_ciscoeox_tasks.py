@@ -271,9 +271,9 @@ class TestExecuteTaskToSynchronizeCiscoEoxStateTask:
 
         monkeypatch.setattr(utils, "check_cisco_eox_api_access", lambda x, y, z: True)
         monkeypatch.setattr(
-            cisco_eox_api_crawler,
-            "get_raw_api_data",
-            lambda api_query=None, year=None: raise_ciscoapicallfailed()
+            cisco_eox_api_crawler.CiscoEoxApiFetcher,
+            "fetch",
+            lambda self, api_query=None, year=None, page_executor=None: raise_ciscoapicallfailed()
         )
 
         # test automatic trigger
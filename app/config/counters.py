@@ -0,0 +1,84 @@
+"""
+usage statistics counters of the Product Database
+
+The counters are stored per day within the UsageCounter model and incremented with a single UPDATE statement (F()
+expression), therefore concurrent increments are not lost. The totals contain the values of the statistics config
+options, which were used before the counters were introduced.
+"""
+import datetime
+from django.db import IntegrityError, transaction
+from django.db.models import DateField, F, Sum
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+from app.config.models import UsageCounter, ConfigOption
+from app.config.settings import get_config_options
+
+# config option with the value of the counter before the UsageCounter model was introduced
+LEGACY_CONFIG_OPTIONS = {
+    UsageCounter.PRODUCT_CHECKS: ConfigOption.STAT_AMOUNT_OF_PRODUCT_CHECKS,
+    UsageCounter.UNIQUE_PRODUCT_CHECK_ENTRIES: ConfigOption.STAT_AMOUNT_OF_UNIQUE_PRODUCT_CHECK_ENTRIES,
+}
+
+PERIODS = ["day", "week"]
+
+
+def increment(name, value=1, date=None):
+    """atomically increment the counter of the given day (default: today)"""
+    date = date or timezone.localdate()
+    if UsageCounter.objects.filter(name=name, date=date).update(value=F("value") + value):
+        return
+
+    try:
+        with transaction.atomic():
+            UsageCounter.objects.create(name=name, date=date, value=value)
+
+    except IntegrityError:
+        # created concurrently
+        UsageCounter.objects.filter(name=name, date=date).update(value=F("value") + value)
+
+
+def get_total(name):
+    """returns the total value of the counter (including the legacy config option)"""
+    total = UsageCounter.objects.filter(name=name).aggregate(total=Sum("value"))["total"] or 0
+    legacy_config_option = LEGACY_CONFIG_OPTIONS.get(name)
+    if legacy_config_option:
+        legacy_value = get_config_options().get(legacy_config_option)
+        total += int(legacy_value) if legacy_value else 0
+
+    return total
+
+
+def get_counts(name, period="day", days=28, today=None):
+    """
+    returns the values of the counter per day or per week (starting on monday) within the last days as list of
+    (date, value) tuples, periods without a value are contained with 0
+    """
+    if period not in PERIODS:
+        raise ValueError("invalid period '%s' (expected one of %s)" % (period, ", ".join(PERIODS)))
+
+    today = today or timezone.localdate()
+    start = today - datetime.timedelta(days=days - 1)
+    if period == "week":
+        # the first week is always complete
+        start -= datetime.timedelta(days=start.weekday())
+
+    queryset = UsageCounter.objects.filter(name=name, date__gte=start, date__lte=today)
+
+    if period == "week":
+        step = datetime.timedelta(days=7)
+        values = dict(
+            queryset.annotate(week=TruncWeek("date", output_field=DateField())).values("week")
+            .annotate(total=Sum("value")).values_list("week", "total")
+        )
+
+    else:
+        step = datetime.timedelta(days=1)
+        values = dict(queryset.values_list("date", "value"))
+
+    result = []
+    date = start
+    while date <= today:
+        result.append((date, values.get(date, 0)))
+        date += step
+
+    return result
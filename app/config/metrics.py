@@ -0,0 +1,305 @@
+"""
+request metrics of the Product Database
+
+The MetricsMiddleware records the wall time, the amount and duration of the database queries and the cache hits and
+misses (Django cache and cacheops) per view. The values are aggregated within the process and flushed periodically to
+Redis (if configured), where the values of all processes are combined. The aggregate is exposed in the Prometheus text
+format by the metrics view of the config module.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+import redis
+from cacheops.signals import cache_read
+from django.conf import settings
+from django.core.cache.backends.db import DatabaseCache as BaseDatabaseCache
+from django.db import connection
+from redis_cache import RedisCache as BaseRedisCache
+
+logger = logging.getLogger("productdb")
+
+METRICS_REDIS_KEY = "pdb:metrics"
+
+# upper bounds of the request duration histogram (in seconds)
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+# amount of SQL statements that are logged for a slow request
+SLOW_REQUEST_QUERIES = 5
+
+# metric families in the Prometheus format: name, type, help text and the samples (field prefix within the aggregate,
+# suffix of the sample name and the names of the labels)
+METRIC_FAMILIES = [
+    ("pdb_http_request_duration_seconds", "histogram", "wall time of the requests per view", [
+        ("duration_bucket", "_bucket", ("view", "le")),
+        ("duration_sum", "_sum", ("view", )),
+        ("duration_count", "_count", ("view", )),
+    ]),
+    ("pdb_db_queries_total", "counter", "database queries per view", [
+        ("queries", "", ("view", )),
+    ]),
+    ("pdb_db_query_duration_seconds_total", "counter", "duration of the database queries per view", [
+        ("query_time", "", ("view", )),
+    ]),
+    ("pdb_cache_requests_total", "counter", "cache hits and misses per view (Django cache and cacheops)", [
+        ("cache", "", ("view", "cache", "result")),
+    ]),
+    ("pdb_slow_requests_total", "counter", "requests that exceed the slow request threshold per view", [
+        ("slow", "", ("view", )),
+    ]),
+]
+
+_local = threading.local()
+_redis_client = None
+
+
+class RequestMetrics:
+    """metrics of a single request"""
+    def __init__(self):
+        self.wall_time = 0.0
+        self.queries = []
+        self.cache = defaultdict(int)
+
+    @property
+    def query_time(self):
+        return sum([e[0] for e in self.queries])
+
+    def record_query(self, execute, sql, params, many, context):
+        """database execute wrapper that records the duration of the query"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+
+        finally:
+            self.queries.append((time.perf_counter() - start, sql))
+
+    def record_cache_read(self, cache_name, hits, misses):
+        self.cache[(cache_name, "hit")] += hits
+        self.cache[(cache_name, "miss")] += misses
+
+    def get_worst_queries(self, count=SLOW_REQUEST_QUERIES):
+        return sorted(self.queries, key=lambda e: e[0], reverse=True)[:count]
+
+
+class MetricsAggregate:
+    """
+    thread-safe aggregate of the request metrics within the process, the values are stored as flat dictionary with
+    the field name (metric and label values separated by |) as key
+    """
+    def __init__(self, flush_interval=None):
+        self.flush_interval = flush_interval if flush_interval is not None else settings.PDB_METRICS_FLUSH_INTERVAL
+        self.values = defaultdict(float)
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+
+    def add(self, view_name, request_metrics, slow=False):
+        with self.lock:
+            self.values["duration_sum|%s" % view_name] += request_metrics.wall_time
+            self.values["duration_count|%s" % view_name] += 1
+            for bucket in DURATION_BUCKETS:
+                if request_metrics.wall_time <= bucket:
+                    self.values["duration_bucket|%s|%s" % (view_name, format_bucket(bucket))] += 1
+
+            self.values["queries|%s" % view_name] += len(request_metrics.queries)
+            self.values["query_time|%s" % view_name] += request_metrics.query_time
+            for (cache_name, result), value in request_metrics.cache.items():
+                self.values["cache|%s|%s|%s" % (view_name, cache_name, result)] += value
+
+            if slow:
+                self.values["slow|%s" % view_name] += 1
+
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """add the local values to the aggregate within Redis, returns False if Redis is not available"""
+        client = get_redis_client()
+        if client is None:
+            return False
+
+        with self.lock:
+            values, self.values = self.values, defaultdict(float)
+            self.last_flush = time.monotonic()
+
+        if not values:
+            return True
+
+        try:
+            pipeline = client.pipeline(transaction=False)
+            for field, value in values.items():
+                pipeline.hincrbyfloat(METRICS_REDIS_KEY, field, value)
+
+            pipeline.execute()
+            return True
+
+        except redis.RedisError as ex:
+            logger.warning("cannot flush the request metrics to Redis: %s" % ex)
+            # keep the values for the next flush
+            with self.lock:
+                for field, value in values.items():
+                    self.values[field] += value
+
+            return False
+
+    def get_values(self):
+        """returns the values of all processes (only the values of this process if Redis is not available)"""
+        if self.flush():
+            try:
+                return {
+                    field.decode(): float(value)
+                    for field, value in get_redis_client().hgetall(METRICS_REDIS_KEY).items()
+                }
+
+            except redis.RedisError as ex:
+                logger.warning("cannot read the request metrics from Redis: %s" % ex)
+
+        with self.lock:
+            return dict(self.values)
+
+    def reset(self):
+        with self.lock:
+            self.values = defaultdict(float)
+
+        client = get_redis_client()
+        if client is not None:
+            try:
+                client.delete(METRICS_REDIS_KEY)
+
+            except redis.RedisError as ex:
+                logger.warning("cannot reset the request metrics in Redis: %s" % ex)
+
+
+class MetricsMiddleware:
+    """records the metrics of every request, requests that exceed PDB_SLOW_REQUEST_THRESHOLD are logged"""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_metrics = RequestMetrics()
+        _local.request_metrics = request_metrics
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(request_metrics.record_query):
+                response = self.get_response(request)
+
+        finally:
+            _local.request_metrics = None
+
+        request_metrics.wall_time = time.perf_counter() - start
+        view_name = get_view_name(request)
+        slow = request_metrics.wall_time >= settings.PDB_SLOW_REQUEST_THRESHOLD
+        if slow:
+            log_slow_request(request, view_name, request_metrics)
+
+        aggregate.add(view_name, request_metrics, slow=slow)
+
+        return response
+
+
+class MetricsCacheMixin:
+    """records the hits and misses of the Django cache for the current request"""
+    _missing = object()
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, self._missing, version=version)
+        hit = value is not self._missing
+        record_cache_read("django", int(hit), int(not hit))
+        return value if hit else default
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        # the default implementation of get_many calls get for every key
+        request_metrics = getattr(_local, "request_metrics", None)
+        _local.request_metrics = None
+        try:
+            result = super().get_many(keys, version=version)
+
+        finally:
+            _local.request_metrics = request_metrics
+
+        record_cache_read("django", len(result), len(keys) - len(result))
+        return result
+
+
+class RedisCache(MetricsCacheMixin, BaseRedisCache):
+    pass
+
+
+class DatabaseCache(MetricsCacheMixin, BaseDatabaseCache):
+    pass
+
+
+def get_redis_client():
+    """Redis connection for the aggregates of all processes and the task progress (None if not configured)"""
+    global _redis_client
+    if _redis_client is None and settings.PDB_METRICS_REDIS:
+        _redis_client = redis.StrictRedis(socket_timeout=1, socket_connect_timeout=1, **settings.PDB_METRICS_REDIS)
+
+    return _redis_client
+
+
+def get_view_name(request):
+    resolver_match = getattr(request, "resolver_match", None)
+    return resolver_match.view_name if resolver_match else "unresolved"
+
+
+def record_cache_read(cache_name, hits, misses):
+    request_metrics = getattr(_local, "request_metrics", None)
+    if request_metrics is not None:
+        request_metrics.record_cache_read(cache_name, hits, misses)
+
+
+def on_cacheops_read(sender, func=None, hit=False, **kwargs):
+    record_cache_read("cacheops", int(hit), int(not hit))
+
+
+def log_slow_request(request, view_name, request_metrics):
+    lines = ["slow request %s %s (%s): %.3f seconds, %d queries (%.3f seconds)" % (
+        request.method, request.path, view_name, request_metrics.wall_time, len(request_metrics.queries),
+        request_metrics.query_time
+    )]
+    for duration, sql in request_metrics.get_worst_queries():
+        lines.append("  %.3f seconds: %s" % (duration, sql))
+
+    logger.warning("\n".join(lines))
+
+
+def format_bucket(bucket):
+    return "+Inf" if bucket == float("inf") else str(bucket)
+
+
+def format_label_value(value):
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def render_prometheus(values):
+    """render the given aggregate in the Prometheus text format"""
+    samples = defaultdict(list)
+    for field, value in values.items():
+        prefix, _, label_values = field.partition("|")
+        samples[prefix].append((label_values.split("|"), value))
+
+    lines = []
+    for name, metric_type, help_text, sample_definitions in METRIC_FAMILIES:
+        family_lines = []
+        for prefix, suffix, label_names in sample_definitions:
+            for label_values, value in sorted(samples[prefix], key=lambda e: get_sample_sort_key(e[0])):
+                labels = ",".join(['%s="%s"' % (k, format_label_value(v)) for k, v in zip(label_names, label_values)])
+                family_lines.append("%s%s{%s} %s" % (name, suffix, labels, repr(float(value))))
+
+        if family_lines:
+            lines += ["# HELP %s %s" % (name, help_text), "# TYPE %s %s" % (name, metric_type)] + family_lines
+
+    return "\n".join(lines) + "\n"
+
+
+def get_sample_sort_key(label_values):
+    # the histogram buckets are ordered by the upper bound
+    if len(label_values) == 2 and label_values[1] in [format_bucket(e) for e in DURATION_BUCKETS]:
+        return label_values[0], float(label_values[1])
+
+    return tuple(label_values)
+
+
+aggregate = MetricsAggregate()
+cache_read.connect(on_cacheops_read)
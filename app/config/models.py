@@ -156,6 +156,30 @@ class ConfigOption(models.Model):
         return self.key
 
 
+class UsageCounter(models.Model):
+    """
+    usage statistics counter per day, the values are incremented atomically (see app.config.counters)
+    """
+    PRODUCT_CHECKS = "product_checks"
+    UNIQUE_PRODUCT_CHECK_ENTRIES = "unique_product_check_entries"
+
+    name = models.CharField(
+        max_length=64
+    )
+
+    date = models.DateField()
+
+    value = models.BigIntegerField(
+        default=0
+    )
+
+    def __str__(self):
+        return "%s (%s)" % (self.name, self.date)
+
+    class Meta:
+        unique_together = ("name", "date")
+
+
 @receiver([post_save, post_delete], sender=NotificationMessage)
 def invalidate_notification_message_related_cache_values(sender, instance, **kwargs):
     """delete cache values that are somehow related to the Notification Message data model"""
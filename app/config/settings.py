@@ -1,31 +1,64 @@
 """
 Settings file class for the product database
+
+The config options are kept as process-local snapshot, which is revalidated against a version stamp in the cache
+at most every PDB_CONFIG_OPTIONS_REVALIDATE_INTERVAL seconds. Changes of a ConfigOption drop the local snapshot and
+set a new version stamp (after the commit), which causes the other processes to reload the config options.
 """
 import logging
+import time
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from app.config.models import ConfigOption
-from django.core.cache import cache
+from app.config.version_stamp import VersionStamp
 
 logger = logging.getLogger("productdb")
 
+CONFIG_OPTIONS_VERSION_CACHE_KEY = "PRODUCTDB_CONFIG_OPTIONS_VERSION"
+CONFIG_OPTIONS_VERSION = VersionStamp(CONFIG_OPTIONS_VERSION_CACHE_KEY, "config options")
+
+_snapshot = None
+
+
+class ConfigOptionsSnapshot:
+    """
+    process-local copy of the config options and the version stamp it is based on (owner is set if the config options
+    contain uncommitted changes of the current transaction)
+    """
+    def __init__(self, version, options, owner=None):
+        self.version = version
+        self.options = options
+        self.owner = owner
+        self.validated_at = time.monotonic()
+
 
 class AppSettings:
     """
     Product Database settings
     """
-    CONFIG_OPTIONS_DICT_CACHE_KEY = "PRODUCTDB_CONFIG_OPTIONS"
+    DEFAULT_CONFIG_OPTIONS = {
+        ConfigOption.GLOBAL_CISCO_API_ENABLED: "false",
+        ConfigOption.GLOBAL_LOGIN_ONLY_MODE: "false",
+        ConfigOption.CISCO_API_CLIENT_ID: "PlsChgMe",
+        ConfigOption.CISCO_API_CLIENT_SECRET: "PlsChgMe",
+        ConfigOption.CISCO_EOX_CRAWLER_AUTO_SYNC: "false",
+        ConfigOption.CISCO_EOX_CRAWLER_CREATE_PRODUCTS: "false",
+        ConfigOption.CISCO_EOX_API_QUERIES: "",
+        ConfigOption.CISCO_EOX_PRODUCT_BLACKLIST_REGEX: "",
+        ConfigOption.GLOBAL_INTERNAL_PRODUCT_ID_LABEL: "Internal Product ID",
+        ConfigOption.CISCO_EOX_WAIT_TIME: "5",
+        ConfigOption.CISCO_EOX_CRAWLER_LAST_EXECUTION_TIME: None,
+        ConfigOption.CISCO_EOX_CRAWLER_LAST_EXECUTION_RESULT: None,
+        ConfigOption.STAT_AMOUNT_OF_PRODUCT_CHECKS: "0",
+        ConfigOption.STAT_AMOUNT_OF_UNIQUE_PRODUCT_CHECK_ENTRIES: "0"
+    }
 
     def __init__(self):
-        self._config_options = cache.get(self.CONFIG_OPTIONS_DICT_CACHE_KEY, None)
-        if not self._config_options or len(self._config_options) < 12:
-            # populate cache
-            self.create_defaults()
-            self._config_options = dict(ConfigOption.objects.all().values_list("key", "value"))
-            cache.set(self.CONFIG_OPTIONS_DICT_CACHE_KEY, self._config_options, timeout=None)
-
-    def _rebuild_config_cache(self):
-        cache.delete(self.CONFIG_OPTIONS_DICT_CACHE_KEY)
-        self._config_options = dict(ConfigOption.objects.all().values_list("key", "value"))
-        cache.set(self.CONFIG_OPTIONS_DICT_CACHE_KEY, self._config_options, timeout=None)
+        self._config_options = get_config_options()
+
+    def _refresh_config_options(self):
+        self._config_options = get_config_options()
 
     def _set_boolean(self, config_object, value):
         if value:
@@ -49,24 +82,9 @@ class AppSettings:
         """
         create default configuration if not set
         """
-        expected_defaults = {
-            ConfigOption.GLOBAL_CISCO_API_ENABLED: "false",
-            ConfigOption.GLOBAL_LOGIN_ONLY_MODE: "false",
-            ConfigOption.CISCO_API_CLIENT_ID: "PlsChgMe",
-            ConfigOption.CISCO_API_CLIENT_SECRET: "PlsChgMe",
-            ConfigOption.CISCO_EOX_CRAWLER_AUTO_SYNC: "false",
-            ConfigOption.CISCO_EOX_CRAWLER_CREATE_PRODUCTS: "false",
-            ConfigOption.CISCO_EOX_API_QUERIES: "",
-            ConfigOption.CISCO_EOX_PRODUCT_BLACKLIST_REGEX: "",
-            ConfigOption.GLOBAL_INTERNAL_PRODUCT_ID_LABEL: "Internal Product ID",
-            ConfigOption.CISCO_EOX_WAIT_TIME: "5",
-            ConfigOption.CISCO_EOX_CRAWLER_LAST_EXECUTION_TIME: None,
-            ConfigOption.CISCO_EOX_CRAWLER_LAST_EXECUTION_RESULT: None,
-            ConfigOption.STAT_AMOUNT_OF_PRODUCT_CHECKS: "0",
-            ConfigOption.STAT_AMOUNT_OF_UNIQUE_PRODUCT_CHECK_ENTRIES: "0"
-        }
-        for key, value in expected_defaults.items():
-            if not ConfigOption.objects.filter(key=key).exists():
+        existing_keys = set(ConfigOption.objects.values_list("key", flat=True))
+        for key, value in AppSettings.DEFAULT_CONFIG_OPTIONS.items():
+            if key not in existing_keys:
                 co = ConfigOption.objects.create(key=key)
                 co.value = value
                 co.save()
@@ -83,7 +101,7 @@ class AppSettings:
         """
         co, created = ConfigOption.objects.get_or_create(key=ConfigOption.GLOBAL_LOGIN_ONLY_MODE)
         self._set_boolean(co, value)
-        self._rebuild_config_cache()
+        self._refresh_config_options()
 
     def is_cisco_api_enabled(self):
         """
@@ -97,7 +115,7 @@ class AppSettings:
         """
         co, _ = ConfigOption.objects.get_or_create(key=ConfigOption.GLOBAL_CISCO_API_ENABLED)
         self._set_boolean(co, value)
-        self._rebuild_config_cache()
+        self._refresh_config_options()
 
     def is_periodic_sync_enabled(self):
         """
@@ -111,7 +129,7 @@ class AppSettings:
         """
         co, _ = ConfigOption.objects.get_or_create(key=ConfigOption.CISCO_EOX_CRAWLER_AUTO_SYNC)
         self._set_boolean(co, value)
-        self._rebuild_config_cache()
+        self._refresh_config_options()
 
     def is_auto_create_new_products(self):
         """
@@ -125,7 +143,7 @@ class AppSettings:
         """
         co, _ = ConfigOption.objects.get_or_create(key=ConfigOption.CISCO_EOX_CRAWLER_CREATE_PRODUCTS)
         self._set_boolean(co, value)
-        self._rebuild_config_cache()
+        self._refresh_config_options()
 
     def get_cisco_eox_api_queries(self):
         """
@@ -151,7 +169,7 @@ class AppSettings:
         co, _ = ConfigOption.objects.get_or_create(key=ConfigOption.CISCO_EOX_API_QUERIES)
         co.value = value
         co.save()
-        self._rebuild_config_cache()
+        self._refresh_config_options()
 
     def get_product_blacklist_regex(self):
         """
@@ -167,7 +185,7 @@ class AppSettings:
         co, _ = ConfigOption.objects.get_or_create(key=ConfigOption.CISCO_EOX_PRODUCT_BLACKLIST_REGEX)
         co.value = value
         co.save()
-        self._rebuild_config_cache()
+        self._refresh_config_options()
 
     def get_cisco_api_client_id(self):
         """
@@ -182,7 +200,7 @@ class AppSettings:
         co, _ = ConfigOption.objects.get_or_create(key=ConfigOption.CISCO_API_CLIENT_ID)
         co.value = value
         co.save()
-        self._rebuild_config_cache()
+        self._refresh_config_options()
 
     def get_cisco_api_client_secret(self):
         """
@@ -197,7 +215,7 @@ class AppSettings:
         co, _ = ConfigOption.objects.get_or_create(key=ConfigOption.CISCO_API_CLIENT_SECRET)
         co.value = value
         co.save()
-        self._rebuild_config_cache()
+        self._refresh_config_options()
 
     def get_cisco_eox_api_auto_sync_last_execution_time(self):
         """
@@ -212,7 +230,7 @@ class AppSettings:
         co, _ = ConfigOption.objects.get_or_create(key=ConfigOption.CISCO_EOX_CRAWLER_LAST_EXECUTION_TIME)
         co.value = value
         co.save()
-        self._rebuild_config_cache()
+        self._refresh_config_options()
 
     def get_cisco_eox_api_auto_sync_last_execution_result(self):
         """
@@ -227,7 +245,7 @@ class AppSettings:
         co, _ = ConfigOption.objects.get_or_create(key=ConfigOption.CISCO_EOX_CRAWLER_LAST_EXECUTION_RESULT)
         co.value = value
         co.save()
-        self._rebuild_config_cache()
+        self._refresh_config_options()
 
     def get_internal_product_id_label(self):
         """
@@ -242,7 +260,7 @@ class AppSettings:
         co, _ = ConfigOption.objects.get_or_create(key=ConfigOption.GLOBAL_INTERNAL_PRODUCT_ID_LABEL)
         co.value = value
         co.save()
-        self._rebuild_config_cache()
+        self._refresh_config_options()
 
     def get_cisco_eox_api_sync_wait_time(self):
         """
@@ -260,7 +278,7 @@ class AppSettings:
         co, _ = ConfigOption.objects.get_or_create(key=ConfigOption.CISCO_EOX_WAIT_TIME)
         co.value = value
         co.save()
-        self._rebuild_config_cache()
+        self._refresh_config_options()
 
     def set_amount_of_product_checks(self, value):
         """
@@ -269,7 +287,7 @@ class AppSettings:
         co, created = ConfigOption.objects.get_or_create(key=ConfigOption.STAT_AMOUNT_OF_PRODUCT_CHECKS)
         co.value = str(int(value))
         co.save()
-        self._rebuild_config_cache()
+        self._refresh_config_options()
 
     def get_amount_of_product_checks(self):
         """
@@ -280,8 +298,8 @@ class AppSettings:
             return int(self._config_options[ConfigOption.STAT_AMOUNT_OF_PRODUCT_CHECKS])\
                 if self._config_options[ConfigOption.STAT_AMOUNT_OF_PRODUCT_CHECKS] else 0
         except:  # catch any exception
-            # may occur after update, after cleaning the cache value it should work
-            cache.delete(self.CONFIG_OPTIONS_DICT_CACHE_KEY)
+            # may occur after update, after reloading the config options it should work
+            invalidate_config_options()
             return -1
 
     def set_amount_of_unique_product_check_entries(self, value):
@@ -291,7 +309,7 @@ class AppSettings:
         co, created = ConfigOption.objects.get_or_create(key=ConfigOption.STAT_AMOUNT_OF_UNIQUE_PRODUCT_CHECK_ENTRIES)
         co.value = str(int(value))
         co.save()
-        self._rebuild_config_cache()
+        self._refresh_config_options()
 
     def get_amount_of_unique_product_check_entries(self):
         """
@@ -302,6 +320,60 @@ class AppSettings:
             return int(self._config_options[ConfigOption.STAT_AMOUNT_OF_UNIQUE_PRODUCT_CHECK_ENTRIES])\
                 if self._config_options[ConfigOption.STAT_AMOUNT_OF_UNIQUE_PRODUCT_CHECK_ENTRIES] else 0
         except:  # catch any exception
-            # may occur after update, after cleaning the cache value it should work
-            cache.delete(self.CONFIG_OPTIONS_DICT_CACHE_KEY)
+            # may occur after update, after reloading the config options it should work
+            invalidate_config_options()
             return -1
+
+
+def get_config_options():
+    """returns the config options of the process-local snapshot (revalidated if required)"""
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is not None and not CONFIG_OPTIONS_VERSION.is_usable(snapshot.owner):
+        snapshot = None
+
+    if snapshot is not None and \
+            time.monotonic() - snapshot.validated_at < settings.PDB_CONFIG_OPTIONS_REVALIDATE_INTERVAL:
+        return snapshot.options
+
+    version = CONFIG_OPTIONS_VERSION.get()
+    if snapshot is None or version is None or snapshot.version != version:
+        snapshot = ConfigOptionsSnapshot(version, load_config_options(), CONFIG_OPTIONS_VERSION.get_transaction_owner())
+        _snapshot = snapshot
+
+    else:
+        snapshot.validated_at = time.monotonic()
+
+    return snapshot.options
+
+
+def load_config_options():
+    """load the config options from the database (the defaults are created if required)"""
+    options = dict(ConfigOption.objects.values_list("key", "value"))
+    if not set(AppSettings.DEFAULT_CONFIG_OPTIONS.keys()).issubset(options.keys()):
+        AppSettings.create_defaults()
+        options = dict(ConfigOption.objects.values_list("key", "value"))
+
+    return options
+
+
+def invalidate_config_options():
+    """drop the process-local snapshot and notify the other processes"""
+    clear_config_options_snapshot()
+    CONFIG_OPTIONS_VERSION.bump()
+
+
+def clear_config_options_snapshot():
+    """drop the process-local snapshot (the config options are reloaded on the next access)"""
+    global _snapshot
+    _snapshot = None
+
+
+@receiver([post_save, post_delete], sender=ConfigOption)
+def drop_config_options_snapshot(sender, instance, **kwargs):
+    """
+    the config options are reloaded on the next access (only used within the current transaction until the commit),
+    the other processes are notified after the commit
+    """
+    clear_config_options_snapshot()
+    CONFIG_OPTIONS_VERSION.changed(clear_config_options_snapshot)
@@ -0,0 +1,247 @@
+"""
+Celery task metrics of the Product Database
+
+The signal handlers of this module record the duration, the queue wait time, the amount of database queries and the
+amount of processed items (reported by the task using record_task_items) of every task execution. The values are
+aggregated per task within hourly windows in Redis (if configured, otherwise within the process), the summary of the
+last 24 hours is shown on the status page and provided as JSON by the task_metrics view of the config module.
+
+The handlers are connected when this module is imported (by the task modules of the Product Database).
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+import redis
+from celery import states
+from celery.signals import before_task_publish, task_prerun, task_postrun
+from django.db import connection
+from app.config.metrics import get_redis_client, format_bucket
+
+logger = logging.getLogger("productdb")
+
+TASK_METRICS_REDIS_KEY = "pdb:task_metrics:%d"
+
+# message header with the publish timestamp (used to compute the queue wait time)
+PUBLISHED_AT_HEADER = "pdb_published_at"
+
+# size and amount of the windows that are aggregated (in seconds)
+WINDOW = 60 * 60
+WINDOWS = 24
+
+# upper bounds of the task duration histogram (in seconds)
+DURATION_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0, float("inf"))
+
+_local = threading.local()
+
+
+class TaskRun:
+    """metrics of a single task execution"""
+    def __init__(self, task_id, task_name, queue_wait=None):
+        self.task_id = task_id
+        self.task_name = task_name
+        self.queue_wait = queue_wait
+        self.queries = 0
+        self.items = None
+        self.duration = 0.0
+        self.start = time.perf_counter()
+
+    def count_query(self, execute, sql, params, many, context):
+        """database execute wrapper that counts the queries of the task"""
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def get_fields(self, failed=False):
+        """returns the increments of the aggregate fields for this task execution"""
+        fields = {
+            "count|%s" % self.task_name: 1,
+            "duration_sum|%s" % self.task_name: self.duration,
+            "queries|%s" % self.task_name: self.queries,
+        }
+        for bucket in DURATION_BUCKETS:
+            if self.duration <= bucket:
+                fields["duration_bucket|%s|%s" % (self.task_name, format_bucket(bucket))] = 1
+
+        if failed:
+            fields["failures|%s" % self.task_name] = 1
+
+        if self.queue_wait is not None:
+            fields["queue_wait_sum|%s" % self.task_name] = self.queue_wait
+            fields["queue_wait_count|%s" % self.task_name] = 1
+
+        if self.items is not None:
+            fields["items|%s" % self.task_name] = self.items
+            fields["items_duration|%s" % self.task_name] = self.duration
+
+        return fields
+
+
+class TaskMetricsStore:
+    """
+    aggregate of the task metrics within hourly windows, the values are stored as flat dictionary with the field name
+    (metric and label values separated by |) as key
+    """
+    def __init__(self):
+        self.windows = defaultdict(lambda: defaultdict(float))
+        self.lock = threading.Lock()
+
+    def add(self, fields, now=None):
+        window = get_window(now)
+        client = get_redis_client()
+        if client is not None:
+            try:
+                pipeline = client.pipeline(transaction=False)
+                key = TASK_METRICS_REDIS_KEY % window
+                for field, value in fields.items():
+                    pipeline.hincrbyfloat(key, field, value)
+
+                pipeline.expire(key, WINDOW * (WINDOWS + 1))
+                pipeline.execute()
+                return
+
+            except redis.RedisError as ex:
+                logger.warning("cannot write the task metrics to Redis: %s" % ex)
+
+        with self.lock:
+            for field, value in fields.items():
+                self.windows[window][field] += value
+
+            # drop the windows that are no longer part of the aggregate
+            for expired_window in [e for e in self.windows.keys() if e <= window - WINDOW * WINDOWS]:
+                del self.windows[expired_window]
+
+    def get_values(self, now=None):
+        """returns the sum of the last WINDOWS windows"""
+        windows = [get_window(now) - WINDOW * e for e in range(WINDOWS)]
+        values = defaultdict(float)
+
+        client = get_redis_client()
+        if client is not None:
+            try:
+                pipeline = client.pipeline(transaction=False)
+                for window in windows:
+                    pipeline.hgetall(TASK_METRICS_REDIS_KEY % window)
+
+                for window_values in pipeline.execute():
+                    for field, value in window_values.items():
+                        values[field.decode()] += float(value)
+
+            except redis.RedisError as ex:
+                logger.warning("cannot read the task metrics from Redis: %s" % ex)
+
+        with self.lock:
+            for window in windows:
+                for field, value in self.windows.get(window, {}).items():
+                    values[field] += value
+
+        return dict(values)
+
+    def get_summary(self, now=None):
+        """returns the summary of the last WINDOWS windows per task (ordered by the task name)"""
+        values = self.get_values(now)
+        task_names = sorted(set([field.split("|")[1] for field in values.keys() if field.startswith("count|")]))
+        return [get_task_summary(task_name, values) for task_name in task_names]
+
+    def reset(self):
+        with self.lock:
+            self.windows.clear()
+
+        client = get_redis_client()
+        if client is not None:
+            try:
+                keys = list(client.scan_iter(TASK_METRICS_REDIS_KEY.replace("%d", "*")))
+                if keys:
+                    client.delete(*keys)
+
+            except redis.RedisError as ex:
+                logger.warning("cannot reset the task metrics in Redis: %s" % ex)
+
+
+def get_window(now=None):
+    now = time.time() if now is None else now
+    return int(now - now % WINDOW)
+
+
+def get_task_summary(task_name, values):
+    """summary of a single task based on the aggregated values"""
+    def value(metric):
+        return values.get("%s|%s" % (metric, task_name), 0.0)
+
+    runs = value("count")
+    duration_buckets = [
+        (format_bucket(bucket), int(values.get("duration_bucket|%s|%s" % (task_name, format_bucket(bucket)), 0)))
+        for bucket in DURATION_BUCKETS
+    ]
+    items_duration = value("items_duration")
+    queue_wait_count = value("queue_wait_count")
+
+    return {
+        "task_name": task_name,
+        "runs": int(runs),
+        "failures": int(value("failures")),
+        "duration_avg": value("duration_sum") / runs if runs else None,
+        "duration_p95": get_percentile(duration_buckets, runs, 0.95),
+        "duration_buckets": duration_buckets,
+        "items": int(value("items")),
+        "items_per_second": value("items") / items_duration if items_duration else None,
+        "queue_wait_avg": value("queue_wait_sum") / queue_wait_count if queue_wait_count else None,
+        "queries_avg": value("queries") / runs if runs else None,
+    }
+
+
+def get_percentile(duration_buckets, runs, percentile):
+    """upper bound of the histogram bucket that contains the given percentile (None if above the largest bound)"""
+    for bucket, count in duration_buckets:
+        if runs and count >= runs * percentile:
+            return None if bucket == "+Inf" else float(bucket)
+
+    return None
+
+
+def record_task_items(count):
+    """record the amount of items that were processed by the current task (no-op outside of a task)"""
+    task_runs = getattr(_local, "task_runs", None)
+    if task_runs:
+        task_run = task_runs[-1]
+        task_run.items = (task_run.items or 0) + count
+
+
+def on_before_task_publish(sender=None, headers=None, **kwargs):
+    if headers is not None:
+        headers[PUBLISHED_AT_HEADER] = time.time()
+
+
+def on_task_prerun(sender=None, task_id=None, task=None, **kwargs):
+    # the queue wait time of scheduled tasks (ETA or countdown) contains the delay and is therefore not recorded
+    published_at = getattr(task.request, PUBLISHED_AT_HEADER, None)
+    queue_wait = None
+    if published_at is not None and not task.request.eta:
+        queue_wait = max(time.time() - float(published_at), 0.0)
+
+    task_run = TaskRun(task_id, task.name, queue_wait=queue_wait)
+    connection.execute_wrappers.append(task_run.count_query)
+
+    if not hasattr(_local, "task_runs"):
+        _local.task_runs = []
+
+    _local.task_runs.append(task_run)
+
+
+def on_task_postrun(sender=None, task_id=None, task=None, state=None, **kwargs):
+    task_runs = getattr(_local, "task_runs", [])
+    task_run = next((e for e in reversed(task_runs) if e.task_id == task_id), None)
+    if task_run is None:
+        return
+
+    task_runs.remove(task_run)
+    if task_run.count_query in connection.execute_wrappers:
+        connection.execute_wrappers.remove(task_run.count_query)
+
+    task_run.duration = time.perf_counter() - task_run.start
+    store.add(task_run.get_fields(failed=state == states.FAILURE))
+
+
+store = TaskMetricsStore()
+before_task_publish.connect(on_before_task_publish)
+task_prerun.connect(on_task_prerun)
+task_postrun.connect(on_task_postrun)
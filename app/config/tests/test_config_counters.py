@@ -0,0 +1,61 @@
+"""
+Test suite for the config.counters module
+"""
+import datetime
+import pytest
+from app.config import counters
+from app.config.models import UsageCounter, ConfigOption
+
+pytestmark = pytest.mark.django_db
+
+
+class TestCounters:
+    def test_increment(self):
+        date = datetime.date(2020, 1, 1)
+        counters.increment(UsageCounter.PRODUCT_CHECKS, date=date)
+        counters.increment(UsageCounter.PRODUCT_CHECKS, 5, date=date)
+        counters.increment(UsageCounter.PRODUCT_CHECKS, date=date + datetime.timedelta(days=1))
+
+        assert UsageCounter.objects.count() == 2
+        assert UsageCounter.objects.get(name=UsageCounter.PRODUCT_CHECKS, date=date).value == 6
+        assert counters.get_total(UsageCounter.PRODUCT_CHECKS) == 7
+        assert counters.get_total(UsageCounter.UNIQUE_PRODUCT_CHECK_ENTRIES) == 0
+
+    def test_total_with_legacy_config_option(self):
+        ConfigOption.objects.create(key=ConfigOption.STAT_AMOUNT_OF_PRODUCT_CHECKS, value="10")
+        counters.increment(UsageCounter.PRODUCT_CHECKS, 2)
+
+        assert counters.get_total(UsageCounter.PRODUCT_CHECKS) == 12
+
+    def test_counts_per_day(self):
+        today = datetime.date(2020, 1, 15)
+        counters.increment(UsageCounter.PRODUCT_CHECKS, 3, date=today)
+        counters.increment(UsageCounter.PRODUCT_CHECKS, 2, date=today - datetime.timedelta(days=2))
+        counters.increment(UsageCounter.PRODUCT_CHECKS, 1, date=today - datetime.timedelta(days=10))
+
+        result = counters.get_counts(UsageCounter.PRODUCT_CHECKS, days=3, today=today)
+
+        assert result == [
+            (datetime.date(2020, 1, 13), 2),
+            (datetime.date(2020, 1, 14), 0),
+            (datetime.date(2020, 1, 15), 3),
+        ]
+
+    def test_counts_per_week(self):
+        # 2020-01-15 is a wednesday
+        today = datetime.date(2020, 1, 15)
+        counters.increment(UsageCounter.PRODUCT_CHECKS, 3, date=today)
+        counters.increment(UsageCounter.PRODUCT_CHECKS, 2, date=datetime.date(2020, 1, 13))
+        counters.increment(UsageCounter.PRODUCT_CHECKS, 1, date=datetime.date(2020, 1, 5))
+
+        result = counters.get_counts(UsageCounter.PRODUCT_CHECKS, period="week", days=14, today=today)
+
+        assert result == [
+            (datetime.date(2019, 12, 30), 1),
+            (datetime.date(2020, 1, 6), 0),
+            (datetime.date(2020, 1, 13), 5),
+        ]
+
+    def test_invalid_period(self):
+        with pytest.raises(ValueError):
+            counters.get_counts(UsageCounter.PRODUCT_CHECKS, period="month")
@@ -0,0 +1,127 @@
+"""
+Test suite for the config.metrics module
+"""
+import logging
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import resolve
+from app.config import metrics
+from app.config.models import ConfigOption
+
+pytestmark = pytest.mark.django_db
+
+
+class MetricsLocMemCache(metrics.MetricsCacheMixin, LocMemCache):
+    pass
+
+
+@pytest.fixture
+def local_aggregate(monkeypatch, settings):
+    """use an aggregate without Redis"""
+    settings.PDB_METRICS_REDIS = None
+    monkeypatch.setattr(metrics, "_redis_client", None)
+    aggregate = metrics.MetricsAggregate(flush_interval=3600)
+    monkeypatch.setattr(metrics, "aggregate", aggregate)
+    return aggregate
+
+
+def get_response(request):
+    request.resolver_match = resolve("/productdb/")
+    ConfigOption.objects.count()
+    metrics.record_cache_read("django", 1, 0)
+    return HttpResponse("ok")
+
+
+class TestMetricsMiddleware:
+    def test_request(self, local_aggregate):
+        request = RequestFactory().get("/productdb/")
+        response = metrics.MetricsMiddleware(get_response)(request)
+
+        assert response.status_code == 200
+        values = local_aggregate.get_values()
+        assert values["duration_count|productdb:home"] == 1
+        assert values["duration_bucket|productdb:home|+Inf"] == 1
+        assert values["queries|productdb:home"] == 1
+        assert values["query_time|productdb:home"] > 0
+        assert values["cache|productdb:home|django|hit"] == 1
+        assert "slow|productdb:home" not in values
+
+    def test_slow_request(self, local_aggregate, settings, caplog):
+        settings.PDB_SLOW_REQUEST_THRESHOLD = 0
+        request = RequestFactory().get("/productdb/")
+
+        with caplog.at_level(logging.WARNING, logger="productdb"):
+            metrics.MetricsMiddleware(get_response)(request)
+
+        assert local_aggregate.get_values()["slow|productdb:home"] == 1
+        assert "slow request GET /productdb/ (productdb:home)" in caplog.text
+        assert "config_configoption" in caplog.text
+
+    def test_unresolved_request(self, local_aggregate):
+        request = RequestFactory().get("/unknown/")
+        metrics.MetricsMiddleware(lambda r: HttpResponse(status=404))(request)
+
+        assert local_aggregate.get_values()["duration_count|unresolved"] == 1
+
+
+class TestCacheMetrics:
+    def test_django_cache(self):
+        request_metrics = metrics.RequestMetrics()
+        cache = MetricsLocMemCache("metrics", {})
+        cache.set("key", "value")
+
+        metrics._local.request_metrics = request_metrics
+        try:
+            assert cache.get("key") == "value"
+            assert cache.get("missing", "default") == "default"
+            assert cache.get_many(["key", "missing"]) == {"key": "value"}
+
+        finally:
+            metrics._local.request_metrics = None
+
+        assert request_metrics.cache[("django", "hit")] == 2
+        assert request_metrics.cache[("django", "miss")] == 2
+
+    def test_cacheops(self):
+        request_metrics = metrics.RequestMetrics()
+
+        metrics._local.request_metrics = request_metrics
+        try:
+            metrics.cache_read.send(sender=None, func=None, hit=True)
+            metrics.cache_read.send(sender=None, func=None, hit=False)
+
+        finally:
+            metrics._local.request_metrics = None
+
+        assert request_metrics.cache[("cacheops", "hit")] == 1
+        assert request_metrics.cache[("cacheops", "miss")] == 1
+
+    def test_outside_of_request(self):
+        # no error if the cache is used outside of a request (e.g. within a task)
+        metrics.record_cache_read("django", 1, 0)
+
+
+def test_render_prometheus():
+    result = metrics.render_prometheus({
+        "duration_bucket|productdb:home|+Inf": 3.0,
+        "duration_bucket|productdb:home|0.1": 1.0,
+        "duration_bucket|productdb:home|1.0": 2.0,
+        "duration_sum|productdb:home": 1.5,
+        "duration_count|productdb:home": 3.0,
+        "cache|productdb:home|cacheops|hit": 4.0,
+    })
+
+    assert result.splitlines() == [
+        "# HELP pdb_http_request_duration_seconds wall time of the requests per view",
+        "# TYPE pdb_http_request_duration_seconds histogram",
+        'pdb_http_request_duration_seconds_bucket{view="productdb:home",le="0.1"} 1.0',
+        'pdb_http_request_duration_seconds_bucket{view="productdb:home",le="1.0"} 2.0',
+        'pdb_http_request_duration_seconds_bucket{view="productdb:home",le="+Inf"} 3.0',
+        'pdb_http_request_duration_seconds_sum{view="productdb:home"} 1.5',
+        'pdb_http_request_duration_seconds_count{view="productdb:home"} 3.0',
+        "# HELP pdb_cache_requests_total cache hits and misses per view (Django cache and cacheops)",
+        "# TYPE pdb_cache_requests_total counter",
+        'pdb_cache_requests_total{view="productdb:home",cache="cacheops",result="hit"} 4.0',
+    ]
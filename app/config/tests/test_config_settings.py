@@ -5,6 +5,8 @@ import pytest
 from datetime import datetime
 from django.utils.dateparse import parse_datetime
 from django.core.cache import cache
+from django.db import transaction
+from app.config import settings as config_settings
 from app.config.settings import AppSettings
 from app.config.models import ConfigOption
 
@@ -12,15 +14,70 @@ pytestmark = pytest.mark.django_db
 
 
 def test_config_options_cache():
-    # check that cache key doesn't exist
-    assert cache.get(AppSettings.CONFIG_OPTIONS_DICT_CACHE_KEY) is None
+    # check that the version stamp doesn't exist
+    assert cache.get(config_settings.CONFIG_OPTIONS_VERSION_CACHE_KEY) is None
 
     # create object
     AppSettings()
 
-    # key exists and contains a dictionary
-    assert cache.get(AppSettings.CONFIG_OPTIONS_DICT_CACHE_KEY) is not None
-    assert type(cache.get(AppSettings.CONFIG_OPTIONS_DICT_CACHE_KEY)) is dict
+    # version stamp exists and the config options are kept within the process
+    version = cache.get(config_settings.CONFIG_OPTIONS_VERSION_CACHE_KEY)
+    assert version is not None
+    assert config_settings._snapshot.version == version
+    assert type(config_settings._snapshot.options) is dict
+
+
+class TestConfigOptionsSnapshot:
+    def test_reads_without_queries(self, django_assert_num_queries):
+        AppSettings()
+
+        with django_assert_num_queries(0):
+            assert AppSettings().is_login_only_mode() is False
+
+    def test_change_in_other_process(self, settings, django_assert_num_queries):
+        settings.PDB_CONFIG_OPTIONS_REVALIDATE_INTERVAL = 0
+        assert AppSettings().get_internal_product_id_label() == "Internal Product ID"
+
+        # simulate a change within another process (database value and new version stamp)
+        ConfigOption.objects.filter(key=ConfigOption.GLOBAL_INTERNAL_PRODUCT_ID_LABEL).update(value="changed")
+        with django_assert_num_queries(0):
+            assert AppSettings().get_internal_product_id_label() == "Internal Product ID"
+
+        config_settings.CONFIG_OPTIONS_VERSION.bump()
+        with django_assert_num_queries(1):
+            assert AppSettings().get_internal_product_id_label() == "changed"
+
+    def test_revalidate_interval(self, settings):
+        settings.PDB_CONFIG_OPTIONS_REVALIDATE_INTERVAL = 3600
+        AppSettings()
+        config_settings.CONFIG_OPTIONS_VERSION.bump()
+
+        # the version stamp is not checked within the interval
+        snapshot = config_settings._snapshot
+        AppSettings()
+        assert config_settings._snapshot is snapshot
+        assert snapshot.version != cache.get(config_settings.CONFIG_OPTIONS_VERSION_CACHE_KEY)
+
+    def test_change_within_process(self):
+        AppSettings()
+        AppSettings().set_internal_product_id_label("changed")
+
+        assert AppSettings().get_internal_product_id_label() == "changed"
+
+    def test_rollback_within_process(self):
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                AppSettings().set_internal_product_id_label("changed")
+                assert AppSettings().get_internal_product_id_label() == "changed"
+                raise RuntimeError()
+
+        assert AppSettings().get_internal_product_id_label() == "Internal Product ID"
+
+    def test_missing_defaults(self):
+        AppSettings()
+        ConfigOption.objects.filter(key=ConfigOption.CISCO_EOX_WAIT_TIME).delete()
+
+        assert AppSettings().get_cisco_eox_api_sync_wait_time() == "5"
 
 
 class TestConfigSettings:
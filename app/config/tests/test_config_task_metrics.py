@@ -0,0 +1,118 @@
+"""
+Test suite for the config.task_metrics module
+"""
+import pytest
+from types import SimpleNamespace
+from django.db import connection
+from app.config import metrics, task_metrics
+from app.config.models import ConfigOption
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def local_store(monkeypatch, settings):
+    """use a task metrics store without Redis"""
+    settings.PDB_METRICS_REDIS = None
+    monkeypatch.setattr(metrics, "_redis_client", None)
+    store = task_metrics.TaskMetricsStore()
+    monkeypatch.setattr(task_metrics, "store", store)
+    return store
+
+
+def get_task(name="productdb.test_task", **request):
+    request.setdefault("eta", None)
+    return SimpleNamespace(name=name, request=SimpleNamespace(**request))
+
+
+def execute_task(task, task_id="task-1", state="SUCCESS", items=None):
+    task_metrics.on_task_prerun(task_id=task_id, task=task)
+    ConfigOption.objects.count()
+    if items is not None:
+        task_metrics.record_task_items(items)
+
+    task_metrics.on_task_postrun(task_id=task_id, task=task, state=state)
+
+
+class TestTaskMetricsSignals:
+    def test_task_execution(self, local_store, monkeypatch):
+        headers = {}
+        monkeypatch.setattr(task_metrics.time, "time", lambda: 1000.0)
+        task_metrics.on_before_task_publish(headers=headers)
+        assert headers == {task_metrics.PUBLISHED_AT_HEADER: 1000.0}
+
+        monkeypatch.setattr(task_metrics.time, "time", lambda: 1002.5)
+        execute_wrappers = list(connection.execute_wrappers)
+        execute_task(get_task(**headers), items=50)
+
+        values = local_store.get_values()
+        assert values["count|productdb.test_task"] == 1
+        assert values["queries|productdb.test_task"] == 1
+        assert values["items|productdb.test_task"] == 50
+        assert values["queue_wait_sum|productdb.test_task"] == 2.5
+        assert values["duration_bucket|productdb.test_task|+Inf"] == 1
+        assert "failures|productdb.test_task" not in values
+
+        # the execute wrapper is removed after the task
+        assert connection.execute_wrappers == execute_wrappers
+
+    def test_failed_and_scheduled_task(self, local_store):
+        execute_task(get_task(pdb_published_at=1.0, eta="2020-01-01T00:00:00"), state="FAILURE")
+
+        values = local_store.get_values()
+        assert values["failures|productdb.test_task"] == 1
+        assert "queue_wait_count|productdb.test_task" not in values
+        assert "items|productdb.test_task" not in values
+
+    def test_nested_tasks(self, local_store):
+        outer_task = get_task("productdb.outer_task")
+        task_metrics.on_task_prerun(task_id="outer", task=outer_task)
+        execute_task(get_task("productdb.inner_task"), task_id="inner", items=5)
+        task_metrics.record_task_items(10)
+        task_metrics.on_task_postrun(task_id="outer", task=outer_task, state="SUCCESS")
+
+        values = local_store.get_values()
+        assert values["items|productdb.inner_task"] == 5
+        assert values["items|productdb.outer_task"] == 10
+
+    def test_items_outside_of_task(self):
+        # no error if the items are recorded outside of a task (e.g. if the function is called directly)
+        task_metrics.record_task_items(10)
+
+
+class TestTaskMetricsStore:
+    def test_summary(self, local_store):
+        now = 100 * task_metrics.WINDOW
+        for duration, items in [(0.4, 100), (2.0, 400), (20.0, None)]:
+            task_run = task_metrics.TaskRun("task", "productdb.import_price_list", queue_wait=1.0)
+            task_run.duration = duration
+            task_run.items = items
+            task_run.queries = 10
+            local_store.add(task_run.get_fields(failed=items is None), now=now)
+
+        summary = local_store.get_summary(now=now)
+
+        assert len(summary) == 1
+        assert summary[0]["task_name"] == "productdb.import_price_list"
+        assert summary[0]["runs"] == 3
+        assert summary[0]["failures"] == 1
+        assert summary[0]["duration_avg"] == pytest.approx(22.4 / 3)
+        assert summary[0]["duration_p95"] == 30.0
+        assert ("0.5", 1) in summary[0]["duration_buckets"]
+        assert ("5.0", 2) in summary[0]["duration_buckets"]
+        assert summary[0]["items"] == 500
+        assert summary[0]["items_per_second"] == pytest.approx(500 / 2.4)
+        assert summary[0]["queue_wait_avg"] == 1.0
+        assert summary[0]["queries_avg"] == 10.0
+
+    def test_rolling_windows(self, local_store):
+        now = 100 * task_metrics.WINDOW
+        local_store.add({"count|productdb.test_task": 1}, now=now - task_metrics.WINDOW * task_metrics.WINDOWS)
+        local_store.add({"count|productdb.test_task": 1}, now=now - task_metrics.WINDOW)
+        local_store.add({"count|productdb.test_task": 1}, now=now)
+
+        assert local_store.get_values(now=now) == {"count|productdb.test_task": 2}
+        assert len(local_store.windows) == 2
+
+        local_store.reset()
+        assert local_store.get_summary(now=now) == []
@@ -1,6 +1,7 @@
 """
 Test suite for the config.views module
 """
+import json
 import pytest
 from html import escape
 from django.contrib.auth.models import AnonymousUser, User
@@ -14,6 +15,9 @@ from django_project import celery
 from app.config import views
 from app.config import models
 from app.config import utils
+from app.config import metrics
+from app.config import task_metrics
+from app.config import counters
 from app.config.settings import AppSettings
 
 pytestmark = pytest.mark.django_db
@@ -198,6 +202,28 @@ class TestStatusView:
         # cleanup
         cache.delete("CISCO_EOX_API_TEST")
 
+    @pytest.mark.usefixtures("mock_cisco_eox_api_access_available")
+    def test_task_metrics(self, monkeypatch):
+        monkeypatch.setattr(task_metrics.store, "get_values", lambda now=None: {
+            "count|productdb.import_price_list": 4.0,
+            "failures|productdb.import_price_list": 1.0,
+            "duration_sum|productdb.import_price_list": 10.0,
+            "duration_bucket|productdb.import_price_list|+Inf": 4.0,
+        })
+        user = User.objects.create(username="username", is_superuser=True)
+        url = reverse(self.URL_NAME)
+        request = RequestFactory().get(url)
+        request.user = user
+
+        response = views.status(request)
+
+        assert response.status_code == 200
+        assert "<code>productdb.import_price_list</code>" in response.content.decode()
+        assert "No tasks were executed within the last 24 hours." not in response.content.decode()
+
+        # cleanup
+        cache.delete("CISCO_EOX_API_TEST")
+
     @pytest.mark.usefixtures("mock_cisco_eox_api_access_available")
     def test_with_active_workers(self, monkeypatch):
         monkeypatch.setattr(celery, "is_worker_active", lambda: True)
@@ -568,3 +594,140 @@ class TestFlushCache:
         assert msgs.added_new
         assert response.url == reverse("productdb_config:status")
 
+
+
+class TestMetrics:
+    URL_NAME = "productdb_config:metrics"
+
+    def test_anonymous_default(self):
+        url = reverse(self.URL_NAME)
+        request = RequestFactory().get(url)
+        request.user = AnonymousUser()
+        response = views.metrics(request)
+
+        assert response.status_code == 302, "Should redirect to login page"
+        assert response.url == reverse("login") + "?next=" + url, \
+            "Should contain a next parameter for redirect"
+
+    @pytest.mark.usefixtures("import_default_vendors")
+    def test_authenticated_user(self):
+        url = reverse(self.URL_NAME)
+        request = RequestFactory().get(url)
+        request.user = User.objects.create(username="username", is_superuser=False, is_staff=False)
+
+        with pytest.raises(PermissionDenied):
+            views.metrics(request)
+
+    @pytest.mark.usefixtures("import_default_users")
+    @pytest.mark.usefixtures("import_default_vendors")
+    def test_superuser(self, monkeypatch):
+        monkeypatch.setattr(metrics.aggregate, "get_values", lambda: {
+            "duration_count|productdb:home": 2.0,
+            "queries|productdb:home": 8.0,
+        })
+        url = reverse(self.URL_NAME)
+        request = RequestFactory().get(url)
+        request.user = User.objects.get(username="pdb_admin")
+        response = views.metrics(request)
+
+        assert response.status_code == 200
+        assert response["Content-Type"].startswith("text/plain")
+        assert 'pdb_http_request_duration_seconds_count{view="productdb:home"} 2.0' in response.content.decode()
+        assert 'pdb_db_queries_total{view="productdb:home"} 8.0' in response.content.decode()
+
+
+class TestTaskMetrics:
+    URL_NAME = "productdb_config:task_metrics"
+
+    def test_anonymous_default(self):
+        url = reverse(self.URL_NAME)
+        request = RequestFactory().get(url)
+        request.user = AnonymousUser()
+        response = views.task_metrics(request)
+
+        assert response.status_code == 302, "Should redirect to login page"
+        assert response.url == reverse("login") + "?next=" + url, \
+            "Should contain a next parameter for redirect"
+
+    @pytest.mark.usefixtures("import_default_vendors")
+    def test_authenticated_user(self):
+        url = reverse(self.URL_NAME)
+        request = RequestFactory().get(url)
+        request.user = User.objects.create(username="username", is_superuser=False, is_staff=False)
+
+        with pytest.raises(PermissionDenied):
+            views.task_metrics(request)
+
+    @pytest.mark.usefixtures("import_default_users")
+    @pytest.mark.usefixtures("import_default_vendors")
+    def test_superuser(self, monkeypatch):
+        monkeypatch.setattr(task_metrics.store, "get_values", lambda now=None: {
+            "count|productdb.perform_product_check": 2.0,
+            "duration_sum|productdb.perform_product_check": 3.0,
+            "duration_bucket|productdb.perform_product_check|5.0": 2.0,
+            "duration_bucket|productdb.perform_product_check|+Inf": 2.0,
+            "items|productdb.perform_product_check": 300.0,
+            "items_duration|productdb.perform_product_check": 3.0,
+        })
+        url = reverse(self.URL_NAME)
+        request = RequestFactory().get(url)
+        request.user = User.objects.get(username="pdb_admin")
+        response = views.task_metrics(request)
+
+        assert response.status_code == 200
+        result = json.loads(response.content.decode())
+        assert result["window_seconds"] == 86400
+        assert len(result["tasks"]) == 1
+        assert result["tasks"][0]["task_name"] == "productdb.perform_product_check"
+        assert result["tasks"][0]["runs"] == 2
+        assert result["tasks"][0]["duration_avg"] == 1.5
+        assert result["tasks"][0]["duration_p95"] == 5.0
+        assert result["tasks"][0]["items_per_second"] == 100.0
+        assert result["tasks"][0]["queue_wait_avg"] is None
+
+
+class TestUsageStatistics:
+    URL_NAME = "productdb_config:usage_statistics"
+
+    def test_anonymous_default(self):
+        url = reverse(self.URL_NAME)
+        request = RequestFactory().get(url)
+        request.user = AnonymousUser()
+        response = views.usage_statistics(request)
+
+        assert response.status_code == 302, "Should redirect to login page"
+        assert response.url == reverse("login") + "?next=" + url, \
+            "Should contain a next parameter for redirect"
+
+    @pytest.mark.usefixtures("import_default_vendors")
+    def test_authenticated_user(self):
+        url = reverse(self.URL_NAME)
+        request = RequestFactory().get(url)
+        request.user = User.objects.create(username="username", is_superuser=False, is_staff=False)
+
+        with pytest.raises(PermissionDenied):
+            views.usage_statistics(request)
+
+    @pytest.mark.usefixtures("import_default_users")
+    @pytest.mark.usefixtures("import_default_vendors")
+    def test_superuser(self):
+        counters.increment(models.UsageCounter.PRODUCT_CHECKS, 2)
+        counters.increment(models.UsageCounter.UNIQUE_PRODUCT_CHECK_ENTRIES, 10)
+
+        url = reverse(self.URL_NAME)
+        request = RequestFactory().get(url, {"period": "week", "days": 14})
+        request.user = User.objects.get(username="pdb_admin")
+        response = views.usage_statistics(request)
+
+        assert response.status_code == 200
+        result = json.loads(response.content.decode())
+        assert result["period"] == "week"
+        product_checks = result["counters"][models.UsageCounter.PRODUCT_CHECKS]
+        assert product_checks["total"] == 2
+        assert product_checks["counts"][-1]["value"] == 2
+        assert len(product_checks["counts"]) in [2, 3]
+        assert result["counters"][models.UsageCounter.UNIQUE_PRODUCT_CHECK_ENTRIES]["total"] == 10
+
+        request = RequestFactory().get(url, {"period": "month"})
+        request.user = User.objects.get(username="pdb_admin")
+        assert views.usage_statistics(request).status_code == 400
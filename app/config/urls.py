@@ -9,7 +9,10 @@ urlpatterns = [
     # user views
     url(r'^change/$', views.change_configuration, name='change_settings'),
     url(r'^status/$', views.status, name='status'),
+    url(r'^status/tasks/$', views.task_metrics, name='task_metrics'),
+    url(r'^status/usage/$', views.usage_statistics, name='usage_statistics'),
     url(r'^flush_cache/$', views.flush_cache, name='flush_cache'),
+    url(r'^metrics/$', views.metrics, name='metrics'),
     url(r'^messages/$', views.server_messages_list, name='notification-list'),
     url(r'^messages/add/$', views.add_notification, name='notification-add'),
     url(r'^messages/(?P<message_id>\d+)/$', views.server_message_detail, name='notification-detail'),
@@ -0,0 +1,87 @@
+"""
+version stamps for process-local caches (e.g. the config options and the compiled normalization rules)
+
+A version stamp is a random value in the cache that is shared by all processes. A process keeps the cached data
+together with the version stamp it was loaded with and reloads the data if the version stamp changes. A change of the
+underlying data sets a new version stamp after the commit of the transaction.
+
+Data that is loaded within a transaction with an uncommitted change is owned by this transaction (see
+get_transaction_owner) and must only be used within it. If the change is rolled back (transaction or savepoint), the
+data is discarded on the next access.
+"""
+import logging
+import threading
+import uuid
+from django.core.cache import cache
+from django.db import connection, transaction
+
+logger = logging.getLogger("productdb")
+
+
+class VersionStamp:
+    def __init__(self, cache_key, name):
+        """
+        :param cache_key: cache key of the version stamp
+        :param name: name of the cached data (used within log messages)
+        """
+        self.cache_key = cache_key
+        self.name = name
+        self._local = threading.local()
+
+    def get(self):
+        """returns the current version stamp (None if the cache is not available)"""
+        try:
+            version = cache.get(self.cache_key)
+            if version is None:
+                # initial version (e.g. after the cache was flushed)
+                cache.add(self.cache_key, uuid.uuid4().hex, timeout=None)
+                version = cache.get(self.cache_key)
+
+            return version
+
+        except Exception:  # catch any exception
+            logger.warning("cannot read the version of the %s" % self.name, exc_info=True)
+            return None
+
+    def bump(self):
+        """set a new version stamp, all processes reload the data on the next access"""
+        try:
+            cache.set(self.cache_key, uuid.uuid4().hex, timeout=None)
+
+        except Exception:  # catch any exception
+            logger.warning("cannot update the version of the %s" % self.name, exc_info=True)
+
+    def get_transaction_owner(self):
+        """
+        returns a token for the transaction of the current thread if it contains an uncommitted change of the data
+        (None otherwise), the token of a rolled back transaction is dropped
+        """
+        owner = getattr(self._local, "owner", None)
+        pending = [getattr(entry[1], "owner", None) for entry in connection.run_on_commit]
+        if owner is not None and owner not in pending:
+            # the on_commit callbacks of the change were discarded by a rollback (the token is dropped after the commit)
+            owner = self._local.owner = None
+
+        return owner
+
+    def is_usable(self, owner):
+        """returns True if data that was loaded by the given owner can be used within the current thread"""
+        return owner is None or owner is self.get_transaction_owner()
+
+    def changed(self, on_commit=None):
+        """
+        register a change of the data within the current transaction, the callback is executed and a new version
+        stamp is set after the commit
+        """
+        owner = self.get_transaction_owner()
+        if owner is None:
+            owner = self._local.owner = object()
+
+        def committed():
+            self._local.owner = None
+            if on_commit:
+                on_commit()
+            self.bump()
+
+        committed.owner = owner
+        transaction.on_commit(committed)
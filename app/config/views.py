@@ -4,13 +4,16 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
 from django.core.cache import cache
 from django.urls import reverse
-from django.http import Http404
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import resolve_url, redirect, render
 from django.utils.safestring import mark_safe
 from app.config.settings import AppSettings
 from app.config.forms import SettingsForm, NotificationMessageForm
-from app.config.models import NotificationMessage, TextBlock
+from app.config.models import NotificationMessage, TextBlock, UsageCounter
 from app.config import utils
+from app.config import counters
+from app.config import metrics as request_metrics
+from app.config import task_metrics as celery_task_metrics
 from app.productdb.utils import login_required_if_login_only_mode
 from django_project import celery
 
@@ -90,6 +93,11 @@ def status(request):
             </div>"""
 
     context['worker_status'] = mark_safe(worker_status)
+    context['task_metrics'] = celery_task_metrics.store.get_summary()
+    context['product_check_usage'] = zip(
+        counters.get_counts(UsageCounter.PRODUCT_CHECKS, period="week", days=7 * 8),
+        counters.get_counts(UsageCounter.UNIQUE_PRODUCT_CHECK_ENTRIES, period="week", days=7 * 8)
+    )
 
     return render(request, "config/status.html", context=context)
 
@@ -103,6 +111,60 @@ def flush_cache(request):
     return redirect(resolve_url("productdb_config:status"))
 
 
+@login_required()
+@permission_required('is_superuser', raise_exception=True)
+def metrics(request):
+    """
+    request metrics of all processes in the Prometheus text format
+    """
+    return HttpResponse(
+        request_metrics.render_prometheus(request_metrics.aggregate.get_values()),
+        content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@login_required()
+@permission_required('is_superuser', raise_exception=True)
+def task_metrics(request):
+    """
+    summary of the Celery task metrics of the last 24 hours as JSON
+    """
+    return JsonResponse({
+        "window_seconds": celery_task_metrics.WINDOW * celery_task_metrics.WINDOWS,
+        "tasks": celery_task_metrics.store.get_summary()
+    })
+
+
+@login_required()
+@permission_required('is_superuser', raise_exception=True)
+def usage_statistics(request):
+    """
+    usage statistics counters per day or week as JSON (GET parameters period and days)
+    """
+    period = request.GET.get("period", "day")
+    try:
+        days = int(request.GET.get("days", 28))
+        if period not in counters.PERIODS or days < 1:
+            raise ValueError()
+
+    except ValueError:
+        return JsonResponse({"error": "invalid period or days"}, status=400)
+
+    return JsonResponse({
+        "period": period,
+        "counters": {
+            name: {
+                "total": counters.get_total(name),
+                "counts": [
+                    {"date": date.isoformat(), "value": value}
+                    for date, value in counters.get_counts(name, period=period, days=days)
+                ]
+            }
+            for name in [UsageCounter.PRODUCT_CHECKS, UsageCounter.UNIQUE_PRODUCT_CHECK_ENTRIES]
+        }
+    })
+
+
 @login_required()
 @permission_required('is_superuser', raise_exception=True)
 def change_configuration(request):
@@ -101,15 +101,19 @@ class ProductAdmin(admin.ModelAdmin):
         "lc_state_sync",
     )
 
+    def get_queryset(self, request):
+        # the migration options are used within the list display
+        return super().get_queryset(request).prefetch_related("productmigrationoption_set__migration_source")
+
     def has_migration_options(self, obj):
-        return obj.has_migration_options()
+        return len(obj.productmigrationoption_set.all()) != 0
 
     def preferred_replacement_option(self, obj):
         result = obj.get_preferred_replacement_option()
         return result.replacement_product_id if result else ""
 
     def product_migration_source_names(self, obj):
-        return "\n".join(obj.get_product_migration_source_names_set())
+        return "\n".join([e.migration_source.name for e in obj.productmigrationoption_set.all()])
 
     def current_lifecycle_states(self, obj):
         val = obj.current_lifecycle_states
@@ -232,6 +236,7 @@ class ProductCheckAdmin(admin.ModelAdmin):
     fields = [
         "name",
         "migration_source",
+        "normalization_vendor",
         "input_product_ids",
         "last_change",
         "create_user",
@@ -265,14 +270,16 @@ class ProductCheckEntryAdmin(admin.ModelAdmin):
         "in_database",
         "amount",
         "migration_product_id",
-        "part_of_product_list"
+        "part_of_product_list",
+        "original_input_product_ids"
     ]
 
     readonly_fields = [
         "product_in_database",
         "in_database",
         "migration_product_id",
-        "part_of_product_list"
+        "part_of_product_list",
+        "original_input_product_ids"
     ]
 
     history_latest_first = True
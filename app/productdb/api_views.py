@@ -1,5 +1,7 @@
 from django.contrib.auth import logout
 from django.core.exceptions import ObjectDoesNotExist
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.utils.decorators import method_decorator
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
@@ -15,9 +17,13 @@ from django_filters.rest_framework import DjangoFilterBackend
 from app.config.models import NotificationMessage
 from app.productdb.serializers import ProductSerializer, VendorSerializer, ProductGroupSerializer, ProductListSerializer, \
     ProductMigrationSourceSerializer, ProductMigrationOptionSerializer, NotificationMessageSerializer, \
-    ProductIdNormalizationRuleSerializer
+    ProductIdNormalizationRuleSerializer, ProductLookupSerializer
 from app.productdb.models import Product, Vendor, ProductGroup, ProductList, ProductMigrationSource, \
-    ProductMigrationOption, ProductIdNormalizationRule
+    ProductMigrationOption, ProductIdNormalizationRule, annotate_lifecycle_state
+from app.productdb import export, normalization
+from app.productdb.bulk_upsert import ProductBulkUpsert
+from app.productdb.product_lookup import ProductLookup
+from app.productdb.search import TrigramSearchFilter
 from rest_framework import viewsets
 from rest_framework.decorators import action
 
@@ -245,6 +251,26 @@ class ProductGroupViewSet(viewsets.ModelViewSet):
         }
         return Response(result)
 
+    @swagger_auto_schema(
+        tags=["Base Data"],
+        operation_id="v1_productgroup_export",
+        operation_description="export all Product Groups for the query as `csv`, `ndjson` or `xlsx` file",
+        manual_parameters=[
+            openapi.Parameter("search", openapi.IN_QUERY, description="search within Product Group Name using a regex string", type=openapi.TYPE_STRING),
+        ],
+        responses={
+            status.HTTP_200_OK: openapi.Response("export file (streamed)")
+        }
+    )
+    @action(detail=False, url_path=r"export/(?P<export_format>%s)" % "|".join(export.EXPORT_FORMATS))
+    def export(self, request, export_format):
+        """
+        Export all Product Groups that match the filters and the search parameter of the list endpoint (without
+        pagination). The file is streamed while the entries are read from the database.
+        """
+        query = self.filter_queryset(self.get_queryset())
+        return export.get_export_response(query, export.PRODUCT_GROUP_EXPORT_COLUMNS, export_format, "product_groups")
+
 
 class ProductListFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(field_name="name", lookup_expr="icontains")
@@ -269,7 +295,7 @@ class ProductListViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for the ProductList object
     """
-    queryset = ProductList.objects.all().order_by("name")
+    queryset = ProductList.objects.select_related("update_user").order_by("name")
     serializer_class = ProductListSerializer
     lookup_field = "id"
     filter_backends = (
@@ -288,11 +314,26 @@ class ProductFilter(django_filters.FilterSet):
     product_group = django_filters.CharFilter(field_name="product_group__name", lookup_expr="exact")
     product_group__name = django_filters.CharFilter(field_name="product_group__name", lookup_expr="exact")
     product_group__id = django_filters.NumberFilter(field_name="product_group")
+    lifecycle_state = django_filters.ChoiceFilter(
+        choices=[(e, e) for e in Product.LIFECYCLE_STATES],
+        method="filter_lifecycle_state"
+    )
 
     class Meta:
         model = Product
         fields = ["id", "product_id", "vendor", "product_group"]
 
+    def filter_lifecycle_state(self, queryset, name, value):
+        return annotate_lifecycle_state(queryset).filter(lifecycle_state=value)
+
+
+class BulkWritePermissions(permissions.DjangoModelPermissions):
+    """the bulk write (POST) requires the permission to add and to change the objects"""
+    perms_map = dict(permissions.DjangoModelPermissions.perms_map, POST=[
+        "%(app_label)s.add_%(model_name)s",
+        "%(app_label)s.change_%(model_name)s",
+    ])
+
 
 @method_decorator(name="list", decorator=swagger_auto_schema(
     tags=["Base Data"],
@@ -306,6 +347,7 @@ class ProductFilter(django_filters.FilterSet):
         openapi.Parameter("product_group", openapi.IN_QUERY, description="DEPRECATED, use `product_group__name` instead", type=openapi.TYPE_STRING),
         openapi.Parameter("product_group__name", openapi.IN_QUERY, description="filter by Product Group name (exact match)", type=openapi.TYPE_STRING),
         openapi.Parameter("product_group__id", openapi.IN_QUERY, description="filter by Product Group Database ID", type=openapi.TYPE_INTEGER),
+        openapi.Parameter("lifecycle_state", openapi.IN_QUERY, description="filter by the current lifecycle state", type=openapi.TYPE_STRING, enum=list(Product.LIFECYCLE_STATES)),
         openapi.Parameter("search", openapi.IN_QUERY, description="search with Product ID, Description and tags field using a regex string", type=openapi.TYPE_STRING),
     ]
 ))
@@ -343,7 +385,7 @@ class ProductViewSet(viewsets.ModelViewSet):
     lookup_field = "id"
     filter_backends = (
         DjangoFilterBackend,
-        filters.SearchFilter,
+        TrigramSearchFilter,
     )
     filter_class = ProductFilter
     search_fields = ("$product_id", "$description", "$tags")
@@ -379,6 +421,151 @@ class ProductViewSet(viewsets.ModelViewSet):
         }
         return Response(result)
 
+    @swagger_auto_schema(
+        tags=["Base Data"],
+        operation_id="v1_product_export",
+        operation_description="export all Products for the query as `csv`, `ndjson` or `xlsx` file",
+        manual_parameters=[
+            openapi.Parameter("vendor__name", openapi.IN_QUERY, description="filter by Vendor name (case-sensitive starts-with match)", type=openapi.TYPE_STRING),
+            openapi.Parameter("vendor__id", openapi.IN_QUERY, description="filter by Vendor ID", type=openapi.TYPE_INTEGER),
+            openapi.Parameter("product_id", openapi.IN_QUERY, description="filter by Product ID (case-insensitive exact match)", type=openapi.TYPE_STRING),
+            openapi.Parameter("product_group__name", openapi.IN_QUERY, description="filter by Product Group name (exact match)", type=openapi.TYPE_STRING),
+            openapi.Parameter("product_group__id", openapi.IN_QUERY, description="filter by Product Group Database ID", type=openapi.TYPE_INTEGER),
+            openapi.Parameter("lifecycle_state", openapi.IN_QUERY, description="filter by the current lifecycle state", type=openapi.TYPE_STRING, enum=list(Product.LIFECYCLE_STATES)),
+            openapi.Parameter("search", openapi.IN_QUERY, description="search with Product ID, Description and tags field using a regex string", type=openapi.TYPE_STRING),
+        ],
+        responses={
+            status.HTTP_200_OK: openapi.Response("export file (streamed)")
+        }
+    )
+    @action(detail=False, url_path=r"export/(?P<export_format>%s)" % "|".join(export.EXPORT_FORMATS))
+    def export(self, request, export_format):
+        """
+        Export all Products that match the filters and the search parameter of the list endpoint (without
+        pagination). The file is streamed while the entries are read from the database.
+        """
+        query = self.filter_queryset(annotate_lifecycle_state(self.get_queryset()))
+        return export.get_export_response(query, export.PRODUCT_EXPORT_COLUMNS, export_format, "products")
+
+    @swagger_auto_schema(
+        tags=["Base Data"],
+        operation_id="v1_product_lookup",
+        operation_description="resolve multiple Product IDs with a single request (optionally limited to a Vendor)",
+        request_body=ProductLookupSerializer,
+        responses={
+            status.HTTP_200_OK: openapi.Response(
+                "lookup result",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "products": openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(type=openapi.TYPE_OBJECT),
+                            description="Products that match the requested Product IDs"
+                        ),
+                        "missing": openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(type=openapi.TYPE_STRING),
+                            description="requested Product IDs without a matching Product"
+                        )
+                    }
+                )
+            )
+        }
+    )
+    @action(detail=False, methods=["post"], permission_classes=(IsAuthenticated,))
+    def lookup(self, request):
+        """
+        Resolve the `product_ids` from the request body to Products, the result contains the matching Products and the
+        Product IDs without a match (`missing`). The Product IDs are matched exactly, if no exact match is found, a
+        case-insensitive match is used (like the `product_id` filter). Large results are streamed as JSON.
+        """
+        serializer = ProductLookupSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        vendor = serializer.validated_data.get("vendor")
+        lookup = ProductLookup(serializer.validated_data["product_ids"], vendor_id=vendor.id if vendor else None)
+
+        def serialize(products):
+            return self.get_serializer(products, many=True).data
+
+        if lookup.is_streamed():
+            return StreamingHttpResponse(lookup.iter_json(serialize), content_type="application/json")
+
+        return Response(lookup.get_result(serialize))
+
+    @swagger_auto_schema(
+        tags=["Base Data"],
+        operation_id="v1_product_bulk",
+        operation_description="create or update multiple Products with a single request",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=["products"],
+            properties={
+                "products": openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_OBJECT),
+                    description="Product entries with the fields of the Product endpoint, identified by `vendor` "
+                                "and `product_id`"
+                ),
+                "update_only": openapi.Schema(
+                    type=openapi.TYPE_BOOLEAN,
+                    description="only update existing Products (default: false)"
+                )
+            }
+        ),
+        responses={
+            status.HTTP_200_OK: openapi.Response(
+                "result per entry",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "results": openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(type=openapi.TYPE_OBJECT),
+                            description="status (`created`, `updated`, `unchanged` or `error`), Database ID and "
+                                        "errors per entry (same order as the request)"
+                        )
+                    }
+                )
+            ),
+            status.HTTP_400_BAD_REQUEST: openapi.Response(
+                "invalid request",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "error": openapi.Schema(
+                            type=openapi.TYPE_STRING,
+                            description="error message"
+                        )
+                    }
+                )
+            )
+        }
+    )
+    @action(detail=False, methods=["post"], permission_classes=(BulkWritePermissions,))
+    def bulk(self, request):
+        """
+        Create or update multiple Products (up to `PDB_API_PRODUCT_BULK_LIMIT` per request). The entries are
+        identified by the `vendor` ID (default: unassigned) and the `product_id`, only the given fields are changed for
+        existing Products. All valid entries are written within a single transaction, entries with errors are skipped.
+        """
+        entries = request.data.get("products") if isinstance(request.data, dict) else None
+        if not isinstance(entries, list) or len(entries) == 0:
+            return Response({
+                "error": "products parameter required (list of Product entries)"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if len(entries) > settings.PDB_API_PRODUCT_BULK_LIMIT:
+            return Response({
+                "error": "too many entries, only %d Products are allowed per request" % settings.PDB_API_PRODUCT_BULK_LIMIT
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        upsert = ProductBulkUpsert(entries, update_only=request.data.get("update_only", False) is True)
+
+        return Response({
+            "results": upsert.save()
+        })
+
 
 class ProductIdNormalizationRuleFilter(django_filters.FilterSet):
     vendor_name = django_filters.CharFilter(field_name="vendor__name", lookup_expr="startswith")
@@ -479,45 +666,140 @@ class ProductIdNormalizationRuleViewSet(viewsets.ReadOnlyModelViewSet):
                 "error": "input_string and vendor_name parameter required"
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # lookup vendor
-        vendor_qs = Vendor.objects.filter(name__startswith=vendor_name)
-        vendor_count = vendor_qs.count()
-        if vendor_count == 0:
+        vendor, error = self.get_vendor(vendor_name=vendor_name)
+        if error:
             return Response({
-                "error": "vendor_name returns no result"
+                "error": error
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        elif vendor_count > 1:
+        # apply rules on input string
+        product_id, matched_rule, product_in_database = normalization.normalize_product_ids(
+            vendor.id, [input_string]
+        )[input_string]
+
+        return Response({
+            "vendor_id": vendor.id,
+            "product_id": product_id,
+            "product_in_database": product_in_database,
+            "matched_rule_id": matched_rule
+        }, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        tags=["Product ID Normalization Rules"],
+        operation_id="v1_productidnormalizationrule_apply_batch",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=["input_strings"],
+            properties={
+                "input_strings": openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_STRING),
+                    description="Strings that should be converted to a Product ID"
+                ),
+                "vendor": openapi.Schema(
+                    type=openapi.TYPE_INTEGER,
+                    description="Vendor ID to use for the rule lookup"
+                ),
+                "vendor_name": openapi.Schema(
+                    type=openapi.TYPE_STRING,
+                    description="Vendor Name (case-sensitive starts-with match) to use for the rule lookup "
+                                "(alternative to `vendor`)"
+                ),
+            }
+        ),
+        responses={
+            status.HTTP_200_OK: openapi.Response(
+                "lookup result",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "vendor_id": openapi.Schema(
+                            type=openapi.TYPE_INTEGER,
+                            description="ID of the vendor object that was used for the lookup"
+                        ),
+                        "results": openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(type=openapi.TYPE_OBJECT),
+                            description="`input_string`, `product_id`, `product_in_database` and `matched_rule_id` "
+                                        "per input string (same values as the apply endpoint)"
+                        )
+                    }
+                )
+            ),
+            status.HTTP_400_BAD_REQUEST: openapi.Response(
+                "invalid response (e.g. parameters missing)",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "error": openapi.Schema(
+                            type=openapi.TYPE_STRING,
+                            description="error message"
+                        )
+                    }
+                )
+            )
+        }
+    )
+    @action(detail=False, methods=["post"], url_path="apply/batch", permission_classes=(IsAuthenticated,))
+    def apply_batch(self, request):
+        """
+        Batch version of the apply endpoint, converts up to `PDB_API_NORMALIZATION_BATCH_LIMIT` input strings with the
+        rules of the given Vendor (`vendor` ID or `vendor_name`). The results have the same order as the input strings.
+        """
+        data = request.data if isinstance(request.data, dict) else {}
+        input_strings = data.get("input_strings")
+        if not isinstance(input_strings, list) or len(input_strings) == 0 or \
+                not all([isinstance(e, str) for e in input_strings]):
             return Response({
-                "error": "vendor_name not unique, multiple entries found"
+                "error": "input_strings parameter required (list of strings)"
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        vendor = vendor_qs.first()
-        product_id = input_string
-        product_in_database = None
-        matched_rule = None
-
-        # apply rules on input string
-        rules = ProductIdNormalizationRule.objects.filter(vendor=vendor).order_by("priority").order_by("product_id")
-        for rule in rules:
-            if rule.matches(input_string):
-                product_id = rule.get_normalized_product_id(product_id)
+        if len(input_strings) > settings.PDB_API_NORMALIZATION_BATCH_LIMIT:
+            return Response({
+                "error": "too many input strings, only %d are allowed per request" %
+                         settings.PDB_API_NORMALIZATION_BATCH_LIMIT
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-                # lookup in local database
-                pqs = Product.objects.filter(product_id=product_id, vendor=vendor)
-                if pqs.count() != 0:
-                    product_in_database = pqs.first().id
+        vendor, error = self.get_vendor(vendor_id=data.get("vendor"), vendor_name=data.get("vendor_name"))
+        if error:
+            return Response({
+                "error": error
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-                matched_rule = rule.id
-                break
+        result = normalization.normalize_product_ids(vendor.id, input_strings)
 
         return Response({
             "vendor_id": vendor.id,
-            "product_id": product_id,
-            "product_in_database": product_in_database,
-            "matched_rule_id": matched_rule
+            "results": [
+                {
+                    "input_string": input_string,
+                    "product_id": result[input_string][0],
+                    "product_in_database": result[input_string][2],
+                    "matched_rule_id": result[input_string][1]
+                } for input_string in input_strings
+            ]
         }, status=status.HTTP_200_OK)
 
+    @staticmethod
+    def get_vendor(vendor_id=None, vendor_name=None):
+        """returns the Vendor by ID or by name (unique starts-with match) and an error message"""
+        if vendor_id is not None:
+            vendor = Vendor.objects.filter(id=vendor_id).first() if str(vendor_id).isdigit() else None
+            return vendor, None if vendor else "vendor not found"
+
+        if not vendor_name:
+            return None, "vendor or vendor_name parameter required"
+
+        # lookup vendor
+        vendors = list(Vendor.objects.filter(name__startswith=vendor_name)[:2])
+        if len(vendors) == 0:
+            return None, "vendor_name returns no result"
+
+        elif len(vendors) > 1:
+            return None, "vendor_name not unique, multiple entries found"
+
+        return vendors[0], None
+
 
 class TokenLogoutApiView(GenericAPIView):
     permission_classes = [IsAuthenticated]
@@ -0,0 +1,551 @@
+"""
+synthetic catalog generator and benchmark scenarios for the hot paths of the Product Database (used by the
+generatecatalog and benchmark management commands)
+"""
+import json
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import OrderedDict
+from datetime import timedelta
+import pandas as pd
+from cacheops import invalidate_model
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import datetime
+from rest_framework.test import force_authenticate
+from app.ciscoeox.api_crawler import update_local_db_based_on_records
+from app.productdb import datatables, normalization, views
+from app.productdb.api_views import ProductViewSet
+from app.productdb.bulk_writer import ProductBulkWriter
+from app.productdb.excel_import import ProductsExcelImporter
+from app.productdb.migration_paths import rebuild_migration_paths
+from app.productdb.models import Vendor, ProductGroup, Product, ProductMigrationSource, ProductMigrationOption, \
+    ProductList, ProductIdNormalizationRule, ProductCheck
+from app.productdb.utils import get_bulk_batch_size
+
+logger = logging.getLogger("productdb")
+
+# tag that is added to all generated Products
+CATALOG_TAG = "synthetic-catalog"
+CATALOG_MIGRATION_SOURCE_NAME = "Synthetic Migration Source"
+
+# names of the files that are created by write_catalog_files
+PRODUCTS_EXCEL_FILE = "products.xlsx"
+PRODUCT_CHECK_FILE = "product_check.txt"
+EOX_RECORDS_FILE = "eox_records.json"
+
+
+class BenchmarkException(Exception):
+    pass
+
+
+class CatalogGenerator:
+    """
+    creates a synthetic catalog within the database: Vendors (the first one is always Cisco Systems, required for the
+    EoX scenarios), Product Groups, Products with lifecycle data, migration chains, Product Lists and Product ID
+    normalization rules
+    """
+    PRODUCT_FAMILIES = ["WS-C", "C9300", "C9500", "ISR", "ASR", "N9K-C", "AIR-AP", "GLC", "SFP", "CP"]
+    PRODUCT_SUFFIXES = ["L", "E", "S", "A", "K9", "24TS", "48P", "X"]
+    DESCRIPTION_WORDS = ["Catalyst", "Switch", "Router", "Access Point", "Transceiver", "Module", "Power Supply",
+                         "Fan Tray", "License", "Chassis", "Line Card", "Uplink", "Gigabit", "PoE", "Stackable"]
+
+    def __init__(self, vendors=3, products=10000, product_groups=100, migration_chains=500, chain_length=3,
+                 product_lists=20, product_list_size=100, normalization_rules=50, seed=None):
+        self.vendors = vendors
+        self.products = products
+        self.product_groups = product_groups
+        self.migration_chains = migration_chains
+        self.chain_length = chain_length
+        self.product_lists = product_lists
+        self.product_list_size = product_list_size
+        self.normalization_rules = normalization_rules
+        self.random = random.Random(seed)
+        self.today = datetime.now().date()
+
+    def generate(self, user=None):
+        """
+        create the catalog (Product Lists are only created if a user is given), returns a dictionary with the amount
+        of created objects
+        """
+        with transaction.atomic():
+            vendors = self._create_vendors()
+            product_groups = self._create_product_groups(vendors)
+            products = self._create_products(vendors, product_groups)
+            migration_options = self._create_migration_chains(products)
+            product_lists = self._create_product_lists(products, user) if user else 0
+            normalization_rules = self._create_normalization_rules(vendors)
+
+        return OrderedDict([
+            ("vendors", len(vendors)),
+            ("product_groups", sum([len(e) for e in product_groups.values()])),
+            ("products", sum([len(e) for e in products.values()])),
+            ("migration_options", migration_options),
+            ("product_lists", product_lists),
+            ("normalization_rules", normalization_rules),
+        ])
+
+    def _create_vendors(self):
+        vendors = [Vendor.objects.get_or_create(name="Cisco Systems")[0]]
+        for index in range(1, self.vendors):
+            vendors.append(Vendor.objects.get_or_create(name="Synthetic Vendor %d" % index)[0])
+
+        return vendors
+
+    def _create_product_groups(self, vendors):
+        """returns a dictionary with the Vendor ID as key and the list of Product Groups as value"""
+        result = {}
+        for vendor in vendors:
+            result[vendor.id] = [
+                ProductGroup.objects.get_or_create(name="Synthetic Group %d" % index, vendor=vendor)[0]
+                for index in range(max(1, int(self.product_groups / len(vendors))))
+            ]
+
+        return result
+
+    def _get_product_values(self, index):
+        family = self.random.choice(self.PRODUCT_FAMILIES)
+        suffix = self.random.choice(self.PRODUCT_SUFFIXES)
+        values = {
+            "product_id": "%s-%06d-%s" % (family, index, suffix),
+            "description": " ".join(self.random.sample(self.DESCRIPTION_WORDS, 4)),
+            "list_price": round(self.random.uniform(10, 50000), 2),
+            "currency": self.random.choice(["USD", "EUR"]),
+            "tags": "%s %s" % (CATALOG_TAG, family.lower()),
+        }
+
+        lifecycle = self.random.random()
+        if lifecycle < 0.4:
+            # lifecycle data with an EoL announcement
+            announcement = self.today - timedelta(days=self.random.randint(0, 2000))
+            end_of_sale = announcement + timedelta(days=180)
+            values.update({
+                "eox_update_time_stamp": self.today - timedelta(days=self.random.randint(0, 30)),
+                "eol_ext_announcement_date": announcement,
+                "end_of_sale_date": end_of_sale,
+                "end_of_new_service_attachment_date": end_of_sale + timedelta(days=365),
+                "end_of_sw_maintenance_date": end_of_sale + timedelta(days=365),
+                "end_of_routine_failure_analysis": end_of_sale + timedelta(days=365),
+                "end_of_service_contract_renewal": end_of_sale + timedelta(days=3 * 365),
+                "end_of_sec_vuln_supp_date": end_of_sale + timedelta(days=3 * 365),
+                "end_of_support_date": end_of_sale + timedelta(days=5 * 365),
+                "eol_reference_number": "EOL%d" % self.random.randint(1000, 9999),
+                "eol_reference_url": "https://www.example.com/eol/%d.html" % index,
+            })
+
+        elif lifecycle < 0.7:
+            # lifecycle data without an EoL announcement
+            values["eox_update_time_stamp"] = self.today - timedelta(days=self.random.randint(0, 30))
+
+        return values
+
+    def _create_products(self, vendors, product_groups):
+        """returns a dictionary with the Vendor ID as key and the list of created Products as value"""
+        # continue the numbering of an existing catalog to keep the Product IDs unique
+        offset = Product.objects.filter(tags__contains=CATALOG_TAG).count()
+        writer = ProductBulkWriter()
+        result = {}
+        for index in range(offset, offset + self.products):
+            vendor = vendors[index % len(vendors)]
+            product = Product(
+                vendor=vendor,
+                product_group=self.random.choice(product_groups[vendor.id]),
+                **self._get_product_values(index)
+            )
+            writer.create(product)
+            result.setdefault(vendor.id, []).append(product)
+
+        writer.save()
+        return result
+
+    def _create_migration_chains(self, products):
+        """create chains of Product Migration Options between Products of the same Vendor"""
+        migration_source, _ = ProductMigrationSource.objects.get_or_create(name=CATALOG_MIGRATION_SOURCE_NAME)
+        options = []
+        pools = [self.random.sample(e, len(e)) for e in products.values()]
+        for index in range(self.migration_chains):
+            pool = pools[index % len(pools)]
+            if len(pool) <= self.chain_length:
+                continue
+
+            chain = [pool.pop() for _ in range(self.chain_length + 1)]
+            for product, replacement in zip(chain[:-1], chain[1:]):
+                options.append(ProductMigrationOption(
+                    product=product,
+                    migration_source=migration_source,
+                    replacement_product_id=replacement.product_id,
+                    replacement_db_product=replacement,
+                    comment="synthetic migration chain %d" % index
+                ))
+
+        ProductMigrationOption.objects.bulk_create(
+            options,
+            batch_size=get_bulk_batch_size(ProductMigrationOption, options)
+        )
+        invalidate_model(ProductMigrationOption)
+        rebuild_migration_paths()
+
+        return len(options)
+
+    def _create_product_lists(self, products, user):
+        offset = ProductList.objects.filter(name__startswith="Synthetic Product List").count()
+        vendor_products = list(products.values())
+        for index in range(offset, offset + self.product_lists):
+            pool = vendor_products[index % len(vendor_products)]
+            ProductList.objects.create(
+                name="Synthetic Product List %d" % index,
+                vendor=pool[0].vendor,
+                string_product_list="\n".join(
+                    [p.product_id for p in self.random.sample(pool, min(len(pool), self.product_list_size))]
+                ),
+                description="synthetic Product List",
+                update_user=user
+            )
+
+        return self.product_lists
+
+    def _create_normalization_rules(self, vendors):
+        # the rules are unique per Vendor, normalized Product ID and regular expression
+        existing_rules = set(ProductIdNormalizationRule.objects.values_list("vendor_id", "product_id", "regex_match"))
+        rules = []
+        for index in range(self.normalization_rules):
+            family = self.PRODUCT_FAMILIES[index % len(self.PRODUCT_FAMILIES)]
+            suffix = self.PRODUCT_SUFFIXES[int(index / len(self.PRODUCT_FAMILIES)) % len(self.PRODUCT_SUFFIXES)]
+            rule = ProductIdNormalizationRule(
+                vendor=vendors[index % len(vendors)],
+                regex_match=r"^%s(\d{6})%s$" % (get_raw_product_id_part(family), get_raw_product_id_part(suffix)),
+                product_id="%s-%%s-%s" % (family, suffix),
+                comment="synthetic normalization rule",
+                priority=index
+            )
+            key = (rule.vendor.id, rule.product_id, rule.regex_match)
+            if key not in existing_rules:
+                existing_rules.add(key)
+                rules.append(rule)
+
+        ProductIdNormalizationRule.objects.bulk_create(rules)
+        # the signals are not sent for bulk operations
+        normalization.invalidate_rule_sets()
+        return len(rules)
+
+
+def get_raw_product_id_part(value):
+    """format of the Product IDs that are used as input for the normalization rules (e.g. ws-c000001l)"""
+    return value.replace("-", "").lower()
+
+
+def write_catalog_files(output_dir, excel_rows=1000, product_check_size=5000, eox_records=1000, seed=None):
+    """
+    write the input files for the benchmark scenarios based on the synthetic catalog within the database (Excel
+    Product import, Product Check input and EoX records), returns a dictionary with the paths of the files
+    """
+    rnd = random.Random(seed)
+    products = list(Product.objects.filter(tags__contains=CATALOG_TAG).select_related("vendor", "product_group"))
+    if len(products) == 0:
+        raise ValueError("no synthetic catalog found in the database")
+
+    os.makedirs(output_dir, exist_ok=True)
+    result = OrderedDict()
+
+    # Excel file for the Product import
+    rows = []
+    for p in rnd.sample(products, min(len(products), excel_rows)):
+        row = OrderedDict([
+            ("product id", p.product_id),
+            ("description", p.description),
+            ("list price", p.list_price),
+            ("currency", p.currency),
+            ("vendor", p.vendor.name),
+            ("tags", p.tags),
+            ("product group", p.product_group.name if p.product_group else None),
+        ])
+        for attr, column in ProductsExcelImporter.datetime_columns.items():
+            row[column] = getattr(p, attr)
+
+        rows.append(row)
+
+    result["excel"] = os.path.join(output_dir, PRODUCTS_EXCEL_FILE)
+    pd.DataFrame(rows).to_excel(result["excel"], sheet_name=ProductsExcelImporter.sheetname, index=False)
+
+    # Product Check input with existing, unknown, duplicate and not normalized Product IDs
+    product_ids = []
+    for index in range(product_check_size):
+        value = rnd.random()
+        product_id = rnd.choice(products).product_id
+        if value < 0.1:
+            product_ids.append("UNKNOWN-%06d" % index)
+
+        elif value < 0.15:
+            product_ids.append(get_raw_product_id_part(product_id))
+
+        else:
+            product_ids.append(product_id)
+
+    result["product_check"] = os.path.join(output_dir, PRODUCT_CHECK_FILE)
+    with open(result["product_check"], "w") as f:
+        f.write("\n".join(product_ids))
+
+    # EoX records for Cisco Products (updated lifecycle data and new Products)
+    cisco_products = [p for p in products if p.vendor.name == "Cisco Systems"]
+    records = []
+    for index in range(eox_records):
+        if len(cisco_products) != 0 and rnd.random() < 0.8:
+            product_id = rnd.choice(cisco_products).product_id
+
+        else:
+            product_id = "EOX-NEW-%06d-%s" % (index, rnd.choice(CatalogGenerator.PRODUCT_SUFFIXES))
+
+        records.append(get_eox_record(product_id, rnd))
+
+    result["eox_records"] = os.path.join(output_dir, EOX_RECORDS_FILE)
+    with open(result["eox_records"], "w") as f:
+        json.dump(records, f)
+
+    return result
+
+
+def get_eox_record(product_id, rnd):
+    """synthetic EoX record in the format of the Cisco EoX API"""
+    today = datetime.now().date()
+    end_of_sale = today - timedelta(days=rnd.randint(-365, 2000))
+
+    def date_value(date):
+        return {"value": date.strftime("%Y-%m-%d"), "dateFormat": "YYYY-MM-DD"}
+
+    return {
+        "EOLProductID": product_id,
+        "ProductIDDescription": "synthetic EoX record for %s" % product_id,
+        "ProductBulletinNumber": "EOL%d" % rnd.randint(1000, 9999),
+        "LinkToProductBulletinURL": "https://www.example.com/eox/%s.html" % product_id,
+        "EOXExternalAnnouncementDate": date_value(end_of_sale - timedelta(days=180)),
+        "EndOfSaleDate": date_value(end_of_sale),
+        "EndOfSWMaintenanceReleases": date_value(end_of_sale + timedelta(days=365)),
+        "EndOfSecurityVulSupportDate": date_value(end_of_sale + timedelta(days=3 * 365)),
+        "EndOfRoutineFailureAnalysisDate": date_value(end_of_sale + timedelta(days=365)),
+        "EndOfServiceContractRenewal": date_value(end_of_sale + timedelta(days=3 * 365)),
+        "LastDateOfSupport": date_value(end_of_sale + timedelta(days=5 * 365)),
+        "EndOfSvcAttachDate": date_value(end_of_sale + timedelta(days=365)),
+        "UpdatedTimeStamp": date_value(today),
+        "EOXMigrationDetails": {
+            "PIDActiveFlag": "Y",
+            "MigrationInformation": "",
+            "MigrationOption": "Enter PID(s)",
+            "MigrationProductId": "%s-R" % product_id,
+            "MigrationProductName": "",
+            "MigrationStrategy": "",
+            "MigrationProductInfoURL": "https://www.example.com/migration/%s.html" % product_id
+        },
+        "EOXInputType": "ShowEOXByPids",
+        "EOXInputValue": product_id
+    }
+
+
+class Benchmark:
+    """
+    benchmark scenarios for the hot paths, every scenario is executed multiple times and reports the wall time and
+    the amount of database queries per run. Scenarios that change the database are executed within a transaction
+    that is rolled back after every run.
+    """
+    SCENARIOS = OrderedDict([
+        ("excel_import", "run_excel_import"),
+        ("excel_import_bulk", "run_excel_import_bulk"),
+        ("product_check", "run_product_check"),
+        ("eox_records", "run_eox_records"),
+        ("datatables_list_products", "run_datatables_list_products"),
+        ("datatables_search_products", "run_datatables_search_products"),
+        ("datatables_vendor_products", "run_datatables_vendor_products"),
+        ("datatables_products_by_group", "run_datatables_products_by_group"),
+        ("api_products_list", "run_api_products_list"),
+        ("api_products_search", "run_api_products_search"),
+        ("product_detail", "run_product_detail"),
+    ])
+    # scenarios that change the database
+    WRITE_SCENARIOS = {"excel_import", "excel_import_bulk", "product_check", "eox_records"}
+
+    def __init__(self, data_dir=None, repeat=3, page_size=100, search_term="C9300"):
+        self.data_dir = data_dir
+        self.repeat = repeat
+        self.page_size = page_size
+        self.search_term = search_term
+        self.request_factory = RequestFactory(HTTP_HOST=get_request_host())
+        self.api_user = User(username="benchmark", is_superuser=True, is_active=True)
+        self._files = None
+
+    @property
+    def files(self):
+        """input files of the scenarios (generated within a temporary directory if no data directory is given)"""
+        if self._files is None:
+            data_dir = self.data_dir or tempfile.mkdtemp(prefix="pdb_benchmark_")
+            self._files = {
+                "excel": os.path.join(data_dir, PRODUCTS_EXCEL_FILE),
+                "product_check": os.path.join(data_dir, PRODUCT_CHECK_FILE),
+                "eox_records": os.path.join(data_dir, EOX_RECORDS_FILE),
+            }
+            if not all([os.path.exists(e) for e in self._files.values()]):
+                self._files = write_catalog_files(data_dir)
+
+        return self._files
+
+    def measure(self, scenario):
+        """execute the given scenario and return the results"""
+        func = getattr(self, self.SCENARIOS[scenario])
+        runs = []
+        for _ in range(self.repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                if scenario in self.WRITE_SCENARIOS:
+                    with transaction.atomic():
+                        func()
+                        transaction.set_rollback(True)
+
+                else:
+                    func()
+
+                wall_time = time.perf_counter() - start
+
+            runs.append({"wall_time": round(wall_time, 6), "queries": len(queries)})
+
+        return OrderedDict([
+            ("name", scenario),
+            ("repeat", self.repeat),
+            ("wall_time_min", min([e["wall_time"] for e in runs])),
+            ("wall_time_median", round(statistics.median([e["wall_time"] for e in runs]), 6)),
+            ("queries", max([e["queries"] for e in runs])),
+            ("runs", runs),
+        ])
+
+    def run(self, scenarios=None):
+        """execute the given scenarios (default is all) and return the report"""
+        scenarios = scenarios or list(self.SCENARIOS.keys())
+        results = []
+        for scenario in scenarios:
+            logger.info("run benchmark scenario %s" % scenario)
+            results.append(self.measure(scenario))
+
+        return OrderedDict([
+            ("timestamp", datetime.now().isoformat()),
+            ("database", connection.vendor),
+            ("cacheops_enabled", getattr(settings, "CACHEOPS_ENABLED", True)),
+            ("catalog", OrderedDict([
+                ("products", Product.objects.count()),
+                ("migration_options", ProductMigrationOption.objects.count()),
+                ("product_lists", ProductList.objects.count()),
+                ("normalization_rules", ProductIdNormalizationRule.objects.count()),
+            ])),
+            ("scenarios", results),
+        ])
+
+    def _get_request(self, url, params=None):
+        request = self.request_factory.get(url, params or {})
+        request.user = AnonymousUser()
+        return request
+
+    def _get_datatables_request(self, url, search_term=""):
+        return self._get_request(url, {
+            "draw": 1,
+            "start": 0,
+            "length": self.page_size,
+            "search[value]": search_term,
+        })
+
+    def _get_api_request(self, params):
+        request = self.request_factory.get(reverse("productdb:products-list"), params)
+        force_authenticate(request, user=self.api_user)
+        return request
+
+    @staticmethod
+    def _get_catalog_products():
+        return Product.objects.filter(tags__contains=CATALOG_TAG)
+
+    def run_excel_import(self, bulk_mode=False):
+        importer = ProductsExcelImporter(self.files["excel"])
+        importer.verify_file()
+        importer.import_to_database(bulk_mode=bulk_mode)
+
+    def run_excel_import_bulk(self):
+        self.run_excel_import(bulk_mode=True)
+
+    def run_product_check(self):
+        with open(self.files["product_check"]) as f:
+            input_product_ids = f.read()
+
+        product_check = ProductCheck.objects.create(name="benchmark", input_product_ids=input_product_ids)
+        product_check.perform_product_check()
+
+    def run_eox_records(self):
+        with open(self.files["eox_records"]) as f:
+            records = json.load(f)
+
+        update_local_db_based_on_records(records, create_missing=True)
+
+    def run_datatables_list_products(self):
+        url = reverse("productdb:datatables_list_products_view")
+        check_response(datatables.ListProductsJson.as_view()(self._get_datatables_request(url)))
+
+    def run_datatables_search_products(self):
+        url = reverse("productdb:datatables_list_products_view")
+        check_response(datatables.ListProductsJson.as_view()(self._get_datatables_request(url, self.search_term)))
+
+    def run_datatables_vendor_products(self):
+        vendor_id = self._get_catalog_products().values_list("vendor_id", flat=True).first()
+        url = reverse("productdb:datatables_vendor_products_endpoint", kwargs={"vendor_id": vendor_id})
+        check_response(
+            datatables.VendorProductListJson.as_view()(self._get_datatables_request(url), vendor_id=vendor_id)
+        )
+
+    def run_datatables_products_by_group(self):
+        group_id = self._get_catalog_products().exclude(
+            product_group=None
+        ).values_list("product_group_id", flat=True).first()
+        url = reverse("productdb:datatables_list_products_by_group_view", kwargs={"product_group_id": group_id})
+        check_response(datatables.ListProductsByGroupJson.as_view()(
+            self._get_datatables_request(url), product_group_id=group_id
+        ))
+
+    def run_api_products_list(self):
+        check_response(
+            ProductViewSet.as_view({"get": "list"})(self._get_api_request({"page_size": self.page_size})).render()
+        )
+
+    def run_api_products_search(self):
+        check_response(ProductViewSet.as_view({"get": "list"})(self._get_api_request({
+            "page_size": self.page_size,
+            "search": self.search_term
+        })).render())
+
+    def run_product_detail(self):
+        # use a Product with a migration path
+        product_id = ProductMigrationOption.objects.filter(
+            migration_source__name=CATALOG_MIGRATION_SOURCE_NAME
+        ).values_list("product_id", flat=True).first()
+        if product_id is None:
+            product_id = self._get_catalog_products().values_list("id", flat=True).first()
+
+        url = reverse("productdb:product-detail", kwargs={"product_id": product_id})
+        check_response(views.view_product_details(self._get_request(url), product_id=product_id))
+
+
+def check_response(response):
+    """
+    verify the response of a scenario (the datatables endpoints return an error message with HTTP 200)
+    :raises BenchmarkException: if the request failed
+    """
+    if response.status_code != 200 or b'"result": "error"' in response.content:
+        raise BenchmarkException("request failed: HTTP %d, %s" % (response.status_code, response.content[:200]))
+
+
+def get_request_host():
+    """host name for the requests of the benchmark scenarios that is accepted by the ALLOWED_HOSTS setting"""
+    for host in settings.ALLOWED_HOSTS:
+        if host != "*":
+            return host.lstrip(".")
+
+    return "localhost"
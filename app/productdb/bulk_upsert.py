@@ -0,0 +1,151 @@
+"""
+create or update multiple Products with a single request (used by the bulk write endpoint of the Product API)
+
+The entries are identified by the vendor and the Product ID. All entries are validated before the existing Products,
+Vendors and Product Groups are loaded with a few bulk queries. The valid entries are written with the
+ProductBulkWriter within a single transaction, which applies the same timestamp semantic as Product.save. Entries with
+errors are skipped and reported within the result.
+"""
+from django.core.exceptions import ValidationError
+from app.productdb.bulk_writer import ProductBulkWriter
+from app.productdb.models import Product, Vendor, ProductGroup
+from app.productdb.serializers import ProductBulkSerializer
+from app.productdb.utils import split_list
+
+CREATED = "created"
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+ERROR = "error"
+
+
+class ProductBulkUpsert:
+    """creates or updates the Products of the given entries (dictionaries with the fields of the Product API)"""
+    def __init__(self, entries, update_only=False):
+        self.entries = entries
+        self.update_only = update_only
+        self.results = []
+
+    def validate_entries(self):
+        """returns the validated data per entry (None if the entry is not valid)"""
+        default_vendor_id = Product._meta.get_field("vendor").get_default()
+        validated_entries = []
+        for index, entry in enumerate(self.entries):
+            serializer = ProductBulkSerializer(data=entry, partial=True)
+            if not isinstance(entry, dict) or not serializer.is_valid():
+                errors = serializer.errors if isinstance(entry, dict) else {"non_field_errors": ["Invalid entry."]}
+                self._set_error(index, errors)
+                validated_entries.append(None)
+                continue
+
+            data = dict(serializer.validated_data)
+            if "product_id" not in data:
+                self._set_error(index, {"product_id": ["This field is required."]})
+                validated_entries.append(None)
+                continue
+
+            data.setdefault("vendor", default_vendor_id)
+            validated_entries.append(data)
+
+        return validated_entries
+
+    def save(self):
+        """write the valid entries to the database and returns the result per entry"""
+        self.results = [
+            {"product_id": e.get("product_id") if isinstance(e, dict) else None, "status": None}
+            for e in self.entries
+        ]
+        validated_entries = self.validate_entries()
+
+        vendor_ids = set([e["vendor"] for e in validated_entries if e])
+        vendor_ids = set(Vendor.objects.filter(id__in=vendor_ids).values_list("id", flat=True))
+
+        product_group_ids = set([e["product_group"] for e in validated_entries if e and e.get("product_group")])
+        product_groups = {}
+        for chunk in split_list(product_group_ids):
+            for pg in ProductGroup.objects.filter(id__in=chunk):
+                product_groups[pg.id] = pg
+
+        writer = ProductBulkWriter()
+        products = {}
+        for vendor_id in vendor_ids:
+            products[vendor_id] = writer.load_products(
+                vendor_id, [e["product_id"] for e in validated_entries if e and e["vendor"] == vendor_id]
+            )
+
+        keys = set()
+        registered_products = []
+        for index, data in enumerate(validated_entries):
+            if data is None:
+                continue
+
+            key = (data["vendor"], data["product_id"])
+            if data["vendor"] not in vendor_ids:
+                self._set_error(index, {"vendor": ["Invalid pk \"%s\" - object does not exist." % data["vendor"]]})
+                continue
+
+            if key in keys:
+                self._set_error(index, {"non_field_errors": ["Duplicate entry within the request."]})
+                continue
+
+            keys.add(key)
+            if data.get("product_group"):
+                if data["product_group"] not in product_groups:
+                    self._set_error(index, {"product_group": [
+                        "Invalid pk \"%s\" - object does not exist." % data["product_group"]
+                    ]})
+                    continue
+
+                data["product_group"] = product_groups[data["product_group"]]
+
+            product = products[data["vendor"]].get(data["product_id"])
+            if product is None and self.update_only:
+                self._set_error(index, {"product_id": ["Product not found."]})
+                continue
+
+            product = self._register(writer, index, product, data)
+            if product is not None:
+                registered_products.append((index, product))
+
+        writer.save()
+        for index, product in registered_products:
+            self.results[index]["id"] = product.pk
+
+        return self.results
+
+    def _register(self, writer, index, product, data):
+        """register the changes of a single entry at the writer, returns the Product (None if it is not valid)"""
+        values = dict([(k, v) for k, v in data.items() if k not in ("vendor", "product_id")])
+        created = product is None
+        if created:
+            product = Product(product_id=data["product_id"], vendor_id=data["vendor"])
+            changes = values
+
+        else:
+            changes = dict([(k, v) for k, v in values.items() if getattr(product, k) != v])
+
+        old_values = dict([(attr, getattr(product, attr)) for attr in changes.keys()])
+        for attr, value in changes.items():
+            setattr(product, attr, value)
+
+        try:
+            if created:
+                writer.create(product)
+
+            elif len(changes) != 0:
+                writer.update(product, changes.keys())
+
+        except ValidationError as ex:
+            # the changes are only applied to the Product if the validation was successful
+            for attr, value in old_values.items():
+                setattr(product, attr, value)
+
+            self._set_error(index, ex.message_dict if hasattr(ex, "error_dict") else {"non_field_errors": ex.messages})
+            return None
+
+        self.results[index]["vendor"] = data["vendor"]
+        self.results[index]["status"] = CREATED if created else (UPDATED if len(changes) != 0 else UNCHANGED)
+        return product
+
+    def _set_error(self, index, errors):
+        self.results[index]["status"] = ERROR
+        self.results[index]["errors"] = errors
@@ -0,0 +1,180 @@
+"""
+create and update Products in batches (used by the bulk import and the bulk API)
+"""
+import logging
+from collections import Counter
+from cacheops import invalidate_model
+from django.db import transaction
+from django.utils.timezone import datetime
+from app.productdb import migration_paths
+from app.productdb import product_statistics
+from app.productdb.models import Product, ProductMigrationOption
+from app.productdb.utils import split_list, get_bulk_batch_size
+
+logger = logging.getLogger("productdb")
+
+# fields that are considered when computing the validity of a replacement (see ProductMigrationOption)
+MIGRATION_PATH_RELEVANT_FIELDS = {
+    "eox_update_time_stamp",
+    "eol_ext_announcement_date",
+    "end_of_sale_date",
+}
+
+
+class ProductBulkWriter:
+    """
+    creates and updates Products with a few bulk queries, applies the same validation and timestamp semantic as
+    Product.save and performs the work of the Product signals once for all changed Products
+    """
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        self._created = []
+        self._created_ids = set()
+        self._updated = {}
+
+    @staticmethod
+    def load_products(vendor_id, product_ids):
+        """returns a dictionary with the Product ID as key and the existing Product of the given vendor as value"""
+        result = {}
+        for chunk in split_list(set(product_ids)):
+            query = Product.objects.filter(vendor_id=vendor_id, product_id__in=chunk).select_related("product_group")
+            for product in query:
+                result[product.product_id] = product
+
+        return result
+
+    @staticmethod
+    def validate(product, fields=None):
+        """
+        validate the given Product (optionally only the given fields, the relations are not validated)
+        :raises ValidationError: if the values are not valid
+        """
+        if product.eol_reference_url is not None:
+            product.eol_reference_url = product.eol_reference_url.strip()
+
+        exclude = ["vendor", "product_group"]
+        if fields is not None:
+            exclude += [f.name for f in Product._meta.fields if f.name not in fields]
+
+        product.clean_fields(exclude=exclude)
+        product.clean()
+
+    def create(self, product):
+        """validate and register a new Product (a Product that is already registered is only validated)"""
+        self.validate(product)
+        if id(product) not in self._created_ids:
+            self._created_ids.add(id(product))
+            self._created.append(product)
+
+    def update(self, product, fields):
+        """validate and register the changed fields of an existing Product"""
+        self.validate(product, fields)
+        if product.pk in self._updated:
+            self._updated[product.pk][1].update(fields)
+
+        else:
+            self._updated[product.pk] = (product, set(fields))
+
+    @property
+    def amount_of_changes(self):
+        return len(self._created) + len(self._updated)
+
+    def save(self):
+        """write all registered changes to the database, returns the amount of created and updated Products"""
+        today = datetime.today().date()
+        for product in self._created:
+            product.update_timestamp = today
+            if product.list_price is not None:
+                product.list_price_timestamp = today
+
+        # the Products are updated per set of changed fields, therefore unchanged values are never written back
+        update_groups = {}
+        for product, fields in self._updated.values():
+            fields = set(fields)
+            if "lc_state_sync" not in fields:
+                # same as Product.save, the update timestamp is not changed if only the state sync is updated
+                product.update_timestamp = today
+                fields.add("update_timestamp")
+
+            if "list_price" in fields:
+                product.list_price_timestamp = today
+                fields.add("list_price_timestamp")
+
+            update_groups.setdefault(tuple(sorted(fields)), []).append(product)
+
+        updated_products = [e[0] for e in self._updated.values()]
+
+        with transaction.atomic():
+            if len(self._created) != 0:
+                Product.objects.bulk_create(
+                    self._created,
+                    batch_size=get_bulk_batch_size(Product, self._created, self.batch_size)
+                )
+                self._load_primary_keys(self._created)
+
+            for update_fields, products in update_groups.items():
+                Product.objects.bulk_update(products, update_fields, batch_size=self.batch_size)
+
+            self._post_process(
+                created_products=self._created,
+                lifecycle_changed_product_ids=[
+                    p.pk for p, fields in self._updated.values() if MIGRATION_PATH_RELEVANT_FIELDS & fields
+                ]
+            )
+
+        result = len(self._created), len(updated_products)
+        self._created = []
+        self._created_ids = set()
+        self._updated = {}
+        return result
+
+    @staticmethod
+    def _load_primary_keys(products):
+        """set the primary keys of the created Products (only returned by bulk_create on some database backends)"""
+        products = [p for p in products if p.pk is None]
+        vendor_ids = set([p.vendor_id for p in products])
+        for vendor_id in vendor_ids:
+            vendor_products = dict([(p.product_id, p) for p in products if p.vendor_id == vendor_id])
+            for chunk in split_list(vendor_products.keys()):
+                query = Product.objects.filter(vendor_id=vendor_id, product_id__in=chunk).values_list("product_id", "id")
+                for product_id, pk in query:
+                    vendor_products[product_id].pk = pk
+
+    @staticmethod
+    def _post_process(created_products, lifecycle_changed_product_ids):
+        """
+        bulk version of the Product signals: updates the database relation of the Product Migration Options that
+        refer to the new Products, recomputes the affected migration paths and invalidates the caches
+        """
+        affected_product_ids = set(lifecycle_changed_product_ids)
+
+        new_product_ids = set([p.product_id for p in created_products])
+        for chunk in split_list(new_product_ids):
+            options = list(ProductMigrationOption.objects.filter(replacement_product_id__in=chunk))
+            if len(options) == 0:
+                continue
+
+            products = Product.objects.filter(
+                product_id__in=set([pmo.replacement_product_id for pmo in options])
+            ).values_list("product_id", "id")
+            # the relation is only set if the Product ID is unique within the database
+            amounts = Counter([product_id for product_id, _ in products])
+            product_ids = dict([(product_id, pid) for product_id, pid in products if amounts[product_id] == 1])
+
+            changed_options = []
+            for pmo in options:
+                replacement_db_product_id = product_ids.get(pmo.replacement_product_id)
+                if pmo.replacement_db_product_id != replacement_db_product_id:
+                    pmo.replacement_db_product_id = replacement_db_product_id
+                    changed_options.append(pmo)
+                    affected_product_ids.add(pmo.product_id)
+
+            if len(changed_options) != 0:
+                ProductMigrationOption.objects.bulk_update(changed_options, ["replacement_db_product"])
+                invalidate_model(ProductMigrationOption)
+
+        if len(affected_product_ids) != 0:
+            migration_paths.update_migration_paths(affected_product_ids)
+
+        invalidate_model(Product)
+        product_statistics.schedule_product_statistics_refresh()
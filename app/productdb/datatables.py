@@ -1,7 +1,10 @@
 from django_datatables_view.base_datatable_view import BaseDatatableView
-from .models import Product, ProductGroup
+from .models import Product, ProductGroup, annotate_lifecycle_state
 from django.db.models import Q
+from django.utils.timezone import datetime
 from app.productdb.utils import is_valid_regex
+from app.productdb.search import get_search_query
+from app.productdb import export
 
 
 def get_try_regex_from_user_profile(request):
@@ -34,22 +37,34 @@ class ColumnSearchMixin:
             column_search_string = request.GET.get(get_param, None)
 
             if column_search_string:
-                query_set = query_set.filter(**{
-                    "%s__%s" % (
-                        param["expr"],
-                        "iregex" if is_valid_regex(column_search_string) and try_regex else "icontains"
-                    ): column_search_string
-                })
+                query_set = query_set.filter(get_search_query([param["expr"]], column_search_string, regex=try_regex))
         return query_set
 
 
+class ExportMixin:
+    """
+    export of all entries of a datatables endpoint (search, column search and ordering of the table are applied, the
+    pagination is ignored), the export format is taken from the URL
+    """
+    export_columns = ()
+    export_filename = "export"
+
+    def get(self, request, *args, **kwargs):
+        self.initialize(*args, **kwargs)
+        self.columns_data = self.extract_datatables_column_data()
+        qs = self.ordering(self.filter_queryset(self.get_initial_queryset()))
+
+        return export.get_export_response(qs, self.export_columns, kwargs["export_format"], self.export_filename)
+
+
 class VendorProductListJson(BaseDatatableView, ColumnSearchMixin):
     order_columns = [
         'product_id',
         'product_group',
         'description',
         'list_price',
-        'tags'
+        'tags',
+        'lifecycle_state_order'
     ]
     column_based_filter = {  # parameters that are required for the column based filtering
         "product_id": {
@@ -72,8 +87,11 @@ class VendorProductListJson(BaseDatatableView, ColumnSearchMixin):
         "tags": {
             "order": 4,
             "expr": "tags",
+        },
+        "lifecycle_state": {
+            "order": 5,
+            "expr": "lifecycle_state",
         }
-
     }
     max_display_length = 250
 
@@ -84,7 +102,9 @@ class VendorProductListJson(BaseDatatableView, ColumnSearchMixin):
         if "vendor_id" in self.kwargs:
             if self.kwargs['vendor_id']:
                 self.vendor_id = self.kwargs['vendor_id']
-        return Product.objects.filter(vendor__id=self.vendor_id).prefetch_related("vendor", "product_group")
+        return annotate_lifecycle_state(
+            Product.objects.filter(vendor__id=self.vendor_id).prefetch_related("vendor", "product_group")
+        )
 
     def filter_queryset(self, qs):
         search_string = self.request.GET.get('search[value]', None)
@@ -92,11 +112,7 @@ class VendorProductListJson(BaseDatatableView, ColumnSearchMixin):
 
         if search_string:
             # search in the Product Group name and Vendor name by default
-            operation = "iregex" if is_valid_regex(search_string) and try_regex else "icontains"
-            qs = qs.filter(
-                Q(**{"product_id__%s" % operation: search_string}) |
-                Q(**{"description__%s" % operation: search_string})
-            )
+            qs = qs.filter(get_search_query(["product_id", "description"], search_string, regex=try_regex))
 
         # apply column based search
         qs = self.apply_column_based_search(request=self.request, query_set=qs, try_regex=try_regex)
@@ -105,6 +121,7 @@ class VendorProductListJson(BaseDatatableView, ColumnSearchMixin):
 
     def prepare_results(self, qs):
         json_data = []
+        today = datetime.now().date()
 
         for item in qs:
             json_data.append({
@@ -116,7 +133,7 @@ class VendorProductListJson(BaseDatatableView, ColumnSearchMixin):
                 "list_price": item.list_price,
                 "currency": item.currency,
                 "tags": item.tags,
-                "lifecycle_state": item.current_lifecycle_states,
+                "lifecycle_state": item.get_lifecycle_states(today),
                 "eox_update_time_stamp": item.eox_update_time_stamp,
                 "eol_ext_announcement_date": item.eol_ext_announcement_date,
                 "end_of_sale_date": item.end_of_sale_date,
@@ -196,7 +213,8 @@ class ListProductsByGroupJson(BaseDatatableView, ColumnSearchMixin):
         'product_id',
         'description',
         'list_price',
-        'tags'
+        'tags',
+        'lifecycle_state_order'
     ]
     column_based_filter = {  # parameters that are required for the column based filtering
         "product_id": {
@@ -215,6 +233,10 @@ class ListProductsByGroupJson(BaseDatatableView, ColumnSearchMixin):
             "order": 3,
             "expr": "tags"
         },
+        "lifecycle_state": {
+            "order": 4,
+            "expr": "lifecycle_state"
+        },
     }
     max_display_length = 250
 
@@ -223,7 +245,7 @@ class ListProductsByGroupJson(BaseDatatableView, ColumnSearchMixin):
 
     def get_initial_queryset(self):
         self.product_group_id = self.kwargs.get('product_group_id', 0)
-        return Product.objects.filter(product_group__id=self.product_group_id)
+        return annotate_lifecycle_state(Product.objects.filter(product_group__id=self.product_group_id))
 
     def filter_queryset(self, qs):
         # use request parameters to filter queryset
@@ -232,11 +254,7 @@ class ListProductsByGroupJson(BaseDatatableView, ColumnSearchMixin):
 
         if search_string:
             # search in the Product Group name and Vendor name by default
-            operation = "iregex" if is_valid_regex(search_string) and try_regex else "icontains"
-            qs = qs.filter(
-                Q(**{"product_id__%s" % operation: search_string}) |
-                Q(**{"description__%s" % operation: search_string})
-            )
+            qs = qs.filter(get_search_query(["product_id", "description"], search_string, regex=try_regex))
 
         # apply column based search
         qs = self.apply_column_based_search(request=self.request, query_set=qs, try_regex=try_regex)
@@ -245,6 +263,7 @@ class ListProductsByGroupJson(BaseDatatableView, ColumnSearchMixin):
 
     def prepare_results(self, qs):
         json_data = []
+        today = datetime.now().date()
 
         for item in qs:
             json_data.append({
@@ -254,7 +273,7 @@ class ListProductsByGroupJson(BaseDatatableView, ColumnSearchMixin):
                 "list_price": item.list_price,
                 "currency": item.currency,
                 "tags": item.tags,
-                "lifecycle_state": item.current_lifecycle_states,
+                "lifecycle_state": item.get_lifecycle_states(today),
                 "eox_update_time_stamp": item.eox_update_time_stamp,
                 "eol_ext_announcement_date": item.eol_ext_announcement_date,
                 "end_of_sale_date": item.end_of_sale_date,
@@ -279,7 +298,8 @@ class ListProductsJson(BaseDatatableView, ColumnSearchMixin):
         'product_group',
         'description',
         'list_price',
-        'tags'
+        'tags',
+        'lifecycle_state_order'
     ]
     column_based_filter = {  # parameters that are required for the column based filtering
         "vendor": {
@@ -305,12 +325,16 @@ class ListProductsJson(BaseDatatableView, ColumnSearchMixin):
         "tags": {
             "order": 5,
             "expr": "tags"
+        },
+        "lifecycle_state": {
+            "order": 6,
+            "expr": "lifecycle_state"
         }
     }
     max_display_length = 250
 
     def get_initial_queryset(self):
-        return Product.objects.all().prefetch_related("vendor", "product_group")
+        return annotate_lifecycle_state(Product.objects.all().prefetch_related("vendor", "product_group"))
 
     def filter_queryset(self, qs):
         # use request parameters to filter queryset
@@ -319,11 +343,7 @@ class ListProductsJson(BaseDatatableView, ColumnSearchMixin):
 
         if search_string:
             # search in the Product Group name and Vendor name by default
-            operation = "iregex" if is_valid_regex(search_string) and try_regex else "icontains"
-            qs = qs.filter(
-                Q(**{"product_id__%s" % operation: search_string}) |
-                Q(**{"description__%s" % operation: search_string})
-            )
+            qs = qs.filter(get_search_query(["product_id", "description"], search_string, regex=try_regex))
 
         # apply column based search
         qs = self.apply_column_based_search(request=self.request, query_set=qs, try_regex=try_regex)
@@ -332,6 +352,7 @@ class ListProductsJson(BaseDatatableView, ColumnSearchMixin):
 
     def prepare_results(self, qs):
         json_data = []
+        today = datetime.now().date()
 
         for item in qs:
             json_data.append({
@@ -344,7 +365,7 @@ class ListProductsJson(BaseDatatableView, ColumnSearchMixin):
                 "list_price": item.list_price,
                 "currency": item.currency,
                 "tags": item.tags,
-                "lifecycle_state": item.current_lifecycle_states,
+                "lifecycle_state": item.get_lifecycle_states(today),
                 "eox_update_time_stamp": item.eox_update_time_stamp,
                 "eol_ext_announcement_date": item.eol_ext_announcement_date,
                 "end_of_sale_date": item.end_of_sale_date,
@@ -360,3 +381,23 @@ class ListProductsJson(BaseDatatableView, ColumnSearchMixin):
                 "internal_product_id": item.internal_product_id
             })
         return json_data
+
+
+class VendorProductListExport(ExportMixin, VendorProductListJson):
+    export_columns = export.PRODUCT_EXPORT_COLUMNS
+    export_filename = "vendor_products"
+
+
+class ListProductGroupsExport(ExportMixin, ListProductGroupsJson):
+    export_columns = export.PRODUCT_GROUP_EXPORT_COLUMNS
+    export_filename = "product_groups"
+
+
+class ListProductsByGroupExport(ExportMixin, ListProductsByGroupJson):
+    export_columns = export.PRODUCT_EXPORT_COLUMNS
+    export_filename = "product_group_products"
+
+
+class ListProductsExport(ExportMixin, ListProductsJson):
+    export_columns = export.PRODUCT_EXPORT_COLUMNS
+    export_filename = "products"
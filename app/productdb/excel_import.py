@@ -1,11 +1,14 @@
 import datetime
 import logging
+import numpy as np
 import pandas as pd
 from django.core.exceptions import ValidationError
 from django.db import transaction
 from xlrd import XLRDError
 from app.productdb.models import Product, CURRENCY_CHOICES, ProductGroup, ProductMigrationSource, ProductMigrationOption
 from app.productdb.models import Vendor
+from app.productdb.bulk_writer import ProductBulkWriter
+from app.productdb.utils import split_list
 
 logger = logging.getLogger("productdb")
 
@@ -106,23 +109,11 @@ class BaseExcelImporter:
         msg = ""
         try:
             if row_key in row:
-                currval = getattr(product, target_key)
-                if not pd.isnull(row[row_key]):
-                    if (type(row[row_key]) is pd.tslib.Timestamp) or (type(row[row_key]) is datetime.datetime):
-                        newval = row[row_key].date()
-
-                    else:
-                        newval = None
-
-                    if currval != newval:
-                        setattr(product, target_key, row[row_key].date())
-                        changed = True
-
-                else:
-                    # if row is present, but no date value is set, update the value to null
-                    if currval is not None:
-                        setattr(product, target_key, None)
-                        changed = True
+                # if row is present, but no date value is set, update the value to null
+                newval = BaseExcelImporter._parse_date_value(row[row_key])
+                if getattr(product, target_key) != newval:
+                    setattr(product, target_key, newval)
+                    changed = True
 
         except Exception as ex:  # catch any exception
             faulty_entry = True
@@ -130,6 +121,21 @@ class BaseExcelImporter:
 
         return changed, faulty_entry, msg
 
+    @staticmethod
+    def _parse_date_value(value):
+        """
+        returns the date of a cell from the excel file (None if the cell is empty)
+        :raises Exception: if the value is not a date
+        """
+        if value is None or pd.isnull(value):
+            return None
+
+        if isinstance(value, datetime.datetime):
+            # includes the pandas Timestamp
+            return value.date()
+
+        raise Exception("invalid date value")
+
     def import_to_database(self, status_callback=None, update_only=False):
         """
         Base method that is triggered for the update
@@ -152,6 +158,18 @@ class ProductsExcelImporter(BaseExcelImporter):
         "tags": str
     }
     drop_na_columns = ["product id"]
+    datetime_columns = {
+        # product attribute - data frame column name (lowered during the import)
+        "eox_update_time_stamp": "eox update timestamp",
+        "eol_ext_announcement_date": "eol announcement date",
+        "end_of_sale_date": "end of sale date",
+        "end_of_new_service_attachment_date": "end of new service attachment date",
+        "end_of_sw_maintenance_date": "end of sw maintenance date",
+        "end_of_routine_failure_analysis": "end of routing failure analysis date",
+        "end_of_service_contract_renewal": "end of service contract renewal date",
+        "end_of_support_date": "last date of support",
+        "end_of_sec_vuln_supp_date": "end of security/vulnerability support date"
+    }
     valid_imported_products = 0
     invalid_products = 0
 
@@ -159,11 +177,62 @@ class ProductsExcelImporter(BaseExcelImporter):
     def amount_of_products(self):
         return len(self.__wb_data_frame__) if self.__wb_data_frame__ is not None else -1
 
-    def import_to_database(self, status_callback=None, update_only=False):
+    @staticmethod
+    def _parse_currency(value):
+        """verify the given currency value"""
+        if value.upper() not in dict(CURRENCY_CHOICES).keys():
+            raise Exception("cannot set currency unknown value %s" % value.upper())
+
+        return value.upper()
+
+    @classmethod
+    def _parse_list_price(cls, product_id, value):
+        """
+        determine the list price and currency from the list price column of the excel file
+        :return: tuple with the list price (None if not set) and the currency
+        """
+        new_currency = "USD"    # default in model
+        if pd.isnull(value):
+            return None, new_currency
+
+        if type(value) == float:
+            new_price = value
+
+        elif type(value) == int:
+            new_price = float(value)
+
+        elif type(value) == str:
+            price = value.split(" ")
+            if len(price) == 1:
+                # only a number
+                new_price = float(value)
+
+            elif len(price) == 2:
+                # contains a number and a currency
+                try:
+                    new_price = float(price[0])
+
+                except:
+                    raise Exception("cannot convert price information to float")
+
+                # check valid currency value
+                new_currency = cls._parse_currency(price[1])
+
+            else:
+                raise Exception("invalid format for list price, detected multiple spaces")
+
+        else:
+            logger.debug("list price data type for %s identified as %s" % (product_id, str(type(value))))
+            raise Exception("invalid data-type for list price")
+
+        return new_price, new_currency
+
+    def import_to_database(self, status_callback=None, update_only=False, bulk_mode=False):
         """
         Import products from the associated excel sheet to the database
-        :param status_callback: optional status message callback function
+        :param status_callback: optional status message callback function (current and total as optional keyword args)
         :param update_only: don't create new entries
+        :param bulk_mode: use the bulk import (vectorized normalization and bulk queries)
         """
         if self.workbook is None:
             self._load_workbook()
@@ -175,13 +244,18 @@ class ProductsExcelImporter(BaseExcelImporter):
         self.import_result_messages.clear()
         amount_of_entries = len(self.__wb_data_frame__.index)
 
+        if bulk_mode:
+            self._bulk_import_to_database(status_callback=status_callback, update_only=update_only)
+            return
+
         # process entries in file
         current_entry = 1
         for index, row in self.__wb_data_frame__.iterrows():
             # update status message if defined
             if status_callback and (current_entry % 100 == 0):
                 status_callback("Process entry <strong>%s</strong> of "
-                                "<strong>%s</strong>..." % (current_entry, amount_of_entries))
+                                "<strong>%s</strong>..." % (current_entry, amount_of_entries),
+                                current=current_entry, total=amount_of_entries)
 
             faulty_entry = False        # indicates an invalid entry
             created = False             # indicates that the product was created
@@ -230,58 +304,12 @@ class ProductsExcelImporter(BaseExcelImporter):
 
                     # determine the list price and currency from the excel file
                     row_key = "list price"
-                    new_currency = "USD"    # default in model
-                    if not pd.isnull(row[row_key]):
-                        if type(row[row_key]) == float:
-                            new_price = row[row_key]
-
-                        elif type(row[row_key]) == int:
-                            new_price = float(row[row_key])
-
-                        elif type(row[row_key]) == str:
-                            price = row[row_key].split(" ")
-                            if len(price) == 1:
-                                # only a number
-                                new_price = float(row[row_key])
-
-                            elif len(price) == 2:
-                                # contains a number and a currency
-                                try:
-                                    new_price = float(price[0])
-
-                                except:
-                                    raise Exception("cannot convert price information to float")
-
-                                # check valid currency value
-                                valid_currency = True if price[1].upper() in dict(CURRENCY_CHOICES).keys() else False
-                                if valid_currency:
-                                    new_currency = price[1].upper()
-
-                                else:
-                                    raise Exception("cannot set currency unknown value %s" % price[1].upper())
-
-                            else:
-                                raise Exception("invalid format for list price, detected multiple spaces")
-
-                        else:
-                            logger.debug("list price data type for %s identified as %s" % (
-                                row["product id"],
-                                str(type(row[row_key]))
-                            ))
-                            raise Exception("invalid data-type for list price")
-                    else:
-                        new_price = None
+                    new_price, new_currency = self._parse_list_price(row["product id"], row[row_key])
 
                     row_key = "currency"
                     if row_key in row:
                         if not pd.isnull(row[row_key]):
-                            # check valid currency value
-                            valid_currency = True if row[row_key].upper() in dict(CURRENCY_CHOICES).keys() else False
-                            if valid_currency:
-                                new_currency = row[row_key].upper()
-
-                            else:
-                                raise Exception("cannot set currency unknown value %s" % row[row_key].upper())
+                            new_currency = self._parse_currency(row[row_key])
 
                     # apply the new list price and currency if required
                     if new_price is not None:
@@ -366,21 +394,8 @@ class ProductsExcelImporter(BaseExcelImporter):
                     msg = "cannot set %s for <code>%s</code> (%s)" % (row_key, row["product id"], ex)
 
                 # import datetime columns from file (all optional, overwrite if None)
-                data_map = {
-                    # product attribute - data frame column name (lowered during the import)
-                    "eox_update_time_stamp": "eox update timestamp",
-                    "eol_ext_announcement_date": "eol announcement date",
-                    "end_of_sale_date": "end of sale date",
-                    "end_of_new_service_attachment_date": "end of new service attachment date",
-                    "end_of_sw_maintenance_date": "end of sw maintenance date",
-                    "end_of_routine_failure_analysis": "end of routing failure analysis date",
-                    "end_of_service_contract_renewal": "end of service contract renewal date",
-                    "end_of_support_date": "last date of support",
-                    "end_of_sec_vuln_supp_date": "end of security/vulnerability support date"
-                }
-
-                for key in data_map.keys():
-                    c, f, ret_msg = self._import_datetime_column_from_file(data_map[key], row, key, p)
+                for key in self.datetime_columns.keys():
+                    c, f, ret_msg = self._import_datetime_column_from_file(self.datetime_columns[key], row, key, p)
                     if c:
                         # value was changed
                         changed = True
@@ -425,6 +440,214 @@ class ProductsExcelImporter(BaseExcelImporter):
 
             current_entry += 1
 
+    def _normalize_data_frame(self):
+        """
+        vectorized normalization of the data frame for the bulk import, adds the database ID of the vendor and the
+        parsed list price and replaces all empty cells with None (the date values are validated per entry, see
+        _parse_date_value)
+        :raises Exception: if the file contains an unknown vendor
+        """
+        df = self.__wb_data_frame__.replace(r"^\s*$", np.nan, regex=True)
+
+        # lookup all vendors at once, an unknown vendor stops the import before any data is written to the database
+        vendor_names = df["vendor"].map(lambda value: None if pd.isnull(value) else str(value).strip())
+        vendor_ids = vendor_names.map(dict(Vendor.objects.values_list("name", "id")))
+        unknown_vendors = vendor_names.notnull() & vendor_ids.isnull()
+        if unknown_vendors.any():
+            raise Exception("unknown vendor '%s'" % df["vendor"][unknown_vendors].iloc[0])
+
+        df["vendor_id"] = vendor_ids.fillna(0).astype(int)
+
+        if "product group" in df:
+            df["product group"] = df["product group"].map(lambda value: value if pd.isnull(value) else value.strip())
+
+        # plain numbers are converted at once, all other values are parsed per entry
+        df["parsed list price"] = pd.to_numeric(df["list price"], errors="coerce")
+
+        return df.astype(object).where(pd.notnull(df), None)
+
+    @staticmethod
+    def _get_product_group(product_groups, name, vendor_id):
+        """get the Product Group from the given dictionary, a new Product Group is created if required"""
+        if (vendor_id, name) not in product_groups:
+            product_groups[(vendor_id, name)], _ = ProductGroup.objects.get_or_create(name=name, vendor_id=vendor_id)
+
+        return product_groups[(vendor_id, name)]
+
+    def _get_product_changes(self, product, values, product_groups):
+        """
+        compare the values of the given entry with the Product, returns a dictionary with the changed attributes
+        :raises Exception: if a value is invalid, the args contains the column name and the message
+        """
+        changes = {}
+        row_key = "description"
+        try:
+            # set the description value
+            if values[row_key] is not None and product.description != values[row_key]:
+                changes["description"] = values[row_key]
+
+            # determine the list price and currency from the excel file
+            row_key = "list price"
+            if values["parsed list price"] is not None:
+                new_price, new_currency = float(values["parsed list price"]), "USD"
+
+            else:
+                new_price, new_currency = self._parse_list_price(values["product id"], values[row_key])
+
+            row_key = "currency"
+            if values.get(row_key) is not None:
+                new_currency = self._parse_currency(values[row_key])
+
+            # apply the new list price and currency if required
+            if new_price is not None:
+                if product.list_price != new_price:
+                    changes["list_price"] = new_price
+                if product.currency != new_currency:
+                    changes["currency"] = new_currency
+
+            # create product group is not existing and product group (optional)
+            row_key = "product group"
+            if row_key in values:
+                if values[row_key] is not None:
+                    if (not product.product_group) or (product.product_group.name != values[row_key]):
+                        changes["product_group"] = self._get_product_group(product_groups, values[row_key],
+                                                                           values["vendor_id"])
+
+                elif product.product_group is not None:
+                    changes["product_group"] = None
+
+            # optional text columns, the value is reset if the column is present but no value is set
+            for row_key, attr, empty_value in [
+                ("eol note url", "eol_reference_url", None),
+                ("eol note url (friendly name)", "eol_reference_number", None),
+                ("internal product id", "internal_product_id", ""),
+                ("tags", "tags", ""),
+            ]:
+                if row_key in values:
+                    if values[row_key] is not None:
+                        if getattr(product, attr) != values[row_key]:
+                            changes[attr] = values[row_key]
+
+                    elif getattr(product, attr) not in (empty_value, ""):
+                        changes[attr] = empty_value
+
+        except Exception as ex:
+            raise Exception(row_key, ex) from ex
+
+        # import datetime columns from file (all optional, overwrite if None)
+        for attr, row_key in self.datetime_columns.items():
+            if row_key in values:
+                try:
+                    new_value = self._parse_date_value(values[row_key])
+
+                except Exception as ex:
+                    raise Exception(row_key, ex) from ex
+
+                if getattr(product, attr) != new_value:
+                    changes[attr] = new_value
+
+        return changes
+
+    def _bulk_import_to_database(self, status_callback=None, update_only=False):
+        """
+        bulk import of the products: the columns are normalized with vectorized operations, the existing products are
+        loaded with a single query per vendor and all changes are written with bulk queries. In contrast to the
+        import per entry, a faulty entry is not written to the database. Multiple entries for the same Product are
+        applied in the order of the file to a single Product object (the last value wins, same as the import per
+        entry), therefore every Product is written only once.
+        """
+        df = self._normalize_data_frame()
+        amount_of_entries = len(df.index)
+        writer = ProductBulkWriter()
+
+        products = {}
+        for vendor_id in df["vendor_id"].unique():
+            products[vendor_id] = writer.load_products(vendor_id, df["product id"][df["vendor_id"] == vendor_id])
+
+        product_groups = {}
+        if "product group" in df:
+            for chunk in split_list(list(set(df["product group"].dropna()))):
+                for pg in ProductGroup.objects.filter(name__in=chunk):
+                    product_groups[(pg.vendor_id, pg.name)] = pg
+
+        # Products that are created by a previous entry of the file
+        created_products = set()
+
+        current_entry = 0
+        for values in df.to_dict("records"):
+            current_entry += 1
+            # update status message if defined
+            if status_callback and (current_entry % 100 == 0):
+                status_callback("Process entry <strong>%s</strong> of "
+                                "<strong>%s</strong>..." % (current_entry, amount_of_entries),
+                                current=current_entry, total=amount_of_entries)
+
+            product_id = values["product id"]
+            p = products[values["vendor_id"]].get(product_id)
+            if p is None:
+                if update_only:
+                    # element doesn't exist
+                    continue
+
+                p = Product(product_id=product_id, vendor_id=values["vendor_id"])
+                products[values["vendor_id"]][product_id] = p
+
+            created = p.pk is None and id(p) not in created_products
+            msg = None
+            try:
+                changes = self._get_product_changes(p, values, product_groups)
+
+            except Exception as ex:
+                row_key, ex = ex.args
+                msg = "cannot set %s for <code>%s</code> (%s)" % (row_key, product_id, ex)
+
+            else:
+                if created or len(changes) != 0:
+                    # the changes are only applied to the Product if the validation was successful
+                    old_values = dict([(attr, getattr(p, attr)) for attr in changes.keys()])
+                    for attr, value in changes.items():
+                        setattr(p, attr, value)
+
+                    try:
+                        if p.pk is None:
+                            # (the Product is registered only once)
+                            writer.create(p)
+                            created_products.add(id(p))
+
+                        else:
+                            writer.update(p, changes.keys())
+
+                    except ValidationError as ex:
+                        for attr, value in old_values.items():
+                            setattr(p, attr, value)
+                        msg = "cannot save data for <code>%s</code> in database (%s)" % (product_id, ex)
+
+                    else:
+                        self.valid_imported_products += 1
+                        self.import_result_messages.append("product <code>%s</code> %s" % (
+                            product_id, "created" if created else "updated"
+                        ))
+
+                else:
+                    self.import_result_messages.append("<i>no changes for product "
+                                                       "<code>%s</code> required</i>" % product_id)
+
+            if msg:
+                logger.error("cannot import %s (%s)" % (product_id, msg))
+                self.import_result_messages.append(msg)
+                self.invalid_products += 1
+
+                # terminate the process after 30 errors
+                if self.invalid_products > 30:
+                    self.import_result_messages.append("There are too many errors in your file, please "
+                                                       "correct them and upload it again")
+                    break
+
+        if status_callback:
+            status_callback("Save <strong>%s</strong> products to the database..." % writer.amount_of_changes)
+
+        writer.save()
+
 
 class ProductMigrationsExcelImporter(BaseExcelImporter):
     """
@@ -444,11 +667,12 @@ class ProductMigrationsExcelImporter(BaseExcelImporter):
         "comment": str,
         "migration product info url": str
     }
+    amount_of_entries = 0
 
     def import_to_database(self, status_callback=None, update_only=False):
         """
         Import products from the associated excel sheet to the database
-        :param status_callback: optional status message callback function
+        :param status_callback: optional status message callback function (current and total as optional keyword args)
         :param update_only: don't create new entries
         """
         if self.workbook is None:
@@ -460,11 +684,13 @@ class ProductMigrationsExcelImporter(BaseExcelImporter):
         self.import_result_messages = []
         current_entry = 1
         amount_of_entries = len(self.__wb_data_frame__.index)
+        self.amount_of_entries = amount_of_entries
         for index, row in self.__wb_data_frame__.iterrows():
             # update status message if defined
             if status_callback:
                 status_callback("Process entry <strong>%s</strong> of "
-                                "<strong>%s</strong>..." % (current_entry, amount_of_entries))
+                                "<strong>%s</strong>..." % (current_entry, amount_of_entries),
+                                current=current_entry, total=amount_of_entries)
 
             if row["product id"] == "" or row["product id"] is None:
                 continue
@@ -0,0 +1,123 @@
+"""
+server-side export of Products and Product Groups (used by the API and the datatables endpoints)
+
+The rows are read with values_list(...).iterator() and written incrementally into a StreamingHttpResponse, therefore
+the memory usage doesn't depend on the amount of exported entries. CSV and NDJSON are streamed while the rows are read
+from the database. XLSX files are written by openpyxl in write-only mode (the rows are kept in a temporary file) and
+streamed after the last row was written.
+"""
+import csv
+import json
+import tempfile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from openpyxl import Workbook
+
+# amount of rows that are fetched from the database at once
+CHUNK_SIZE = 2000
+
+# size of the blocks that are read from the temporary XLSX file
+FILE_BLOCK_SIZE = 64 * 1024
+
+CSV_DELIMITER = ";"
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# column name and field lookup (the lifecycle_state requires the annotate_lifecycle_state function)
+PRODUCT_EXPORT_COLUMNS = (
+    ("id", "id"),
+    ("vendor", "vendor__name"),
+    ("product_id", "product_id"),
+    ("product_group", "product_group__name"),
+    ("description", "description"),
+    ("list_price", "list_price"),
+    ("currency", "currency"),
+    ("tags", "tags"),
+    ("lifecycle_state", "lifecycle_state"),
+    ("eox_update_time_stamp", "eox_update_time_stamp"),
+    ("eol_ext_announcement_date", "eol_ext_announcement_date"),
+    ("end_of_sale_date", "end_of_sale_date"),
+    ("end_of_new_service_attachment_date", "end_of_new_service_attachment_date"),
+    ("end_of_sw_maintenance_date", "end_of_sw_maintenance_date"),
+    ("end_of_routine_failure_analysis", "end_of_routine_failure_analysis"),
+    ("end_of_service_contract_renewal", "end_of_service_contract_renewal"),
+    ("end_of_sec_vuln_supp_date", "end_of_sec_vuln_supp_date"),
+    ("end_of_support_date", "end_of_support_date"),
+    ("eol_reference_number", "eol_reference_number"),
+    ("eol_reference_url", "eol_reference_url"),
+    ("lc_state_sync", "lc_state_sync"),
+    ("internal_product_id", "internal_product_id"),
+)
+
+PRODUCT_GROUP_EXPORT_COLUMNS = (
+    ("id", "id"),
+    ("vendor", "vendor__name"),
+    ("name", "name"),
+)
+
+
+class Echo:
+    """file-like object that returns the written value (used to stream the output of the csv writer)"""
+    def write(self, value):
+        return value
+
+
+def iter_rows(queryset, columns):
+    """yields the values of the given columns per entry of the queryset (without loading the entire result)"""
+    return queryset.prefetch_related(None).values_list(
+        *[lookup for _, lookup in columns]
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def iter_csv(columns, rows):
+    writer = csv.writer(Echo(), delimiter=CSV_DELIMITER)
+    yield writer.writerow([name for name, _ in columns])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_ndjson(columns, rows):
+    names = [name for name, _ in columns]
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+def iter_xlsx(columns, rows):
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("export")
+    worksheet.append([name for name, _ in columns])
+    for row in rows:
+        worksheet.append(row)
+
+    with tempfile.TemporaryFile() as export_file:
+        workbook.save(export_file)
+        export_file.seek(0)
+        block = export_file.read(FILE_BLOCK_SIZE)
+        while block:
+            yield block
+            block = export_file.read(FILE_BLOCK_SIZE)
+
+
+EXPORT_WRITERS = {
+    "csv": iter_csv,
+    "ndjson": iter_ndjson,
+    "xlsx": iter_xlsx,
+}
+
+
+def get_export_response(queryset, columns, export_format, filename):
+    """
+    returns a StreamingHttpResponse with the given columns of the queryset in the export format (csv, ndjson or
+    xlsx), the file extension is added to the filename
+    """
+    response = StreamingHttpResponse(
+        EXPORT_WRITERS[export_format](columns, iter_rows(queryset, columns)),
+        content_type=EXPORT_FORMATS[export_format]
+    )
+    response["Content-Disposition"] = "attachment; filename=\"%s.%s\"" % (filename, export_format)
+
+    return response
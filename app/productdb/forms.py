@@ -122,6 +122,13 @@ class ImportProductsFileUploadForm(forms.Form):
                   "based on a price list)"
     )
 
+    bulk_mode = forms.BooleanField(
+        required=False,
+        label="Bulk import",
+        help_text="Use this option for large files, all changes are written at once and entries with invalid values "
+                  "are not saved"
+    )
+
     def __init__(self, user=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if user:
@@ -208,6 +215,7 @@ class ProductCheckForm(forms.ModelForm):
         fields = [
             "name",
             "migration_source",
+            "normalization_vendor",
             "create_user",
         ]
 
@@ -0,0 +1,31 @@
+import json
+from django.core.management.base import BaseCommand
+from app.productdb.benchmark import Benchmark
+
+
+class Command(BaseCommand):
+    help = "run the benchmark scenarios against the synthetic catalog (see generatecatalog) and report the wall " \
+           "time and the amount of queries per scenario as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=list(Benchmark.SCENARIOS.keys()),
+            help="scenario that should be executed (can be used multiple times, default is all scenarios)"
+        )
+        parser.add_argument("--repeat", type=int, default=3, help="amount of runs per scenario")
+        parser.add_argument("--data-dir", help="directory with the input files (created if they don't exist)")
+        parser.add_argument("--output", help="write the JSON report to the given file instead of stdout")
+
+    def handle(self, *args, **kwargs):
+        benchmark = Benchmark(data_dir=kwargs["data_dir"], repeat=kwargs["repeat"])
+        report = json.dumps(benchmark.run(kwargs["scenario"]), indent=2)
+
+        if kwargs["output"]:
+            with open(kwargs["output"], "w") as f:
+                f.write(report)
+            self.stdout.write("Benchmark report written to %s" % kwargs["output"])
+
+        else:
+            self.stdout.write(report)
@@ -0,0 +1,63 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from app.productdb.benchmark import CatalogGenerator, write_catalog_files
+
+
+class Command(BaseCommand):
+    help = "generate a synthetic catalog within the database (and the input files for the benchmark command)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--vendors", type=int, default=3, help="amount of Vendors (including Cisco Systems)")
+        parser.add_argument("--products", type=int, default=10000, help="amount of Products")
+        parser.add_argument("--product-groups", type=int, default=100, help="amount of Product Groups")
+        parser.add_argument("--migration-chains", type=int, default=500, help="amount of migration chains")
+        parser.add_argument("--chain-length", type=int, default=3, help="amount of migration options per chain")
+        parser.add_argument("--product-lists", type=int, default=20, help="amount of Product Lists")
+        parser.add_argument("--product-list-size", type=int, default=100, help="amount of Products per Product List")
+        parser.add_argument("--normalization-rules", type=int, default=50,
+                            help="amount of Product ID normalization rules")
+        parser.add_argument("--user", help="owner of the Product Lists (default is the first superuser)")
+        parser.add_argument("--seed", type=int, help="seed for the random generator")
+        parser.add_argument("--output-dir", help="directory for the input files of the benchmark scenarios")
+        parser.add_argument("--excel-rows", type=int, default=1000, help="amount of Products within the Excel file")
+        parser.add_argument("--product-check-size", type=int, default=5000,
+                            help="amount of Product IDs within the Product Check input")
+        parser.add_argument("--eox-records", type=int, default=1000, help="amount of EoX records")
+
+    def handle(self, *args, **kwargs):
+        if kwargs["user"]:
+            try:
+                user = User.objects.get(username=kwargs["user"])
+
+            except User.DoesNotExist:
+                raise CommandError("User '%s' not found" % kwargs["user"])
+
+        else:
+            user = User.objects.filter(is_superuser=True).order_by("id").first()
+            if user is None and kwargs["product_lists"] != 0:
+                self.stderr.write("No superuser found, Product Lists are not created")
+
+        generator = CatalogGenerator(
+            vendors=kwargs["vendors"],
+            products=kwargs["products"],
+            product_groups=kwargs["product_groups"],
+            migration_chains=kwargs["migration_chains"],
+            chain_length=kwargs["chain_length"],
+            product_lists=kwargs["product_lists"],
+            product_list_size=kwargs["product_list_size"],
+            normalization_rules=kwargs["normalization_rules"],
+            seed=kwargs["seed"]
+        )
+        result = generator.generate(user=user)
+        self.stdout.write("Synthetic catalog created (%s)" % ", ".join(["%d %s" % (v, k) for k, v in result.items()]))
+
+        if kwargs["output_dir"]:
+            files = write_catalog_files(
+                kwargs["output_dir"],
+                excel_rows=kwargs["excel_rows"],
+                product_check_size=kwargs["product_check_size"],
+                eox_records=kwargs["eox_records"],
+                seed=kwargs["seed"]
+            )
+            for path in files.values():
+                self.stdout.write("File written: %s" % path)
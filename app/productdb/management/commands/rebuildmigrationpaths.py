@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from app.productdb.migration_paths import rebuild_migration_paths
+
+
+class Command(BaseCommand):
+    help = "recompute the materialized migration paths of all Products"
+
+    def handle(self, *args, **kwargs):
+        counter = rebuild_migration_paths()
+        self.stdout.write("Migration paths recomputed (%d entries)" % counter)
@@ -0,0 +1,164 @@
+"""
+computation of the materialized migration paths (ProductMigrationPath), the paths are resolved for multiple Products
+at once with a single query per hop
+"""
+import logging
+from django.db import transaction
+from django.db.models import Q
+import app.productdb.models
+from app.productdb.utils import split_list, get_bulk_batch_size
+
+logger = logging.getLogger("productdb")
+
+
+class MigrationPathResolver:
+    """
+    resolves the migration paths for multiple Products (same semantic as the lookup that was previously implemented
+    within Product.get_migration_path), stops if a loop within the migration path is detected
+    """
+    def __init__(self):
+        # Product database ID -> {migration source name: ProductMigrationOption}
+        self._options = {}
+
+    def load_options(self, product_ids):
+        """load all Product Migration Options for the given Products that are not already loaded"""
+        product_ids = [pid for pid in set(product_ids) if pid not in self._options]
+        for chunk in split_list(product_ids):
+            for pid in chunk:
+                self._options[pid] = {}
+
+            query = app.productdb.models.ProductMigrationOption.objects.filter(
+                product_id__in=chunk
+            ).select_related("migration_source", "replacement_db_product").order_by()
+
+            for pmo in query:
+                self._options[pmo.product_id][pmo.migration_source.name] = pmo
+
+    def get_options(self, product_id):
+        """all Product Migration Options of the given Product (requires loaded options)"""
+        return self._options.get(product_id, {})
+
+    def get_preferred_migration_source_name(self, product_id):
+        """name of the most preferred Migration Source for the given Product (requires loaded options)"""
+        preferred = [
+            pmo.migration_source for pmo in self.get_options(product_id).values()
+            if pmo.migration_source.preference > app.productdb.models.Product.LESS_PREFERRED_PREFERENCE_VALUE
+        ]
+        if len(preferred) == 0:
+            return None
+
+        return sorted(preferred, key=lambda ms: (-ms.preference, ms.name))[0].name
+
+    def resolve(self, start_options):
+        """
+        follow the migration paths for the given start options (dictionary with a key for the path and the first
+        Product Migration Option as value), returns a dictionary with the same keys and a tuple of the path (ordered
+        list of Product Migration Options) and a flag that indicates that a loop was detected
+        """
+        paths = {key: [pmo] for key, pmo in start_options.items()}
+        visited = {key: {pmo.product_id} for key, pmo in start_options.items()}
+        loops = set()
+
+        open_paths = list(paths.keys())
+        while len(open_paths) != 0:
+            next_hops = {}
+            for key in open_paths:
+                last = paths[key][-1]
+                if last.replacement_product_id and last.replacement_db_product_id and \
+                        not last.is_valid_replacement():
+                    if last.replacement_db_product_id in visited[key]:
+                        logger.warning("loop detected in the migration path of Product %d (%s)" % (
+                            paths[key][0].product_id, paths[key][0].migration_source.name
+                        ))
+                        loops.add(key)
+                        continue
+
+                    next_hops[key] = last.replacement_db_product_id
+
+            self.load_options(next_hops.values())
+
+            open_paths = []
+            for key, replacement_id in next_hops.items():
+                pmo = self.get_options(replacement_id).get(paths[key][0].migration_source.name)
+                if pmo:
+                    paths[key].append(pmo)
+                    visited[key].add(replacement_id)
+                    open_paths.append(key)
+
+        return {key: (path, key in loops) for key, path in paths.items()}
+
+
+def get_affected_product_ids(product_ids):
+    """
+    returns the IDs of all Products with a materialized migration path that contains or refers to one of the given
+    Products
+    """
+    result = set()
+    for chunk in split_list(product_ids):
+        result.update(app.productdb.models.ProductMigrationPath.objects.filter(
+            Q(migration_option__product_id__in=chunk) | Q(migration_option__replacement_db_product_id__in=chunk)
+        ).values_list("product_id", flat=True).distinct())
+
+    return result
+
+
+def _create_migration_path_entries(product_ids):
+    """compute the ProductMigrationPath entries for the given Products (not saved to the database)"""
+    resolver = MigrationPathResolver()
+    resolver.load_options(product_ids)
+
+    start_options = {}
+    preferred_source_names = {}
+    for pid in product_ids:
+        preferred_source_names[pid] = resolver.get_preferred_migration_source_name(pid)
+        for source_name, pmo in resolver.get_options(pid).items():
+            start_options[(pid, source_name)] = pmo
+
+    entries = []
+    for (pid, source_name), (path, loop_detected) in sorted(resolver.resolve(start_options).items()):
+        for position, pmo in enumerate(path):
+            entries.append(app.productdb.models.ProductMigrationPath(
+                product_id=pid,
+                migration_source_id=path[0].migration_source_id,
+                position=position,
+                migration_option=pmo,
+                preferred=preferred_source_names[pid] == source_name,
+                loop_detected=loop_detected and position == len(path) - 1
+            ))
+
+    return entries
+
+
+def rebuild_migration_paths(product_ids=None, chunk_size=1000):
+    """
+    recompute the materialized migration paths of the given Products, if no Products are given, the migration paths
+    of all Products are recomputed. Returns the amount of migration path entries that were created.
+    """
+    model = app.productdb.models.ProductMigrationPath
+    full_rebuild = product_ids is None
+    if full_rebuild:
+        product_ids = app.productdb.models.ProductMigrationOption.objects.order_by("product_id").values_list(
+            "product_id", flat=True
+        ).distinct()
+
+    counter = 0
+    with transaction.atomic():
+        if full_rebuild:
+            model.objects.all().delete()
+
+        for chunk in split_list(set(product_ids), chunk_size):
+            entries = _create_migration_path_entries(chunk)
+            if not full_rebuild:
+                for delete_chunk in split_list(chunk):
+                    model.objects.filter(product_id__in=delete_chunk).delete()
+
+            model.objects.bulk_create(entries, batch_size=get_bulk_batch_size(model, entries))
+            counter += len(entries)
+
+    return counter
+
+
+def update_migration_paths(product_ids):
+    """recompute the migration paths of the given Products and all Products with a migration path that depends on them"""
+    product_ids = set(product_ids)
+    return rebuild_migration_paths(product_ids | get_affected_product_ids(product_ids))
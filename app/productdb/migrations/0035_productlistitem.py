@@ -0,0 +1,52 @@
+# Generated by Django 2.2.12 on 2026-10-18 04:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_product_list_items(apps, schema_editor):
+    """create the Product List Items for all existing Product Lists"""
+    ProductList = apps.get_model("productdb", "ProductList")
+    ProductListItem = apps.get_model("productdb", "ProductListItem")
+
+    for product_list in ProductList.objects.filter(vendor__isnull=False).iterator():
+        product_ids = set()
+        for line in product_list.string_product_list.splitlines():
+            product_ids.update([e.strip() for e in line.split(";") if e.strip() != ""])
+
+        ProductListItem.objects.bulk_create([
+            ProductListItem(product_list=product_list, vendor_id=product_list.vendor_id, product_id=product_id)
+            for product_id in sorted(product_ids)
+        ], batch_size=100)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productdb', '0034_auto_20200526_1555'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductListItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.CharField(help_text='Product ID/Number', max_length=512)),
+                ('product_list', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='productdb.ProductList')),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='productdb.Vendor')),
+            ],
+            options={
+                'verbose_name': 'Product List Item',
+                'verbose_name_plural': 'Product List Items',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='productlistitem',
+            index=models.Index(fields=['product_id', 'vendor'], name='productdb_p_product_7f040a_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='productlistitem',
+            unique_together={('product_list', 'product_id')},
+        ),
+        migrations.RunPython(populate_product_list_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,113 @@
+# Generated by Django 2.2.12 on 2026-10-18 04:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# see Product.LESS_PREFERRED_PREFERENCE_VALUE
+LESS_PREFERRED_PREFERENCE_VALUE = 25
+
+
+def populate_product_migration_paths(apps, schema_editor):
+    """
+    create the migration paths of all Products (same result as app.productdb.migration_paths.rebuild_migration_paths)
+    """
+    Product = apps.get_model("productdb", "Product")
+    ProductMigrationOption = apps.get_model("productdb", "ProductMigrationOption")
+    ProductMigrationPath = apps.get_model("productdb", "ProductMigrationPath")
+
+    # Product database ID -> {migration source name: migration option}
+    options = {}
+    preferred_source_names = {}
+    for pmo in ProductMigrationOption.objects.select_related("migration_source").order_by().iterator():
+        options.setdefault(pmo.product_id, {})[pmo.migration_source.name] = pmo
+
+    for product_id, product_options in options.items():
+        preferred = sorted([
+            (-pmo.migration_source.preference, pmo.migration_source.name) for pmo in product_options.values()
+            if pmo.migration_source.preference > LESS_PREFERRED_PREFERENCE_VALUE
+        ])
+        preferred_source_names[product_id] = preferred[0][1] if len(preferred) != 0 else None
+
+    # a replacement within the database is valid if it is not EoL announced (see is_valid_replacement)
+    valid_replacement_ids = set()
+    replacement_ids = set([
+        pmo.replacement_db_product_id for product_options in options.values() for pmo in product_options.values()
+        if pmo.replacement_db_product_id
+    ])
+    query = Product.objects.filter(id__in=replacement_ids).values_list(
+        "id", "end_of_sale_date", "eol_ext_announcement_date", "eox_update_time_stamp"
+    )
+    for pid, end_of_sale_date, eol_ext_announcement_date, eox_update_time_stamp in query.iterator():
+        if not end_of_sale_date or (not eol_ext_announcement_date and eox_update_time_stamp is not None):
+            valid_replacement_ids.add(pid)
+
+    entries = []
+    for product_id, product_options in options.items():
+        for source_name, start_option in product_options.items():
+            path = [start_option]
+            visited = {product_id}
+            loop_detected = False
+            while True:
+                last = path[-1]
+                if not last.replacement_product_id or not last.replacement_db_product_id or \
+                        last.replacement_db_product_id in valid_replacement_ids:
+                    break
+
+                if last.replacement_db_product_id in visited:
+                    loop_detected = True
+                    break
+
+                pmo = options.get(last.replacement_db_product_id, {}).get(source_name)
+                if pmo is None:
+                    break
+
+                path.append(pmo)
+                visited.add(last.replacement_db_product_id)
+
+            for position, pmo in enumerate(path):
+                entries.append(ProductMigrationPath(
+                    product_id=product_id,
+                    migration_source_id=start_option.migration_source_id,
+                    position=position,
+                    migration_option_id=pmo.id,
+                    preferred=preferred_source_names[product_id] == source_name,
+                    loop_detected=loop_detected and position == len(path) - 1
+                ))
+
+    ProductMigrationPath.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productdb', '0035_productlistitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductMigrationPath',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(help_text='position within the migration path (0 is the direct replacement)')),
+                ('preferred', models.BooleanField(default=False, help_text='part of the preferred migration path of the Product')),
+                ('loop_detected', models.BooleanField(default=False, help_text='the migration path was stopped at this position because of a loop')),
+                ('migration_option', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='productdb.ProductMigrationOption')),
+                ('migration_source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='productdb.ProductMigrationSource')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='productdb.Product')),
+            ],
+            options={
+                'verbose_name': 'Product Migration Path',
+                'verbose_name_plural': 'Product Migration Paths',
+                'ordering': ('position',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='productmigrationpath',
+            index=models.Index(fields=['product', 'preferred', 'position'], name='productdb_p_product_b9e989_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='productmigrationpath',
+            unique_together={('product', 'migration_source', 'position')},
+        ),
+        migrations.RunPython(populate_product_migration_paths, migrations.RunPython.noop),
+    ]
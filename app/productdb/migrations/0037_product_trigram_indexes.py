@@ -0,0 +1,38 @@
+# Generated by Django 2.2.12 on 2026-10-18 09:12
+
+from django.db import migrations
+
+# columns of the Product table that are used by the Product search (see app.productdb.search)
+TRIGRAM_INDEXED_COLUMNS = ["product_id", "description", "tags"]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # the trigram indexes are only available on PostgreSQL
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for column in TRIGRAM_INDEXED_COLUMNS:
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS productdb_product_%s_trgm ON productdb_product "
+            "USING gin (%s gin_trgm_ops)" % (column, column)
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for column in TRIGRAM_INDEXED_COLUMNS:
+        schema_editor.execute("DROP INDEX IF EXISTS productdb_product_%s_trgm" % column)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productdb', '0036_productmigrationpath'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
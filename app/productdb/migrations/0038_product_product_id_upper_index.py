@@ -0,0 +1,31 @@
+# Generated by Django 2.2.12 on 2026-10-18 05:32
+
+from django.db import migrations
+
+
+def create_product_id_upper_index(apps, schema_editor):
+    # case-insensitive lookup of the Product IDs (see app.productdb.product_lookup), only available on PostgreSQL
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS productdb_product_product_id_upper ON productdb_product (UPPER(product_id))"
+    )
+
+
+def drop_product_id_upper_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute("DROP INDEX IF EXISTS productdb_product_product_id_upper")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productdb', '0037_product_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_product_id_upper_index, drop_product_id_upper_index),
+    ]
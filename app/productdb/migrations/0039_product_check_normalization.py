@@ -0,0 +1,24 @@
+# Generated by Django 2.2.12 on 2026-10-18 05:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productdb', '0038_product_product_id_upper_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcheck',
+            name='normalization_vendor',
+            field=models.ForeignKey(blank=True, help_text='if selected, the Product ID Normalization Rules of the Vendor are applied to the input Product IDs', null=True, on_delete=django.db.models.deletion.SET_NULL, to='productdb.Vendor', verbose_name='normalization rules'),
+        ),
+        migrations.AddField(
+            model_name='productcheckentry',
+            name='original_input_product_ids',
+            field=models.TextField(blank=True, default='', help_text='input strings that were normalized to the Product ID (one per line)', verbose_name='original input'),
+        ),
+    ]
@@ -1,7 +1,4 @@
 import hashlib
-import re
-from collections import Counter
-from datetime import timedelta
 from django.contrib.auth.models import User
 from django.conf import settings
 from django.contrib.auth.models import User
@@ -9,13 +6,15 @@ from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.cache import cache
 from django.core.cache.utils import make_template_fragment_key
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction
 from django.db.models.signals import pre_delete, post_save, pre_save, post_delete
 from django.dispatch import receiver
 from django.utils.timezone import datetime, now
-from app.config.settings import AppSettings
 from app.productdb.validators import validate_product_list_string
+from app.productdb.product_check import ProductCheckEngine
+from app.productdb import migration_paths
+from app.productdb import normalization
+from app.productdb import product_statistics
 from app.productdb import utils
 
 CURRENCY_CHOICES = (
@@ -142,6 +141,14 @@ class Product(models.Model):
     EOS_ANNOUNCED_STR = "EoS announced"
     NO_EOL_ANNOUNCEMENT_STR = "No EoL announcement"
 
+    # lifecycle states that are computed by annotate_lifecycle_state (in lifecycle order)
+    LIFECYCLE_STATES = (
+        NO_EOL_ANNOUNCEMENT_STR,
+        EOS_ANNOUNCED_STR,
+        END_OF_SALE_STR,
+        END_OF_SUPPORT_STR,
+    )
+
     # preference greater than the following constant is considered preferred
     LESS_PREFERRED_PREFERENCE_VALUE = 25
 
@@ -305,47 +312,41 @@ class Product(models.Model):
         """
         returns a list with all EoL states or None if no EoL announcement ist set
         """
+        return self.get_lifecycle_states()
+
+    def get_lifecycle_states(self, today=None):
+        """
+        returns a list with all EoL states at the given date (default is today) or None if no EoL announcement ist set
+        """
         # compute only if an EoL announcement date is specified
         if self.eol_ext_announcement_date:
             # check the current state
             result = []
-            today = datetime.now().date()
-
-            # if not defined, use a date in the future
-            end_of_sale_date = self.end_of_sale_date \
-                if self.end_of_sale_date else (datetime.now() + timedelta(days=7)).date()
-            end_of_support_date = self.end_of_support_date \
-                if self.end_of_support_date else (datetime.now() + timedelta(days=7)).date()
-            end_of_new_service_attachment_date = self.end_of_new_service_attachment_date \
-                if self.end_of_new_service_attachment_date else (datetime.now() + timedelta(days=7)).date()
-            end_of_sw_maintenance_date = self.end_of_sw_maintenance_date \
-                if self.end_of_sw_maintenance_date else (datetime.now() + timedelta(days=7)).date()
-            end_of_routine_failure_analysis = self.end_of_routine_failure_analysis \
-                if self.end_of_routine_failure_analysis else (datetime.now() + timedelta(days=7)).date()
-            end_of_service_contract_renewal = self.end_of_service_contract_renewal \
-                if self.end_of_service_contract_renewal else (datetime.now() + timedelta(days=7)).date()
-            end_of_sec_vuln_supp_date = self.end_of_sec_vuln_supp_date \
-                if self.end_of_sec_vuln_supp_date else (datetime.now() + timedelta(days=7)).date()
-
-            if today >= end_of_sale_date:
-                if today >= end_of_support_date:
+            today = today or datetime.now().date()
+
+            def is_reached(date):
+                # if not defined, the date is in the future
+                return date is not None and today >= date
+
+            if is_reached(self.end_of_sale_date):
+                if is_reached(self.end_of_support_date):
                     result.append(self.END_OF_SUPPORT_STR)
 
                 else:
                     result.append(self.END_OF_SALE_STR)
-                    if today >= end_of_new_service_attachment_date:
+                    if is_reached(self.end_of_new_service_attachment_date):
                         result.append(self.END_OF_NEW_SERVICE_ATTACHMENT_STR)
 
-                    if today >= end_of_sw_maintenance_date:
+                    if is_reached(self.end_of_sw_maintenance_date):
                         result.append(self.END_OF_SW_MAINTENANCE_RELEASES_STR)
 
-                    if today >= end_of_routine_failure_analysis:
+                    if is_reached(self.end_of_routine_failure_analysis):
                         result.append(self.END_OF_ROUTINE_FAILURE_ANALYSIS_STR)
 
-                    if today >= end_of_service_contract_renewal:
+                    if is_reached(self.end_of_service_contract_renewal):
                         result.append(self.END_OF_SERVICE_CONTRACT_RENEWAL_STR)
 
-                    if today >= end_of_sec_vuln_supp_date:
+                    if is_reached(self.end_of_sec_vuln_supp_date):
                         result.append(self.END_OF_VUL_SUPPORT_STR)
 
             else:
@@ -390,7 +391,7 @@ class Product(models.Model):
     def clean(self):
         # the vendor values of the product group and the product must be the same
         if self.product_group:
-            if self.product_group.vendor != self.vendor:
+            if self.product_group.vendor_id != self.vendor_id:
                 raise ValidationError({
                     "product_group":
                         ValidationError(
@@ -404,59 +405,51 @@ class Product(models.Model):
 
     def has_preferred_migration_option(self):
         """check that a preferred migration option exist (Product Migration Source preference > 25)"""
-        return self.productmigrationoption_set.filter(
-            migration_source__preference__gt=self.LESS_PREFERRED_PREFERENCE_VALUE
-        ).count() != 0
+        return self.productmigrationpath_set.filter(preferred=True).exists()
 
     def get_preferred_replacement_option(self):
         """Return the preferred replacement option (Product Migration Sources with a preference greater than 25)"""
-        if self.has_migration_options() and self.has_preferred_migration_option():
-            return self.get_migration_path(self.productmigrationoption_set.filter(
-                migration_source__preference__gt=self.LESS_PREFERRED_PREFERENCE_VALUE
-            ).first().migration_source.name)[-1]
+        path = self.get_migration_path()
+        if len(path) != 0:
+            return path[-1]
         return None
 
     def get_migration_path(self, migration_source_name=None):
         """
-        recursive lookup of the given migration source name, result is an ordered list, the first element
-        is the direct replacement and the last one is the valid replacement
+        lookup of the (materialized) migration path for the given migration source name, result is an ordered list,
+        the first element is the direct replacement and the last one is the valid replacement. If no migration source
+        name is given, the preferred path is used (except all Migration sources with a preference of 25 and lower).
         """
-        if not migration_source_name:
-            if not self.productmigrationoption_set.all().exists():
-                return []
+        query = self.productmigrationpath_set.select_related(
+            "migration_option__migration_source",
+            "migration_option__replacement_db_product"
+        ).order_by("position")
 
-            else:
-                # use the preferred path (except all Migration sources with a preference of 25 and lower)
-                migration_source_name = self.productmigrationoption_set.filter(
-                    migration_source__preference__gt=self.LESS_PREFERRED_PREFERENCE_VALUE
-                ).first().migration_source.name
+        if not migration_source_name:
+            query = query.filter(preferred=True)
 
-        if type(migration_source_name) is not str:
+        elif type(migration_source_name) is not str:
             raise AttributeError("attribute 'migration_source_name' must be a string")
 
-        result = []
-        if self.productmigrationoption_set.filter(migration_source__name=migration_source_name).exists():
-            result.append(self.productmigrationoption_set.filter(migration_source__name=migration_source_name).first())
-
-            while True:
-                # test, that the product migration option is valid and that a replacement_product_id exists
-                if not result[-1].is_valid_replacement() and result[-1].replacement_product_id:
-                    # test if it is in the database
-                    if result[-1].is_replacement_in_db():
-                        # get replacement product ID from database
-                        p = Product.objects.get(product_id=result[-1].replacement_product_id)
-                        if p.productmigrationoption_set.filter(migration_source__name=migration_source_name).exists():
-                            result.append(
-                                p.productmigrationoption_set.filter(
-                                    migration_source__name=migration_source_name
-                                )[:1].first()
-                            )
-                        else:
-                            break
-                    else:
-                        break
-                else:
-                    break
+        else:
+            query = query.filter(migration_source__name=migration_source_name)
+
+        return [e.migration_option for e in query]
+
+    def get_migration_paths(self):
+        """
+        lookup of all (materialized) migration paths of the Product with a single query, result is a dictionary with
+        the migration source name as key and the migration path (see get_migration_path) as value
+        """
+        query = self.productmigrationpath_set.select_related(
+            "migration_source",
+            "migration_option__migration_source",
+            "migration_option__replacement_db_product"
+        ).order_by("migration_source__name", "position")
+
+        result = {}
+        for e in query:
+            result.setdefault(e.migration_source.name, []).append(e.migration_option)
 
         return result
 
@@ -470,6 +463,39 @@ class Product(models.Model):
         ordering = ("product_id",)
 
 
+def annotate_lifecycle_state(queryset, today=None):
+    """
+    annotates the lifecycle state of the Products (first element of the current lifecycle states) as lifecycle_state
+    and its position within Product.LIFECYCLE_STATES as lifecycle_state_order (0 if no state is available) to the
+    given Product QuerySet, both values are computed within the database and can be used to filter and order
+    """
+    today = today or datetime.now().date()
+    eol_announced = models.Q(eol_ext_announcement_date__isnull=False)
+    end_of_sale = eol_announced & models.Q(end_of_sale_date__lte=today)
+    end_of_support = end_of_sale & models.Q(end_of_support_date__lte=today)
+    no_eol_announcement = ~eol_announced & models.Q(eox_update_time_stamp__isnull=False)
+
+    states = [
+        (end_of_support, Product.END_OF_SUPPORT_STR),
+        (end_of_sale, Product.END_OF_SALE_STR),
+        (eol_announced, Product.EOS_ANNOUNCED_STR),
+        (no_eol_announcement, Product.NO_EOL_ANNOUNCEMENT_STR),
+    ]
+    return queryset.annotate(
+        lifecycle_state=models.Case(
+            *[models.When(condition, then=models.Value(state)) for condition, state in states],
+            default=models.Value(None),
+            output_field=models.CharField()
+        ),
+        lifecycle_state_order=models.Case(
+            *[models.When(condition, then=models.Value(Product.LIFECYCLE_STATES.index(state) + 1))
+              for condition, state in states],
+            default=models.Value(0),
+            output_field=models.IntegerField()
+        )
+    )
+
+
 class ProductMigrationSource(models.Model):
     name = models.CharField(
         help_text="name of the migration source",
@@ -493,9 +519,27 @@ class ProductMigrationSource(models.Model):
         default=50
     )
 
+    # preference that was loaded from the database (None if not loaded)
+    __loaded_preference = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.__loaded_preference = dict(zip(field_names, values)).get("preference")
+        return instance
+
+    @property
+    def preference_changed(self):
+        """
+        True if the preference was changed since the object was loaded from the database (also True if the preference
+        was not loaded)
+        """
+        return self.__loaded_preference is None or self.__loaded_preference != self.preference
+
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
         self.full_clean()
         super().save(force_insert, force_update, using, update_fields)
+        self.__loaded_preference = self.preference
 
     def __str__(self):
         return self.name
@@ -588,6 +632,54 @@ class ProductMigrationOption(models.Model):
         verbose_name_plural = "Product Migration Options"
 
 
+class ProductMigrationPath(models.Model):
+    """
+    materialized migration path of a Product for a Migration Source, every entry is a single step within the path
+    (maintained by the signals of this module, see app.productdb.migration_paths)
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE
+    )
+
+    migration_source = models.ForeignKey(
+        ProductMigrationSource,
+        on_delete=models.CASCADE
+    )
+
+    position = models.PositiveIntegerField(
+        help_text="position within the migration path (0 is the direct replacement)"
+    )
+
+    migration_option = models.ForeignKey(
+        ProductMigrationOption,
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+
+    preferred = models.BooleanField(
+        default=False,
+        help_text="part of the preferred migration path of the Product"
+    )
+
+    loop_detected = models.BooleanField(
+        default=False,
+        help_text="the migration path was stopped at this position because of a loop"
+    )
+
+    def __str__(self):
+        return "migration path for %s (%s, %d)" % (self.product_id, self.migration_source_id, self.position)
+
+    class Meta:
+        verbose_name = "Product Migration Path"
+        verbose_name_plural = "Product Migration Paths"
+        unique_together = ("product", "migration_source", "position")
+        ordering = ("position",)
+        indexes = [
+            models.Index(fields=["product", "preferred", "position"]),
+        ]
+
+
 class ProductList(models.Model):
     name = models.CharField(
         max_length=2048,
@@ -646,6 +738,9 @@ class ProductList(models.Model):
         default=""
     )
 
+    # Product List string and vendor that were verified by the last full_clean call
+    _validated_product_list = None
+
     def get_string_product_list_as_list(self):
         result = []
         for line in self.string_product_list.splitlines():
@@ -653,11 +748,10 @@ class ProductList(models.Model):
         return sorted([e.strip() for e in result])
 
     def get_product_list_objects(self):
-        q_filter = Q()
-        for product_id in self.get_string_product_list_as_list():
-            q_filter.add(Q(product_id=product_id, vendor_id=self.vendor_id), Q.OR)
-
-        return Product.objects.filter(q_filter).prefetch_related("vendor", "product_group")
+        return Product.objects.filter(
+            vendor_id=self.vendor_id,
+            product_id__in=self.productlistitem_set.values("product_id")
+        ).prefetch_related("vendor", "product_group")
 
     def full_clean(self, exclude=None, validate_unique=True):
         # validate product list string together with selected vendor
@@ -665,7 +759,10 @@ class ProductList(models.Model):
         # validation between fields
         self.__discover_vendor_based_on_products()
         if self.vendor is not None:
-            validate_product_list_string(self.string_product_list, self.vendor.id)
+            # the save function calls full_clean again, the Product IDs are only verified if they were changed
+            if self._validated_product_list != (self.string_product_list, self.vendor_id):
+                validate_product_list_string(self.string_product_list, self.vendor_id)
+                self._validated_product_list = (self.string_product_list, self.vendor_id)
 
         else:
             raise ValidationError("vendor not set")
@@ -684,7 +781,33 @@ class ProductList(models.Model):
         s = "%s:%s:%s" % (self.name, self.string_product_list, self.vendor_id)
         self.hash = hashlib.sha256(s.encode()).hexdigest()
 
-        super(ProductList, self).save(**kwargs)
+        # the Product List Items must always match the saved Product List
+        with transaction.atomic():
+            super(ProductList, self).save(**kwargs)
+            self.__update_product_list_items()
+
+    def __update_product_list_items(self):
+        """synchronize the Product List Items with the (normalized) Product List string"""
+        values = set([e for e in self.string_product_list.splitlines() if e != ""])
+        current_items = dict(self.productlistitem_set.values_list("product_id", "vendor_id"))
+
+        outdated_items = set([
+            product_id for product_id, vendor_id in current_items.items()
+            if product_id not in values or vendor_id != self.vendor_id
+        ])
+        if len(outdated_items) != 0:
+            for chunk in utils.split_list(outdated_items):
+                self.productlistitem_set.filter(product_id__in=chunk).delete()
+
+        new_items = [
+            ProductListItem(product_list=self, vendor_id=self.vendor_id, product_id=product_id)
+            for product_id in sorted(values) if product_id not in current_items or product_id in outdated_items
+        ]
+        if len(new_items) != 0:
+            ProductListItem.objects.bulk_create(
+                new_items,
+                batch_size=utils.get_bulk_batch_size(ProductListItem, new_items)
+            )
 
     def __discover_vendor_based_on_products(self):
         # discovery vendor based on the products (if not set, used primary for data migration)
@@ -702,6 +825,35 @@ class ProductList(models.Model):
         ordering = ('name',)
 
 
+class ProductListItem(models.Model):
+    """normalized Product IDs of a Product List (maintained as part of the ProductList save function)"""
+    product_list = models.ForeignKey(
+        ProductList,
+        on_delete=models.CASCADE
+    )
+
+    vendor = models.ForeignKey(
+        Vendor,
+        on_delete=models.CASCADE
+    )
+
+    product_id = models.CharField(
+        max_length=512,
+        help_text="Product ID/Number"
+    )
+
+    def __str__(self):
+        return "%s: %s" % (self.product_list, self.product_id)
+
+    class Meta:
+        verbose_name = "Product List Item"
+        verbose_name_plural = "Product List Items"
+        unique_together = ("product_list", "product_id")
+        indexes = [
+            models.Index(fields=["product_id", "vendor"]),
+        ]
+
+
 class UserProfileManager(models.Manager):
     def get_by_natural_key(self, username):
         return self.get(user=User.objects.get(username=username))
@@ -782,6 +934,15 @@ class ProductCheck(models.Model):
         on_delete=models.CASCADE
     )
 
+    normalization_vendor = models.ForeignKey(
+        Vendor,
+        verbose_name="normalization rules",
+        help_text="if selected, the Product ID Normalization Rules of the Vendor are applied to the input Product IDs",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL
+    )
+
     @property
     def use_preferred_migration_source(self):
         """if no migration source is choosen, always use the preferred one"""
@@ -843,30 +1004,10 @@ class ProductCheck(models.Model):
         return self.task_id is not None
 
     def perform_product_check(self):
-        """perform the product check and populate the ProductCheckEntries"""
-        unique_products = [line.strip() for line in set(self.input_product_ids_list) if line.strip() != ""]
-        amounts = Counter(self.input_product_ids_list)
-
-        # clean all entries
-        self.productcheckentry_set.all().delete()
-
-        for input_product_id in unique_products:
-            product_entry, _ = ProductCheckEntry.objects.get_or_create(
-                input_product_id=input_product_id,
-                product_check=self
-            )
-            product_entry.amount = amounts[input_product_id]
-            product_entry.discover_product_list_values()
-
-            product_entry.save()
-
-        # increments statistics
-        settings = AppSettings()
-        settings.set_amount_of_product_checks(settings.get_amount_of_product_checks() + 1)
-        settings.set_amount_of_unique_product_check_entries(settings.get_amount_of_unique_product_check_entries() +
-                                                            len(unique_products))
-
+        """perform the product check and populate the ProductCheckEntries, returns the created entries"""
+        entries = ProductCheckEngine(self).run()
         self.save()
+        return entries
 
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
         self.full_clean()
@@ -937,6 +1078,18 @@ class ProductCheckEntry(models.Model):
         default=""
     )
 
+    original_input_product_ids = models.TextField(
+        verbose_name="original input",
+        help_text="input strings that were normalized to the Product ID (one per line)",
+        null=False,
+        blank=True,
+        default=""
+    )
+
+    @property
+    def original_input_product_ids_list(self):
+        return self.original_input_product_ids.splitlines()
+
     @property
     def product_list_hash_values(self):
         """return an unordered list of hash strings that contains the Product at time of the check"""
@@ -949,9 +1102,8 @@ class ProductCheckEntry(models.Model):
 
     def discover_product_list_values(self):
         """populate the part_of_product_list field"""
-        self.part_of_product_list = ""
-        query = ProductList.objects.filter(string_product_list__contains=self.input_product_id)
-        self.part_of_product_list += "\n".join(query.values_list("hash", flat=True))
+        query = ProductListItem.objects.filter(product_id=self.input_product_id).order_by("product_list__name")
+        self.part_of_product_list = "\n".join(query.values_list("product_list__hash", flat=True))
 
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
         self.full_clean()
@@ -1027,20 +1179,13 @@ class ProductIdNormalizationRule(models.Model):
         default=500
     )
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._pattern = None
-
     def matches(self, raw_product_id):
         """
         returns True if the given Product ID matches the pattern from the instance
         :param raw_product_id: raw Product ID
         :return:
         """
-        if self._pattern is None:
-            self._pattern = re.compile(self.regex_match)
-
-        if self._pattern.match(raw_product_id):
+        if normalization.compile_pattern(self.regex_match).match(raw_product_id):
             return True
 
         else:
@@ -1053,13 +1198,13 @@ class ProductIdNormalizationRule(models.Model):
         :param raw_product_id:
         :return:
         """
-        if not self.matches(raw_product_id):
+        match = normalization.compile_pattern(self.regex_match).match(raw_product_id)
+        if not match:
             raise AttributeError("input product ID does not match normalization")
 
-        if self._pattern.match(raw_product_id):
-            groups = self._pattern.match(raw_product_id).groups()
-            if len(groups) != 0:
-                return self.product_id % groups
+        groups = match.groups()
+        if len(groups) != 0:
+            return self.product_id % groups
 
         return self.product_id
 
@@ -1106,10 +1251,54 @@ def update_db_state_for_the_migration_options_with_product_id(sender, instance,
         pmo.save()
 
 
+@receiver([post_save, post_delete], sender=ProductIdNormalizationRule)
+def invalidate_normalization_rule_sets(sender, instance, **kwargs):
+    """the compiled rule sets are loaded again after changes of the rules"""
+    normalization.invalidate_rule_sets()
+
+
 @receiver([post_save, post_delete], sender=Product)
 def invalidate_product_related_cache_values(sender, instance, **kwargs):
-    """delete cache values that are somehow related to the Product data model"""
-    cache.delete("PDB_HOMEPAGE_CONTEXT")
+    """refresh cache values that are somehow related to the Product data model"""
+    product_statistics.schedule_product_statistics_refresh()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductMigrationOption)
+def update_migration_paths(sender, instance, raw=False, **kwargs):
+    """recompute the materialized migration paths that depend on the given Product or Product Migration Option"""
+    if not raw:
+        product_id = instance.id if sender is Product else instance.product_id
+        migration_paths.update_migration_paths([product_id])
+
+
+@receiver(pre_delete, sender=Product)
+@receiver(pre_delete, sender=ProductMigrationOption)
+def discover_dependent_migration_paths(sender, instance, **kwargs):
+    """identify the migration paths that depend on the object before it is deleted (removed by the cascade)"""
+    product_id = instance.id if sender is Product else instance.product_id
+    instance._dependent_migration_path_product_ids = migration_paths.get_affected_product_ids([product_id])
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductMigrationOption)
+def update_dependent_migration_paths(sender, instance, **kwargs):
+    """recompute the migration paths that depend on the deleted object"""
+    product_ids = getattr(instance, "_dependent_migration_path_product_ids", set())
+    if sender is Product:
+        product_ids = product_ids - {instance.id}
+
+    if len(product_ids) != 0:
+        migration_paths.rebuild_migration_paths(product_ids)
+
+
+@receiver(post_save, sender=ProductMigrationSource)
+def update_migration_paths_on_preference_change(sender, instance, created=False, raw=False, **kwargs):
+    """the preferred migration path depends on the preference of the Migration Source"""
+    if not raw and not created and instance.preference_changed:
+        migration_paths.rebuild_migration_paths(
+            instance.productmigrationoption_set.values_list("product_id", flat=True).distinct()
+        )
 
 
 @receiver(pre_save, sender=ProductMigrationOption)
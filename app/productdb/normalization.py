@@ -0,0 +1,212 @@
+"""
+normalization of Product IDs with the Product ID Normalization Rules of a Vendor
+
+The rules of a Vendor are compiled once into a rule set, which is kept within the process together with a version
+stamp from the cache. Every change of a rule drops the rule sets of the process and updates the version stamp (after the
+commit), therefore all processes load the rule set again on the next access. Rule sets that are loaded within the
+transaction of the change are only used within this transaction (see app.config.version_stamp).
+
+The patterns of the rule set are combined into a single regular expression (alternation in the order of the priority,
+every rule is wrapped in a capturing group), therefore an input string is matched only once against all rules. Rules
+that cannot be combined (named groups, backreferences or inline flags) are matched separately at their position.
+"""
+import logging
+import re
+import threading
+from functools import lru_cache
+import app.productdb.models
+from app.config.version_stamp import VersionStamp
+from app.productdb.utils import split_list
+
+logger = logging.getLogger("productdb")
+
+RULES_VERSION_CACHE_KEY = "PDB_NORMALIZATION_RULES_VERSION"
+RULES_VERSION = VersionStamp(RULES_VERSION_CACHE_KEY, "normalization rules")
+
+# Vendor ID -> NormalizationRuleSet
+_rule_sets = {}
+_lock = threading.Lock()
+
+
+# backreference to a numbered group (not usable within a combined pattern)
+NUMBERED_BACKREFERENCE = re.compile(r"(?<!\\)(\\\\)*\\[1-9]")
+
+# flags of a pattern without inline flags
+DEFAULT_FLAGS = re.compile("").flags
+
+
+@lru_cache(maxsize=8192)
+def compile_pattern(regex_match):
+    """compiled pattern of a rule (cached within the process, shared by all rule instances)"""
+    return re.compile(regex_match)
+
+
+def is_combinable(pattern):
+    """returns True if the compiled pattern of a rule can be used within a combined pattern"""
+    return (
+        len(pattern.groupindex) == 0 and
+        pattern.flags == DEFAULT_FLAGS and
+        not NUMBERED_BACKREFERENCE.search(pattern.pattern)
+    )
+
+
+class CombinedPattern:
+    """alternation of multiple rule patterns, the first matching rule (in the given order) is used"""
+    def __init__(self, rules):
+        self.rules = {}
+        parts = []
+        group_index = 1
+        for rule_id, pattern, product_id in rules:
+            self.rules[group_index] = (rule_id, product_id, pattern.groups)
+            parts.append("(%s)" % pattern.pattern)
+            group_index += pattern.groups + 1
+
+        self.pattern = re.compile("|".join(parts))
+
+    def match(self, input_string):
+        """returns the rule ID, the normalized Product ID and the groups of the first matching rule (or None)"""
+        match = self.pattern.match(input_string)
+        if not match:
+            return None
+
+        # the group of the rule is closed after all inner groups, therefore it is the last matched group
+        rule_id, product_id, group_count = self.rules[match.lastindex]
+        return rule_id, product_id, match.groups()[match.lastindex:match.lastindex + group_count]
+
+
+class SinglePattern:
+    """pattern of a single rule that cannot be combined"""
+    def __init__(self, rule_id, pattern, product_id):
+        self.rule_id = rule_id
+        self.pattern = pattern
+        self.product_id = product_id
+
+    def match(self, input_string):
+        match = self.pattern.match(input_string)
+        if not match:
+            return None
+
+        return self.rule_id, self.product_id, match.groups()
+
+
+class NormalizationRuleSet:
+    """compiled Product ID Normalization Rules of a Vendor (in the order of the priority)"""
+    def __init__(self, vendor_id, rules, version=None, owner=None):
+        self.vendor_id = vendor_id
+        self.version = version
+        # set if the rules contain uncommitted changes of the current transaction
+        self.owner = owner
+        self.rules = []
+        for rule_id, regex_match, product_id in rules:
+            try:
+                self.rules.append((rule_id, compile_pattern(regex_match), product_id))
+
+            except (re.error, TypeError):
+                logger.warning("invalid regular expression within the normalization rule %s: %s" % (
+                    rule_id, regex_match
+                ))
+
+        # consecutive rules are combined into a single pattern, the other rules are kept at their position
+        self.patterns = []
+        combinable_rules = []
+        for rule in self.rules:
+            if is_combinable(rule[1]):
+                combinable_rules.append(rule)
+                continue
+
+            self._add_combined_pattern(combinable_rules)
+            combinable_rules = []
+            self.patterns.append(SinglePattern(*rule))
+
+        self._add_combined_pattern(combinable_rules)
+
+    def _add_combined_pattern(self, rules):
+        if len(rules) == 0:
+            return
+
+        try:
+            self.patterns.append(CombinedPattern(rules))
+
+        except (re.error, RecursionError):
+            # e.g. too many nested groups, the rules are matched separately
+            self.patterns += [SinglePattern(*rule) for rule in rules]
+
+    @classmethod
+    def load(cls, vendor_id, version=None, owner=None):
+        rules = app.productdb.models.ProductIdNormalizationRule.objects.filter(
+            vendor_id=vendor_id
+        ).order_by("priority", "product_id").values_list("id", "regex_match", "product_id")
+
+        return cls(vendor_id, rules, version, owner)
+
+    def normalize(self, input_string):
+        """
+        returns the normalized Product ID and the ID of the first matching rule, the input string is returned unmodified
+        if no rule matches
+        """
+        for pattern in self.patterns:
+            result = pattern.match(input_string)
+            if result:
+                rule_id, product_id, groups = result
+                return (product_id % groups if len(groups) != 0 else product_id), rule_id
+
+        return input_string, None
+
+
+def normalize_input_strings(vendor_id, input_strings):
+    """
+    normalize the given input strings with the rules of the Vendor, returns a dictionary with the input string as key
+    and a tuple with the normalized Product ID and the ID of the matching rule (None if no rule matches) as value
+    """
+    rule_set = get_rule_set(vendor_id)
+    return dict([(input_string, rule_set.normalize(input_string)) for input_string in set(input_strings)])
+
+
+def normalize_product_ids(vendor_id, input_strings):
+    """
+    normalize the given input strings with the rules of the Vendor, returns a dictionary with the input string as key
+    and a tuple with the normalized Product ID, the ID of the matching rule and the database ID of the normalized
+    Product (only if a rule matches) as value. The Products are resolved with a single query per chunk.
+    """
+    result = normalize_input_strings(vendor_id, input_strings)
+
+    normalized_product_ids = set([product_id for product_id, rule_id in result.values() if rule_id is not None])
+    products = {}
+    for chunk in split_list(normalized_product_ids):
+        products.update(app.productdb.models.Product.objects.filter(
+            vendor_id=vendor_id,
+            product_id__in=chunk
+        ).values_list("product_id", "id"))
+
+    return dict([
+        (input_string, (product_id, rule_id, products.get(product_id) if rule_id is not None else None))
+        for input_string, (product_id, rule_id) in result.items()
+    ])
+
+
+def get_rule_set(vendor_id):
+    """returns the compiled rule set of the Vendor (loaded again if the rules were changed)"""
+    version = RULES_VERSION.get()
+    rule_set = _rule_sets.get(vendor_id)
+    if rule_set is None or version is None or rule_set.version != version or \
+            not RULES_VERSION.is_usable(rule_set.owner):
+        rule_set = NormalizationRuleSet.load(vendor_id, version, RULES_VERSION.get_transaction_owner())
+        with _lock:
+            _rule_sets[vendor_id] = rule_set
+
+    return rule_set
+
+
+def clear_rule_sets():
+    """drop the rule sets of the process (loaded again on the next access)"""
+    with _lock:
+        _rule_sets.clear()
+
+
+def invalidate_rule_sets():
+    """
+    drop the rule sets of the process immediately (and again after the commit), the other processes are notified after
+    the commit
+    """
+    clear_rule_sets()
+    RULES_VERSION.changed(clear_rule_sets)
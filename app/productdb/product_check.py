@@ -0,0 +1,141 @@
+"""
+set-based implementation of the Product Check, resolves all input Product IDs with a few bulk queries instead of
+multiple queries per Product Check Entry
+
+If a normalization Vendor is selected, the unique input Product IDs are normalized with the rule set of the Vendor
+before the lookup. Input Product IDs with the same normalized Product ID are combined into a single entry, the original
+input strings are stored within the entry.
+"""
+from collections import Counter
+import app.productdb.models
+from app.productdb import normalization
+from app.config import counters
+from app.config.models import UsageCounter
+from app.productdb.utils import split_list, get_bulk_batch_size
+
+
+class ProductCheckEngine:
+    """
+    performs a Product Check with a fixed amount of queries per chunk of input Product IDs
+    """
+    def __init__(self, product_check):
+        self.product_check = product_check
+
+    def lookup_products(self, product_ids):
+        """returns a dictionary with the Product ID string as key and the first matching Product as value"""
+        result = {}
+        for chunk in split_list(product_ids):
+            query = app.productdb.models.Product.objects.filter(
+                product_id__in=chunk
+            ).order_by("product_id", "id")
+
+            for product in query:
+                result.setdefault(product.product_id, product)
+
+        return result
+
+    def lookup_product_list_hashes(self, product_ids):
+        """
+        returns a dictionary with the Product ID as key and the (ordered) hash values of all Product Lists that
+        contains the Product ID
+        """
+        result = {}
+        for chunk in split_list(product_ids):
+            query = app.productdb.models.ProductListItem.objects.filter(
+                product_id__in=chunk
+            ).order_by("product_list__name").values_list("product_id", "product_list__hash")
+
+            for product_id, pl_hash in query:
+                result.setdefault(product_id, []).append(pl_hash)
+
+        return result
+
+    def lookup_migration_options(self, product_ids):
+        """
+        returns a dictionary with the Product database ID as key and the ID of the last Product Migration Option
+        within the (preferred or selected) migration path as value
+        """
+        result = {}
+        for chunk in split_list(product_ids):
+            query = app.productdb.models.ProductMigrationPath.objects.filter(product_id__in=chunk)
+            if self.product_check.migration_source:
+                query = query.filter(migration_source=self.product_check.migration_source)
+
+            else:
+                query = query.filter(preferred=True)
+
+            for product_id, migration_option_id in query.order_by("product_id", "position").values_list(
+                    "product_id", "migration_option_id"):
+                result[product_id] = migration_option_id
+
+        return result
+
+    def normalize_input_product_ids(self, input_product_ids):
+        """
+        returns a dictionary with the input Product ID as key and the normalized Product ID as value (only the input
+        Product IDs that match a normalization rule of the selected Vendor)
+        """
+        if self.product_check.normalization_vendor_id is None:
+            return {}
+
+        normalized = normalization.normalize_input_strings(self.product_check.normalization_vendor_id, input_product_ids)
+        return dict([
+            (input_product_id, product_id) for input_product_id, (product_id, rule_id) in normalized.items()
+            if rule_id is not None and product_id != input_product_id
+        ])
+
+    def create_entries(self):
+        """compute the Product Check Entries (not saved to the database)"""
+        input_product_ids = self.product_check.input_product_ids_list
+        unique_inputs = [line.strip() for line in set(input_product_ids) if line.strip() != ""]
+        input_amounts = Counter(input_product_ids)
+        normalized_product_ids = self.normalize_input_product_ids(unique_inputs)
+
+        amounts = Counter()
+        original_inputs = {}
+        for input_product_id in unique_inputs:
+            product_id = normalized_product_ids.get(input_product_id, input_product_id)
+            amounts[product_id] += input_amounts[input_product_id]
+            if product_id != input_product_id:
+                original_inputs.setdefault(product_id, []).append(input_product_id)
+
+        unique_products = list(amounts.keys())
+        products = self.lookup_products(unique_products)
+        product_list_hashes = self.lookup_product_list_hashes(unique_products)
+        migration_options = self.lookup_migration_options([p.id for p in products.values()])
+
+        entries = []
+        for input_product_id in unique_products:
+            entry = app.productdb.models.ProductCheckEntry(
+                product_check=self.product_check,
+                input_product_id=input_product_id,
+                amount=amounts[input_product_id],
+                part_of_product_list="\n".join(product_list_hashes.get(input_product_id, [])),
+                original_input_product_ids="\n".join(sorted(original_inputs.get(input_product_id, [])))
+            )
+            entry.clean_fields(exclude=["product_check", "product_in_database", "migration_product"])
+
+            product = products.get(input_product_id)
+            if product:
+                entry.product_in_database = product
+                entry.migration_product_id = migration_options.get(product.id)
+
+            entries.append(entry)
+
+        return entries
+
+    def run(self):
+        """perform the product check and replace the existing Product Check Entries"""
+        entries = self.create_entries()
+
+        self.product_check.productcheckentry_set.all().delete()
+        app.productdb.models.ProductCheckEntry.objects.bulk_create(
+            entries,
+            batch_size=get_bulk_batch_size(app.productdb.models.ProductCheckEntry, entries)
+        )
+
+        # increments statistics
+        counters.increment(UsageCounter.PRODUCT_CHECKS)
+        counters.increment(UsageCounter.UNIQUE_PRODUCT_CHECK_ENTRIES, len(entries))
+
+        return entries
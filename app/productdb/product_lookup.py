@@ -0,0 +1,101 @@
+"""
+bulk lookup of Products by their Product ID (used by the lookup endpoint of the Product API)
+
+The Product IDs are resolved per chunk with an exact match (unique index on the Product ID and the vendor), the
+remaining Product IDs of the chunk are resolved with a case-insensitive match like the product_id filter of the
+Product API (index on UPPER(product_id) on PostgreSQL, see migration 0038). Large results are streamed as JSON while
+the chunks are resolved.
+"""
+import json
+from django.db.models.functions import Upper
+from rest_framework.utils.encoders import JSONEncoder
+import app.productdb.models
+from app.productdb.utils import split_list
+
+# amount of Product IDs that are resolved by a single query (results with more Product IDs are streamed)
+CHUNK_SIZE = 500
+
+
+class ProductLookup:
+    """
+    resolves multiple Product IDs (optionally limited to a Vendor), the Product IDs without a matching Product are
+    available as missing after the iteration of the chunks
+    """
+    def __init__(self, product_ids, vendor_id=None):
+        # unique Product IDs in the order of the request
+        self.product_ids = list(dict.fromkeys([e.strip() for e in product_ids if e.strip() != ""]))
+        self.vendor_id = vendor_id
+        self.missing = []
+
+    def get_queryset(self):
+        queryset = app.productdb.models.Product.objects.all()
+        if self.vendor_id is not None:
+            queryset = queryset.filter(vendor_id=self.vendor_id)
+
+        return queryset.order_by("product_id", "vendor_id")
+
+    def iter_chunks(self):
+        """
+        yields the matching Products per chunk of Product IDs in the order of the request (every Product is contained
+        only once)
+        """
+        self.missing = []
+        product_db_ids = set()
+        for chunk in split_list(self.product_ids, CHUNK_SIZE):
+            products = list(self.get_queryset().filter(product_id__in=chunk))
+            exact_matches = set([p.product_id for p in products])
+            chunk_db_ids = set([p.id for p in products])
+
+            remaining = set([e.upper() for e in chunk if e not in exact_matches])
+            if len(remaining) != 0:
+                query = self.get_queryset().annotate(
+                    product_id_upper=Upper("product_id")
+                ).filter(product_id_upper__in=list(remaining))
+
+                for product in query:
+                    remaining.discard(product.product_id_upper)
+                    # the Product may be already matched exactly by another spelling within the chunk
+                    if product.id not in chunk_db_ids:
+                        chunk_db_ids.add(product.id)
+                        products.append(product)
+
+                self.missing += [e for e in chunk if e.upper() in remaining]
+
+            # order of the requested Product IDs
+            positions = {}
+            for position, product_id in enumerate(chunk):
+                positions.setdefault(product_id, position)
+                positions.setdefault(product_id.upper(), position)
+
+            products = sorted(
+                [p for p in products if p.id not in product_db_ids],
+                key=lambda p: positions.get(p.product_id, positions.get(p.product_id.upper(), len(chunk)))
+            )
+            product_db_ids.update([p.id for p in products])
+
+            yield products
+
+    def get_result(self, serialize):
+        """returns the result as dictionary, the serialize function converts a list of Products"""
+        products = []
+        for chunk in self.iter_chunks():
+            products += serialize(chunk)
+
+        return {
+            "products": products,
+            "missing": self.missing
+        }
+
+    def iter_json(self, serialize):
+        """yields the result as JSON string while the chunks are resolved"""
+        yield '{"products": ['
+        separator = ""
+        for chunk in self.iter_chunks():
+            for entry in serialize(chunk):
+                yield separator + json.dumps(entry, cls=JSONEncoder)
+                separator = ", "
+
+        yield '], "missing": %s}' % json.dumps(self.missing)
+
+    def is_streamed(self):
+        return len(self.product_ids) > CHUNK_SIZE
@@ -0,0 +1,113 @@
+"""
+statistics about the Products that are shown on the homepage
+
+The counts are computed with a single aggregate query by the productdb.refresh_product_statistics task, which is
+executed periodically (see CELERYBEAT_SCHEDULE) and after changes of the Products. The statistics are never computed
+within a request, a placeholder is shown until the task has stored the statistics in the cache.
+
+Changes of the Products schedule a refresh after the transaction is committed. The task is delayed by
+PDB_PRODUCT_STATISTICS_REFRESH_DELAY seconds, all changes within this delay (e.g. during an import or the
+synchronization with the Cisco EoX API) are coalesced into a single refresh. The cached statistics expire after
+PDB_PRODUCT_STATISTICS_CACHE_TIMEOUT seconds (longer than the interval of the periodic refresh), therefore outdated
+statistics are not shown for long if no backend worker is running.
+"""
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils.timezone import datetime
+import app.productdb.models
+
+logger = logging.getLogger("productdb")
+
+PRODUCT_STATISTICS_CACHE_KEY = "PDB_PRODUCT_STATISTICS"
+REFRESH_SCHEDULED_CACHE_KEY = "PDB_PRODUCT_STATISTICS_REFRESH_SCHEDULED"
+
+# shown until the statistics are computed by the refresh task
+PLACEHOLDER_STATISTICS = {
+    "date": None,
+    "product_count": None,
+    "product_lifecycle_count": None,
+    "product_no_eol_announcement_count": None,
+    "product_eol_announcement_count": None,
+    "product_eos_count": None,
+    "product_eol_count": None,
+    "product_price_count": None,
+}
+
+
+def compute_product_statistics(today=None):
+    """compute the statistics of the homepage with a single query, the date is part of the result"""
+    today = today or datetime.now().date()
+    statistics = app.productdb.models.Product.objects.aggregate(
+        product_count=Count("id"),
+        product_lifecycle_count=Count("id", filter=Q(eox_update_time_stamp__isnull=False)),
+        product_no_eol_announcement_count=Count("id", filter=Q(
+            eox_update_time_stamp__isnull=False,
+            eol_ext_announcement_date__isnull=True
+        )),
+        product_eol_announcement_count=Count("id", filter=Q(
+            eol_ext_announcement_date__isnull=False,
+            end_of_sale_date__gt=today
+        )),
+        product_eos_count=Count("id", filter=(
+            Q(end_of_sale_date__lte=today, end_of_support_date__gt=today) |
+            Q(end_of_sale_date__lte=today, end_of_support_date__isnull=True)
+        )),
+        product_eol_count=Count("id", filter=Q(end_of_support_date__lte=today)),
+        product_price_count=Count("id", filter=Q(list_price__isnull=False)),
+    )
+    statistics["date"] = today
+
+    return statistics
+
+
+def refresh_product_statistics():
+    """compute the statistics and store them in the cache"""
+    statistics = compute_product_statistics()
+    cache.set(PRODUCT_STATISTICS_CACHE_KEY, statistics, timeout=settings.PDB_PRODUCT_STATISTICS_CACHE_TIMEOUT)
+
+    return statistics
+
+
+def get_product_statistics():
+    """
+    returns the cached statistics without computing them, an immediate refresh is started if the statistics are not
+    cached (the placeholder is returned) or if they are from a previous day
+    """
+    statistics = cache.get(PRODUCT_STATISTICS_CACHE_KEY)
+    if statistics is None or statistics["date"] != datetime.now().date():
+        enqueue_product_statistics_refresh(delay=0)
+
+    if statistics is None:
+        return dict(PLACEHOLDER_STATISTICS)
+
+    return statistics
+
+
+def schedule_product_statistics_refresh():
+    """schedule a refresh of the statistics after the current transaction is committed (once per transaction)"""
+    if any([func is enqueue_product_statistics_refresh for _, func in connection.run_on_commit]):
+        return
+
+    transaction.on_commit(enqueue_product_statistics_refresh)
+
+
+def enqueue_product_statistics_refresh(delay=None):
+    """
+    start the refresh task (delayed by PDB_PRODUCT_STATISTICS_REFRESH_DELAY seconds if no delay is given) if no refresh
+    is already scheduled
+    """
+    delay = delay if delay is not None else settings.PDB_PRODUCT_STATISTICS_REFRESH_DELAY
+    # the flag expires if the refresh task is not executed (e.g. if no backend worker is running)
+    if not cache.add(REFRESH_SCHEDULED_CACHE_KEY, True, timeout=delay + 60):
+        return
+
+    from app.productdb.tasks import refresh_product_statistics as refresh_product_statistics_task
+    try:
+        refresh_product_statistics_task.apply_async(countdown=delay)
+
+    except Exception:  # catch any exception
+        logger.warning("cannot schedule the refresh of the product statistics", exc_info=True)
+        cache.delete(REFRESH_SCHEDULED_CACHE_KEY)
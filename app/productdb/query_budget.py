@@ -0,0 +1,290 @@
+"""
+query budgets for the views, API endpoints and Celery tasks of the Product Database
+
+Every entry within QUERY_BUDGETS defines the maximum amount of database queries for a URL name or a Celery task.
+The budgets are enforced by the test suite (see test_productdb_query_budgets.py) against a generated dataset that is
+large enough to reveal N+1 queries. If a budget is exceeded, the report contains the executed SQL statements grouped
+by their call site (the innermost frame within the project or the template line that triggered the query).
+"""
+import os
+import sys
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from app.config.settings import AppSettings
+from app.productdb.benchmark import CatalogGenerator, CATALOG_TAG, get_request_host
+from app.productdb.models import Product, ProductCheck, ProductList, ProductMigrationOption, ProductMigrationSource
+from django_project.celery import app as celery_app
+
+
+class QueryBudgetExceeded(Exception):
+    """the amount of queries exceeds the budget"""
+    pass
+
+
+class QueryBudget:
+    """
+    base class of a query budget, the kwargs contain the name of the dataset object (see QueryBudgetDataset) whose ID
+    is used as value, e.g. {"product_id": "product"}
+    """
+    def __init__(self, max_queries, kwargs=None):
+        self.max_queries = max_queries
+        self.kwargs = kwargs or {}
+
+    @property
+    def name(self):
+        raise NotImplementedError()
+
+    def get_kwargs(self, dataset):
+        return {key: getattr(dataset, value).id for key, value in self.kwargs.items()}
+
+    def prepare(self, dataset):
+        """returns a callable that executes the budget against the given dataset (without arguments)"""
+        raise NotImplementedError()
+
+    def measure(self, dataset):
+        """execute the budget against the given dataset and return the recorded queries"""
+        func = self.prepare(dataset)
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            func()
+
+        return recorder
+
+    def verify(self, dataset):
+        """
+        :raises QueryBudgetExceeded: if the amount of queries exceeds the budget
+        """
+        recorder = self.measure(dataset)
+        if len(recorder.queries) > self.max_queries:
+            raise QueryBudgetExceeded("query budget for '%s' exceeded: %d queries (budget %d)\n%s" % (
+                self.name, len(recorder.queries), self.max_queries, recorder.format_report()
+            ))
+
+        return recorder
+
+
+class ViewQueryBudget(QueryBudget):
+    """query budget of a GET request to a URL name (optionally as superuser, required for the admin and the API)"""
+    def __init__(self, url_name, max_queries, kwargs=None, params=None, superuser=False):
+        super().__init__(max_queries, kwargs)
+        self.url_name = url_name
+        self.params = params or {}
+        self.superuser = superuser
+
+    @property
+    def name(self):
+        return self.url_name
+
+    def prepare(self, dataset):
+        # the login is not part of the budget
+        client = Client(HTTP_HOST=get_request_host())
+        if self.superuser:
+            client.force_login(dataset.user)
+
+        url = reverse(self.url_name, kwargs=self.get_kwargs(dataset))
+
+        def execute():
+            response = client.get(url, self.params)
+            if response.status_code != 200:
+                raise QueryBudgetExceeded("request to '%s' failed: HTTP %d" % (self.url_name, response.status_code))
+
+        return execute
+
+
+class TaskQueryBudget(QueryBudget):
+    """query budget of a Celery task (executed synchronously)"""
+    def __init__(self, task_name, max_queries, kwargs=None):
+        super().__init__(max_queries, kwargs)
+        self.task_name = task_name
+
+    @property
+    def name(self):
+        return self.task_name
+
+    def prepare(self, dataset):
+        task = celery_app.tasks[self.task_name]
+        kwargs = self.get_kwargs(dataset)
+        return lambda: task(**kwargs)
+
+
+# modules that execute the queries on behalf of the caller (ignored when identifying the call site)
+DATABASE_LAYER_PATHS = [os.path.join("django", "db"), os.path.join("site-packages", "cacheops")]
+
+# datatables endpoints are called with the parameters of the first page
+DATATABLES_PARAMS = {
+    "draw": 1,
+    "start": 0,
+    "length": 100,
+    "search[value]": "",
+}
+
+QUERY_BUDGETS = [
+    # HTML views
+    ViewQueryBudget("productdb:home", 6),
+    ViewQueryBudget("productdb:all_products", 2),
+    ViewQueryBudget("productdb:browse_vendor_products", 2),
+    ViewQueryBudget("productdb:list-product_groups", 2),
+    ViewQueryBudget("productdb:detail-product_group", 4, kwargs={"product_group_id": "product_group"}),
+    ViewQueryBudget("productdb:list-product_lists", 2),
+    ViewQueryBudget("productdb:detail-product_list", 6, kwargs={"product_list_id": "product_list"}),
+    ViewQueryBudget("productdb:product-detail", 8, kwargs={"product_id": "product"}),
+    ViewQueryBudget("productdb:list-product_checks", 4),
+    ViewQueryBudget("productdb:detail-product_check", 10, kwargs={"product_check_id": "product_check"}),
+
+    # datatables endpoints
+    ViewQueryBudget("productdb:datatables_list_products_view", 6, params=DATATABLES_PARAMS),
+    ViewQueryBudget("productdb:datatables_vendor_products_endpoint", 6, kwargs={"vendor_id": "vendor"},
+                    params=DATATABLES_PARAMS),
+    ViewQueryBudget("productdb:datatables_list_product_groups", 5, params=DATATABLES_PARAMS),
+    ViewQueryBudget("productdb:datatables_list_products_by_group_view", 6,
+                    kwargs={"product_group_id": "product_group"}, params=DATATABLES_PARAMS),
+
+    # API endpoints
+    ViewQueryBudget("productdb:products-list", 8, params={"page_size": 100}, superuser=True),
+    ViewQueryBudget("productdb:productlists-list", 8, params={"page_size": 100}, superuser=True),
+    ViewQueryBudget("productdb:productmigrationoptions-list", 8, params={"page_size": 100}, superuser=True),
+
+    # admin
+    ViewQueryBudget("admin:productdb_product_changelist", 14, superuser=True),
+
+    # Celery tasks
+    TaskQueryBudget("productdb.perform_product_check", 30, kwargs={"product_check_id": "product_check"}),
+]
+
+
+class QueryBudgetDataset:
+    """
+    generated dataset for the query budgets (based on the synthetic catalog), the objects that are referenced by the
+    budgets are available as attributes
+    """
+    def __init__(self, products=250, product_check_size=100, seed=1):
+        self.products = products
+        self.product_check_size = product_check_size
+        self.seed = seed
+        self.user = None
+        self.vendor = None
+        self.product_group = None
+        self.product = None
+        self.product_list = None
+        self.product_check = None
+
+    def generate(self):
+        # the default config options exist on every installation
+        AppSettings.create_defaults()
+        self.user, _ = User.objects.get_or_create(username="query-budget", defaults={
+            "is_superuser": True,
+            "is_staff": True,
+        })
+        CatalogGenerator(
+            vendors=2,
+            products=self.products,
+            product_groups=4,
+            migration_chains=int(self.products / 10),
+            chain_length=3,
+            product_lists=5,
+            product_list_size=int(self.products / 10),
+            normalization_rules=10,
+            seed=self.seed
+        ).generate(user=self.user)
+
+        products = Product.objects.filter(tags__contains=CATALOG_TAG).order_by("id")
+        self.product = Product.objects.get(
+            id=ProductMigrationOption.objects.order_by("id").values_list("product_id", flat=True).first()
+        )
+        self.vendor = self.product.vendor
+        self.product_group = self.product.product_group
+        self.product_list = ProductList.objects.order_by("id").first()
+
+        # a second migration source for the Product to verify multiple migration paths
+        migration_source, _ = ProductMigrationSource.objects.get_or_create(name="Query Budget Migration Source")
+        ProductMigrationOption.objects.get_or_create(
+            product=self.product,
+            migration_source=migration_source,
+            defaults={"replacement_product_id": products.last().product_id}
+        )
+
+        input_product_ids = list(products.values_list("product_id", flat=True)[:self.product_check_size])
+        self.product_check = ProductCheck.objects.create(
+            name="Query Budget",
+            input_product_ids="\n".join(input_product_ids + ["unknown product %d" % e for e in range(10)])
+        )
+        self.product_check.perform_product_check()
+
+        return self
+
+
+class QueryRecorder:
+    """database execute wrapper that records the executed SQL statements with their call site"""
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((get_call_site(), sql))
+        return execute(sql, params, many, context)
+
+    def get_queries_by_call_site(self):
+        """returns an ordered dictionary with the call site as key and the SQL statements (with count) as value"""
+        result = OrderedDict()
+        for call_site, sql in self.queries:
+            statements = result.setdefault(call_site, OrderedDict())
+            statements[sql] = statements.get(sql, 0) + 1
+
+        return OrderedDict(sorted(result.items(), key=lambda e: sum(e[1].values()), reverse=True))
+
+    def format_report(self):
+        lines = []
+        for call_site, statements in self.get_queries_by_call_site().items():
+            lines.append("%4dx %s" % (sum(statements.values()), call_site))
+            for sql, count in statements.items():
+                lines.append("        %dx %s" % (count, sql))
+
+        return "\n".join(lines)
+
+
+def get_call_site():
+    """
+    returns the call site of the current query: the innermost frame within the project, the template line if the
+    query is triggered while rendering a template or the innermost frame outside of django.db if the query is executed
+    by a library (e.g. the session middleware)
+    """
+    library_call_site = None
+    # skip the execute wrapper
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename == __file__:
+            # reached the caller of the execute wrapper
+            break
+
+        if frame.f_code.co_name == "render_annotated":
+            node = frame.f_locals.get("self")
+            origin = getattr(node, "origin", None)
+            token = getattr(node, "token", None)
+            if origin is not None and token is not None:
+                return "%s:%d (template)" % (origin.template_name, token.lineno)
+
+        elif is_project_file(filename):
+            return format_frame(frame, os.path.relpath(filename, get_project_dir()))
+
+        elif library_call_site is None and not any([e in filename for e in DATABASE_LAYER_PATHS]):
+            library_call_site = format_frame(frame, filename.split("site-packages" + os.sep)[-1])
+
+        frame = frame.f_back
+
+    return library_call_site or "unknown"
+
+
+def format_frame(frame, filename):
+    return "%s:%d (%s)" % (filename, frame.f_lineno, frame.f_code.co_name)
+
+
+def get_project_dir():
+    return os.path.abspath(os.path.join(settings.BASE_DIR, ".."))
+
+
+def is_project_file(filename):
+    return filename.startswith(get_project_dir()) and "site-packages" not in filename
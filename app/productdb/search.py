@@ -0,0 +1,165 @@
+"""
+search query planner for the Product search (used by the API and the datatables endpoints)
+
+On PostgreSQL, the searchable Product columns are indexed with trigram GIN indexes (pg_trgm, see migration 0037).
+Simple search terms (plain strings and regular expressions that describe a literal string with optional anchors) are
+translated to ILIKE lookups that can use these indexes. All other regular expressions are executed as case-insensitive
+regex match, which is also supported by the trigram indexes. Other database backends use the existing lookups.
+"""
+import operator
+import re
+from functools import reduce
+from django.db import connection
+from django.db.models import Field, Q
+from django.db.models.lookups import IContains, IStartsWith, IEndsWith, IExact
+from rest_framework import filters
+from app.productdb.utils import is_valid_regex
+
+# characters with a special meaning within a regular expression (if not escaped)
+REGEX_META_CHARACTERS = set(".^$*+?{}[]|()\\")
+
+
+class TrigramLookupMixin:
+    """
+    use ILIKE on PostgreSQL (can use a trigram GIN index on the column, UPPER(...) LIKE UPPER(...) can't), the
+    behavior of the base lookup is used on all other database backends
+    """
+    fallback_lookup = None
+
+    def as_sql(self, compiler, connection):
+        return self.fallback_lookup(self.lhs, self.rhs).as_sql(compiler, connection)
+
+    def as_postgresql(self, compiler, connection):
+        lhs_sql, params = self.process_lhs(compiler, connection)
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+        params.extend(rhs_params)
+        return "%s::text ILIKE %s" % (lhs_sql, rhs_sql), params
+
+
+@Field.register_lookup
+class TrigramIContains(TrigramLookupMixin, IContains):
+    lookup_name = "trgm_icontains"
+    fallback_lookup = IContains
+
+
+@Field.register_lookup
+class TrigramIStartsWith(TrigramLookupMixin, IStartsWith):
+    lookup_name = "trgm_istartswith"
+    fallback_lookup = IStartsWith
+
+
+@Field.register_lookup
+class TrigramIEndsWith(TrigramLookupMixin, IEndsWith):
+    lookup_name = "trgm_iendswith"
+    fallback_lookup = IEndsWith
+
+
+@Field.register_lookup
+class TrigramIExact(TrigramLookupMixin, IExact):
+    lookup_name = "trgm_iexact"
+    fallback_lookup = IExact
+
+    def process_rhs(self, qn, connection):
+        rhs, params = super().process_rhs(qn, connection)
+        if self.rhs_is_direct_value() and params:
+            # ILIKE without wildcards (the value is not escaped by the base lookup on PostgreSQL)
+            params[0] = connection.ops.prep_for_like_query(params[0])
+        return rhs, params
+
+
+def get_regex_literal(regex_pattern):
+    """
+    returns a tuple with the literal string that is described by the given regular expression and a flag for the start
+    and end anchor (^ and $), None is returned if the expression contains any other special construct
+    """
+    anchored_start = regex_pattern.startswith("^")
+    if anchored_start:
+        regex_pattern = regex_pattern[1:]
+
+    anchored_end = False
+    if regex_pattern.endswith("$") and not re.search(r"(^|[^\\])(\\\\)*\\\$$", regex_pattern):
+        anchored_end = True
+        regex_pattern = regex_pattern[:-1]
+
+    literal = ""
+    escaped = False
+    for char in regex_pattern:
+        if escaped:
+            if char.isalnum() or char == "_":
+                # special sequence like \d or \w
+                return None
+            literal += char
+            escaped = False
+
+        elif char == "\\":
+            escaped = True
+
+        elif char in REGEX_META_CHARACTERS:
+            return None
+
+        else:
+            literal += char
+
+    if escaped or literal == "":
+        return None
+
+    return literal, anchored_start, anchored_end
+
+
+def plan_search(search_string, regex=True):
+    """
+    returns the name of the lookup and the value that should be used to search for the given string. If regex is
+    set, the search string is used as a regular expression (if valid), otherwise as a substring.
+    """
+    regex = regex and is_valid_regex(search_string)
+    if connection.vendor != "postgresql":
+        # fallback to the default behavior
+        return ("iregex" if regex else "icontains"), search_string
+
+    if not regex:
+        return "trgm_icontains", search_string
+
+    result = get_regex_literal(search_string)
+    if result is None:
+        return "iregex", search_string
+
+    literal, anchored_start, anchored_end = result
+    if anchored_start and anchored_end:
+        lookup = "trgm_iexact"
+
+    elif anchored_start:
+        lookup = "trgm_istartswith"
+
+    elif anchored_end:
+        lookup = "trgm_iendswith"
+
+    else:
+        lookup = "trgm_icontains"
+
+    return lookup, literal
+
+
+def get_search_query(field_names, search_string, regex=True):
+    """returns a Q object that matches all entries where at least one of the given fields matches the search string"""
+    lookup, value = plan_search(search_string, regex)
+    return reduce(operator.or_, [Q(**{"%s__%s" % (field_name, lookup): value}) for field_name in field_names])
+
+
+class TrigramSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter that uses the search query planner for regex search fields (prefixed with $), the search terms are
+    handled in the same way as within the SearchFilter (all terms must match at least one of the fields)
+    """
+    def filter_queryset(self, request, queryset, view):
+        search_fields = getattr(view, "search_fields", None)
+        search_terms = self.get_search_terms(request)
+
+        if connection.vendor != "postgresql" or not search_fields or not search_terms or \
+                not all([f.startswith("$") for f in search_fields]):
+            return super().filter_queryset(request, queryset, view)
+
+        field_names = [f[1:] for f in search_fields]
+        for search_term in search_terms:
+            queryset = queryset.filter(get_search_query(field_names, search_term, regex=True))
+
+        return queryset
@@ -1,6 +1,7 @@
 from rest_framework.serializers import HyperlinkedModelSerializer, BooleanField
 from rest_framework import serializers
 from rest_framework.serializers import ChoiceField, CharField, DecimalField, PrimaryKeyRelatedField
+from django.conf import settings
 from django.core.validators import MinValueValidator
 
 from app.config.models import NotificationMessage
@@ -189,6 +190,55 @@ class ProductSerializer(HyperlinkedModelSerializer):
         depth = 0
 
 
+class ProductBulkSerializer(ProductSerializer):
+    """
+    validation of a single entry of the bulk write endpoint (see app.productdb.bulk_upsert), the relations are
+    resolved for the entire batch, therefore they are validated as plain IDs
+    """
+    vendor = serializers.IntegerField(
+        required=False,
+        help_text="Vendor ID of the Product (part of the key of the entry)"
+    )
+
+    product_group = serializers.IntegerField(
+        required=False,
+        allow_null=True
+    )
+
+    def validate_product_group(self, value):
+        # verified together with the vendor of the Product
+        return value
+
+    class Meta(ProductSerializer.Meta):
+        fields = tuple([e for e in ProductSerializer.Meta.fields if e not in ("id", "url")])
+        # the unique constraint is used as key of the entries
+        validators = []
+
+
+class ProductLookupSerializer(serializers.Serializer):
+    """request of the bulk lookup of Products (see ProductViewSet.lookup)"""
+    product_ids = serializers.ListField(
+        child=CharField(max_length=512),
+        allow_empty=False,
+        help_text="Product IDs that should be resolved (exact match, case-insensitive if no exact match is found)"
+    )
+
+    vendor = PrimaryKeyRelatedField(
+        many=False,
+        queryset=Vendor.objects.all(),
+        required=False,
+        allow_null=True,
+        help_text="limit the lookup to the Products of the given Vendor ID"
+    )
+
+    def validate_product_ids(self, value):
+        if len(value) > settings.PDB_API_PRODUCT_LOOKUP_LIMIT:
+            raise serializers.ValidationError(
+                "Ensure this field has no more than %d elements." % settings.PDB_API_PRODUCT_LOOKUP_LIMIT
+            )
+        return value
+
+
 class ProductMigrationOptionSerializer(HyperlinkedModelSerializer):
     product = PrimaryKeyRelatedField(
         many=False,
@@ -1,12 +1,16 @@
 import logging
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db import transaction
 
+from app.config import task_metrics
 from app.config.models import NotificationMessage
 from app.productdb.excel_import import ProductsExcelImporter, InvalidImportFormatException, InvalidExcelFileFormat, \
     ProductMigrationsExcelImporter
 from app.productdb.models import JobFile, ProductCheck
-from django_project.celery import app, TaskState
+from app.productdb import migration_paths
+from app.productdb import product_statistics
+from django_project.celery import app, TaskState, TaskProgress
 import time
 
 logger = logging.getLogger("productdb")
@@ -17,6 +21,22 @@ def delete_all_product_checks():
     ProductCheck.objects.all().delete()
 
 
+@app.task(name="productdb.rebuild_migration_paths")
+def rebuild_migration_paths():
+    """the validity of a replacement depends on the current date, therefore the paths are recomputed periodically"""
+    return {
+        "status_message": "Migration paths recomputed (%d entries)" % migration_paths.rebuild_migration_paths()
+    }
+
+
+@app.task(name="productdb.refresh_product_statistics")
+def refresh_product_statistics():
+    """refresh the cached statistics of the homepage (executed periodically and after changes of the Products)"""
+    # changes during the refresh schedule a new refresh
+    cache.delete(product_statistics.REFRESH_SCHEDULED_CACHE_KEY)
+    product_statistics.refresh_product_statistics()
+
+
 @app.task(serializer="json", name="productdb.perform_product_check", bind=True)
 def perform_product_check(self, product_check_id):
     """
@@ -25,11 +45,11 @@ def perform_product_check(self, product_check_id):
     :param product_check_id:
     :return:
     """
-    def update_task_state(status_message):
+    progress = TaskProgress(self.request.id)
+
+    def update_task_state(status_message, current=None, total=None):
         """Update the status message of the task, which is displayed in the watch view"""
-        self.update_state(state=TaskState.PROCESSING, meta={
-            "status_message": status_message
-        })
+        progress.update(status_message, current=current, total=total)
 
     update_task_state("Load Product Check...")
 
@@ -48,7 +68,8 @@ def perform_product_check(self, product_check_id):
 
     update_task_state("Product Check in progress, please wait...")
 
-    product_check.perform_product_check()
+    entries = product_check.perform_product_check()
+    task_metrics.record_task_items(len(entries))
     result = {
         "status_message": "Product check successful finished."
     }
@@ -70,11 +91,11 @@ def import_product_migrations(self, job_file_id, user_for_revision=None):
     :param user_for_revision: username that should be used for the revision tracking (only if started manually)
     :return:
     """
-    def update_task_state(status_message):
+    progress = TaskProgress(self.request.id)
+
+    def update_task_state(status_message, current=None, total=None):
         """Update the status message of the task, which is displayed in the watch view"""
-        self.update_state(state=TaskState.PROCESSING, meta={
-            "status_message": status_message
-        })
+        progress.update(status_message, current=current, total=total)
 
     update_task_state("Try to import uploaded file...")
 
@@ -99,6 +120,7 @@ def import_product_migrations(self, job_file_id, user_for_revision=None):
         update_task_state("File valid, start updating the database...")
 
         import_product_migrations_excel.import_to_database(status_callback=update_task_state)
+        task_metrics.record_task_items(import_product_migrations_excel.amount_of_entries)
         update_task_state("Database import finished, processing results...")
 
         status_message = "<p style=\"text-align: left\">Product migrations successful updated</p>" \
@@ -136,19 +158,21 @@ def import_product_migrations(self, job_file_id, user_for_revision=None):
 
 
 @app.task(serializer='json', name="productdb.import_price_list", bind=True)
-def import_price_list(self, job_file_id, create_notification_on_server=True, update_only=False, user_for_revision=None):
+def import_price_list(self, job_file_id, create_notification_on_server=True, update_only=False, user_for_revision=None,
+                      bulk_mode=False):
     """
     import products from the given price list
     :param job_file_id: ID within the database that references the Excel file that should be imported
     :param create_notification_on_server: create a new Notification Message on the Server
     :param update_only: Don't create new products in the database, update only existing ones
     :param user_for_revision: username that should be used for the revision tracking (only if started manually)
+    :param bulk_mode: use the bulk import (all changes are written with bulk queries, faulty entries are not saved)
     """
-    def update_task_state(status_message):
+    progress = TaskProgress(self.request.id)
+
+    def update_task_state(status_message, current=None, total=None):
         """Update the status message of the task, which is displayed in the watch view"""
-        self.update_state(state=TaskState.PROCESSING, meta={
-            "status_message": status_message
-        })
+        progress.update(status_message, current=current, total=total)
 
     update_task_state("Try to import uploaded file...")
 
@@ -174,7 +198,10 @@ def import_price_list(self, job_file_id, create_notification_on_server=True, upd
 
         # if something goes wrong, rollback all changes
         with transaction.atomic():
-            import_products_excel.import_to_database(status_callback=update_task_state, update_only=update_only)
+            import_products_excel.import_to_database(status_callback=update_task_state, update_only=update_only,
+                                                     bulk_mode=bulk_mode)
+        task_metrics.record_task_items(import_products_excel.valid_imported_products +
+                                       import_products_excel.invalid_products)
 
         update_task_state("Database import finished, processing results...")
 
@@ -2,7 +2,10 @@
 Test suite for the productdb.api_views module
 """
 import base64
+import io
+import json
 import pytest
+from openpyxl import load_workbook
 from urllib.parse import quote
 import pytz
 
@@ -11,6 +14,8 @@ from django.utils.dateformat import DateFormat
 from django.utils.formats import get_format
 from django.conf import settings
 from django.contrib.auth.models import User, Permission
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils.datetime_safe import date, datetime
 from rest_framework import status
@@ -39,9 +44,13 @@ REST_VENDOR_LIST = reverse("productdb:vendors-list")
 REST_VENDOR_DETAIL = REST_VENDOR_LIST + "%d/"
 REST_PRODUCT_GROUP_LIST = reverse("productdb:productgroups-list")
 REST_PRODUCT_GROUP_COUNT = REST_PRODUCT_GROUP_LIST + "count/"
+REST_PRODUCT_GROUP_EXPORT = REST_PRODUCT_GROUP_LIST + "export/%s/"
 REST_PRODUCT_GROUP_DETAIL = REST_PRODUCT_GROUP_LIST + "%d/"
 REST_PRODUCT_LIST = reverse("productdb:products-list")
 REST_PRODUCT_COUNT = REST_PRODUCT_LIST + "count/"
+REST_PRODUCT_EXPORT = REST_PRODUCT_LIST + "export/%s/"
+REST_PRODUCT_LOOKUP = REST_PRODUCT_LIST + "lookup/"
+REST_PRODUCT_BULK = REST_PRODUCT_LIST + "bulk/"
 REST_PRODUCT_DETAIL = REST_PRODUCT_LIST + "%d/"
 REST_PRODUCTLIST_LIST = reverse("productdb:productlists-list")
 REST_PRODUCTLIST_DETAIL = REST_PRODUCTLIST_LIST + "%d/"
@@ -164,6 +173,46 @@ class TestCommonAPIEndpoint:
         response = client.get(REST_PRODUCT_LIST + "?page_size=1001")
         assert response.status_code == status.HTTP_400_BAD_REQUEST
 
+    def test_cursor_pagination(self):
+        for e in range(1, 50):
+            models.Product.objects.create(product_id="Foo %s" % e)
+        expected_ids = list(models.Product.objects.order_by("id").values_list("id", flat=True))
+
+        client = APIClient()
+        client.login(**AUTH_USER)
+
+        # walk through all entries, the total amount of records is only computed on request
+        response = client.get(REST_PRODUCT_LIST + "?cursor=&page_size=20&include_total=true")
+        assert response.status_code == status.HTTP_200_OK
+        jdata = response.json()
+        assert jdata["pagination"]["total_records"] == 50
+        assert jdata["pagination"]["page_records"] == 20
+        assert jdata["pagination"]["page"] is None
+        assert jdata["pagination"]["url"]["previous"] is None
+        assert "include_total=true" in jdata["pagination"]["url"]["next"]
+
+        ids = [e["id"] for e in jdata["data"]]
+        while jdata["pagination"]["url"]["next"]:
+            response = client.get(jdata["pagination"]["url"]["next"].replace("&include_total=true", ""))
+            assert response.status_code == status.HTTP_200_OK
+            jdata = response.json()
+            assert jdata["pagination"]["total_records"] is None
+            ids += [e["id"] for e in jdata["data"]]
+
+        assert jdata["pagination"]["page_records"] == 10
+        assert ids == expected_ids, "all entries should be returned once, ordered by the ID"
+
+        # cursor pagination together with filters
+        response = client.get(REST_PRODUCT_LIST + "?cursor=&product_id=Foo 1")
+        assert response.status_code == status.HTTP_200_OK
+        assert [e["product_id"] for e in response.json()["data"]] == ["Foo 1"]
+
+        response = client.get(REST_PRODUCT_LIST + "?cursor=invalid")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        response = client.get(REST_PRODUCT_LIST + "?cursor=&page_size=1001")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
     def test_http_basic_authentication(self):
         for e in range(1, 50):
             models.Product.objects.create(product_id="Foo %s" % e)
@@ -1169,6 +1218,34 @@ class TestProductGroupAPIEndpoint:
         assert response.status_code == status.HTTP_200_OK
         assert response.json() == {'count': 3}
 
+    def test_export_endpoint(self):
+        models.ProductGroup.objects.create(name="product group 1", vendor=Vendor.objects.get(id=1))
+        models.ProductGroup.objects.create(name="product group 2")
+
+        client = APIClient()
+        client.login(**AUTH_USER)
+        response = client.get(REST_PRODUCT_GROUP_EXPORT % "csv")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        assert response["Content-Disposition"] == "attachment; filename=\"product_groups.csv\""
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        assert lines[0] == "id;vendor;name"
+        assert [e.split(";")[1:] for e in lines[1:]] == [
+            ["Cisco Systems", "product group 1"],
+            ["unassigned", "product group 2"]
+        ]
+
+        # same filter and search parameters as the list endpoint
+        response = client.get(REST_PRODUCT_GROUP_EXPORT % "ndjson" + "?search=" + quote("group 2$"))
+
+        assert response.status_code == status.HTTP_200_OK
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        assert [json.loads(e)["name"] for e in lines] == ["product group 2"]
+
+        response = client.get(REST_PRODUCT_GROUP_LIST + "export/pdf/")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
     def test_search_field(self):
         expected_result = {
             "pagination": {
@@ -1743,6 +1820,207 @@ class TestProductAPIEndpoint:
         assert response.status_code == status.HTTP_200_OK
         assert response.json() == {'count': 3}
 
+    def test_export_endpoint(self):
+        v1 = Vendor.objects.get(id=1)
+        models.Product.objects.create(product_id="product 1", vendor=v1, list_price=12.5, currency="USD")
+        models.Product.objects.create(
+            product_id="product 2",
+            vendor=v1,
+            eox_update_time_stamp=date(2016, 1, 1),
+            eol_ext_announcement_date=date(2016, 1, 1),
+            end_of_sale_date=date(2016, 1, 2),
+            end_of_support_date=date(2016, 1, 3)
+        )
+        models.Product.objects.create(product_id="product 3")
+
+        client = APIClient()
+        client.login(**AUTH_USER)
+        response = client.get(REST_PRODUCT_EXPORT % "ndjson")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        assert response["Content-Type"] == "application/x-ndjson"
+        jdata = [json.loads(e) for e in b"".join(response.streaming_content).decode().splitlines()]
+        assert [e["product_id"] for e in jdata] == ["product 1", "product 2", "product 3"]
+        assert jdata[0]["vendor"] == "Cisco Systems"
+        assert jdata[0]["list_price"] == 12.5
+        assert jdata[1]["lifecycle_state"] == Product.END_OF_SUPPORT_STR
+        assert jdata[1]["end_of_sale_date"] == "2016-01-02"
+
+        # same filter and search parameters as the list endpoint
+        response = client.get(REST_PRODUCT_EXPORT % "csv" + "?vendor__id=1&lifecycle_state=" +
+                              quote(Product.END_OF_SUPPORT_STR))
+
+        assert response.status_code == status.HTTP_200_OK
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        assert lines[0].startswith("id;vendor;product_id;product_group;")
+        assert [e.split(";")[2] for e in lines[1:]] == ["product 2"]
+
+        response = client.get(REST_PRODUCT_EXPORT % "xlsx" + "?search=" + quote("^product [13]$"))
+
+        assert response.status_code == status.HTTP_200_OK
+        workbook = load_workbook(io.BytesIO(b"".join(response.streaming_content)), read_only=True)
+        rows = list(workbook.active.iter_rows(values_only=True))
+        assert rows[0][:3] == ("id", "vendor", "product_id")
+        assert [e[2] for e in rows[1:]] == ["product 1", "product 3"]
+
+    def test_lookup_endpoint(self):
+        models.Product.objects.create(product_id="product 1")
+        models.Product.objects.create(product_id="Product 2")
+        models.Product.objects.create(product_id="product 3", vendor=Vendor.objects.get(id=1))
+
+        client = APIClient()
+        client.login(**AUTH_USER)
+        response = client.post(REST_PRODUCT_LOOKUP, {
+            "product_ids": ["product 3", "product 1", "product 2", "unknown", "product 1"]
+        }, format="json")
+
+        assert response.status_code == status.HTTP_200_OK
+        jdata = response.json()
+        assert [e["product_id"] for e in jdata["products"]] == ["product 3", "product 1", "Product 2"]
+        assert jdata["products"][0]["url"] == "http://testserver/productdb/api/v1/products/%d/" % \
+            Product.objects.get(product_id="product 3").id
+        assert jdata["missing"] == ["unknown"]
+
+        # limited to a vendor
+        response = client.post(REST_PRODUCT_LOOKUP, {
+            "product_ids": ["product 1", "product 3"],
+            "vendor": 1
+        }, format="json")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [e["product_id"] for e in response.json()["products"]] == ["product 3"]
+        assert response.json()["missing"] == ["product 1"]
+
+    def test_lookup_endpoint_with_mixed_case_duplicates(self):
+        p = models.Product.objects.create(product_id="abc")
+
+        client = APIClient()
+        client.login(**AUTH_USER)
+        response = client.post(REST_PRODUCT_LOOKUP, {
+            "product_ids": ["abc", "ABC", "Abc"]
+        }, format="json")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [e["id"] for e in response.json()["products"]] == [p.id]
+        assert response.json()["missing"] == []
+
+    def test_lookup_endpoint_streams_large_results(self):
+        Product.objects.bulk_create([
+            Product(product_id="product %d" % e, vendor=Vendor.objects.get(id=1)) for e in range(600)
+        ])
+
+        client = APIClient()
+        client.login(**AUTH_USER)
+        response = client.post(REST_PRODUCT_LOOKUP, {
+            "product_ids": ["product %d" % e for e in range(605)]
+        }, format="json")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        jdata = json.loads(b"".join(response.streaming_content).decode())
+        assert len(jdata["products"]) == 600
+        assert jdata["missing"] == ["product %d" % e for e in range(600, 605)]
+
+    def test_lookup_endpoint_with_invalid_request(self, settings):
+        settings.PDB_API_PRODUCT_LOOKUP_LIMIT = 2
+        client = APIClient()
+        client.login(**AUTH_USER)
+
+        response = client.post(REST_PRODUCT_LOOKUP, {"product_ids": []}, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = client.post(REST_PRODUCT_LOOKUP, {"product_ids": ["a", "b", "c"]}, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json() == {"product_ids": ["Ensure this field has no more than 2 elements."]}
+
+    def test_bulk_endpoint_requires_add_and_change_permission(self):
+        u = User.objects.create_user("user", "", "user")
+        u.user_permissions.add(Permission.objects.get(codename="add_product"))
+
+        client = APIClient()
+        client.login(username="user", password="user")
+        response = client.post(REST_PRODUCT_BULK, {"products": [{"product_id": "product"}]}, format="json")
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert Product.objects.count() == 0
+
+    def test_bulk_endpoint(self):
+        v = Vendor.objects.get(id=1)
+        pg = ProductGroup.objects.create(name="group", vendor=v)
+        Product.objects.create(product_id="existing", vendor=v, list_price=10.00)
+        Product.objects.create(product_id="unchanged", vendor=v, description="description")
+        Product.objects.filter(product_id="existing").update(update_timestamp=date(2019, 1, 1))
+
+        client = APIClient()
+        client.login(**SUPER_USER)
+        response = client.post(REST_PRODUCT_BULK, {"products": [
+            {"product_id": "new", "vendor": v.id, "list_price": "5.00", "product_group": pg.id},
+            {"product_id": "existing", "vendor": v.id, "description": "changed"},
+            {"product_id": "unchanged", "vendor": v.id, "description": "description"},
+            {"product_id": "new", "vendor": v.id},
+            {"product_id": "invalid price", "vendor": v.id, "list_price": "-1"},
+            {"product_id": "invalid vendor", "vendor": 9999},
+            {"description": "no product id"},
+        ]}, format="json")
+
+        assert response.status_code == status.HTTP_200_OK, response.content.decode()
+        results = response.json()["results"]
+        assert [e["status"] for e in results] == [
+            "created", "updated", "unchanged", "error", "error", "error", "error"
+        ]
+        new_product = Product.objects.get(product_id="new", vendor=v)
+        assert results[0]["id"] == new_product.id
+        assert new_product.product_group == pg
+        assert new_product.list_price_timestamp is not None
+        assert "list_price" in results[4]["errors"]
+        assert "vendor" in results[5]["errors"]
+        assert "product_id" in results[6]["errors"]
+
+        # same timestamp semantic as Product.save
+        existing = Product.objects.get(product_id="existing", vendor=v)
+        assert existing.description == "changed"
+        assert existing.update_timestamp == datetime.today().date()
+        assert Product.objects.filter(product_id__in=["invalid price", "invalid vendor"]).count() == 0
+
+        # update only
+        response = client.post(REST_PRODUCT_BULK, {"update_only": True, "products": [
+            {"product_id": "another new", "vendor": v.id},
+            {"product_id": "existing", "vendor": v.id, "list_price": "12.00"},
+        ]}, format="json")
+
+        assert [e["status"] for e in response.json()["results"]] == ["error", "updated"]
+        assert Product.objects.get(product_id="existing", vendor=v).list_price == 12
+
+    def test_bulk_endpoint_query_count_is_independent_of_the_batch_size(self):
+        client = APIClient()
+        client.login(**SUPER_USER)
+
+        query_counts = []
+        for amount in [5, 30]:
+            with CaptureQueriesContext(connection) as context:
+                response = client.post(REST_PRODUCT_BULK, {"products": [
+                    {"product_id": "product %d-%d" % (amount, e), "vendor": 1, "list_price": "1.00"}
+                    for e in range(amount)
+                ]}, format="json")
+
+            assert response.status_code == status.HTTP_200_OK
+            query_counts.append(len(context.captured_queries))
+
+        assert query_counts[0] == query_counts[1]
+
+    def test_bulk_endpoint_with_invalid_request(self, settings):
+        settings.PDB_API_PRODUCT_BULK_LIMIT = 1
+        client = APIClient()
+        client.login(**SUPER_USER)
+
+        response = client.post(REST_PRODUCT_BULK, {"products": "product"}, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = client.post(REST_PRODUCT_BULK, {"products": [{"product_id": "a"}, {"product_id": "b"}]}, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert Product.objects.count() == 0
+
     def test_search_field_by_product_id(self):
         expected_result = {
             "pagination": {
@@ -2473,6 +2751,31 @@ class TestProductAPIEndpoint:
         assert jdata["pagination"]["total_records"] == 1, "Expect a single entry in the result"
         assert jdata == expected_result, "unexpected result from API endpoint"
 
+    def test_filter_lifecycle_state_field(self):
+        today = date.today()
+        models.Product.objects.create(product_id="A")
+        models.Product.objects.create(product_id="B", eox_update_time_stamp=today)
+        models.Product.objects.create(product_id="C", eox_update_time_stamp=today, eol_ext_announcement_date=today,
+                                      end_of_sale_date=today)
+
+        client = APIClient()
+        client.login(**AUTH_USER)
+
+        response = client.get(REST_PRODUCT_LIST + "?lifecycle_state=%s" % models.Product.END_OF_SALE_STR)
+        assert response.status_code == status.HTTP_200_OK
+
+        jdata = response.json()
+        assert jdata["pagination"]["total_records"] == 1, "Expect a single entry in the result"
+        assert jdata["data"][0]["product_id"] == "C"
+
+        response = client.get(REST_PRODUCT_LIST + "?lifecycle_state=%s" % models.Product.NO_EOL_ANNOUNCEMENT_STR)
+        assert response.status_code == status.HTTP_200_OK
+        assert [e["product_id"] for e in response.json()["data"]] == ["B"]
+
+        # invalid lifecycle state
+        response = client.get(REST_PRODUCT_LIST + "?lifecycle_state=invalid")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
 
 @pytest.mark.usefixtures("import_default_users")
 @pytest.mark.usefixtures("import_default_vendors")
@@ -2869,6 +3172,64 @@ class TestProductIdNormalizationRuleAPIEndpoint:
         }
         assert response.json() == expected_result
 
+    def test_apply_function_uses_the_priority(self):
+        v1 = Vendor.objects.get(id=1)
+        ProductIdNormalizationRule.objects.create(vendor=v1, product_id="A", regex_match=r"^PWR", priority=600)
+        pnr = ProductIdNormalizationRule.objects.create(vendor=v1, product_id="B", regex_match=r"^PWR", priority=100)
+
+        client = APIClient()
+        client.login(**AUTH_USER)
+        response = client.get(REST_PRODUCTNORMALIZATIONRULE_LIST + "apply/?input_string=PWR-1&vendor_name=Cisco")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["matched_rule_id"] == pnr.id
+        assert response.json()["product_id"] == "B"
+
+    def test_apply_batch_function(self):
+        v1 = Vendor.objects.get(id=1)
+        pnr = ProductIdNormalizationRule.objects.create(
+            vendor=v1,
+            product_id="PWR-%sWAC=",
+            regex_match=r"^PWR\-(\d+)WAC$"
+        )
+        p = Product.objects.create(product_id="PWR-123WAC=", vendor=v1)
+        api_url = REST_PRODUCTNORMALIZATIONRULE_LIST + "apply/batch/"
+
+        client = APIClient()
+        client.login(**AUTH_USER)
+
+        response = client.post(api_url, {"vendor": 1}, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = client.post(api_url, {"input_strings": ["PWR-123WAC"], "vendor": 9999}, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = client.post(api_url, {
+            "input_strings": ["PWR-123WAC", "PWR-456WAC", "Test", "PWR-123WAC"],
+            "vendor_name": "Cisco"
+        }, format="json")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {
+            "vendor_id": 1,
+            "results": [
+                {"input_string": "PWR-123WAC", "product_id": "PWR-123WAC=", "product_in_database": p.id,
+                 "matched_rule_id": pnr.id},
+                {"input_string": "PWR-456WAC", "product_id": "PWR-456WAC=", "product_in_database": None,
+                 "matched_rule_id": pnr.id},
+                {"input_string": "Test", "product_id": "Test", "product_in_database": None,
+                 "matched_rule_id": None},
+                {"input_string": "PWR-123WAC", "product_id": "PWR-123WAC=", "product_in_database": p.id,
+                 "matched_rule_id": pnr.id},
+            ]
+        }
+
+        # the rule set is loaded again after a change of the rules
+        pnr.product_id = "PWR-%s"
+        pnr.save()
+        response = client.post(api_url, {"input_strings": ["PWR-456WAC"], "vendor": 1}, format="json")
+        assert response.json()["results"][0]["product_id"] == "PWR-456"
+
 
 @pytest.mark.usefixtures("import_default_users")
 @pytest.mark.usefixtures("import_default_vendors")
@@ -0,0 +1,49 @@
+"""
+Test suite for the productdb.bulk_writer module
+"""
+import pytest
+from datetime import date
+from app.productdb.bulk_writer import ProductBulkWriter
+from app.productdb.models import Product, Vendor
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.mark.usefixtures("import_default_vendors")
+class TestProductBulkWriter:
+    def test_update_writes_only_the_changed_fields(self):
+        v = Vendor.objects.get(id=1)
+        Product.objects.create(product_id="price", vendor=v, list_price=10.00)
+        Product.objects.create(product_id="description", vendor=v, list_price=20.00)
+        Product.objects.create(product_id="state sync", vendor=v)
+        Product.objects.all().update(update_timestamp=date(2019, 1, 1), list_price_timestamp=date(2019, 1, 1))
+
+        writer = ProductBulkWriter()
+        products = writer.load_products(v.id, ["price", "description", "state sync"])
+
+        # changed by another process after the Products were loaded
+        Product.objects.filter(product_id="description").update(list_price=25.00)
+
+        products["price"].list_price = 12.00
+        writer.update(products["price"], ["list_price"])
+        products["description"].description = "changed"
+        writer.update(products["description"], ["description"])
+        products["state sync"].lc_state_sync = True
+        writer.update(products["state sync"], ["lc_state_sync"])
+        assert writer.save() == (0, 3)
+
+        p = Product.objects.get(product_id="price")
+        assert p.list_price == 12.00
+        assert p.list_price_timestamp == date.today()
+        assert p.update_timestamp == date.today()
+
+        p = Product.objects.get(product_id="description")
+        assert p.description == "changed"
+        assert p.list_price == 25.00
+        assert p.list_price_timestamp == date(2019, 1, 1)
+        assert p.update_timestamp == date.today()
+
+        # same as Product.save, the update timestamp is not changed by the state sync
+        p = Product.objects.get(product_id="state sync")
+        assert p.lc_state_sync is True
+        assert p.update_timestamp == date(2019, 1, 1)
@@ -1,6 +1,7 @@
 """
 Test suite for the productdb.datatables module
 """
+import datetime
 import pytest
 from urllib.parse import quote
 from django.contrib.auth.models import User
@@ -235,6 +236,38 @@ def test_datatables_search_on_list_products_view():
     assert result_json["recordsFiltered"] == 1
 
 
+@pytest.mark.usefixtures("import_default_users")
+@pytest.mark.usefixtures("import_default_vendors")
+def test_datatables_lifecycle_state_on_list_products_view():
+    today = datetime.date.today()
+    uv = Vendor.objects.get(id=0)
+    models.Product.objects.create(product_id="eol", vendor=uv, eox_update_time_stamp=today,
+                                  eol_ext_announcement_date=today, end_of_sale_date=today, end_of_support_date=today)
+    models.Product.objects.create(product_id="no eol", vendor=uv, eox_update_time_stamp=today)
+    models.Product.objects.create(product_id="eos", vendor=uv, eox_update_time_stamp=today,
+                                  eol_ext_announcement_date=today, end_of_sale_date=today)
+    url = reverse('productdb:datatables_list_products_view')
+
+    client = Client()
+    client.login(**AUTH_USER)
+
+    # filter by the lifecycle state column
+    response = client.get(url + "?" + quote("columns[6][search][value]") + "=" + quote("end of"))
+    assert response.status_code == status.HTTP_200_OK
+
+    result_json = response.json()
+    assert result_json["recordsFiltered"] == 2
+    assert sorted([e["product_id"] for e in result_json["data"]]) == ["eol", "eos"]
+
+    # order by the lifecycle state column
+    response = client.get(url + "?" + quote("order[0][column]") + "=6&" + quote("order[0][dir]") + "=desc")
+    assert response.status_code == status.HTTP_200_OK
+
+    result_json = response.json()
+    assert [e["product_id"] for e in result_json["data"]] == ["eol", "eos", "no eol"]
+    assert result_json["data"][0]["lifecycle_state"] == [models.Product.END_OF_SUPPORT_STR]
+
+
 @pytest.mark.usefixtures("import_default_users")
 @pytest.mark.usefixtures("import_default_vendors")
 def test_datatables_search_on_list_product_groups_view():
@@ -528,3 +561,42 @@ def test_list_products_json_datatables_endpoint():
     assert "recordsFiltered" in result_json
 
     assert result_json["data"][0]["list_price"] == 12.34
+
+
+@pytest.mark.usefixtures("import_default_vendors")
+def test_list_products_export_datatables_endpoint(django_assert_num_queries):
+    v1 = Vendor.objects.get(name="Cisco Systems")
+    pg = models.ProductGroup.objects.create(name="group", vendor=v1)
+    for e in range(1, 25):
+        models.Product.objects.create(product_id="id %s" % e, vendor=v1, product_group=pg if e % 2 == 0 else None)
+
+    client = Client()  # no login required to access the endpoint
+
+    # search, column search and ordering of the table are applied, the pagination is ignored
+    url = reverse('productdb:datatables_list_products_export', kwargs={"export_format": "csv"}) + "?" + "&".join([
+        quote("search[value]") + "=" + quote("id 1"),
+        quote("columns[2][search][value]") + "=group",
+        quote("order[0][column]") + "=1",
+        quote("order[0][dir]") + "=desc",
+        "length=1",
+    ])
+    response = client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert response["Content-Disposition"] == "attachment; filename=\"products.csv\""
+    with django_assert_num_queries(1):
+        lines = b"".join(response.streaming_content).decode().splitlines()
+
+    assert [e.split(";")[2] for e in lines[1:]] == ["id 18", "id 16", "id 14", "id 12", "id 10"]
+
+    url = reverse('productdb:datatables_list_products_by_group_export', kwargs={
+        "product_group_id": pg.id,
+        "export_format": "ndjson"
+    })
+    response = client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert len(b"".join(response.streaming_content).decode().splitlines()) == 12
+
+    url = reverse('productdb:datatables_list_product_groups_export', kwargs={"export_format": "ndjson"})
+    response = client.get(url + "?" + quote("search[value]") + "=cisco")
+    assert response.status_code == status.HTTP_200_OK
+    assert b"".join(response.streaming_content).decode() == '{"id": %d, "vendor": "Cisco Systems", "name": "group"}\n' % pg.id
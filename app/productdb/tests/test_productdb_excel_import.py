@@ -6,6 +6,8 @@ import pandas as pd
 import pytest
 import datetime
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from app.productdb.excel_import import ProductsExcelImporter, InvalidImportFormatException, InvalidExcelFileFormat, \
     ProductMigrationsExcelImporter
 from app.productdb import models
@@ -579,6 +581,236 @@ class TestProductsExcelImporter:
         assert exinfo.match("No such file or directory:")
 
 
+@pytest.mark.usefixtures("import_default_users")
+@pytest.mark.usefixtures("import_default_vendors")
+class TestBulkProductsExcelImporter:
+    @staticmethod
+    def create_product_data(amount, list_price="10.00", product_group="Group A"):
+        return pd.DataFrame(
+            [
+                [
+                    "Product %d" % e,
+                    "description of Product %d" % e,
+                    list_price,
+                    "USD",
+                    "Cisco Systems",
+                    product_group,
+                    datetime.datetime(2016, 1, 3),
+                    ""
+                ] for e in range(0, amount)
+            ], columns=[
+                "product id",
+                "description",
+                "list price",
+                "currency",
+                "vendor",
+                "product group",
+                "end of sale date",
+                "tags"
+            ]
+        )
+
+    @pytest.mark.usefixtures("apply_base_import_products_excel_file_mock")
+    def test_valid_bulk_import(self):
+        global CURRENT_PRODUCT_TEST_DATA
+        CURRENT_PRODUCT_TEST_DATA = DEFAULT_PRODUCT_TEST_DATA.copy()
+        product_file = ProductsExcelImporter("virtual_file.xlsx")
+        product_file.verify_file()
+        product_file.import_to_database(bulk_mode=True)
+
+        assert Product.objects.count() == 2
+        assert product_file.valid_imported_products == 2
+        assert product_file.invalid_products == 0
+        assert product_file.import_result_messages == [
+            "product <code>Product A</code> created",
+            "product <code>Product B</code> created"
+        ]
+
+        p = Product.objects.get(product_id="Product A")
+        assert p.description == "description of Product A"
+        assert p.list_price == 4000.0
+        assert p.currency == "USD"
+        assert p.vendor == Vendor.objects.get(id=1)
+        assert p.eox_update_time_stamp == datetime.date(2016, 1, 1)
+        assert p.eol_ext_announcement_date == datetime.date(2016, 1, 2)
+        assert p.end_of_sale_date == datetime.date(2016, 1, 3)
+        assert p.end_of_new_service_attachment_date == datetime.date(2016, 1, 4)
+        assert p.end_of_sw_maintenance_date == datetime.date(2016, 1, 5)
+        assert p.end_of_routine_failure_analysis == datetime.date(2016, 1, 6)
+        assert p.end_of_service_contract_renewal == datetime.date(2016, 1, 7)
+        assert p.end_of_support_date == datetime.date(2016, 1, 8)
+        assert p.end_of_sec_vuln_supp_date == datetime.date(2016, 1, 9)
+        assert p.internal_product_id == "12345"
+        assert p.tags == "chassis"
+        assert p.update_timestamp == datetime.date.today()
+        assert p.list_price_timestamp == datetime.date.today()
+
+        p = Product.objects.get(product_id="Product B")
+        assert p.list_price == 6000.0
+        assert p.end_of_sale_date is None
+        assert p.internal_product_id == ""
+        assert p.tags == ""
+
+        # second import without changes
+        product_file.import_to_database(bulk_mode=True)
+        assert Product.objects.count() == 2
+        assert product_file.valid_imported_products == 0
+        assert product_file.import_result_messages == [
+            "<i>no changes for product <code>Product A</code> required</i>",
+            "<i>no changes for product <code>Product B</code> required</i>"
+        ]
+
+    @pytest.mark.usefixtures("apply_base_import_products_excel_file_mock")
+    def test_bulk_import_of_existing_products(self):
+        global CURRENT_PRODUCT_TEST_DATA
+        CURRENT_PRODUCT_TEST_DATA = self.create_product_data(3)
+        v = Vendor.objects.get(id=1)
+        Product.objects.create(product_id="Product 0", vendor=v, list_price=10.0, tags="foo")
+        Product.objects.create(product_id="Product 1", vendor=v, list_price=5.0,
+                               product_group=ProductGroup.objects.create(name="Group A", vendor=v))
+        pmo = ProductMigrationOption.objects.create(
+            product=Product.objects.create(product_id="Product X", vendor=v),
+            migration_source=ProductMigrationSource.objects.create(name="Source"),
+            replacement_product_id="Product 2"
+        )
+        assert pmo.replacement_db_product is None
+
+        product_file = ProductsExcelImporter("virtual_file.xlsx")
+        product_file.verify_file()
+        product_file.import_to_database(update_only=True, bulk_mode=True)
+
+        assert Product.objects.count() == 3, "no Product should be created in update only mode"
+        assert product_file.import_result_messages == [
+            "product <code>Product 0</code> updated",
+            "product <code>Product 1</code> updated"
+        ]
+        assert ProductGroup.objects.count() == 1
+        p = Product.objects.get(product_id="Product 0")
+        assert p.product_group.name == "Group A"
+        assert p.tags == ""
+        assert p.end_of_sale_date == datetime.date(2016, 1, 3)
+        p = Product.objects.get(product_id="Product 1")
+        assert p.list_price == 10.0
+        assert p.list_price_timestamp == datetime.date.today()
+
+        product_file.import_to_database(bulk_mode=True)
+        assert Product.objects.count() == 4
+        assert product_file.import_result_messages[-1] == "product <code>Product 2</code> created"
+
+        # the relation of the Product Migration Option is updated for the new Product
+        pmo.refresh_from_db()
+        assert pmo.replacement_db_product == Product.objects.get(product_id="Product 2")
+
+    @pytest.mark.usefixtures("apply_base_import_products_excel_file_mock")
+    def test_bulk_import_with_faulty_entries(self):
+        global CURRENT_PRODUCT_TEST_DATA
+        CURRENT_PRODUCT_TEST_DATA = self.create_product_data(3)
+        CURRENT_PRODUCT_TEST_DATA.loc[0, "list price"] = "invalid"
+        CURRENT_PRODUCT_TEST_DATA.loc[1, "currency"] = "XYZ"
+        CURRENT_PRODUCT_TEST_DATA.loc[2, "end of sale date"] = "invalid"
+        v = Vendor.objects.get(id=1)
+        Product.objects.create(product_id="Product 0", vendor=v, description="unchanged")
+
+        product_file = ProductsExcelImporter("virtual_file.xlsx")
+        product_file.verify_file()
+        product_file.import_to_database(bulk_mode=True)
+
+        assert product_file.invalid_products == 3
+        assert product_file.valid_imported_products == 0
+        assert product_file.import_result_messages == [
+            "cannot set list price for <code>Product 0</code> (could not convert string to float: 'invalid')",
+            "cannot set currency for <code>Product 1</code> (cannot set currency unknown value XYZ)",
+            "cannot set end of sale date for <code>Product 2</code> (invalid date value)",
+        ]
+        assert Product.objects.count() == 1, "faulty entries are not written to the database"
+        assert Product.objects.get(product_id="Product 0").description == "unchanged"
+
+    @pytest.mark.usefixtures("apply_base_import_products_excel_file_mock")
+    def test_bulk_import_has_the_same_result_as_the_import_per_entry(self):
+        global CURRENT_PRODUCT_TEST_DATA
+        data = self.create_product_data(3)
+        # duplicate entries within the file, the last value wins
+        data.loc[3] = data.loc[1]
+        data.loc[3, "description"] = "changed description of Product 1"
+        data.loc[3, "end of sale date"] = datetime.datetime(2017, 1, 1)
+        data.loc[4] = data.loc[2]
+        # date strings are not accepted
+        data["end of sale date"] = data["end of sale date"].astype(object)
+        data.loc[5] = data.loc[0]
+        data.loc[5, "end of sale date"] = "2016-01-05"
+        CURRENT_PRODUCT_TEST_DATA = data
+
+        results = []
+        messages = []
+        for bulk_mode in [False, True]:
+            Product.objects.all().delete()
+            product_file = ProductsExcelImporter("virtual_file.xlsx")
+            product_file.verify_file()
+            product_file.import_to_database(bulk_mode=bulk_mode)
+
+            results.append((
+                product_file.valid_imported_products,
+                product_file.invalid_products,
+                list(Product.objects.order_by("product_id").values_list(
+                    "product_id", "description", "list_price", "end_of_sale_date", "product_group__name"
+                ))
+            ))
+            messages.append(product_file.import_result_messages)
+
+        assert results[0] == results[1]
+        valid_imported_products, invalid_products, products = results[1]
+        assert valid_imported_products == 4
+        assert invalid_products == 1
+        assert messages[1] == [
+            "product <code>Product 0</code> created",
+            "product <code>Product 1</code> created",
+            "product <code>Product 2</code> created",
+            "product <code>Product 1</code> updated",
+            "<i>no changes for product <code>Product 2</code> required</i>",
+            "cannot set end of sale date for <code>Product 0</code> (invalid date value)",
+        ]
+        # the import per entry reports the (unchanged) faulty entry in addition
+        assert messages[0] == messages[1][:5] + [
+            "<i>no changes for product <code>Product 0</code> required</i>",
+            "cannot set end of sale date for <code>Product 0</code> (invalid date value)",
+        ]
+        assert products[1] == (
+            "Product 1", "changed description of Product 1", 10.0, datetime.date(2017, 1, 1), "Group A"
+        )
+        assert products[0][3] == datetime.date(2016, 1, 3)
+
+    @pytest.mark.usefixtures("apply_base_import_products_excel_file_mock")
+    def test_bulk_import_with_unknown_vendor(self):
+        global CURRENT_PRODUCT_TEST_DATA
+        CURRENT_PRODUCT_TEST_DATA = self.create_product_data(3)
+        CURRENT_PRODUCT_TEST_DATA.loc[2, "vendor"] = "FooBar Unknown"
+
+        product_file = ProductsExcelImporter("virtual_file.xlsx")
+        product_file.verify_file()
+        with pytest.raises(Exception) as exinfo:
+            product_file.import_to_database(bulk_mode=True)
+
+        assert exinfo.match("unknown vendor 'FooBar Unknown'")
+        assert Product.objects.count() == 0
+
+    @pytest.mark.usefixtures("apply_base_import_products_excel_file_mock")
+    def test_bulk_import_query_count_is_independent_of_the_amount_of_entries(self):
+        global CURRENT_PRODUCT_TEST_DATA
+        ProductGroup.objects.create(name="Group A", vendor=Vendor.objects.get(id=1))
+        query_counts = []
+        for amount in [5, 30]:
+            Product.objects.all().delete()
+            CURRENT_PRODUCT_TEST_DATA = self.create_product_data(amount)
+            product_file = ProductsExcelImporter("virtual_file.xlsx")
+            product_file.verify_file()
+            with CaptureQueriesContext(connection) as context:
+                product_file.import_to_database(bulk_mode=True)
+
+            assert Product.objects.count() == amount
+            query_counts.append(len(context.captured_queries))
+
+        assert query_counts[0] == query_counts[1]
+
 @pytest.mark.usefixtures("import_default_users")
 @pytest.mark.usefixtures("import_default_vendors")
 class TestProductMigrationExcelImporter:
@@ -0,0 +1,91 @@
+"""
+Test suite for the productdb management commands
+"""
+import json
+import pytest
+from io import StringIO
+from django.core.management import call_command
+from app.productdb import models
+from app.productdb.benchmark import Benchmark
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.mark.usefixtures("import_default_vendors")
+class TestRebuildMigrationPathsCommand:
+    def test_call(self):
+        pms = models.ProductMigrationSource.objects.create(name="Group One")
+        p = models.Product.objects.create(product_id="p1", vendor=models.Vendor.objects.get(id=1))
+        models.ProductMigrationOption.objects.create(product=p, migration_source=pms, replacement_product_id="r1")
+        models.ProductMigrationPath.objects.all().delete()
+
+        out = StringIO()
+        call_command("rebuildmigrationpaths", stdout=out)
+
+        assert out.getvalue() == "Migration paths recomputed (1 entries)\n"
+        assert p.get_preferred_replacement_option().replacement_product_id == "r1"
+
+
+@pytest.mark.usefixtures("import_default_vendors")
+@pytest.mark.usefixtures("import_default_users")
+class TestGenerateCatalogCommand:
+    def test_call(self, tmpdir):
+        out = StringIO()
+        call_command(
+            "generatecatalog",
+            "--products=60", "--product-groups=6", "--migration-chains=5", "--chain-length=2", "--product-lists=2",
+            "--product-list-size=10", "--normalization-rules=10", "--seed=1", "--excel-rows=20",
+            "--product-check-size=50", "--eox-records=10", "--output-dir=%s" % tmpdir,
+            stdout=out
+        )
+
+        assert "Synthetic catalog created (3 vendors, 6 product_groups, 60 products, 10 migration_options, " \
+               "2 product_lists, 10 normalization_rules)" in out.getvalue()
+        assert models.Product.objects.filter(tags__contains="synthetic-catalog").count() == 60
+        assert models.ProductMigrationPath.objects.filter(position=0).count() == 10, "migration paths not computed"
+        assert models.ProductList.objects.filter(name__startswith="Synthetic Product List").count() == 2
+        assert sorted([e.basename for e in tmpdir.listdir()]) == ["eox_records.json", "product_check.txt",
+                                                                  "products.xlsx"]
+
+        # the normalization rules match the raw Product IDs
+        rule = models.ProductIdNormalizationRule.objects.get(priority=0)
+        assert rule.get_normalized_product_id("wsc000001l") == "WS-C-000001-L"
+
+        # a second call extends the catalog
+        call_command("generatecatalog", "--products=30", "--product-lists=0", "--seed=2", stdout=StringIO())
+        assert models.Product.objects.filter(tags__contains="synthetic-catalog").count() == 90
+
+
+@pytest.mark.usefixtures("import_default_vendors")
+@pytest.mark.usefixtures("import_default_users")
+class TestBenchmarkCommand:
+    def test_call(self, tmpdir):
+        call_command(
+            "generatecatalog", "--products=60", "--migration-chains=5", "--product-lists=1", "--seed=1",
+            stdout=StringIO()
+        )
+        product_count = models.Product.objects.count()
+        report_file = tmpdir.join("report.json")
+
+        out = StringIO()
+        call_command("benchmark", "--repeat=2", "--data-dir=%s" % tmpdir.join("data"),
+                     "--output=%s" % report_file, stdout=out)
+
+        assert out.getvalue() == "Benchmark report written to %s\n" % report_file
+        report = json.loads(report_file.read())
+        assert report["catalog"]["products"] == product_count
+        assert [e["name"] for e in report["scenarios"]] == list(Benchmark.SCENARIOS.keys())
+        for scenario in report["scenarios"]:
+            assert len(scenario["runs"]) == 2
+            assert scenario["queries"] > 0, scenario["name"]
+            assert scenario["wall_time_median"] > 0
+
+        # the write scenarios are rolled back
+        assert models.Product.objects.count() == product_count
+        assert models.ProductCheck.objects.count() == 0
+
+        out = StringIO()
+        call_command("benchmark", "--repeat=1", "--scenario=api_products_search", "--scenario=product_detail",
+                     "--data-dir=%s" % tmpdir.join("data"), stdout=out)
+        assert [e["name"] for e in json.loads(out.getvalue())["scenarios"]] == ["api_products_search",
+                                                                                "product_detail"]
@@ -5,12 +5,17 @@ import pytest
 import os
 import tempfile
 import datetime as _datetime
+import importlib
 from hashlib import sha512
+from django.apps import apps
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.core.files import File
+from django.db import connection
 from django.db.models import QuerySet
-from app.productdb import models
+from django.test.utils import CaptureQueriesContext
+from app.config.settings import AppSettings
+from app.productdb import models, migration_paths
 
 pytestmark = pytest.mark.django_db
 
@@ -272,6 +277,45 @@ class TestProduct:
         p.end_of_support_date = _datetime.date.today()
         assert p.current_lifecycle_states == [models.Product.END_OF_SUPPORT_STR]
 
+    def test_annotate_lifecycle_state(self):
+        today = _datetime.date.today()
+        future = today + _datetime.timedelta(days=1)
+        products = [
+            models.Product.objects.create(product_id="no state"),
+            models.Product.objects.create(product_id="no eol", eox_update_time_stamp=today),
+            models.Product.objects.create(product_id="eos announced", eox_update_time_stamp=today,
+                                          eol_ext_announcement_date=today, end_of_sale_date=future),
+            models.Product.objects.create(product_id="eos", eox_update_time_stamp=today,
+                                          eol_ext_announcement_date=today, end_of_sale_date=today,
+                                          end_of_sw_maintenance_date=today, end_of_support_date=future),
+            models.Product.objects.create(product_id="eol", eox_update_time_stamp=today,
+                                          eol_ext_announcement_date=today, end_of_sale_date=today,
+                                          end_of_support_date=today),
+            # the end of support date is only considered if the end of sale date is reached
+            models.Product.objects.create(product_id="eol without eos", eox_update_time_stamp=today,
+                                          eol_ext_announcement_date=today, end_of_support_date=today),
+        ]
+
+        query = models.annotate_lifecycle_state(models.Product.objects.all())
+        for p in query:
+            expected_states = p.current_lifecycle_states
+            assert p.lifecycle_state == (expected_states[0] if expected_states else None), p.product_id
+
+        result = query.order_by("lifecycle_state_order", "id").values_list("product_id", flat=True)
+        assert list(result) == ["no state", "no eol", "eos announced", "eol without eos", "eos", "eol"]
+
+        result = query.filter(lifecycle_state=models.Product.END_OF_SALE_STR).values_list("product_id", flat=True)
+        assert list(result) == ["eos"]
+
+        # the lifecycle state can be computed for any date
+        query = models.annotate_lifecycle_state(
+            models.Product.objects.all(), today=today - _datetime.timedelta(days=1)
+        )
+        assert query.get(id=products[4].id).lifecycle_state == models.Product.EOS_ANNOUNCED_STR
+        assert products[4].get_lifecycle_states(today - _datetime.timedelta(days=1)) == [
+            models.Product.EOS_ANNOUNCED_STR
+        ]
+
     def test_product_id_unique_constraint(self):
         test_name = "my product id"
         v1 = models.Vendor.objects.create(name="test vendor")
@@ -642,6 +686,107 @@ class TestProductList:
         assert hash == pl.hash
 
 
+    @pytest.mark.usefixtures("import_default_vendors")
+    def test_product_list_items(self):
+        u = User.objects.create(username="pdb_admin")
+        v = models.Vendor.objects.get(name__contains="Cisco")
+        j_vendor = models.Vendor.objects.get(name__contains="Juniper")
+        for product_id in ["myprod1", "myprod2", "myprod3"]:
+            models.Product.objects.create(product_id=product_id, vendor=v)
+            models.Product.objects.create(product_id=product_id, vendor=j_vendor)
+
+        pl = models.ProductList.objects.create(
+            name="Test Product List",
+            string_product_list="myprod1;myprod2",
+            vendor=v,
+            update_user=u
+        )
+
+        assert list(pl.productlistitem_set.order_by("product_id").values_list("product_id", "vendor")) == [
+            ("myprod1", v.id),
+            ("myprod2", v.id)
+        ]
+
+        pl.string_product_list = "myprod2\nmyprod3"
+        pl.save()
+
+        assert list(pl.productlistitem_set.order_by("product_id").values_list("product_id", "vendor")) == [
+            ("myprod2", v.id),
+            ("myprod3", v.id)
+        ]
+        assert list(pl.get_product_list_objects().values_list("product_id", "vendor")) == [
+            ("myprod2", v.id),
+            ("myprod3", v.id)
+        ]
+
+        # change the vendor of the list
+        pl.vendor = j_vendor
+        pl.save()
+
+        assert list(pl.productlistitem_set.order_by("product_id").values_list("product_id", "vendor")) == [
+            ("myprod2", j_vendor.id),
+            ("myprod3", j_vendor.id)
+        ]
+        assert list(pl.get_product_list_objects().values_list("product_id", "vendor")) == [
+            ("myprod2", j_vendor.id),
+            ("myprod3", j_vendor.id)
+        ]
+
+        pl.delete()
+        assert models.ProductListItem.objects.count() == 0
+
+    @pytest.mark.usefixtures("import_default_vendors")
+    def test_product_list_items_are_saved_with_the_product_list(self, monkeypatch):
+        u = User.objects.create(username="pdb_admin")
+        v = models.Vendor.objects.get(name__contains="Cisco")
+        for product_id in ["myprod1", "myprod2", "myprod3"]:
+            models.Product.objects.create(product_id=product_id, vendor=v)
+
+        pl = models.ProductList.objects.create(
+            name="Test Product List",
+            string_product_list="myprod1;myprod2",
+            vendor=v,
+            update_user=u
+        )
+
+        def raise_error(*args, **kwargs):
+            raise Exception("cannot create the Product List Items")
+
+        monkeypatch.setattr(models.ProductListItem.objects, "bulk_create", raise_error)
+        pl.string_product_list = "myprod3"
+        with pytest.raises(Exception):
+            pl.save()
+
+        # the change of the Product List is rolled back together with the Product List Items
+        pl = models.ProductList.objects.get(id=pl.id)
+        assert pl.string_product_list == "myprod1\nmyprod2"
+        assert list(pl.productlistitem_set.order_by("product_id").values_list("product_id", flat=True)) == [
+            "myprod1", "myprod2"
+        ]
+
+    @pytest.mark.usefixtures("import_default_vendors")
+    def test_product_list_query_count_is_independent_of_the_list_size(self):
+        u = User.objects.create(username="pdb_admin")
+        v = models.Vendor.objects.get(id=1)
+        models.Product.objects.bulk_create([
+            models.Product(product_id="myprod%d" % e, vendor=v) for e in range(200)
+        ])
+
+        query_counts = []
+        for amount in [10, 200]:
+            with CaptureQueriesContext(connection) as context:
+                models.ProductList.objects.create(
+                    name="product list %d" % amount,
+                    string_product_list="\n".join(["myprod%d" % e for e in range(amount)]),
+                    vendor=v,
+                    update_user=u
+                )
+
+            query_counts.append(len(context.captured_queries))
+
+        assert query_counts[0] == query_counts[1]
+
+
 class TestUserProfile:
     """Test UserProfile model object"""
     @pytest.mark.usefixtures("import_default_vendors")
@@ -687,6 +832,23 @@ class TestProductMigrationSource:
         assert models.ProductMigrationSource.objects.count() == 3
         assert models.ProductMigrationSource.objects.all().first().name == pmiggrp2.name
 
+    def test_preference_changed(self):
+        models.ProductMigrationSource.objects.create(name="Test", preference=60)
+
+        pms = models.ProductMigrationSource.objects.get(name="Test")
+        assert pms.preference_changed is False
+        pms.preference = 70
+        assert pms.preference_changed is True
+        pms.save()
+        assert pms.preference_changed is False
+
+        # the loaded preference is taken from the query, deferred instances are not loaded again
+        with CaptureQueriesContext(connection) as context:
+            pms = models.ProductMigrationSource.objects.only("id", "preference").get(name="Test")
+            assert pms.preference_changed is False
+            pms = models.ProductMigrationSource.objects.defer("preference").get(name="Test")
+        assert len(context.captured_queries) == 2
+
     def test_unique_name(self):
         test_name = "Test Migration Source"
         models.ProductMigrationSource.objects.create(name=test_name)
@@ -1121,6 +1283,170 @@ class TestProductCheck:
         assert not_in_db.migration_product is None
 
 
+    def test_product_check_with_partial_product_id(self):
+        """Product IDs that are only part of a Product ID in a Product List should not match the Product List"""
+        u = User.objects.create(username="username")
+        v = models.Vendor.objects.get(id=1)
+        models.Product.objects.create(product_id="WS-C2960-24T", vendor=v)
+        models.Product.objects.create(product_id="C2960", vendor=v)
+        pl = models.ProductList.objects.create(
+            name="TestList",
+            string_product_list="WS-C2960-24T",
+            vendor=v,
+            update_user=u
+        )
+
+        pc = models.ProductCheck.objects.create(name="Test", input_product_ids="WS-C2960-24T\nC2960")
+        pc.perform_product_check()
+
+        assert pc.productcheckentry_set.get(input_product_id="WS-C2960-24T").part_of_product_list == pl.hash
+        assert pc.productcheckentry_set.get(input_product_id="C2960").part_of_product_list == ""
+
+    def test_product_check_engine_results_are_equal_to_the_per_entry_lookup(self):
+        """the set-based Product Check must provide the same results as the lookup on the ProductCheckEntry"""
+        u = User.objects.create(username="username")
+        v = models.Vendor.objects.get(id=1)
+        eol_values = dict(
+            eox_update_time_stamp=_datetime.datetime.utcnow(),
+            eol_ext_announcement_date=_datetime.date(2016, 1, 1),
+            end_of_sale_date=_datetime.date(2016, 1, 1)
+        )
+        pms1 = models.ProductMigrationSource.objects.create(name="Preferred Migration Source", preference=60)
+        pms2 = models.ProductMigrationSource.objects.create(name="Another Migration Source", preference=40)
+        pms3 = models.ProductMigrationSource.objects.create(name="Less Preferred Migration Source", preference=10)
+
+        # migration chain with multiple hops
+        for e in range(1, 6):
+            models.Product.objects.create(product_id="chain_%d" % e, vendor=v, **eol_values)
+        for e in range(1, 5):
+            models.ProductMigrationOption.objects.create(
+                product=models.Product.objects.get(product_id="chain_%d" % e),
+                migration_source=pms1,
+                replacement_product_id="chain_%d" % (e + 1)
+            )
+        models.ProductMigrationOption.objects.create(
+            product=models.Product.objects.get(product_id="chain_1"),
+            migration_source=pms2,
+            replacement_product_id="not_in_db"
+        )
+
+        # only less preferred migration option
+        p = models.Product.objects.create(product_id="less_preferred", vendor=v)
+        models.ProductMigrationOption.objects.create(product=p, migration_source=pms3, replacement_product_id="other")
+
+        # same Product ID for multiple vendors
+        models.Product.objects.create(product_id="multi_vendor", vendor=v)
+        models.Product.objects.create(product_id="multi_vendor", vendor=models.Vendor.objects.get(id=2))
+
+        models.ProductList.objects.create(
+            name="TestList", string_product_list="chain_1;chain_2", vendor=v, update_user=u
+        )
+        models.ProductList.objects.create(
+            name="AnotherTestList", string_product_list="chain_2\nless_preferred", vendor=v, update_user=u
+        )
+
+        input_product_ids = "chain_1;chain_1\nchain_2\nchain_4\nchain_5\nless_preferred\nmulti_vendor\nunknown;" \
+                            "chain"
+
+        for migration_source in [None, pms1, pms2, pms3]:
+            pc = models.ProductCheck.objects.create(
+                name="Test", input_product_ids=input_product_ids, migration_source=migration_source
+            )
+            pc.perform_product_check()
+            result = sorted(pc.productcheckentry_set.values_list(
+                "input_product_id", "amount", "product_in_database", "migration_product", "part_of_product_list"
+            ))
+
+            # lookup every entry on its own
+            pc.productcheckentry_set.all().delete()
+            amounts = {}
+            for product_id in pc.input_product_ids_list:
+                amounts[product_id] = amounts.get(product_id, 0) + 1
+            for product_id, amount in amounts.items():
+                entry = models.ProductCheckEntry(product_check=pc, input_product_id=product_id, amount=amount)
+                entry.discover_product_list_values()
+                entry.save()
+
+            expected_result = sorted(pc.productcheckentry_set.values_list(
+                "input_product_id", "amount", "product_in_database", "migration_product", "part_of_product_list"
+            ))
+
+            assert len(result) == 8
+            assert result == expected_result
+
+    def test_product_check_query_count_is_independent_of_the_input_size(self):
+        v = models.Vendor.objects.get(id=1)
+        pms = models.ProductMigrationSource.objects.create(name="Preferred Migration Source", preference=60)
+        for e in range(0, 50):
+            p = models.Product.objects.create(product_id="prod_%d" % e, vendor=v)
+            models.ProductMigrationOption.objects.create(
+                product=p, migration_source=pms, replacement_product_id="replacement_%d" % e
+            )
+
+        AppSettings()  # populate default configuration
+
+        query_counts = []
+        # the first product check of the day creates the usage counters
+        for amount in [1, 5, 50]:
+            pc = models.ProductCheck.objects.create(
+                name="Test",
+                input_product_ids="\n".join(["prod_%d" % e for e in range(0, amount)] + ["unknown_%d" % amount])
+            )
+            with CaptureQueriesContext(connection) as context:
+                pc.perform_product_check()
+
+            assert pc.productcheckentry_set.count() == amount + 1
+            assert pc.productcheckentry_set.filter(migration_product__isnull=False).count() == amount
+            query_counts.append(len(context.captured_queries))
+
+        assert query_counts[1] == query_counts[2]
+
+    def test_product_check_with_normalization(self):
+        v = models.Vendor.objects.get(id=1)
+        p1 = models.Product.objects.create(product_id="WS-C2960-24T-L", vendor=v)
+        p2 = models.Product.objects.create(product_id="PWR-C1-350WAC=", vendor=v)
+        models.ProductIdNormalizationRule.objects.create(
+            vendor=v, product_id="WS-C%s-%s-L", regex_match=r"^(?:WS-)?C(\d+)-(\d+T)(?:-L)?$"
+        )
+        models.ProductIdNormalizationRule.objects.create(
+            vendor=v, product_id="PWR-C1-%sWAC=", regex_match=r"^PWR-C1-(\d+)WAC=?$"
+        )
+        input_product_ids = "C2960-24T\nWS-C2960-24T\nWS-C2960-24T-L\nPWR-C1-350WAC\nPWR-C1-350WAC\nunknown"
+
+        # without normalization
+        pc = models.ProductCheck.objects.create(name="Test", input_product_ids=input_product_ids)
+        pc.perform_product_check()
+
+        assert pc.productcheckentry_set.count() == 5
+        assert pc.productcheckentry_set.filter(product_in_database__isnull=False).count() == 1
+
+        # with normalization, all inputs with the same normalized Product ID are combined
+        pc = models.ProductCheck.objects.create(
+            name="Test", input_product_ids=input_product_ids, normalization_vendor=v
+        )
+        with CaptureQueriesContext(connection) as context:
+            pc.perform_product_check()
+
+        result = sorted(pc.productcheckentry_set.values_list(
+            "input_product_id", "amount", "product_in_database", "original_input_product_ids"
+        ))
+        assert result == [
+            ("PWR-C1-350WAC=", 2, p2.id, "PWR-C1-350WAC"),
+            ("WS-C2960-24T-L", 3, p1.id, "C2960-24T\nWS-C2960-24T"),
+            ("unknown", 1, None, ""),
+        ]
+        assert pc.productcheckentry_set.get(input_product_id="unknown").original_input_product_ids_list == []
+
+        # the rule set is cached within the process
+        pc.input_product_ids = input_product_ids + "\nC3750-48T"
+        pc.save()
+        with CaptureQueriesContext(connection) as second_context:
+            pc.perform_product_check()
+
+        assert pc.productcheckentry_set.get(input_product_id="WS-C3750-48T-L").original_input_product_ids == \
+            "C3750-48T"
+        assert len(second_context.captured_queries) <= len(context.captured_queries)
+
 @pytest.mark.usefixtures("import_default_vendors")
 class TestProductMigrationOption:
     def test_model(self):
@@ -1495,6 +1821,147 @@ class TestProductMigrationOption:
         assert pmo3.replacement_db_product is None
 
 
+@pytest.mark.usefixtures("import_default_vendors")
+class TestProductMigrationPath:
+    """Test the materialized migration paths"""
+    def create_eol_product(self, product_id):
+        return models.Product.objects.create(
+            product_id=product_id,
+            vendor=models.Vendor.objects.get(id=1),
+            eox_update_time_stamp=_datetime.datetime.utcnow(),
+            eol_ext_announcement_date=_datetime.date(2016, 1, 1),
+            end_of_sale_date=_datetime.date(2016, 1, 1)
+        )
+
+    def test_incremental_update(self):
+        pms = models.ProductMigrationSource.objects.create(name="Group One")
+        p1 = self.create_eol_product("p1")
+        models.ProductMigrationOption.objects.create(product=p1, migration_source=pms, replacement_product_id="p2")
+
+        assert [e.replacement_product_id for e in p1.get_migration_path()] == ["p2"]
+
+        # replacement Product is created (EoL announced)
+        p2 = self.create_eol_product("p2")
+        models.ProductMigrationOption.objects.create(product=p2, migration_source=pms, replacement_product_id="p3")
+
+        assert [e.replacement_product_id for e in p1.get_migration_path()] == ["p2", "p3"]
+
+        # replacement Product is not EoL anymore
+        p2.end_of_sale_date = None
+        p2.save()
+
+        assert [e.replacement_product_id for e in p1.get_migration_path()] == ["p2"]
+        assert p1.get_preferred_replacement_option().replacement_product_id == "p2"
+
+        # remove the replacement Product
+        p2.end_of_sale_date = _datetime.date(2016, 1, 1)
+        p2.save()
+
+        assert [e.replacement_product_id for e in p1.get_migration_path()] == ["p2", "p3"]
+
+        p2.delete()
+
+        assert [e.replacement_product_id for e in p1.get_migration_path()] == ["p2"]
+        assert models.ProductMigrationPath.objects.count() == 1
+
+        p1.productmigrationoption_set.all().delete()
+
+        assert p1.get_migration_path() == []
+        assert p1.get_preferred_replacement_option() is None
+        assert models.ProductMigrationPath.objects.count() == 0
+
+    def test_update_on_preference_change(self):
+        pms1 = models.ProductMigrationSource.objects.create(name="Group One", preference=60)
+        pms2 = models.ProductMigrationSource.objects.create(name="Group Two", preference=40)
+        p = models.Product.objects.create(product_id="p1", vendor=models.Vendor.objects.get(id=1))
+        models.ProductMigrationOption.objects.create(product=p, migration_source=pms1, replacement_product_id="r1")
+        models.ProductMigrationOption.objects.create(product=p, migration_source=pms2, replacement_product_id="r2")
+
+        assert p.get_preferred_replacement_option().replacement_product_id == "r1"
+
+        pms2.preference = 80
+        pms2.save()
+
+        assert p.get_preferred_replacement_option().replacement_product_id == "r2"
+
+        pms1.preference = 25
+        pms1.save()
+        pms2.preference = 25
+        pms2.save()
+
+        assert p.has_preferred_migration_option() is False
+        assert p.get_preferred_replacement_option() is None
+        assert [e.replacement_product_id for e in p.get_migration_path("Group One")] == ["r1"]
+
+    def test_loop_detection(self):
+        pms = models.ProductMigrationSource.objects.create(name="Group One")
+        p1 = self.create_eol_product("p1")
+        p2 = self.create_eol_product("p2")
+        models.ProductMigrationOption.objects.create(product=p1, migration_source=pms, replacement_product_id="p2")
+        models.ProductMigrationOption.objects.create(product=p2, migration_source=pms, replacement_product_id="p1")
+
+        assert [e.replacement_product_id for e in p1.get_migration_path()] == ["p2", "p1"]
+        assert [e.replacement_product_id for e in p2.get_migration_path()] == ["p1", "p2"]
+        assert models.ProductMigrationPath.objects.filter(loop_detected=True).count() == 2
+
+    def test_single_query_lookup(self):
+        pms = models.ProductMigrationSource.objects.create(name="Group One")
+        products = [self.create_eol_product("p%d" % e) for e in range(0, 5)]
+        for e in range(0, 4):
+            models.ProductMigrationOption.objects.create(
+                product=products[e], migration_source=pms, replacement_product_id="p%d" % (e + 1)
+            )
+
+        with CaptureQueriesContext(connection) as context:
+            path = products[0].get_migration_path("Group One")
+            assert [e.replacement_product_id for e in path] == ["p1", "p2", "p3", "p4"]
+            assert path[-1].replacement_db_product.product_id == "p4"
+            assert path[-1].migration_source.name == "Group One"
+
+        assert len(context.captured_queries) == 1
+
+    def test_rebuild_migration_paths(self):
+        pms = models.ProductMigrationSource.objects.create(name="Group One")
+        p1 = self.create_eol_product("p1")
+        self.create_eol_product("p2")
+        models.ProductMigrationOption.objects.create(product=p1, migration_source=pms, replacement_product_id="p2")
+
+        models.ProductMigrationPath.objects.all().delete()
+        assert p1.get_migration_path() == []
+
+        assert migration_paths.rebuild_migration_paths() == 1
+        assert [e.replacement_product_id for e in p1.get_migration_path()] == ["p2"]
+
+    def test_data_migration(self):
+        migration = importlib.import_module("app.productdb.migrations.0036_productmigrationpath")
+        pms1 = models.ProductMigrationSource.objects.create(name="Group One", preference=60)
+        pms2 = models.ProductMigrationSource.objects.create(name="Group Two", preference=80)
+        pms3 = models.ProductMigrationSource.objects.create(name="Group Three", preference=20)
+        p1 = self.create_eol_product("p1")
+        p2 = self.create_eol_product("p2")
+        p3 = self.create_eol_product("p3")
+        models.Product.objects.create(product_id="p4", vendor=models.Vendor.objects.get(id=1))
+        for pms, product, replacement_product_id in [
+            (pms1, p1, "p2"), (pms1, p2, "p3"), (pms1, p3, "p4"),
+            (pms2, p1, "p3"), (pms2, p3, "p1"),
+            (pms3, p2, "unknown"),
+        ]:
+            models.ProductMigrationOption.objects.create(
+                product=product, migration_source=pms, replacement_product_id=replacement_product_id
+            )
+
+        fields = ["product__product_id", "migration_source__name", "position", "migration_option_id", "preferred",
+                  "loop_detected"]
+        order = ["product__product_id", "migration_source__name", "position"]
+        expected = list(models.ProductMigrationPath.objects.order_by(*order).values_list(*fields))
+        assert len(expected) == 11
+        models.ProductMigrationPath.objects.all().delete()
+
+        migration.populate_product_migration_paths(apps, None)
+
+        assert list(models.ProductMigrationPath.objects.order_by(*order).values_list(*fields)) == expected
+
+
 @pytest.mark.usefixtures("import_default_vendors")
 class TestProductIdNormalization:
     def test_model(self):
@@ -0,0 +1,102 @@
+"""
+Test suite for the productdb.normalization module
+"""
+import pytest
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, transaction
+from app.productdb import normalization, models
+
+pytestmark = pytest.mark.django_db
+
+
+def normalize_with_single_rules(rules, input_string):
+    """reference implementation (every rule is matched separately)"""
+    for rule_id, regex_match, product_id in rules:
+        match = normalization.compile_pattern(regex_match).match(input_string)
+        if match:
+            groups = match.groups()
+            return (product_id % groups if len(groups) != 0 else product_id), rule_id
+
+    return input_string, None
+
+
+class TestNormalizationRuleSet:
+    def test_combined_pattern(self):
+        rules = [
+            (1, r"^WS-C(\d+)(X|G)?-(\d+)$", "WS-C%s%s-%s"),
+            (2, r"^WS-C(\d+)", "WS-C%s-ANY"),
+            (3, r"^(?P<name>PWR)-(\d+)$", "PWR-%s-%s"),
+            (4, r"^(a)\1$", "double %s"),
+            (5, r"(?i)^abc$", "ABC"),
+            (6, r"^AIR-(CAP|LAP)(\d{4})?$", "AIR-%s%s"),
+            (7, r"^(invalid", "invalid"),
+            (8, r"^AIR", "AIR"),
+        ]
+        rule_set = normalization.NormalizationRuleSet(1, rules)
+
+        # the invalid rule is skipped, the named group, the backreference and the inline flag aren't combined
+        assert [r[0] for r in rule_set.rules] == [1, 2, 3, 4, 5, 6, 8]
+        assert [type(p) for p in rule_set.patterns] == [
+            normalization.CombinedPattern,
+            normalization.SinglePattern,
+            normalization.SinglePattern,
+            normalization.SinglePattern,
+            normalization.CombinedPattern,
+        ]
+
+        for input_string in ["WS-C3750X-48", "WS-C3750-48", "WS-C3750G", "PWR-1", "aa", "ABC", "AIR-CAP",
+                             "AIR-LAP1234", "AIR-OTHER", "unknown", ""]:
+            expected = normalize_with_single_rules([r for r in rules if r[0] != 7], input_string)
+            assert rule_set.normalize(input_string) == expected, input_string
+
+        assert rule_set.normalize("WS-C3750X-48") == ("WS-C3750X-48", 1)
+        assert rule_set.normalize("WS-C3750G") == ("WS-C3750-ANY", 2)
+        assert rule_set.normalize("PWR-1") == ("PWR-PWR-1", 3)
+        assert rule_set.normalize("AIR-LAP1234") == ("AIR-LAP1234", 6)
+        assert rule_set.normalize("AIR-OTHER") == ("AIR", 8)
+
+    def test_large_rule_set(self):
+        rules = [(e, r"^PID-%d-(\d+)$" % e, "PID-%d-%%s" % e) for e in range(3000)]
+        rule_set = normalization.NormalizationRuleSet(1, rules)
+
+        assert len(rule_set.patterns) == 1
+        assert rule_set.normalize("PID-2999-12") == ("PID-2999-12", 2999)
+        assert rule_set.normalize("PID-0-1") == ("PID-0-1", 0)
+        assert rule_set.normalize("PID-3000-1") == ("PID-3000-1", None)
+
+    @pytest.mark.usefixtures("import_default_vendors")
+    def test_rule_set_is_cached_per_vendor(self):
+        v1 = models.Vendor.objects.get(id=1)
+        rule = models.ProductIdNormalizationRule.objects.create(vendor=v1, product_id="PWR-%s", regex_match=r"^PWR(\d+)$")
+        normalization.clear_rule_sets()
+        normalization.RULES_VERSION.bump()
+
+        rule_set = normalization.get_rule_set(v1.id)
+        with CaptureQueriesContext(connection) as context:
+            assert normalization.get_rule_set(v1.id) is rule_set
+        assert len(context.captured_queries) == 0
+        assert rule_set.normalize("PWR1") == ("PWR-1", rule.id)
+
+        # the rule set is loaded again after a change of the rules
+        rule.product_id = "PWR-%s="
+        rule.save()
+        assert normalization.get_rule_set(v1.id).normalize("PWR1") == ("PWR-1=", rule.id)
+
+        rule.delete()
+        assert normalization.get_rule_set(v1.id).normalize("PWR1") == ("PWR1", None)
+
+    @pytest.mark.usefixtures("import_default_vendors")
+    def test_rule_set_after_rollback(self):
+        v1 = models.Vendor.objects.get(id=1)
+        assert normalization.get_rule_set(v1.id).normalize("PWR1") == ("PWR1", None)
+
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                models.ProductIdNormalizationRule.objects.create(
+                    vendor=v1, product_id="PWR-%s", regex_match=r"^PWR(\d+)$"
+                )
+                assert normalization.get_rule_set(v1.id).normalize("PWR1")[0] == "PWR-1"
+                raise RuntimeError()
+
+        # the rule set with the uncommitted rule is not used after the rollback
+        assert normalization.get_rule_set(v1.id).normalize("PWR1") == ("PWR1", None)
@@ -0,0 +1,110 @@
+"""
+Test suite for the productdb.product_statistics module
+"""
+import pytest
+from django.core.cache import cache
+from django.utils.timezone import datetime, timedelta
+from app.productdb import product_statistics
+from app.productdb import tasks
+from app.productdb.models import Product, Vendor
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.mark.usefixtures("import_default_vendors")
+class TestProductStatistics:
+    def test_compute_product_statistics(self, django_assert_num_queries):
+        today = datetime(2020, 6, 1).date()
+        v = Vendor.objects.get(id=1)
+        Product.objects.create(product_id="no lifecycle data", vendor=v, list_price=1.0)
+        Product.objects.create(product_id="no announcement", vendor=v, eox_update_time_stamp=today)
+        Product.objects.create(
+            product_id="announced", vendor=v, eox_update_time_stamp=today,
+            eol_ext_announcement_date=today - timedelta(days=10), end_of_sale_date=today + timedelta(days=10)
+        )
+        Product.objects.create(
+            product_id="end of sale", vendor=v, eox_update_time_stamp=today,
+            eol_ext_announcement_date=today - timedelta(days=20), end_of_sale_date=today - timedelta(days=10)
+        )
+        Product.objects.create(
+            product_id="end of support", vendor=v, eox_update_time_stamp=today,
+            eol_ext_announcement_date=today - timedelta(days=30), end_of_sale_date=today - timedelta(days=20),
+            end_of_support_date=today
+        )
+
+        with django_assert_num_queries(1):
+            result = product_statistics.compute_product_statistics(today)
+
+        assert result == {
+            "date": today,
+            "product_count": 5,
+            "product_lifecycle_count": 4,
+            "product_no_eol_announcement_count": 1,
+            "product_eol_announcement_count": 1,
+            "product_eos_count": 1,
+            "product_eol_count": 1,
+            "product_price_count": 1,
+        }
+
+    def test_cached_statistics(self, monkeypatch, django_assert_num_queries):
+        delays = []
+        monkeypatch.setattr(product_statistics, "enqueue_product_statistics_refresh", lambda delay: delays.append(
+            delay
+        ))
+        Product.objects.create(product_id="product", vendor=Vendor.objects.get(id=1))
+
+        # the statistics are never computed within the request, an immediate refresh is started instead
+        with django_assert_num_queries(0):
+            assert product_statistics.get_product_statistics() == product_statistics.PLACEHOLDER_STATISTICS
+        assert delays == [0]
+
+        product_statistics.refresh_product_statistics()
+        assert product_statistics.get_product_statistics()["product_count"] == 1
+
+        # the cached value is used until the next refresh
+        Product.objects.create(product_id="another product", vendor=Vendor.objects.get(id=1))
+        assert product_statistics.get_product_statistics()["product_count"] == 1
+        assert delays == [0]
+
+        # statistics of a previous day are shown until they are refreshed
+        statistics = cache.get(product_statistics.PRODUCT_STATISTICS_CACHE_KEY)
+        statistics["date"] -= timedelta(days=1)
+        cache.set(product_statistics.PRODUCT_STATISTICS_CACHE_KEY, statistics)
+        assert product_statistics.get_product_statistics()["product_count"] == 1
+        assert delays == [0, 0]
+
+    def test_cache_timeout_is_longer_than_the_refresh_interval(self, settings):
+        schedule = settings.CELERYBEAT_SCHEDULE["productdb.refresh_product_statistics"]
+        assert schedule["task"] == "productdb.refresh_product_statistics"
+        assert schedule["schedule"].minute == set(range(0, 60, 5))
+        assert settings.PDB_PRODUCT_STATISTICS_CACHE_TIMEOUT > 5 * 60
+
+    def test_refresh_is_enqueued_once(self, monkeypatch, settings):
+        settings.PDB_PRODUCT_STATISTICS_REFRESH_DELAY = 30
+        countdowns = []
+        monkeypatch.setattr(tasks.refresh_product_statistics, "apply_async", lambda countdown: countdowns.append(
+            countdown
+        ))
+
+        product_statistics.enqueue_product_statistics_refresh()
+        product_statistics.enqueue_product_statistics_refresh()
+        assert countdowns == [30]
+
+        # the task resets the schedule before the statistics are computed
+        tasks.refresh_product_statistics()
+        assert cache.get(product_statistics.PRODUCT_STATISTICS_CACHE_KEY)["product_count"] == 0
+        product_statistics.enqueue_product_statistics_refresh()
+        assert countdowns == [30, 30]
+
+    def test_refresh_cannot_be_enqueued(self, monkeypatch):
+        def raise_error(countdown):
+            raise Exception("broker not available")
+
+        monkeypatch.setattr(tasks.refresh_product_statistics, "apply_async", raise_error)
+        product_statistics.refresh_product_statistics()
+
+        product_statistics.enqueue_product_statistics_refresh()
+
+        # the last statistics are kept
+        assert cache.get(product_statistics.PRODUCT_STATISTICS_CACHE_KEY)["product_count"] == 0
+        assert cache.get(product_statistics.REFRESH_SCHEDULED_CACHE_KEY) is None
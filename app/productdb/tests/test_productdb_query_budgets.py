@@ -0,0 +1,52 @@
+"""
+Test suite for the query budgets of the views, API endpoints and Celery tasks (see app.productdb.query_budget)
+"""
+import pytest
+from app.productdb import query_budget
+from django_project.celery import TaskProgress
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def query_budget_dataset(import_default_vendors):
+    return query_budget.QueryBudgetDataset().generate()
+
+
+@pytest.fixture
+def suppress_progress_updates_in_tasks(monkeypatch):
+    """the progress of the tasks is written to the cache and published to the message broker"""
+    monkeypatch.setattr(TaskProgress, "update", lambda self, status_message, current=None, total=None: True)
+
+
+def verify_query_budget(budget, dataset):
+    try:
+        budget.verify(dataset)
+
+    except query_budget.QueryBudgetExceeded as ex:
+        pytest.fail(str(ex), pytrace=False)
+
+
+class TestQueryBudgets:
+    @pytest.mark.parametrize("budget", [
+        e for e in query_budget.QUERY_BUDGETS if isinstance(e, query_budget.ViewQueryBudget)
+    ], ids=lambda e: e.name)
+    def test_view_query_budget(self, budget, query_budget_dataset):
+        verify_query_budget(budget, query_budget_dataset)
+
+    @pytest.mark.usefixtures("suppress_progress_updates_in_tasks")
+    @pytest.mark.parametrize("budget", [
+        e for e in query_budget.QUERY_BUDGETS if isinstance(e, query_budget.TaskQueryBudget)
+    ], ids=lambda e: e.name)
+    def test_task_query_budget(self, budget, query_budget_dataset):
+        verify_query_budget(budget, query_budget_dataset)
+
+    def test_report_groups_queries_by_call_site(self, query_budget_dataset):
+        budget = query_budget.ViewQueryBudget("productdb:product-detail", 0, kwargs={"product_id": "product"})
+
+        with pytest.raises(query_budget.QueryBudgetExceeded) as exinfo:
+            budget.verify(query_budget_dataset)
+
+        assert "query budget for 'productdb:product-detail' exceeded" in str(exinfo.value)
+        assert "app/productdb/views.py" in str(exinfo.value)
+        assert "SELECT" in str(exinfo.value)
@@ -0,0 +1,103 @@
+"""
+Test suite for the productdb.search module
+"""
+import pytest
+from django.db.models import Q
+from django.db.backends.postgresql.base import DatabaseWrapper
+from app.productdb import search, models
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def postgresql_connection():
+    """PostgreSQL database connection that is only used to compile queries (never connected)"""
+    return DatabaseWrapper({
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": "productdb",
+        "USER": "",
+        "PASSWORD": "",
+        "HOST": "",
+        "PORT": "",
+        "OPTIONS": {},
+        "TIME_ZONE": None,
+        "CONN_MAX_AGE": 0,
+        "AUTOCOMMIT": True,
+        "ATOMIC_REQUESTS": False,
+    }, alias="postgresql")
+
+
+@pytest.fixture
+def use_postgresql_vendor(monkeypatch):
+    monkeypatch.setattr(search, "connection", type("Connection", (), {"vendor": "postgresql"}))
+
+
+class TestSearchQueryPlanner:
+    @pytest.mark.parametrize("regex_pattern, expected_result", [
+        ("WS-C2960", ("WS-C2960", False, False)),
+        ("^WS-C2960", ("WS-C2960", True, False)),
+        ("WS-C2960$", ("WS-C2960", False, True)),
+        ("^WS-C2960$", ("WS-C2960", True, True)),
+        (r"WS-C2960\.1\$", ("WS-C2960.1$", False, False)),
+        (r"WS-C2960\\$", ("WS-C2960\\", False, True)),
+        ("100% off_", ("100% off_", False, False)),
+        ("WS-C2960.*", None),
+        ("WS-C(2960|3750)", None),
+        (r"WS-C\d+", None),
+        ("^$", None),
+    ])
+    def test_get_regex_literal(self, regex_pattern, expected_result):
+        assert search.get_regex_literal(regex_pattern) == expected_result
+
+    def test_plan_search_fallback(self):
+        # the existing lookups are used on any database except PostgreSQL
+        assert search.plan_search("^WS-C2960", regex=True) == ("iregex", "^WS-C2960")
+        assert search.plan_search("^WS-C2960", regex=False) == ("icontains", "^WS-C2960")
+        assert search.plan_search("WS-C2960{", regex=True) == ("icontains", "WS-C2960{")
+
+    @pytest.mark.usefixtures("use_postgresql_vendor")
+    def test_plan_search_postgresql(self):
+        assert search.plan_search("WS-C2960", regex=True) == ("trgm_icontains", "WS-C2960")
+        assert search.plan_search("^WS-C2960", regex=True) == ("trgm_istartswith", "WS-C2960")
+        assert search.plan_search("WS-C2960$", regex=True) == ("trgm_iendswith", "WS-C2960")
+        assert search.plan_search("^WS-C2960$", regex=True) == ("trgm_iexact", "WS-C2960")
+        assert search.plan_search("^WS-C2960", regex=False) == ("trgm_icontains", "^WS-C2960")
+        assert search.plan_search("WS-C2960.*24", regex=True) == ("iregex", "WS-C2960.*24")
+        assert search.plan_search("WS-C2960{", regex=True) == ("trgm_icontains", "WS-C2960{")
+
+    def test_postgresql_sql(self, postgresql_connection):
+        expected_results = {
+            "trgm_icontains": ("%WS-C2960\\_1%", "%WS-C2960\\_1%"),
+            "trgm_istartswith": ("WS-C2960\\_1%", "WS-C2960\\_1%"),
+            "trgm_iendswith": ("%WS-C2960\\_1", "%WS-C2960\\_1"),
+            "trgm_iexact": ("WS-C2960\\_1", "WS-C2960\\_1"),
+        }
+        for lookup, expected_params in expected_results.items():
+            query = models.Product.objects.filter(
+                Q(**{"product_id__%s" % lookup: "WS-C2960_1"}) | Q(**{"description__%s" % lookup: "WS-C2960_1"})
+            )
+            sql, params = query.query.get_compiler(connection=postgresql_connection).as_sql()
+
+            assert '"productdb_product"."product_id"::text ILIKE %s' in sql
+            assert '"productdb_product"."description"::text ILIKE %s' in sql
+            assert "UPPER" not in sql
+            assert params == expected_params
+
+    @pytest.mark.usefixtures("import_default_vendors")
+    def test_fallback_results(self):
+        p1 = models.Product.objects.create(product_id="WS-C2960-24TC-L", description="Catalyst 2960 Switch")
+        p2 = models.Product.objects.create(product_id="WS-C3750-24TS", description="Catalyst 3750 Switch")
+        p3 = models.Product.objects.create(product_id="WS-C2960_48", description="100% Switch")
+
+        def query(lookup, value):
+            return set(models.Product.objects.filter(**{"product_id__%s" % lookup: value}))
+
+        assert query("trgm_icontains", "ws-c2960") == {p1, p3}
+        assert query("trgm_icontains", "C2960_") == {p3}
+        assert query("trgm_istartswith", "ws-c3750") == {p2}
+        assert query("trgm_iendswith", "24ts") == {p2}
+        assert query("trgm_iexact", "ws-c2960_48") == {p3}
+        assert set(models.Product.objects.filter(description__trgm_icontains="100%")) == {p3}
+        assert set(models.Product.objects.filter(
+            search.get_search_query(["product_id", "description"], "3750", regex=True)
+        )) == {p2}
@@ -191,6 +191,25 @@ class TestImportPriceListTask:
         p = models.Product.objects.get(product_id="Product A")
         assert "description of Product A" == p.description
 
+    def test_successful_bulk_import_price_list_task(self, monkeypatch):
+        # replace the ProductsExcelImporter class
+        monkeypatch.setattr(tasks, "ProductsExcelImporter", BaseProductsExcelImporterMock)
+
+        jf = models.JobFile.objects.create(file=SimpleUploadedFile("myfile.xlsx", b"xyz"))
+        result = tasks.import_price_list(
+            job_file_id=jf.id,
+            create_notification_on_server=True,
+            update_only=False,
+            user_for_revision=User.objects.get(username="api"),
+            bulk_mode=True
+        )
+
+        assert "status_message" in result, "If successful, a status message should be returned"
+        assert models.JobFile.objects.count() == 0, "Should be deleted after the task was completed"
+        assert models.Product.objects.count() == 1, "One Product was created"
+        p = models.Product.objects.get(product_id="Product A")
+        assert "description of Product A" == p.description
+
     def test_notification_message_on_import_price_list_task(self, monkeypatch):
         # replace the ProductsExcelImporter class
         monkeypatch.setattr(tasks, "ProductsExcelImporter", BaseProductsExcelImporterMock)
@@ -57,3 +57,18 @@ def test_validate_product_list_string():
     with pytest.raises(ValidationError) as exinfo:
         validate_product_list_string(test_product_string, v.id)
     assert exinfo.match(expected_error_msg)
+
+    # all missing products are reported (sorted and without duplicates)
+    test_product_string = "myprod6;myprod1\nmyprod5;myprod6"
+    with pytest.raises(ValidationError) as exinfo:
+        validate_product_list_string(test_product_string, v.id)
+    assert exinfo.match("for the vendor unassigned: myprod5,myprod6'")
+
+
+def test_validate_large_product_list_string(django_assert_num_queries):
+    v = models.Vendor.objects.create(name="unassigned", id=0)
+    models.Product.objects.bulk_create([models.Product(product_id="myprod%d" % e, vendor=v) for e in range(1200)])
+
+    # the Product IDs are resolved in chunks of 500 entries
+    with django_assert_num_queries(3):
+        validate_product_list_string("\n".join(["myprod%d" % e for e in range(1200)]), v.id)
@@ -113,6 +113,28 @@ urlpatterns = [
         name='datatables_list_products_by_group_view'
     ),
 
+    # export endpoints for the datatables (same search parameters)
+    url(
+        r'^datatables/vendor_products/(?P<vendor_id>[0-9]+)/export/(?P<export_format>csv|ndjson|xlsx)/$',
+        datatables.VendorProductListExport.as_view(),
+        name='datatables_vendor_products_export'
+    ),
+    url(
+        r'^datatables/product_data/export/(?P<export_format>csv|ndjson|xlsx)/$',
+        datatables.ListProductsExport.as_view(),
+        name='datatables_list_products_export'
+    ),
+    url(
+        r'^datatables/product_groups_data/export/(?P<export_format>csv|ndjson|xlsx)/$',
+        datatables.ListProductGroupsExport.as_view(),
+        name='datatables_list_product_groups_export'
+    ),
+    url(
+        r'^datatables/product_groups_data/(?P<product_group_id>[0-9]+)/products/export/(?P<export_format>csv|ndjson|xlsx)/$',
+        datatables.ListProductsByGroupExport.as_view(),
+        name='datatables_list_products_by_group_export'
+    ),
+
     # user views
     url(r'^vendor/$', views.browse_vendor_products, name='browse_vendor_products'),
 
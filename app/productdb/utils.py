@@ -2,6 +2,7 @@ import re
 import jtextfsm as textfsm
 import io
 from django.core.cache import cache
+from django.db import connection
 from app.config.settings import AppSettings
 
 DEFAULT_DATE_FORMAT = "%Y/%m/%d"
@@ -128,3 +129,27 @@ def split_string(string, length=65536):
     while string:
         yield string[:length]
         string = string[length:]
+
+
+def split_list(values, length=500):
+    """
+    small utility to split a list into chunks (e.g. to limit the amount of values within an IN query)
+    :param values:
+    :param length:
+    :return:
+    """
+    values = list(values)
+    for index in range(0, len(values), length):
+        yield values[index:index + length]
+
+
+def get_bulk_batch_size(model, objs, batch_size=1000):
+    """
+    limit the batch size of a bulk operation to the maximum value that is supported by the database backend
+    :param model:
+    :param objs:
+    :param batch_size:
+    :return:
+    """
+    max_batch_size = connection.ops.bulk_batch_size(model._meta.concrete_fields, objs)
+    return max(min(batch_size, max_batch_size), 1)
@@ -1,6 +1,7 @@
 import json
 from django.core.exceptions import ValidationError
 import app.productdb.models
+from app.productdb.utils import split_list
 
 
 def validate_json(value):
@@ -18,22 +19,20 @@ def validate_json(value):
 def validate_product_list_string(value, vendor_id):
     """
     verifies that a product list string contains only valid Product IDs that are stored in the database for a given
-    vendor
+    vendor (the Product IDs are resolved with a single query per chunk of the list)
     """
-    values = []
-    missing_products = []
-
+    values = set()
     for line in value.splitlines():
-        values += line.split(";")
-    values = sorted([e.strip() for e in values])
-
-    for value in values:
-        try:
-            app.productdb.models.Product.objects.get(product_id=value, vendor_id=vendor_id)
+        values.update([e.strip() for e in line.split(";")])
 
-        except:
-            missing_products.append(value)
+    existing_products = set()
+    for chunk in split_list(values):
+        existing_products.update(app.productdb.models.Product.objects.filter(
+            product_id__in=chunk,
+            vendor_id=vendor_id
+        ).values_list("product_id", flat=True))
 
+    missing_products = sorted(values - existing_products)
     if len(missing_products) != 0:
         v = app.productdb.models.Vendor.objects.filter(id=vendor_id).first()
         msg = "The following products are not found in the database for the vendor %s: %s" % (
@@ -21,7 +21,8 @@ from app.productdb.models import Product, JobFile, ProductGroup, ProductList, Us
 from app.productdb.models import Vendor
 import app.productdb.tasks as tasks
 from django_project.celery import set_meta_data_for_task
-from app.productdb.utils import login_required_if_login_only_mode
+from app.productdb.utils import login_required_if_login_only_mode, split_list
+from app.productdb import product_statistics
 
 HOMEPAGE_CONTEXT_CACHE_KEY = "PDB_HOMEPAGE_CONTEXT"
 logger = logging.getLogger("productdb")
@@ -44,37 +45,18 @@ def home(request):
                 message="No backend worker process is running on the server. Please check the state of the application."
             )
 
-    today_date = datetime.now().date()
-
     context = cache.get(HOMEPAGE_CONTEXT_CACHE_KEY)
     if not context:
-        all_products_query = Product.objects.all()
         context = {
             "recent_events": NotificationMessage.objects.filter(
                 created__gte=datetime.now(get_current_timezone()) - timedelta(days=30)
             ).order_by('-created')[:5],
             "vendors": [x.name for x in Vendor.objects.all() if x.name != "unassigned"],
-            "product_count": all_products_query.count(),
-            "product_lifecycle_count": all_products_query.filter(eox_update_time_stamp__isnull=False).count(),
-            "product_no_eol_announcement_count": all_products_query.filter(
-                eox_update_time_stamp__isnull=False,
-                eol_ext_announcement_date__isnull=True
-            ).count(),
-            "product_eol_announcement_count": all_products_query.filter(
-                eol_ext_announcement_date__isnull=False,
-                end_of_sale_date__gt=today_date
-            ).count(),
-            "product_eos_count": all_products_query.filter(
-                Q(end_of_sale_date__lte=today_date, end_of_support_date__gt=today_date)|
-                Q(end_of_sale_date__lte=today_date, end_of_support_date__isnull=True)
-            ).count(),
-            "product_eol_count": all_products_query.filter(
-                end_of_support_date__lte=today_date
-            ).count(),
-            "product_price_count": all_products_query.filter(list_price__isnull=False).count(),
         }
         cache.set(HOMEPAGE_CONTEXT_CACHE_KEY, context, timeout=60*10)
 
+    # the statistics are refreshed in the background after changes of the Products
+    context.update(product_statistics.get_product_statistics())
     context.update({
         "TB_HOMEPAGE_TEXT_BEFORE_FAVORITE_ACTIONS":
             TextBlock.objects.filter(name=TextBlock.TB_HOMEPAGE_TEXT_BEFORE_FAVORITE_ACTIONS).first(),
@@ -148,7 +130,7 @@ def list_product_lists(request):
         return redirect('%s?next=%s' % (settings.LOGIN_URL, request.path))
 
     context = {
-        "product_lists": ProductList.objects.all()
+        "product_lists": ProductList.objects.select_related("vendor", "update_user")
     }
 
     return render(request, "productdb/product_list/list-product_list.html", context=context)
@@ -203,7 +185,7 @@ def detail_product_list(request, product_list_id=None, share_link=False):
 
     else:
         try:
-            pl = ProductList.objects.get(id=product_list_id)
+            pl = ProductList.objects.select_related("vendor", "update_user").get(id=product_list_id)
 
         except:
             raise Http404("Product List with ID %s not found in database" % product_list_id)
@@ -248,7 +230,9 @@ def view_product_details(request, product_id=None):
 
     else:
         try:
-            view_product = Product.objects.prefetch_related("productmigrationoption_set", "vendor").get(id=product_id)
+            view_product = Product.objects.select_related("vendor", "product_group").prefetch_related(
+                "productmigrationoption_set__migration_source"
+            ).get(id=product_id)
         except:
             raise Http404("Product with ID %s not found in database" % product_id)
 
@@ -276,10 +260,12 @@ def view_product_details(request, product_id=None):
                     "product_id": dict_preferred_replacement_option["get_valid_replacement_product"]
                 })
 
-    for migration_source_name in view_product.get_product_migration_source_names_set():
-        db_migration_path = view_product.get_migration_path(migration_source_name)
+    # all migration paths are fetched with a single query
+    db_migration_paths = view_product.get_migration_paths()
+    for migration_option in view_product.productmigrationoption_set.all():
+        migration_source_name = migration_option.migration_source.name
         dict_migration_paths[migration_source_name] = []
-        for pmo in db_migration_path:
+        for pmo in db_migration_paths.get(migration_source_name, []):
             dict_migration_paths[migration_source_name].append({
                 "replacement_product_id": pmo.replacement_product_id,
                 "is_replacement_in_db": pmo.is_replacement_in_db(),
@@ -337,10 +323,14 @@ def detail_product_check(request, product_check_id):
     if login_required_if_login_only_mode(request):
         return redirect('%s?next=%s' % (settings.LOGIN_URL, request.path))
 
-    product_check = ProductCheck.objects.filter(id=product_check_id).prefetch_related(
+    product_check = ProductCheck.objects.filter(id=product_check_id).select_related(
+        "migration_source",
+        "normalization_vendor",
+    ).prefetch_related(
         "productcheckentry_set",
-        "productcheckentry_set__product_in_database",
-        "productcheckentry_set__migration_product",
+        "productcheckentry_set__product_in_database__vendor",
+        "productcheckentry_set__migration_product__migration_source",
+        "productcheckentry_set__migration_product__replacement_db_product",
     ).first()
 
     if product_check is None:
@@ -350,8 +340,21 @@ def detail_product_check(request, product_check_id):
     if product_check.in_progress:
         return redirect(reverse("task_in_progress", kwargs={"task_id": product_check.task_id}))
 
+    # lookup the names of the Product Lists for all entries at once
+    product_check_entries = product_check.productcheckentry_set.all()
+    product_list_hashes = list(set([h for e in product_check_entries for h in e.product_list_hash_values]))
+    product_list_names = {}
+    for chunk in split_list(product_list_hashes):
+        product_list_names.update(ProductList.objects.filter(hash__in=chunk).values_list("hash", "name"))
+
+    for entry in product_check_entries:
+        entry.product_list_names = sorted(
+            [product_list_names[h] for h in entry.product_list_hash_values if h in product_list_names]
+        )
+
     return render(request, "productdb/product_check/detail-product_check.html", context={
         "product_check": product_check,
+        "product_check_entries": product_check_entries,
         "back_to": request.GET.get("back_to") if request.GET.get("back_to") else reverse("productdb:list-product_checks")
     })
 
@@ -547,7 +550,8 @@ def import_products(request):
                     "job_file_id": job_file.id,
                     "create_notification_on_server": not form.cleaned_data["suppress_notification"],
                     "update_only": form.cleaned_data["update_existing_products_only"],
-                    "user_for_revision": request.user.username
+                    "user_for_revision": request.user.username,
+                    "bulk_mode": form.cleaned_data["bulk_mode"]
                 }
             )
 
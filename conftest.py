@@ -6,7 +6,7 @@ from cacheops import invalidate_all
 from django.core.management import call_command
 from django.core.cache import cache
 from requests import Response
-from app.config.settings import AppSettings
+from app.config.settings import AppSettings, clear_config_options_snapshot
 from app.config import utils
 
 CISCO_API_TEST_CREDENTIALS_FILE = ".cisco_api_credentials"
@@ -102,4 +102,5 @@ def enable_db_access_for_all_tests(db):
 def flush_cache():
     """delete all cached data"""
     cache.clear()
+    clear_config_options_snapshot()
     invalidate_all()
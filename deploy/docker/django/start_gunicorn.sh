@@ -2,6 +2,7 @@
 
 gunicorn django_project.wsgi:application --bind 0.0.0.0:8000 \
         --workers ${PDB_GUNICORN_WORKER} \
+        --threads ${PDB_GUNICORN_THREADS} \
         --log-level=${DJANGO_LOG_LEVEL} \
         --limit-request-line 6144 \
         --timeout 600 \
@@ -1,8 +1,11 @@
+import json
 import logging
 import os
+import time
 import celery
 import raven
 from celery import states
+from celery.signals import task_prerun, task_postrun
 from django.conf import settings
 from django.core.cache import cache
 from raven.contrib.celery import register_signal, register_logger_signal
@@ -74,6 +77,87 @@ def set_meta_data_for_task(task_id, title, redirect_to=None, auto_redirect=True)
     cache.set("task_meta_%s" % task_id, meta_data, 60 * 60 * 8)
 
 
+# Redis pub/sub channel for the progress updates and state changes of a task (see task_progress_stream)
+TASK_PROGRESS_CHANNEL = "pdb:task_progress:%s"
+
+
+class TaskProgress:
+    """
+    progress of a running task, which is stored in the cache instead of the result backend (see task_status_ajax) and
+    published to the TASK_PROGRESS_CHANNEL of the task. Updates with counters are rate-limited to one update every
+    PDB_TASK_PROGRESS_INTERVAL seconds, updates without counters (e.g. the next step of a task) are always written.
+    """
+    def __init__(self, task_id, interval=None):
+        self.task_id = task_id
+        self.interval = interval if interval is not None else settings.PDB_TASK_PROGRESS_INTERVAL
+        self.last_update = None
+        # time and counter of the first update with counters (used to compute the ETA)
+        self.counter_start = None
+
+    def update(self, status_message, current=None, total=None):
+        """returns True if the progress was written to the cache"""
+        now = time.monotonic()
+        if current is not None and self.last_update is not None and now - self.last_update < self.interval:
+            return False
+
+        progress = {
+            "status_message": status_message
+        }
+        if current is not None and total:
+            progress["current"] = current
+            progress["total"] = total
+            progress["percent"] = round(100.0 * current / total, 1)
+            if self.counter_start is None:
+                self.counter_start = now, current
+
+            elif current > self.counter_start[1] and now > self.counter_start[0]:
+                rate = (current - self.counter_start[1]) / (now - self.counter_start[0])
+                progress["eta"] = int((total - current) / rate)
+
+        self.last_update = now
+        cache.set("task_progress_%s" % self.task_id, progress, 60 * 60 * 8)
+        publish_task_progress(self.task_id, progress)
+        return True
+
+
+def get_progress_for_task(task_id):
+    try:
+        progress = cache.get("task_progress_%s" % task_id)
+
+    except Exception:  # catch any exception
+        logging.debug("no progress for task '%s' found" % task_id, exc_info=True)
+        progress = None
+
+    return progress
+
+
+def publish_task_progress(task_id, message):
+    """publish a message to the TASK_PROGRESS_CHANNEL of the task (no-op if Redis is not configured)"""
+    # imported on demand, this module is loaded before the Django settings
+    from app.config.metrics import get_redis_client
+
+    client = get_redis_client()
+    if client is None:
+        return
+
+    try:
+        client.publish(TASK_PROGRESS_CHANNEL % task_id, json.dumps(message))
+
+    except Exception:  # catch any exception, the progress is still available in the cache
+        logging.debug("cannot publish progress of task '%s'" % task_id, exc_info=True)
+
+
+def on_task_state_changed(sender=None, task_id=None, **kwargs):
+    """notify the progress streams that the state of the task within the result backend has changed"""
+    publish_task_progress(task_id, {
+        "state_changed": True
+    })
+
+
+task_prerun.connect(on_task_state_changed)
+task_postrun.connect(on_task_state_changed)
+
+
 @app.task
 def hello_task():  # ignore for coverage
     logging.info("Hello Task called")
@@ -3,6 +3,8 @@ custom context processors for the page
 """
 from django.conf import settings
 
+from app.config import counters
+from app.config.models import UsageCounter
 from app.config.settings import AppSettings
 
 
@@ -38,8 +40,11 @@ def is_ldap_authenticated_user(request):
 
 def get_internal_product_id_label(request):
     app_config = AppSettings()
+    # the statistics are only computed if they are used within the template
     return {
         "INTERNAL_PRODUCT_ID_LABEL": app_config.get_internal_product_id_label(),
-        "STAT_AMOUNT_OF_PRODUCT_CHECKS": app_config.get_amount_of_product_checks(),
-        "STAT_AMOUNT_OF_UNIQUE_PRODUCT_CHECK_ENTRIES": app_config.get_amount_of_unique_product_check_entries()
+        "STAT_AMOUNT_OF_PRODUCT_CHECKS": lambda: counters.get_total(UsageCounter.PRODUCT_CHECKS),
+        "STAT_AMOUNT_OF_UNIQUE_PRODUCT_CHECK_ENTRIES": lambda: counters.get_total(
+            UsageCounter.UNIQUE_PRODUCT_CHECK_ENTRIES
+        )
     }
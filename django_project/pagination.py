@@ -1,17 +1,88 @@
-from rest_framework.exceptions import ValidationError
+from base64 import b64decode, b64encode
+from rest_framework.compat import coreapi, coreschema
+from rest_framework.exceptions import ValidationError, NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 import math
 
 
 class CustomPagination(PageNumberPagination):
+    """
+    page number based pagination, the keyset (cursor) based pagination is used if the cursor query parameter is set
+    (e.g. ?cursor= for the first page). The cursor pagination is ordered by the ID, skips the total amount of records
+    (unless include_total=true is set) and uses the same result format.
+    """
     page_size_query_param = "page_size"
+    max_page_size = 1000
+    cursor_query_param = "cursor"
+    include_total_query_param = "include_total"
+    invalid_cursor_message = "Invalid cursor"
 
-    def get_paginated_response(self, data):
-        used_page_size = int(self.request.GET.get("page_size", self.page_size))
-        if used_page_size > 1000:
+    cursor_mode = False
+    next_cursor = None
+    total_records = None
+
+    def get_used_page_size(self):
+        used_page_size = int(self.request.GET.get(self.page_size_query_param, self.page_size))
+        if used_page_size > self.max_page_size:
             raise ValidationError("page size to big")
 
+        return used_page_size
+
+    @staticmethod
+    def encode_cursor(last_id):
+        return b64encode(str(last_id).encode("ascii")).decode("ascii")
+
+    def decode_cursor(self, cursor):
+        """returns the ID of the last element of the previous page (None for the first page)"""
+        if cursor == "":
+            return None
+
+        try:
+            return int(b64decode(cursor.encode("ascii"), validate=True).decode("ascii"))
+
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_used_page_size()
+        last_id = self.decode_cursor(request.query_params[self.cursor_query_param])
+
+        self.total_records = None
+        if request.query_params.get(self.include_total_query_param, "").lower() == "true":
+            self.total_records = queryset.count()
+
+        queryset = queryset.order_by("pk")
+        if last_id is not None:
+            queryset = queryset.filter(pk__gt=last_id)
+
+        # fetch one additional element to identify the last page without a COUNT query
+        result = list(queryset[:page_size + 1])
+        self.next_cursor = self.encode_cursor(result[page_size - 1].pk) if len(result) > page_size else None
+
+        return result[:page_size]
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+
+        if self.next_cursor is None:
+            return None
+
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        if self.cursor_mode:
+            return self.get_cursor_paginated_response(data)
+
+        used_page_size = self.get_used_page_size()
+
         if self.page.paginator.count / used_page_size <= 1:
             last_page_index = 1
 
@@ -33,3 +104,44 @@ class CustomPagination(PageNumberPagination):
         }
 
         return Response(result)
+
+    def get_cursor_paginated_response(self, data):
+        """same result format as the page number based pagination, the cursor pagination can only move forward"""
+        result = {
+            "pagination": {
+                "total_records": self.total_records,
+                "page_records": len(data),
+                "page": None,
+                "last_page": None,
+                "url": {
+                    "next": self.get_next_link(),
+                    "previous": None,
+                }
+            },
+            "data": data
+        }
+
+        return Response(result)
+
+    def get_schema_fields(self, view):
+        fields = super().get_schema_fields(view)
+        return fields + [
+            coreapi.Field(
+                name=self.cursor_query_param,
+                required=False,
+                location="query",
+                schema=coreschema.String(
+                    title="Cursor",
+                    description="use the cursor pagination (ordered by ID), an empty value returns the first page"
+                )
+            ),
+            coreapi.Field(
+                name=self.include_total_query_param,
+                required=False,
+                location="query",
+                schema=coreschema.Boolean(
+                    title="Include total",
+                    description="include the total amount of records when using the cursor pagination"
+                )
+            ),
+        ]
@@ -31,6 +31,16 @@ CELERYBEAT_SCHEDULE = {
         "task": "ciscoeox.populate_product_lc_state_sync_field",
         "schedule": crontab(hour=1, minute=0)
     },
+    # recompute the migration paths (the validity of a replacement depends on the current date)
+    "productdb.rebuild_migration_paths": {
+        "task": "productdb.rebuild_migration_paths",
+        "schedule": crontab(hour=0, minute=30)
+    },
+    # refresh the homepage statistics (the cache timeout PDB_PRODUCT_STATISTICS_CACHE_TIMEOUT must be longer)
+    "productdb.refresh_product_statistics": {
+        "task": "productdb.refresh_product_statistics",
+        "schedule": crontab(minute="*/5")
+    },
     # remove all product checks every Sunday at midnight
     "productdb.delete_all_product_checks": {
         "task": "productdb.delete_all_product_checks",
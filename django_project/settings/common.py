@@ -30,6 +30,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "app.config.metrics.MetricsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -43,11 +44,12 @@ if os.getenv("PDB_DEBUG", False) and os.getenv("PDB_DEBUG_NO_CACHE", False):
     logger.warning("DJANGO CONFIG: use database caching and disable cacheops...")
     CACHES = {
         "default": {
-            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "BACKEND": "app.config.metrics.DatabaseCache",
             "LOCATION": "product_database_cache_table",
         }
     }
     CACHEOPS_ENABLED = False  # disable cacheops for debugging
+    PDB_METRICS_REDIS = None  # request metrics are only available per process
 
 else:
     redis_server = os.environ.get("PDB_REDIS_HOST", "127.0.0.1")
@@ -55,7 +57,7 @@ else:
     redis_pass = os.environ.get("PDB_REDIS_PASSWORD", None)
     CACHES = {
         "default": {
-            "BACKEND": "redis_cache.RedisCache",
+            "BACKEND": "app.config.metrics.RedisCache",
             "LOCATION": "%s:%s" % (redis_server, redis_port),
             "OPTIONS": {
                 "CONNECTION_POOL_CLASS": "redis.BlockingConnectionPool",
@@ -69,6 +71,12 @@ else:
     if redis_pass:
         CACHES["default"]["OPTIONS"]["PASSWORD"] = redis_pass
 
+    PDB_METRICS_REDIS = {
+        "host": redis_server,
+        "port": redis_port,
+        "password": redis_pass,
+    }
+
     if os.getenv("PDB_DISABLE_CACHEOPS", False):
         logger.warning("DJANGO CONFIG: use redis caching and disable cacheops...")
         CACHEOPS_ENABLED = False  # disable cacheops for debugging
@@ -104,6 +112,42 @@ else:
             },
         }
 
+# request metrics (see app.config.metrics), the values are flushed to Redis every PDB_METRICS_FLUSH_INTERVAL seconds
+# and requests that take longer than PDB_SLOW_REQUEST_THRESHOLD seconds are logged with the slowest SQL statements
+PDB_METRICS_FLUSH_INTERVAL = int(os.getenv("PDB_METRICS_FLUSH_INTERVAL", 15))
+PDB_SLOW_REQUEST_THRESHOLD = float(os.getenv("PDB_SLOW_REQUEST_THRESHOLD", 2.0))
+
+# the config options are cached per process and revalidated every PDB_CONFIG_OPTIONS_REVALIDATE_INTERVAL seconds (see
+# app.config.settings), changes in another process are therefore visible after this interval
+PDB_CONFIG_OPTIONS_REVALIDATE_INTERVAL = float(os.getenv("PDB_CONFIG_OPTIONS_REVALIDATE_INTERVAL", 5.0))
+
+# minimum interval (seconds) between two progress updates of a task (see django_project.celery.TaskProgress)
+PDB_TASK_PROGRESS_INTERVAL = float(os.getenv("PDB_TASK_PROGRESS_INTERVAL", 2.0))
+
+# maximum duration (seconds) of a task progress stream before the browser reconnects (see task_progress_stream)
+PDB_TASK_PROGRESS_STREAM_TIMEOUT = int(os.getenv("PDB_TASK_PROGRESS_STREAM_TIMEOUT", 30))
+
+# maximum amount of concurrent task progress streams per web worker process, every stream occupies a thread of the
+# worker, therefore further clients poll the task state (see task_progress_stream)
+PDB_TASK_PROGRESS_STREAM_LIMIT = int(os.getenv("PDB_TASK_PROGRESS_STREAM_LIMIT", 4))
+
+# delay (seconds) of the refresh of the homepage statistics after changes of the Products, all changes within this
+# delay are coalesced (see app.productdb.product_statistics)
+PDB_PRODUCT_STATISTICS_REFRESH_DELAY = int(os.getenv("PDB_PRODUCT_STATISTICS_REFRESH_DELAY", 30))
+
+# lifetime (seconds) of the cached homepage statistics, must be longer than the interval of the periodic refresh (5
+# minutes), upper bound for outdated statistics if the refresh task is not executed (e.g. no backend worker is running)
+PDB_PRODUCT_STATISTICS_CACHE_TIMEOUT = int(os.getenv("PDB_PRODUCT_STATISTICS_CACHE_TIMEOUT", 900))
+
+# maximum amount of Product IDs per request of the Product lookup API endpoint (see app.productdb.product_lookup)
+PDB_API_PRODUCT_LOOKUP_LIMIT = int(os.getenv("PDB_API_PRODUCT_LOOKUP_LIMIT", 10000))
+
+# maximum amount of Products per request of the bulk write API endpoint (see app.productdb.bulk_upsert)
+PDB_API_PRODUCT_BULK_LIMIT = int(os.getenv("PDB_API_PRODUCT_BULK_LIMIT", 1000))
+
+# maximum amount of input strings per request of the batch normalization API endpoint (see app.productdb.normalization)
+PDB_API_NORMALIZATION_BATCH_LIMIT = int(os.getenv("PDB_API_NORMALIZATION_BATCH_LIMIT", 10000))
+
 ROOT_URLCONF = "django_project.urls"
 
 TEMPLATES = [
@@ -3,6 +3,7 @@ Test suite for the django_project.celery module
 """
 import pytest
 import uuid
+from app.config import metrics
 from django_project import celery
 
 pytestmark = pytest.mark.django_db
@@ -62,3 +63,52 @@ class TestCustomMetaData:
         assert result["title"] == test_title
         assert result["auto_redirect"] is False
         assert result["redirect_to"] == test_redirect
+
+
+class TestTaskProgress:
+    def test_get_invalid_task_progress(self):
+        assert celery.get_progress_for_task("invalid id") is None
+
+    def test_rate_limited_updates(self, monkeypatch):
+        test_task_id = str(uuid.uuid4())
+        now = [100.0]
+        monkeypatch.setattr(celery.time, "monotonic", lambda: now[0])
+        progress = celery.TaskProgress(test_task_id, interval=2)
+
+        assert progress.update("start import...") is True
+        assert progress.update("Process entry 1 of 100", current=1, total=100) is False
+        assert celery.get_progress_for_task(test_task_id) == {"status_message": "start import..."}
+
+        now[0] = 102.0
+        assert progress.update("Process entry 10 of 100", current=10, total=100) is True
+        assert celery.get_progress_for_task(test_task_id) == {
+            "status_message": "Process entry 10 of 100",
+            "current": 10,
+            "total": 100,
+            "percent": 10.0
+        }
+
+        now[0] = 103.0
+        assert progress.update("Process entry 20 of 100", current=20, total=100) is False
+
+        # updates without counters are always written
+        assert progress.update("save to database...") is True
+
+        now[0] = 106.0
+        assert progress.update("Process entry 50 of 100", current=50, total=100) is True
+        result = celery.get_progress_for_task(test_task_id)
+        assert result["percent"] == 50.0
+        assert result["eta"] == 5, "10 entries per second since the first update with counters"
+
+    def test_publish_progress(self, monkeypatch):
+        published = []
+        client = type("MockRedis", (), {"publish": lambda self, channel, message: published.append((channel, message))})
+        monkeypatch.setattr(metrics, "get_redis_client", lambda: client())
+
+        celery.TaskProgress("mock_task_id", interval=2).update("start import...")
+        celery.on_task_state_changed(task_id="mock_task_id")
+
+        assert published == [
+            ("pdb:task_progress:mock_task_id", '{"status_message": "start import..."}'),
+            ("pdb:task_progress:mock_task_id", '{"state_changed": true}'),
+        ]
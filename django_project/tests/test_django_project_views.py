@@ -6,6 +6,7 @@ import pytest
 import redis
 from django.contrib.auth.models import AnonymousUser, User
 from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.cache import cache
 from django.urls import reverse
 from django.test import RequestFactory
 from django_project.celery import app, TaskState
@@ -392,6 +393,40 @@ class TestStatusAjaxCall:
         assert response.status_code == 200, "Should be callable"
         assert json.loads(response.content.decode()) == {"state": "processing", "status_message": "no state"}
 
+    def test_processing_task_with_progress(self, monkeypatch):
+        class MockAsyncResult:
+            state = TaskState.PENDING
+
+        monkeypatch.setattr(app, "AsyncResult", lambda task_id: MockAsyncResult())
+        cache.set("task_progress_mock_task_id", {
+            "status_message": "Process entry 50 of 200",
+            "current": 50,
+            "total": 200,
+            "percent": 25.0,
+            "eta": 30
+        })
+
+        url = reverse(self.URL_NAME, kwargs={"task_id": "mock_task_id"})
+        request = RequestFactory().get(url)
+        request.META["HTTP_X_REQUESTED_WITH"] = "XMLHttpRequest"  # AJAX request
+        request.user = User.objects.create(username="testuser", is_superuser=False, is_staff=False)
+
+        try:
+            response = views.task_status_ajax(request, "mock_task_id")
+
+        finally:
+            cache.delete("task_progress_mock_task_id")
+
+        assert response.status_code == 200, "Should be callable"
+        assert json.loads(response.content.decode()) == {
+            "state": "processing",
+            "status_message": "Process entry 50 of 200",
+            "current": 50,
+            "total": 200,
+            "percent": 25.0,
+            "eta": 30
+        }
+
     def test_success_task_state_without_error(self, monkeypatch):
         class MockAsyncResult:
             state = TaskState.SUCCESS
@@ -508,3 +543,107 @@ class TestStatusAjaxCall:
         response = views.task_status_ajax(request, "mock_task_id")
 
         assert response.status_code == 400
+
+
+class MockPubSub:
+    """pub/sub connection that returns the given messages (None if no message was received)"""
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.channels = []
+        self.closed = False
+
+    def subscribe(self, channel):
+        self.channels.append(channel)
+
+    def get_message(self, timeout=0):
+        return self.messages.pop(0) if self.messages else None
+
+    def close(self):
+        self.closed = True
+
+
+class MockRedis:
+    def __init__(self, messages):
+        self.pubsub_connection = MockPubSub(messages)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return self.pubsub_connection
+
+
+class TestTaskProgressStream:
+    URL_NAME = "task_progress_stream"
+
+    def test_without_redis(self, monkeypatch):
+        monkeypatch.setattr(views, "get_redis_client", lambda: None)
+
+        url = reverse(self.URL_NAME, kwargs={"task_id": "mock_task_id"})
+        request = RequestFactory().get(url)
+        request.user = AnonymousUser()
+        response = views.task_progress_stream(request, "mock_task_id")
+
+        assert response.status_code == 503, "task_status_ajax is used as fallback"
+
+    def test_stream(self, monkeypatch):
+        states = [
+            {"state": "pending", "status_message": "try to start task"},
+            {"state": "success", "status_message": "done"},
+        ]
+        monkeypatch.setattr(views, "get_task_state", lambda task_id: states.pop(0))
+        client = MockRedis([
+            None,
+            {"data": json.dumps({"status_message": "Process entry 10 of 20", "percent": 50.0})},
+            {"data": json.dumps({"state_changed": True})},
+        ])
+        monkeypatch.setattr(views, "get_redis_client", lambda: client)
+
+        url = reverse(self.URL_NAME, kwargs={"task_id": "mock_task_id"})
+        request = RequestFactory().get(url)
+        request.user = AnonymousUser()
+        response = views.task_progress_stream(request, "mock_task_id")
+
+        assert response.status_code == 200
+        assert response["Content-Type"] == "text/event-stream"
+        events = [e.decode() for e in response.streaming_content]
+        assert events == [
+            "retry: 1000\n",
+            'data: {"state": "pending", "status_message": "try to start task"}\n\n',
+            ": keep-alive\n\n",
+            'data: {"status_message": "Process entry 10 of 20", "percent": 50.0, "state": "processing"}\n\n',
+            'data: {"state": "success", "status_message": "done"}\n\n',
+        ]
+        response.close()
+        assert client.pubsub_connection.channels == ["pdb:task_progress:mock_task_id"]
+        assert client.pubsub_connection.closed is True
+
+    def test_stream_limit(self, monkeypatch, settings):
+        settings.PDB_TASK_PROGRESS_STREAM_LIMIT = 1
+        monkeypatch.setattr(views, "_progress_streams", {"active": 0})
+        monkeypatch.setattr(views, "get_task_state", lambda task_id: {"state": "success", "status_message": ""})
+        monkeypatch.setattr(views, "get_redis_client", lambda: MockRedis([]))
+
+        url = reverse(self.URL_NAME, kwargs={"task_id": "mock_task_id"})
+        request = RequestFactory().get(url)
+        request.user = AnonymousUser()
+        response = views.task_progress_stream(request, "mock_task_id")
+        assert response.status_code == 200
+
+        # the limit is reached, task_status_ajax is used as fallback
+        assert views.task_progress_stream(request, "mock_task_id").status_code == 503
+
+        # the stream is released when the response is closed (also if it was not consumed)
+        response.close()
+        response.close()
+        response = views.task_progress_stream(request, "mock_task_id")
+        assert response.status_code == 200
+        list(response.streaming_content)
+        response.close()
+        assert views._progress_streams["active"] == 0
+
+    def test_stream_timeout(self, monkeypatch):
+        monkeypatch.setattr(views, "get_task_state", lambda task_id: {"state": "pending", "status_message": ""})
+        client = MockRedis([])
+
+        events = list(views.stream_task_progress(client, "mock_task_id", timeout=0))
+
+        assert events == ["retry: 1000\n", 'data: {"state": "pending", "status_message": ""}\n\n']
+        assert client.pubsub_connection.closed is True
@@ -14,6 +14,7 @@ urlpatterns = [
 
     # common views for the application
     url(r"^productdb/task/watch/(?P<task_id>.*)", views.task_status_ajax, name="task_state"),
+    url(r"^productdb/task/stream/(?P<task_id>.*)", views.task_progress_stream, name="task_progress_stream"),
     url(r"^productdb/task/(?P<task_id>.*)", views.task_progress_view, name="task_in_progress"),
     url(r'^productdb/login/$', views.login_user, name="login"),
     url(r'^productdb/logout/$', views.logout_user, name="logout"),
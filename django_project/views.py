@@ -1,4 +1,7 @@
+import json
 import logging
+import threading
+import time
 
 import redis
 from django.conf import settings
@@ -6,18 +9,27 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import PasswordChangeView
-from django.http import HttpResponseForbidden, JsonResponse, HttpResponse
+from django.http import HttpResponseForbidden, JsonResponse, HttpResponse, StreamingHttpResponse
 from django.http import HttpResponseRedirect
 from django.shortcuts import redirect, render, render_to_response
 from django.urls import reverse_lazy, reverse
 
+from app.config.metrics import get_redis_client
 from app.config.settings import AppSettings
 from app.productdb.utils import login_required_if_login_only_mode
-from django_project.celery import app as celery, TaskState, get_meta_data_for_task
+from django_project.celery import app as celery, TaskState, TASK_PROGRESS_CHANNEL, get_meta_data_for_task, \
+    get_progress_for_task
 from django_project import context_processors
 
 logger = logging.getLogger("productdb")
 
+# interval (seconds) of the keep-alive comments within the task progress stream
+TASK_PROGRESS_STREAM_KEEPALIVE = 15
+
+# amount of open task progress streams within the process (see task_progress_stream)
+_progress_streams = {"active": 0}
+_progress_streams_lock = threading.Lock()
+
 
 def custom_page_not_found_view(request, exception):
     response = render(request, 'django_project/custom_404_page.html', {})
@@ -159,6 +171,69 @@ def task_progress_view(request, task_id):
     return render(request, "django_project/task_progress_view.html", context=context)
 
 
+def get_task_state(task_id):
+    """returns the state of the task as dictionary (used by task_status_ajax and task_progress_stream)"""
+    try:
+        task = celery.AsyncResult(task_id)
+        is_running = task.state in [TaskState.PENDING, TaskState.STARTED] or \
+            task.state.lower() == TaskState.PROCESSING
+
+        # the progress of a running task is not stored in the result backend (see TaskProgress)
+        progress = get_progress_for_task(task_id) if is_running else None
+        if progress:
+            response = {
+                "state": "processing"
+            }
+            response.update(progress)
+
+        elif task.state == TaskState.PENDING:
+            response = {
+                "state": "pending",
+                "status_message": "try to start task"
+            }
+
+        elif task.state == TaskState.STARTED or task.state.lower() == TaskState.PROCESSING:
+            response = {
+                "state": "processing",
+                "status_message": task.info.get("status_message", "")
+            }
+
+        elif task.state == TaskState.SUCCESS:
+            response = {
+                "state": "success",
+                "status_message": task.info.get("status_message", "")
+            }
+            if "error_message" in task.info:
+                response["error_message"] = task.info["error_message"]
+
+            if "data" in task.info:
+                response["data"] = task.info["data"]
+
+        else:
+            # something went wrong in the within the task
+            response = {
+                "state": "failed",
+                "error_message": str(task.info),  # this is the exception that was raised
+            }
+
+    except redis.ConnectionError:
+        logger.error("cannot get task update", exc_info=True)
+        response = {
+            "state": "failed",
+            "error_message": "A server process (redis) is not running, please contact the administrator"
+        }
+
+    except Exception:  # catch any exception
+        logger.error("cannot get task update", exc_info=True)
+        response = {
+            "state": "failed",
+            "error_message": "Unknown error: " + str(task.info),  # this is the exception raised
+        }
+    logger.debug("task state for %s is\n%s" % (task_id, str(response)))
+
+    return response
+
+
 def task_status_ajax(request, task_id):
     """returns a JSON representation of the task state"""
     if settings.DEBUG:  # show results for task in debug mode
@@ -167,54 +242,99 @@ def task_status_ajax(request, task_id):
         valid_request = request.is_ajax()
 
     if valid_request:
-        try:
-            task = celery.AsyncResult(task_id)
-            if task.state == TaskState.PENDING:
-                response = {
-                    "state": "pending",
-                    "status_message": "try to start task"
-                }
-
-            elif task.state == TaskState.STARTED or task.state.lower() == TaskState.PROCESSING:
-                response = {
-                    "state": "processing",
-                    "status_message": task.info.get("status_message", "")
-                }
-
-            elif task.state == TaskState.SUCCESS:
-                response = {
-                    "state": "success",
-                    "status_message": task.info.get("status_message", "")
-                }
-                if "error_message" in task.info:
-                    response["error_message"] = task.info["error_message"]
-
-                if "data" in task.info:
-                    response["data"] = task.info["data"]
+        return JsonResponse(get_task_state(task_id))
+
+    else:
+        return HttpResponse("Bad Request", status=400)
+
+
+def task_progress_stream(request, task_id):
+    """
+    streams the state of the task as server-sent events, the events are pushed by the tasks using Redis pub/sub (see
+    TaskProgress). The stream is closed after PDB_TASK_PROGRESS_STREAM_TIMEOUT seconds (the browser reconnects
+    automatically), task_status_ajax is used as fallback if Redis is not available or if the process already serves
+    PDB_TASK_PROGRESS_STREAM_LIMIT streams (every stream occupies a worker thread).
+    """
+    client = get_redis_client()
+    if client is None or not acquire_progress_stream():
+        return HttpResponse("Service Unavailable", status=503)
+
+    response = StreamingHttpResponse(
+        ProgressStream(stream_task_progress(client, task_id)),
+        content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def acquire_progress_stream():
+    """returns True if another task progress stream can be opened within the process"""
+    with _progress_streams_lock:
+        if _progress_streams["active"] >= settings.PDB_TASK_PROGRESS_STREAM_LIMIT:
+            return False
+
+        _progress_streams["active"] += 1
+        return True
+
+
+def release_progress_stream():
+    with _progress_streams_lock:
+        _progress_streams["active"] -= 1
+
+
+class ProgressStream:
+    """events of a task progress stream, the stream is released when the response is closed"""
+    def __init__(self, events):
+        self.events = events
+        self.released = False
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def close(self):
+        self.events.close()
+        if not self.released:
+            self.released = True
+            release_progress_stream()
+
+
+def stream_task_progress(client, task_id, timeout=None):
+    """generator for the server-sent events of task_progress_stream"""
+    timeout = timeout if timeout is not None else settings.PDB_TASK_PROGRESS_STREAM_TIMEOUT
+    deadline = time.monotonic() + timeout
+
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    try:
+        # subscribe before reading the current state, otherwise a change between both calls is lost
+        pubsub.subscribe(TASK_PROGRESS_CHANNEL % task_id)
+        state = get_task_state(task_id)
+        yield "retry: 1000\n"
+        yield format_server_sent_event(state)
+
+        while state["state"] not in ["success", "failed"] and time.monotonic() < deadline:
+            remaining = max(deadline - time.monotonic(), 0)
+            message = pubsub.get_message(timeout=min(remaining, TASK_PROGRESS_STREAM_KEEPALIVE))
+            if message is None:
+                # keep the connection open
+                yield ": keep-alive\n\n"
+                continue
+
+            data = json.loads(message["data"])
+            if data.get("state_changed"):
+                state = get_task_state(task_id)
 
             else:
-                # something went wrong in the within the task
-                response = {
-                    "state": "failed",
-                    "error_message": str(task.info),  # this is the exception that was raised
-                }
-
-        except redis.ConnectionError:
-            logger.error("cannot get task update", exc_info=True)
-            response = {
-                "state": "failed",
-                "error_message": "A server process (redis) is not running, please contact the administrator"
-            }
+                state = dict(data, state="processing")
 
-        except Exception:  # catch any exception
-            logger.error("cannot get task update", exc_info=True)
-            response = {
-                "state": "failed",
-                "error_message": "Unknown error: " + str(task.info),  # this is the exception raised
-            }
-        logger.debug("task state for %s is\n%s" % (task_id, str(response)))
+            yield format_server_sent_event(state)
 
-        return JsonResponse(response)
+    except redis.RedisError:
+        logger.error("cannot stream task progress", exc_info=True)
 
-    else:
-        return HttpResponse("Bad Request", status=400)
+    finally:
+        pubsub.close()
+
+
+def format_server_sent_event(data):
+    return "data: %s\n\n" % json.dumps(data)